@@ -19,6 +19,7 @@ if str(_APP_DIR) not in sys.path:
 from survey_xml_generator.config import OPENAI_MODEL
 from survey_xml_generator.ai_client import reset_client
 from survey_xml_generator.assembler import process_bytes
+from survey_xml_generator.logic_graph import graph_to_dot
 
 # ---------------------------------------------------------------------------
 # API key resolution: st.secrets -> .env -> user input
@@ -194,6 +195,15 @@ if uploaded_file is not None:
             use_container_width=True,
         )
 
+        if debug_info.get("logic_graph"):
+            st.download_button(
+                label="Download logic graph (Graphviz)",
+                data=graph_to_dot(debug_info["logic_graph"]),
+                file_name=xml_filename.replace(".xml", ".logic.dot"),
+                mime="text/vnd.graphviz",
+                use_container_width=True,
+            )
+
         with st.expander("Preview XML", expanded=True):
             st.markdown(
                 """<style>
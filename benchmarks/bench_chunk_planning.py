@@ -0,0 +1,170 @@
+"""Benchmark: stage makespan with document-order vs. cost-aware chunking.
+
+Builds synthetic questionnaires (screeners of short single-selects followed
+by matrix-heavy persona blocks, the shape that puts the most expensive
+chunk last) and simulates dispatching their segmentation and
+classification chunks onto a fixed number of AI workers.
+
+Strategies compared per document:
+    fixed/doc    fixed-size chunks, submitted in document order (old)
+    fixed/lpt    fixed-size chunks, most expensive first
+    balanced/lpt cost-balanced boundaries, most expensive first (new);
+                 classification chunks are also packed by token budget
+
+"lpt" uses the stages' ``submission_order``: longest-first only when there
+are more chunks than workers, since otherwise every chunk starts at once.
+
+Simulated durations are the planner's cost estimate times log-normal
+noise, so the planner is not graded against its own model.
+
+Usage:
+    python benchmarks/bench_chunk_planning.py [--workers 5] [--trials 50]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from survey_xml_generator.chunk_planner import (  # noqa: E402
+    block_cost,
+    plan_chunks,
+    segment_cost,
+    simulate_makespan,
+    submission_order,
+)
+from survey_xml_generator.classifier import (  # noqa: E402
+    _CHUNK_FIXED_COST as CLASSIFY_FIXED,
+    _plan_segment_chunks,
+)
+from survey_xml_generator.config import (  # noqa: E402
+    CLASSIFICATION_COMPACT_OUTPUT,
+    SEGMENTATION_CHUNK_OVERLAP,
+    SEGMENTATION_CHUNK_SIZE,
+)
+from survey_xml_generator.segmenter import _CHUNK_FIXED_COST as SEGMENT_FIXED  # noqa: E402
+
+
+# ---------------------------------------------------------------------------
+# Synthetic documents
+# ---------------------------------------------------------------------------
+
+def _para(words):
+    return {"block_type": "paragraph", "text": " ".join("lorem" for _ in range(words))}
+
+
+def synthetic_document(rng: random.Random, screeners: int, personas: int):
+    """Return (blocks, segments) for a screener-then-matrices questionnaire."""
+    blocks, segments = [], []
+    for q in range(screeners):
+        n_opts = rng.randint(2, 6)
+        blocks.append(_para(3))
+        blocks.append(_para(rng.randint(8, 20)))
+        blocks.extend(_para(rng.randint(1, 3)) for _ in range(n_opts))
+        segments.append({
+            "block_type": "question",
+            "label": f"qS{q}",
+            "title_text": "lorem " * 12,
+            "answer_lines": ["opt"] * n_opts,
+        })
+    for p in range(personas):
+        for m in range(rng.randint(2, 4)):
+            rows = [[f"statement {r} " + "lorem " * rng.randint(10, 25)] + ["x"] * 5
+                    for r in range(rng.randint(10, 20))]
+            blocks.append(_para(25))
+            blocks.append({"block_type": "table", "rows": rows})
+            segments.append({
+                "block_type": "question",
+                "label": f"qP{p}M{m}",
+                "title_text": "lorem " * 25,
+                "is_matrix": True,
+                "matrix_statements": [r[0] for r in rows],
+                "matrix_scale": ["Strongly agree", "Agree", "Neutral",
+                                 "Disagree", "Strongly disagree"],
+            })
+    return blocks, segments
+
+
+# ---------------------------------------------------------------------------
+# Strategies
+# ---------------------------------------------------------------------------
+
+def _fixed_ranges(n, size, overlap):
+    if n <= size:
+        return [(0, n)]
+    ranges, start = [], 0
+    while start < n:
+        ranges.append((start, min(start + size, n)))
+        start += size - overlap
+    return ranges
+
+
+# Segments per classification chunk before token budgets
+_OLD_CLASSIFICATION_CHUNK_SIZE = 30
+
+
+def _stage_makespans(costs, base, workers, strategies, rng, trials):
+    results = {"fixed/doc": [], "fixed/lpt": [], "balanced/lpt": []}
+    for _ in range(trials):
+        noise = [rng.lognormvariate(0, 0.25) for _ in costs]
+        for name, ranges in strategies.items():
+            actual = [
+                base * rng.lognormvariate(0, 0.1)
+                + sum(costs[i] * noise[i] for i in range(s, e))
+                for s, e in ranges
+            ]
+            estimated = [base + sum(costs[s:e]) for s, e in ranges]
+            if name == "fixed":
+                results["fixed/doc"].append(simulate_makespan(actual, workers))
+            results[f"{name}/lpt"].append(
+                simulate_makespan(actual, workers, submission_order(estimated, workers))
+            )
+    chunks = {name: len(r) for name, r in strategies.items()}
+    return {k: statistics.mean(v) for k, v in results.items()}, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    docs = [("small", 15, 1), ("screener-heavy", 60, 2), ("persona-heavy", 25, 6), ("tracker", 90, 8)]
+    print(f"workers={args.workers} trials={args.trials} (estimated seconds, mean makespan)\n")
+    header = f"{'document':<16} {'stage':<9} {'chunks':>9} {'fixed/doc':>10} {'fixed/lpt':>10} {'bal/lpt':>10} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, screeners, personas in docs:
+        blocks, segments = synthetic_document(rng, screeners, personas)
+        block_costs = [block_cost(b) for b in blocks]
+        stages = [
+            ("segment", block_costs, SEGMENT_FIXED, {
+                "fixed": _fixed_ranges(len(blocks), SEGMENTATION_CHUNK_SIZE, SEGMENTATION_CHUNK_OVERLAP),
+                "balanced": plan_chunks(
+                    block_costs, workers=args.workers, max_items=SEGMENTATION_CHUNK_SIZE,
+                    base_cost=SEGMENT_FIXED, overlap=SEGMENTATION_CHUNK_OVERLAP,
+                    min_items=2 * SEGMENTATION_CHUNK_OVERLAP,
+                ),
+            }),
+            ("classify", [segment_cost(s, CLASSIFICATION_COMPACT_OUTPUT) for s in segments], CLASSIFY_FIXED, {
+                "fixed": _fixed_ranges(len(segments), _OLD_CLASSIFICATION_CHUNK_SIZE, 0),
+                "balanced": _plan_segment_chunks(segments, args.workers),
+            }),
+        ]
+        for stage, costs, base, strategies in stages:
+            ms, chunks = _stage_makespans(costs, base, args.workers, strategies, rng, args.trials)
+            print(
+                f"{name:<16} {stage:<9} {chunks['fixed']:>4}->{chunks['balanced']:<4}"
+                f"{ms['fixed/doc']:>10.1f} {ms['fixed/lpt']:>10.1f} {ms['balanced/lpt']:>10.1f}"
+                f" {ms['fixed/doc'] / ms['balanced/lpt']:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
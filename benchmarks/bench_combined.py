@@ -0,0 +1,122 @@
+"""Benchmark: two-stage vs. combined segment+classify latency for small documents.
+
+Builds synthetic screeners of increasing length (a question line, the
+question text and its answers per question, a pagebreak after each) and
+estimates end-to-end Stage 2+3 latency with the chunk planner's cost
+model:
+
+    two-stage   segmentation call, then the classification chunks (run in
+                parallel) once it has answered
+    combined    one call whose answer holds both the segments and their
+                classification (only for documents under the token budget)
+
+Simulated durations are the planner's cost estimate times log-normal
+noise, so a single slow call is not hidden behind the average.
+
+Usage:
+    python benchmarks/bench_combined.py [--questions 5 10 20 40 80] [--trials 200]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from survey_xml_generator.block_store import BlockStore  # noqa: E402
+from survey_xml_generator.chunk_planner import (  # noqa: E402
+    SEGMENTATION_OUTPUT_RATIO,
+    call_cost,
+    estimate_tokens,
+    segment_cost,
+)
+from survey_xml_generator.classifier import (  # noqa: E402
+    _CHUNK_FIXED_COST as CLASSIFY_FIXED,
+    _chunk_segments,
+)
+from survey_xml_generator.config import (  # noqa: E402
+    CLASSIFICATION_COMPACT_OUTPUT as COMPACT,
+    COMBINED_MAX_DOCUMENT_TOKENS,
+    SEGMENTATION_CHUNK_SIZE,
+)
+from survey_xml_generator.prompts import combined, segmentation  # noqa: E402
+
+_ANSWERS = [
+    "Yes", "No", "Not sure", "Very likely", "Somewhat likely", "Not very likely",
+    "Not at all likely", "Under $50,000", "$50,000 - $99,999", "$100,000 or more",
+]
+
+
+def synthetic_screener(rng, n_questions):
+    """(blocks, segments) for a screener of ``n_questions`` questions."""
+    blocks, segments = [], []
+    for i in range(n_questions):
+        start = len(blocks)
+        answers = rng.sample(_ANSWERS, rng.randint(2, 6))
+        title = f"How likely are you to take a leisure trip of {i + 1} nights or more in the next 12 months?"
+        blocks.append({"block_type": "paragraph", "text": f"Q. SCREENER {i + 1}"})
+        blocks.append({"block_type": "paragraph", "text": title})
+        blocks.extend({"block_type": "paragraph", "text": a, "is_list_item": True} for a in answers)
+        segments.append({
+            "block_type": "question", "label": f"qScreener{i + 1}", "title_text": title,
+            "instruction_text": "Select one.", "answer_lines": answers,
+            "paragraph_indices": list(range(start, len(blocks))),
+        })
+        blocks.append({"block_type": "pagebreak", "text": ""})
+    for i, block in enumerate(blocks):
+        block["index"] = i
+    return blocks, segments
+
+
+def _noisy(rng, seconds):
+    return seconds * rng.lognormvariate(0, 0.25)
+
+
+def two_stage(rng, blocks_tokens, segments):
+    seg_prompt = estimate_tokens(segmentation.SYSTEM_PROMPT + segmentation.USER_PROMPT_TEMPLATE)
+    total = _noisy(rng, call_cost(seg_prompt + blocks_tokens, blocks_tokens * SEGMENTATION_OUTPUT_RATIO))
+    return total + max(
+        _noisy(rng, CLASSIFY_FIXED + sum(segment_cost(s, COMPACT) for s in chunk))
+        for chunk in _chunk_segments(segments)
+    )
+
+
+def combined_call(rng, blocks_tokens, segments):
+    template = combined.COMPACT_USER_PROMPT_TEMPLATE if COMPACT else combined.USER_PROMPT_TEMPLATE
+    prompt = estimate_tokens(combined.SYSTEM_PROMPT + template) + blocks_tokens
+    classify = sum(segment_cost(s, COMPACT) for s in segments)
+    return _noisy(rng, call_cost(prompt, blocks_tokens * SEGMENTATION_OUTPUT_RATIO) + classify)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, nargs="+", default=[5, 10, 20, 40, 80])
+    parser.add_argument("--trials", type=int, default=200)
+    args = parser.parse_args()
+
+    header = f"{'questions':>9} {'blocks':>7} {'tokens':>7} {'two-stage s':>12} {'combined s':>11} {'saved':>6}"
+    print(header)
+    print("-" * len(header))
+    for n in args.questions:
+        rng = random.Random(n)
+        blocks, segments = synthetic_screener(rng, n)
+        content = [b for b in blocks if b["block_type"] != "pagebreak"]
+        store = BlockStore.from_blocks(content)
+        blocks_tokens = estimate_tokens(store.select(range(len(store))).to_prompt_json())
+        fits = len(content) <= SEGMENTATION_CHUNK_SIZE and blocks_tokens <= COMBINED_MAX_DOCUMENT_TOKENS
+
+        staged = statistics.median(two_stage(rng, blocks_tokens, segments) for _ in range(args.trials))
+        if fits:
+            single = statistics.median(combined_call(rng, blocks_tokens, segments) for _ in range(args.trials))
+            cells = f"{single:>11.1f} {1 - single / staged:>6.0%}"
+        else:
+            cells = f"{'(too big)':>11} {'':>6}"
+        print(f"{n:>9} {len(content):>7} {blocks_tokens:>7} {staged:>12.1f} {cells}")
+    print(f"\nCOMBINED_MAX_DOCUMENT_TOKENS={COMBINED_MAX_DOCUMENT_TOKENS}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark: country / US state lookup cost per query.
+
+Times ``PlaceIndex.lookup`` for exact names, aliases, misspellings and
+non-place text (the "Other" / "None of the above" options every country
+list has), next to ``difflib.get_close_matches`` over the same spellings
+as a reference for what naive fuzzy matching would cost.
+
+Usage:
+    python benchmarks/bench_place_lookup.py [--repeat 2000]
+"""
+
+import argparse
+import difflib
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from survey_xml_generator.data.place_lookup import (  # noqa: E402
+    PlaceIndex,
+    country_index,
+    normalize_place,
+    us_state_index,
+)
+from survey_xml_generator.data.countries import COUNTRIES  # noqa: E402
+from survey_xml_generator.data.place_lookup import COUNTRY_ALIASES  # noqa: E402
+
+QUERIES = {
+    "countries": {
+        "exact": ["United States", "Canada", "Germany", "Japan", "New Zealand"],
+        "alias": ["USA", "U.S.", "United States of America", "Bahamas", "UK"],
+        "typo": ["Untied States", "Germny", "Phillipines", "Argentinia", "Kazakstan"],
+        "miss": ["Other", "None of the above", "Prefer not to say", "Don't know", "Europe"],
+    },
+    "us_states": {
+        "exact": ["New York", "Texas", "California", "Ohio", "West Virginia"],
+        "alias": ["NY", "TX", "Washington DC", "D.C.", "New York State"],
+        "typo": ["Massachusets", "Tennesee", "Conneticut", "Pensylvania", "Missisippi"],
+        "miss": ["Other", "Outside the US", "Prefer not to say", "Puerto Rico", "Guam"],
+    },
+}
+
+
+def _per_query_us(fn, queries, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            fn(q)
+    return (time.perf_counter() - t0) / (repeat * len(queries)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    PlaceIndex(COUNTRIES, COUNTRY_ALIASES)
+    build_ms = (time.perf_counter() - t0) * 1e3
+    print(f"country index build: {build_ms:.2f} ms (built once per process)\n")
+
+    indexes = {"countries": country_index(), "us_states": us_state_index()}
+    header = f"{'index':<10} {'kind':<6} {'lookup µs':>10} {'difflib µs':>11}  results"
+    print(header)
+    print("-" * len(header))
+    for name, kinds in QUERIES.items():
+        index = indexes[name]
+        spellings = list(index._exact)
+        for kind, queries in kinds.items():
+            ours = _per_query_us(index.lookup, queries, args.repeat)
+            ref = _per_query_us(
+                lambda q: difflib.get_close_matches(normalize_place(q), spellings, n=1, cutoff=0.8),
+                queries, max(1, args.repeat // 50),
+            )
+            results = ", ".join(str(index.lookup(q)) for q in queries)
+            print(f"{name:<10} {kind:<6} {ours:>10.2f} {ref:>11.1f}  {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark: question library lookups, LSH index vs. a full scan.
+
+Fills a temporary library with synthetic question segments, then looks
+up three kinds of query segments:
+
+- copies of stored segments with a new question number and label
+  (should be reused);
+- stored segments with one answer replaced (not near-identical at the
+  default threshold, so normally not reused);
+- unrelated segments (should never be reused);
+
+and times the MinHash/LSH lookup next to a scan that computes the exact
+Jaccard similarity against every stored segment.
+
+Usage:
+    python benchmarks/bench_question_library.py [--sizes 1000 10000] [--queries 200]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from survey_xml_generator.question_library import (  # noqa: E402
+    QuestionLibrary,
+    jaccard,
+    segment_shape,
+    segment_text,
+    shingles,
+)
+
+_WORDS = (
+    "travel trip leisure destination hotel stay visit family friends weekend beach city "
+    "mountain park museum food wine spa golf cruise budget luxury plan book airline car "
+    "road history culture nature outdoor event sport concert festival shopping night"
+).split()
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(_WORDS) for _ in range(n)).capitalize()
+
+
+def synthetic_segment(rng, i):
+    return {
+        "block_type": "question",
+        "label": f"q{i}",
+        "title_text": f"Q{i}. {_sentence(rng, rng.randint(10, 25))}?",
+        "answer_lines": [_sentence(rng, rng.randint(1, 4)) for _ in range(rng.randint(2, 8))],
+        "inline_modifiers": [],
+        "conditions": [],
+        "paragraph_indices": [i],
+    }
+
+
+def _renumbered(seg, i):
+    title = seg["title_text"].split(". ", 1)[1]
+    return dict(seg, label=f"qNew{i}", title_text=f"S{i}. {title}")
+
+
+def _new_answer(seg, rng):
+    answers = list(seg["answer_lines"])
+    answers[rng.randrange(len(answers))] = _sentence(rng, 3)
+    return dict(seg, answer_lines=answers)
+
+
+def _scan(entries, seg, threshold):
+    grams, shape = shingles(segment_text(seg)), segment_shape(seg)
+    best = None
+    for entry_shape, entry_grams in entries:
+        if entry_shape == shape:
+            similarity = jaccard(grams, entry_grams)
+            if similarity >= threshold and (best is None or similarity > best):
+                best = similarity
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    header = (
+        f"{'stored':>7} {'query':>10} {'lsh ms/q':>9} {'scan ms/q':>10} "
+        f"{'lsh reused':>11} {'scan reused':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        rng = random.Random(size)
+        stored = [synthetic_segment(rng, i) for i in range(size)]
+        with tempfile.TemporaryDirectory() as tmp:
+            library = QuestionLibrary(Path(tmp) / "library.sqlite3")
+            library.add((seg, {"forsta_type": "radio", "label": seg["label"]}) for seg in stored)
+            entries = [(segment_shape(s), shingles(segment_text(s))) for s in stored]
+
+            picks = rng.sample(stored, args.queries)
+            queries = {
+                "renumbered": [_renumbered(s, i) for i, s in enumerate(picks)],
+                "new answer": [_new_answer(s, rng) for s in picks],
+                "unrelated": [synthetic_segment(rng, size + i) for i in range(args.queries)],
+            }
+            for name, segs in queries.items():
+                t0 = time.perf_counter()
+                matches = library.lookup(segs)
+                lsh_ms = (time.perf_counter() - t0) * 1e3 / len(segs)
+                t0 = time.perf_counter()
+                scanned = [_scan(entries, s, library.threshold) for s in segs]
+                scan_ms = (time.perf_counter() - t0) * 1e3 / len(segs)
+                lsh_hits = sum(m is not None for m in matches)
+                scan_hits = sum(m is not None for m in scanned)
+                print(
+                    f"{size:>7} {name:>10} {lsh_ms:>9.2f} {scan_ms:>10.2f} "
+                    f"{lsh_hits / len(segs):>11.0%} {scan_hits / len(segs):>12.0%}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark: building auto-populated dropdowns.
+
+Times ``build_select`` for the ``special_handling`` lists (US states,
+countries, year and numeric ranges) with a warm choice cache, next to
+the same call with the cache cleared before every build, i.e. what each
+dropdown cost when its choice list was rendered from scratch.
+
+Usage:
+    python benchmarks/bench_select_choices.py [--repeat 2000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from survey_xml_generator.xml_builder import _auto_choice_lines, build_select  # noqa: E402
+
+QUESTIONS = {
+    "us_states": {"special_handling": "us_states"},
+    "countries": {"special_handling": "countries"},
+    "year_range": {"special_handling": "year_range"},
+    "numeric_range": {
+        "special_handling": "numeric_range", "range_start": 0, "range_end": 20,
+        "floor_label": "None", "ceiling_label": "20 or more",
+    },
+}
+
+
+def _per_build_us(q, repeat, cold):
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        if cold:
+            _auto_choice_lines.cache_clear()
+        build_select({**q, "label": f"q{i}", "title": "Where do you live?"})
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    header = f"{'special_handling':<16} {'choices':>7} {'cold µs':>9} {'cached µs':>10} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, q in QUESTIONS.items():
+        cold = _per_build_us(q, args.repeat, cold=True)
+        warm = _per_build_us(q, args.repeat, cold=False)
+        n = build_select({**q, "label": "q", "title": ""}).count("<choice ")
+        print(f"{name:<16} {n:>7} {cold:>9.1f} {warm:>10.1f} {cold / warm:>7.1f}x")
+    print(f"\n{_auto_choice_lines.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark: survey logic simulation throughput.
+
+Assembles a synthetic survey (radio, checkbox, matrix, select, number
+and text questions in blocks, with display conditions, row conditions,
+shared ``condition.X`` definitions and terms) and times building the
+evaluation plan and running it for increasing respondent counts.
+
+Usage:
+    python benchmarks/bench_simulator.py [--questions 300] [--respondents 1000 10000 100000]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from survey_xml_generator.assembler import assemble_xml  # noqa: E402
+from survey_xml_generator.simulator import SurveyPlan  # noqa: E402
+
+
+def _answers(n, exclusive_last=False):
+    rows = [{"label": f"r{i}", "text": f"Option {i}"} for i in range(1, n + 1)]
+    if exclusive_last:
+        rows[-1]["exclusive"] = "1"
+    return rows
+
+
+def synthetic_survey(n_questions):
+    questions = [
+        {"forsta_type": "number", "label": "qAge", "title": "Age?", "verify": "range(12,99)"},
+        {"forsta_type": "term", "label": "termAge", "cond": "not (qAge.val >= 18)"},
+    ]
+    conditions = [{"label": "Adult", "cond": "(qAge.val >= 18) and not (qAge.val >= 65)", "description": ""}]
+    for i in range(n_questions):
+        if i % 25 == 0:
+            questions.append({
+                "forsta_type": "block_start", "label": f"b{i}", "block_title": f"Block {i}",
+                "cond": "condition.Adult" if i % 50 else "",
+            })
+        q = {"label": f"q{i}", "title": f"Question {i}?"}
+        kind = i % 6
+        if kind == 0:
+            q.update(forsta_type="radio", answers=_answers(5))
+        elif kind == 1:
+            q.update(forsta_type="checkbox", answers=_answers(8, exclusive_last=True),
+                     cond=f"(q{i - 1}.r1) or (q{i - 1}.r2)")
+        elif kind == 2:
+            q.update(forsta_type="radio", is_matrix=True, matrix_rows=_answers(6),
+                     matrix_cols=[{"label": f"c{c}", "text": str(c)} for c in range(1, 6)])
+        elif kind == 3:
+            answers = _answers(6)
+            answers[0]["cond"] = f"(q{i - 2}.r1)"
+            q.update(forsta_type="checkbox", answers=answers)
+        elif kind == 4:
+            q.update(forsta_type="select", special_handling="us_states", cond="condition.Adult")
+        else:
+            q.update(forsta_type="text")
+        questions.append(q)
+        if kind == 0 and i % 30 == 0:
+            questions.append({"forsta_type": "term", "label": f"term{i}", "cond": f"(q{i}.r5)"})
+        questions.append({"forsta_type": "suspend"})
+        if i % 25 == 24:
+            questions.append({"forsta_type": "block_end"})
+    return {"conditions": conditions, "questions": questions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--respondents", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    xml, _ = assemble_xml(synthetic_survey(args.questions))
+    t0 = time.perf_counter()
+    plan = SurveyPlan.from_xml(xml)
+    plan_ms = (time.perf_counter() - t0) * 1e3
+    print(f"{args.questions} questions, {len(plan.steps)} plan steps, plan built in {plan_ms:.1f} ms\n")
+
+    header = f"{'respondents':>11} {'seconds':>8} {'resp/s':>10} {'completed':>10} {'approx':>7}"
+    print(header)
+    print("-" * len(header))
+    for n in args.respondents:
+        report = plan.run(n, seed=1)
+        print(
+            f"{n:>11} {report.seconds:>8.2f} {n / report.seconds:>10,.0f} "
+            f"{report.completed / n:>10.1%} {len(report.approximate):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
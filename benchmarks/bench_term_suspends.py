@@ -0,0 +1,95 @@
+"""Benchmark: suspend injection before terms on long screeners.
+
+Builds screeners of increasing size -- question/term pairs with no page
+breaks, each term also depending on the first question through a
+condition -- and times ``_ensure_suspend_before_terms`` next to the previous
+implementation (an ``any()`` scan between each referenced question and
+its term, then one ``list.insert`` per injected suspend).  Time per term
+staying flat as the screener grows is the linear scaling to look for.
+
+Usage:
+    python benchmarks/bench_term_suspends.py [--sizes 500 2000 8000]
+"""
+
+import argparse
+import copy
+import logging
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from survey_xml_generator import condition_expr  # noqa: E402
+from survey_xml_generator.assembler import _ensure_suspend_before_terms  # noqa: E402
+
+
+def previous_implementation(questions, conditions):
+    """The quadratic version this pass replaced, kept for comparison."""
+    label_to_idx = {q["label"]: i for i, q in enumerate(questions) if q.get("label")}
+    cond_map = {c["label"]: c.get("cond", "") for c in conditions}
+    insert_before = []
+    for term_idx, q in enumerate(questions):
+        if q.get("forsta_type") != "term":
+            continue
+        for ref in condition_expr.referenced_questions(q.get("cond", ""), cond_map):
+            ref_idx = label_to_idx.get(ref)
+            if ref_idx is None:
+                continue
+            if not any(
+                questions[j].get("forsta_type") == "suspend"
+                for j in range(ref_idx + 1, term_idx)
+            ):
+                insert_before.append(term_idx)
+                break
+    for idx in reversed(sorted(set(insert_before))):
+        questions.insert(idx, {"forsta_type": "suspend"})
+    return questions
+
+
+def screener(n_terms):
+    """Question/term pairs on one page; every term also references the
+    first question, so the previous implementation scans back to the top
+    for each term, and every term needs a suspend."""
+    questions = [{"forsta_type": "radio", "label": "qCountry"}]
+    for i in range(n_terms):
+        questions.append({"forsta_type": "radio", "label": f"q{i}"})
+        questions.append({
+            "forsta_type": "term",
+            "label": f"term{i}",
+            "cond": f"condition.NotUS or (q{i}.r2)",
+        })
+    conditions = [{"label": "NotUS", "cond": "(qCountry.r2)"}]
+    return questions, conditions
+
+
+def _time(fn, questions, conditions):
+    questions = copy.deepcopy(questions)
+    t0 = time.perf_counter()
+    result = fn(questions, conditions)
+    return time.perf_counter() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000])
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # one log line per injected suspend
+
+    header = f"{'terms':>6} {'elements':>9} {'linear ms':>10} {'µs/term':>8} {'previous ms':>12} {'µs/term':>8}  same"
+    print(header)
+    print("-" * len(header))
+    for n in args.sizes:
+        questions, conditions = screener(n)
+        ours, result = _time(_ensure_suspend_before_terms, questions, conditions)
+        ref, expected = _time(previous_implementation, questions, conditions)
+        same = result == expected
+        print(
+            f"{n:>6} {len(questions):>9} {ours * 1e3:>10.1f} {ours / n * 1e6:>8.1f} "
+            f"{ref * 1e3:>12.1f} {ref / n * 1e6:>8.1f}  {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
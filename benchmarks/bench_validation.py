@@ -0,0 +1,94 @@
+"""Benchmark: cost of validating assembled survey XML.
+
+Builds synthetic surveys of increasing size with ``assemble_xml`` (no AI
+calls) and times, per document:
+
+- the expat pass alone (well-formedness, nesting, labels, conditions);
+- the expat pass plus Forsta schema validation;
+
+next to the one-off cost of compiling the schema, which
+``forsta_schema()`` pays once per process.
+
+Usage:
+    python benchmarks/bench_validation.py [--sizes 100 1000 5000] [--repeat 5]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_ROOT))
+
+from lxml import etree  # noqa: E402
+
+from survey_xml_generator.assembler import assemble_xml  # noqa: E402
+from survey_xml_generator.data.forsta_schema import FORSTA_XSD  # noqa: E402
+from survey_xml_generator.xml_validator import forsta_schema, validate_xml  # noqa: E402
+
+
+def _answers(n):
+    return [{"label": f"r{i}", "text": f"Option {i}"} for i in range(1, n + 1)]
+
+
+def synthetic_survey(n_questions):
+    """Classified dict with blocks, conditions and a mix of question types."""
+    questions = []
+    for i in range(n_questions):
+        if i % 20 == 0:
+            questions.append({"forsta_type": "block_start", "label": f"b{i}", "block_title": f"Block {i}"})
+        kind = i % 5
+        q = {"label": f"q{i}", "title": f"Question {i}?"}
+        if kind == 0:
+            q.update(forsta_type="radio", answers=_answers(6), cond="condition.Adult")
+        elif kind == 1:
+            q.update(forsta_type="checkbox", answers=_answers(8), atleast=1)
+        elif kind == 2:
+            q.update(forsta_type="select", special_handling="us_states")
+        elif kind == 3:
+            q.update(forsta_type="number", verify="range(0,99)")
+        else:
+            q.update(forsta_type="text")
+        questions.append(q)
+        questions.append({"forsta_type": "suspend"})
+        if i % 20 == 19:
+            questions.append({"forsta_type": "block_end"})
+    conditions = [{"label": "Adult", "cond": "(q0.r1)", "description": "Adults"}]
+    return {"conditions": conditions, "questions": questions}
+
+
+def _best_ms(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    compile_ms = _best_ms(lambda: etree.XMLSchema(etree.fromstring(FORSTA_XSD.encode())), args.repeat)
+    forsta_schema()
+    cached_us = _best_ms(forsta_schema, args.repeat) * 1e3
+    print(f"schema compile: {compile_ms:.2f} ms cold, {cached_us:.2f} µs cached\n")
+
+    header = f"{'questions':>9} {'lines':>8} {'expat ms':>9} {'+schema ms':>11} {'warnings':>9}"
+    print(header)
+    print("-" * len(header))
+    for n in args.sizes:
+        xml, _ = assemble_xml(synthetic_survey(n))
+        lines = xml.count("\n") + 1
+        expat_ms = _best_ms(lambda: validate_xml(xml), args.repeat)
+        schema_ms = _best_ms(lambda: validate_xml(xml, schema=True), args.repeat)
+        warnings = len(validate_xml(xml, schema=True))
+        print(f"{n:>9} {lines:>8} {expat_ms:>9.1f} {schema_ms:>11.1f} {warnings:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Allow ``python -m survey_xml_generator`` to run the batch CLI."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -4,14 +4,32 @@ from __future__ import annotations
 
 import json
 import logging
+import math
 import os
 import threading
 import time
-from typing import Optional
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
 
-from openai import OpenAI
+from openai import APITimeoutError, OpenAI, RateLimitError
 
-from .config import OPENAI_MODEL, OPENAI_MODEL_MINI, AI_TEMPERATURE
+from .config import (
+    OPENAI_MODEL,
+    OPENAI_MODEL_MINI,
+    AI_TEMPERATURE,
+    AI_ADAPTIVE_CONCURRENCY,
+    AI_HEDGE_MIN_SAMPLES,
+    AI_HEDGE_PERCENTILE,
+    AI_HEDGE_REQUESTS,
+    AI_INITIAL_CONCURRENCY,
+    AI_MAX_CONCURRENCY,
+    AI_MIN_CONCURRENCY,
+    AI_SCHEDULER_POLICY,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +63,601 @@ def reset_client() -> None:
         _client = None
 
 
+# ---------------------------------------------------------------------------
+# Adaptive (AIMD) concurrency control
+# ---------------------------------------------------------------------------
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class AdaptiveConcurrencyController:
+    """Additive-increase / multiplicative-decrease limit on in-flight calls.
+
+    - Every ``limit`` healthy completions since the last change add one
+      slot (about one step per "round trip" of the whole pool), up to
+      ``max_limit``.  Growth pauses while per-token latency is inflated
+      relative to the long-run median, which is how contention on the
+      provider side usually shows up before 429s do.
+    - A 429 or timeout multiplies the limit by ``backoff`` (down to
+      ``min_limit``).  Signals from calls that started before the last
+      decrease are ignored -- they were issued under the old limit.
+
+    Listeners (the scheduler) are called with the new limit on change.
+    """
+
+    def __init__(
+        self,
+        initial: int = AI_INITIAL_CONCURRENCY,
+        min_limit: int = AI_MIN_CONCURRENCY,
+        max_limit: int = AI_MAX_CONCURRENCY,
+        backoff: float = 0.5,
+        adaptive: bool = AI_ADAPTIVE_CONCURRENCY,
+        window: int = 200,
+        latency_tolerance: float = 2.0,
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.backoff = backoff
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self._limit = min(max(int(initial), self.min_limit), self.max_limit)
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[int], None]] = []
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._per_token: Deque[float] = deque(maxlen=window)
+        self._successes_since_change = 0
+        self._last_decrease = 0.0
+        self._counts = {
+            "successes": 0,
+            "throttles": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "increases": 0,
+            "decreases": 0,
+        }
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def add_listener(self, listener: Callable[[int], None]) -> None:
+        self._listeners.append(listener)
+
+    def set_max_limit(self, max_limit: int) -> None:
+        """Change the ceiling (and clamp the current limit to it)."""
+        with self._lock:
+            self.max_limit = max(self.min_limit, int(max_limit))
+            new = min(self._limit, self.max_limit)
+        self._apply(new)
+
+    # -- signals --------------------------------------------------------------
+
+    def record_success(self, started: float, completion_tokens: int = 0) -> None:
+        latency = time.monotonic() - started
+        with self._lock:
+            self._counts["successes"] += 1
+            self._latencies.append(latency)
+            healthy = True
+            if completion_tokens:
+                per_token = latency / completion_tokens
+                baseline = _percentile(list(self._per_token), 50)
+                self._per_token.append(per_token)
+                healthy = baseline is None or per_token <= baseline * self.latency_tolerance
+            if not self.adaptive or started < self._last_decrease:
+                return
+            if not healthy:
+                self._successes_since_change = 0
+                return
+            self._successes_since_change += 1
+            if self._successes_since_change < self._limit or self._limit >= self.max_limit:
+                return
+            self._successes_since_change = 0
+            self._counts["increases"] += 1
+            new = self._limit + 1
+        self._apply(new)
+
+    def record_throttle(self, started: float) -> None:
+        """A 429 / rate-limit response."""
+        self._decrease(started, "throttles")
+
+    def record_timeout(self, started: float) -> None:
+        self._decrease(started, "timeouts")
+
+    def record_error(self, started: float) -> None:
+        """Any other failure: counted, but not a capacity signal."""
+        with self._lock:
+            self._counts["errors"] += 1
+
+    def _decrease(self, started: float, counter: str) -> None:
+        with self._lock:
+            self._counts[counter] += 1
+            if not self.adaptive or started < self._last_decrease:
+                return
+            new = max(self.min_limit, int(self._limit * self.backoff))
+            self._last_decrease = time.monotonic()
+            self._successes_since_change = 0
+            if new == self._limit:
+                return
+            self._counts["decreases"] += 1
+        logger.warning(f"AI {counter[:-1]} -- reducing concurrency {self._limit} -> {new}")
+        self._apply(new)
+
+    def _apply(self, new: int) -> None:
+        with self._lock:
+            if new == self._limit:
+                return
+            self._limit = new
+        for listener in self._listeners:
+            listener(new)
+
+    # -- metrics --------------------------------------------------------------
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            p50 = _percentile(latencies, 50)
+            p95 = _percentile(latencies, 95)
+            return {
+                "limit": self._limit,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "adaptive": self.adaptive,
+                "p50_latency_s": round(p50, 3) if p50 is not None else None,
+                "p95_latency_s": round(p95, 3) if p95 is not None else None,
+                **self._counts,
+            }
+
+
+_controller: Optional[AdaptiveConcurrencyController] = None
+_controller_lock = threading.Lock()
+
+
+def get_concurrency_controller() -> AdaptiveConcurrencyController:
+    """Return the process-wide concurrency controller (created on first use)."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdaptiveConcurrencyController()
+    return _controller
+
+
+def concurrency_metrics() -> Dict[str, Any]:
+    """Current limit, p50/p95 call latency and throttle/timeout counts."""
+    return get_concurrency_controller().metrics()
+
+
+# ---------------------------------------------------------------------------
+# Process-wide fair-share scheduler for AI chunk work
+# ---------------------------------------------------------------------------
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+
+class AIJob:
+    """One pipeline run's queue of chunk work inside the :class:`AIScheduler`.
+
+    Tasks are submitted with :meth:`submit` and return standard
+    ``concurrent.futures.Future`` objects, so stages can keep using
+    ``as_completed``.
+    """
+
+    def __init__(self, scheduler: "AIScheduler", name: str, priority: int, weight: float):
+        self.scheduler = scheduler
+        self.name = name
+        self.priority = priority
+        self.weight = max(float(weight), 0.01)
+        self.queue: Deque[Tuple[Future, Context, Callable, tuple, dict]] = deque()
+        self.dispatched = 0
+        self.running = 0
+        self.seq = 0  # registration order, used for round-robin and tie-breaks
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue ``fn(*args, **kwargs)``; it runs in the caller's context."""
+        return self.scheduler._enqueue(self, fn, args, kwargs)
+
+    def __repr__(self) -> str:
+        return f"AIJob({self.name!r}, priority={self.priority}, queued={len(self.queue)})"
+
+
+class AIScheduler:
+    """Dispatches chunk work from all concurrent pipeline runs onto one pool.
+
+    - A global concurrency limit caps in-flight tasks across every job in
+      the process (two Streamlit users no longer get 2 x 5 requests).  The
+      limit follows the :class:`AdaptiveConcurrencyController`.
+    - Each job has its own queue.  Jobs in a more urgent priority class
+      (``PRIORITY_INTERACTIVE``) are always served before batch jobs.
+    - Within a class, ``"weighted_fair"`` dispatches from the job with the
+      least work dispatched relative to its weight, so a 2-chunk screener
+      is not stuck behind a 40-chunk tracker; ``"round_robin"`` cycles
+      through jobs one task at a time.
+    """
+
+    def __init__(self, max_concurrency: int = AI_INITIAL_CONCURRENCY, policy: str = AI_SCHEDULER_POLICY):
+        if policy not in ("weighted_fair", "round_robin"):
+            raise ValueError(f"Unknown scheduler policy '{policy}'")
+        self.policy = policy
+        self._limit = max(1, int(max_concurrency))
+        self._cond = threading.Condition()
+        self._jobs: List[AIJob] = []
+        self._running = 0
+        self._extra = 0  # hedge requests holding a slot outside any job
+        self._workers: List[threading.Thread] = []
+        self._job_seq = 0
+        self._rr_cursor: Dict[int, int] = {}
+
+    # -- configuration --------------------------------------------------------
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._limit
+
+    def set_max_concurrency(self, limit: int) -> None:
+        with self._cond:
+            self._limit = max(1, int(limit))
+            if any(j.queue for j in self._jobs):
+                self._ensure_workers()
+            self._cond.notify_all()
+
+    # -- jobs -----------------------------------------------------------------
+
+    def register(self, name: str, priority: int = PRIORITY_INTERACTIVE, weight: float = 1.0) -> AIJob:
+        job = AIJob(self, name, priority, weight)
+        with self._cond:
+            self._job_seq += 1
+            job.seq = self._job_seq
+            # New jobs start level with the least-served active job so they
+            # neither starve nor monopolise the pool.
+            peers = [j for j in self._jobs if j.priority == priority]
+            if peers:
+                job.dispatched = min(j.dispatched / j.weight for j in peers) * job.weight
+            self._jobs.append(job)
+        return job
+
+    def unregister(self, job: AIJob) -> None:
+        with self._cond:
+            if job in self._jobs:
+                self._jobs.remove(job)
+
+    def try_reserve_slot(self) -> bool:
+        """Take a free slot for a hedge request without queueing.
+
+        Succeeds only when the pool has idle capacity, so hedging never
+        delays queued chunk work or exceeds the (adaptive) limit.
+        """
+        with self._cond:
+            if self._running + self._extra >= self._limit:
+                return False
+            if any(j.queue for j in self._jobs):
+                return False
+            self._extra += 1
+            return True
+
+    def release_slot(self) -> None:
+        with self._cond:
+            self._extra = max(0, self._extra - 1)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_concurrency": self._limit,
+                "running": self._running,
+                "hedges_in_flight": self._extra,
+                "jobs": [
+                    {
+                        "name": j.name,
+                        "priority": j.priority,
+                        "weight": j.weight,
+                        "queued": len(j.queue),
+                        "running": j.running,
+                        "dispatched": j.dispatched,
+                    }
+                    for j in self._jobs
+                ],
+            }
+
+    # -- dispatch ---------------------------------------------------------------
+
+    def _enqueue(self, job: AIJob, fn: Callable, args: tuple, kwargs: dict) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if job not in self._jobs:
+                self._jobs.append(job)
+            job.queue.append((future, copy_context(), fn, args, kwargs))
+            self._ensure_workers()
+            self._cond.notify()
+        return future
+
+    def _ensure_workers(self) -> None:
+        alive = [w for w in self._workers if w.is_alive()]
+        self._workers = alive
+        for _ in range(self._limit - len(alive)):
+            w = threading.Thread(target=self._worker, name="ai-scheduler", daemon=True)
+            w.start()
+            self._workers.append(w)
+
+    def _pick(self) -> Optional[AIJob]:
+        """Choose the job to serve next (caller holds the lock)."""
+        ready = [j for j in self._jobs if j.queue]
+        if not ready:
+            return None
+        top = min(j.priority for j in ready)
+        ready = [j for j in ready if j.priority == top]
+        if self.policy == "round_robin":
+            ready.sort(key=lambda j: j.seq)
+            cursor = self._rr_cursor.get(top, 0)
+            for j in ready:
+                if j.seq > cursor:
+                    break
+            else:
+                j = ready[0]
+            self._rr_cursor[top] = j.seq
+            return j
+        return min(ready, key=lambda j: (j.dispatched / j.weight, j.seq))
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    busy = self._running + self._extra
+                    if len(self._workers) > self._limit and busy < self._limit:
+                        # Limit was lowered: retire surplus idle workers.
+                        if threading.current_thread() in self._workers:
+                            self._workers.remove(threading.current_thread())
+                        return
+                    job = self._pick() if busy < self._limit else None
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                future, ctx, fn, args, kwargs = job.queue.popleft()
+                job.dispatched += 1
+                job.running += 1
+                self._running += 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(ctx.run(fn, *args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    job.running -= 1
+                    self._running -= 1
+                    self._cond.notify_all()
+
+
+_scheduler: Optional[AIScheduler] = None
+_scheduler_lock = threading.Lock()
+_current_job: ContextVar[Optional[AIJob]] = ContextVar("ai_job", default=None)
+
+
+def get_scheduler() -> AIScheduler:
+    """Return the process-wide scheduler (created on first use)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                controller = get_concurrency_controller()
+                _scheduler = AIScheduler(max_concurrency=controller.limit)
+                controller.add_listener(_scheduler.set_max_concurrency)
+    return _scheduler
+
+
+def set_max_concurrency(limit: int) -> None:
+    """Change the ceiling on in-flight AI calls for the whole process.
+
+    The adaptive controller never grows past it; if it is below the
+    current limit the limit drops immediately.
+    """
+    get_scheduler()
+    get_concurrency_controller().set_max_limit(limit)
+
+
+@contextmanager
+def ai_job(
+    name: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    weight: float = 1.0,
+) -> Iterator[AIJob]:
+    """Register a job with the scheduler for the duration of the block.
+
+    Nested calls reuse the enclosing job, so a whole pipeline run (both AI
+    stages) shares one queue and one fair share of the pool.
+    """
+    existing = _current_job.get()
+    if existing is not None:
+        yield existing
+        return
+    scheduler = get_scheduler()
+    job = scheduler.register(name, priority=priority, weight=weight)
+    token = _current_job.set(job)
+    try:
+        yield job
+    finally:
+        _current_job.reset(token)
+        scheduler.unregister(job)
+
+
+# ---------------------------------------------------------------------------
+# Token usage tracking
+# ---------------------------------------------------------------------------
+
+_usage_var: ContextVar[Optional[Dict[str, int]]] = ContextVar("ai_usage", default=None)
+_usage_lock = threading.Lock()
+
+
+@contextmanager
+def track_usage() -> Iterator[Dict[str, int]]:
+    """Accumulate API call and token counts for everything run inside the block.
+
+    Chunk work submitted through the :class:`AIScheduler` runs in a copy of
+    the submitter's context, so calls made by scheduler workers count too.
+    """
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    token = _usage_var.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage_var.reset(token)
+
+
+def _record_usage(response) -> None:
+    usage = _usage_var.get()
+    if usage is None:
+        return
+    stats = getattr(response, "usage", None)
+    with _usage_lock:
+        usage["calls"] += 1
+        if stats is not None:
+            usage["prompt_tokens"] += getattr(stats, "prompt_tokens", 0) or 0
+            usage["completion_tokens"] += getattr(stats, "completion_tokens", 0) or 0
+            usage["total_tokens"] += getattr(stats, "total_tokens", 0) or 0
+
+
+# ---------------------------------------------------------------------------
+# Hedged requests
+# ---------------------------------------------------------------------------
+
+class _LatencyHistory:
+    """Recent successful-call latencies per (model, prompt size bucket)."""
+
+    def __init__(self, window: int = 100):
+        self._window = window
+        self._samples: Dict[Tuple[str, int], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, prompt_chars: int) -> Tuple[str, int]:
+        # Power-of-two buckets from 1k characters: latency tracks size
+        return model, max(0, int(math.log2(max(prompt_chars, 1) / 1000)) + 1)
+
+    def add(self, key: Tuple[str, int], latency: float) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self._window)
+            samples.append(latency)
+
+    def threshold(self, key: Tuple[str, int], pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        return _percentile(samples, pct)
+
+
+_latency_history = _LatencyHistory()
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_lock = threading.Lock()
+_hedge_counts = {"hedged": 0, "hedge_wins": 0, "skipped_no_capacity": 0}
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="ai-hedge")
+    return _hedge_pool
+
+
+def _count_hedge(name: str) -> None:
+    with _hedge_lock:
+        _hedge_counts[name] += 1
+
+
+def hedge_metrics() -> Dict[str, Any]:
+    """How often calls were hedged and how often the duplicate won."""
+    with _hedge_lock:
+        counts = dict(_hedge_counts)
+    counts["enabled"] = AI_HEDGE_REQUESTS
+    counts["percentile"] = AI_HEDGE_PERCENTILE
+    return counts
+
+
+def _timed_create(client: OpenAI, kwargs: dict, key: Tuple[str, int]):
+    """One chat completion, reported to the concurrency controller."""
+    controller = get_concurrency_controller()
+    started = time.monotonic()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except RateLimitError:
+        controller.record_throttle(started)
+        raise
+    except APITimeoutError:
+        controller.record_timeout(started)
+        raise
+    except Exception:
+        controller.record_error(started)
+        raise
+    usage = getattr(response, "usage", None)
+    controller.record_success(started, getattr(usage, "completion_tokens", 0) or 0)
+    _latency_history.add(key, time.monotonic() - started)
+    _record_usage(response)
+    return response
+
+
+def _hedged_create(client: OpenAI, kwargs: dict, key: Tuple[str, int], hedge: bool):
+    """Run a completion, duplicating it if it is slower than usual.
+
+    The hedge waits for the latency percentile of recent calls with the
+    same model and prompt size, then is only sent when the scheduler has
+    an idle slot.  The first successful response wins; the sync OpenAI
+    client can't abort an in-flight HTTP request, so the loser is left to
+    finish in the background and its result is discarded (its tokens are
+    still counted in usage).
+    """
+    threshold = (
+        _latency_history.threshold(key, AI_HEDGE_PERCENTILE, AI_HEDGE_MIN_SAMPLES)
+        if hedge else None
+    )
+    if threshold is None:
+        return _timed_create(client, kwargs, key)
+
+    pool = _get_hedge_pool()
+    primary = pool.submit(copy_context().run, _timed_create, client, kwargs, key)
+    try:
+        return primary.result(timeout=threshold)
+    except FuturesTimeout:
+        pass
+
+    scheduler = get_scheduler()
+    if not scheduler.try_reserve_slot():
+        _count_hedge("skipped_no_capacity")
+        return primary.result()
+
+    _count_hedge("hedged")
+    logger.info(f"Hedging AI call after {threshold:.1f}s (p{AI_HEDGE_PERCENTILE:g}, model={key[0]})")
+
+    def _run_hedge():
+        try:
+            return _timed_create(client, kwargs, key)
+        finally:
+            scheduler.release_slot()
+
+    secondary = pool.submit(copy_context().run, _run_hedge)
+    pending = {primary, secondary}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None or not pending:
+                for loser in pending:
+                    loser.cancel()
+                if future is secondary and future.exception() is None:
+                    _count_hedge("hedge_wins")
+                return future.result()
+    raise RuntimeError("Unreachable")
+
+
 def call_ai(
     system_prompt: str,
     user_prompt: str,
@@ -52,15 +665,18 @@ def call_ai(
     temperature: Optional[float] = None,
     max_retries: int = 3,
     expect_json: bool = True,
+    hedge: Optional[bool] = None,
 ) -> str | dict | list:
     """Call the OpenAI API and return the response.
 
     If expect_json is True, parses the response as JSON and retries on
-    parse failure.
+    parse failure.  ``hedge`` overrides ``AI_HEDGE_REQUESTS`` for this call.
     """
     client = get_client()
     model = model or OPENAI_MODEL
     temperature = temperature if temperature is not None else AI_TEMPERATURE
+    hedge = AI_HEDGE_REQUESTS if hedge is None else hedge
+    latency_key = _LatencyHistory.key(model, len(system_prompt) + len(user_prompt))
 
     messages = [
         {"role": "system", "content": system_prompt},
@@ -82,7 +698,7 @@ def call_ai(
             if expect_json:
                 kwargs["response_format"] = {"type": "json_object"}
 
-            response = client.chat.completions.create(**kwargs)
+            response = _hedged_create(client, kwargs, latency_key, hedge)
             content = response.choices[0].message.content.strip()
 
             if expect_json:
@@ -2,27 +2,33 @@
 
 Takes classified questions and conditions from Stage 3, runs each through
 the deterministic xml_builder (Stage 4), wraps everything in the Forsta
-<survey> root element, and performs basic validation.
+<survey> root element, and validates the result in one expat pass.
 """
 
 from __future__ import annotations
 
 import logging
-import re
-from typing import Any, Dict, List, Optional, Set, Tuple
-
-from .config import SURVEY_NAMESPACES, SURVEY_ROOT_DEFAULTS
+import time
+from collections.abc import Mapping
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from . import condition_expr
+from .config import (
+    COMBINED_SMALL_DOCUMENTS,
+    LOGIC_ANALYSIS,
+    SCHEMA_VALIDATION,
+    SURVEY_NAMESPACES,
+    SURVEY_ROOT_DEFAULTS,
+)
 from .xml_builder import (
-    build_question,
     build_condition,
-    build_suspend,
     build_block_open,
     build_block_close,
-    build_zipcode_block,
-    _is_zipcode_question,
-    build_age_block,
-    _is_age_question,
+    write_question,
 )
+from .standard_blocks import find_standard_block
+from .xml_validator import XmlValidator
+from .xml_writer import XmlWriter
 
 logger = logging.getLogger(__name__)
 
@@ -62,99 +68,81 @@ def _deduplicate_labels(questions: List[dict]) -> List[str]:
     return info
 
 
-def _validate_labels(questions: List[dict]) -> List[str]:
-    """Check for duplicate labels and return a list of warnings."""
-    warnings = []
-    seen: Dict[str, int] = {}
-
-    for i, q in enumerate(questions):
-        label = q.get("label", "")
-        if not label:
-            continue
-        if label in seen:
-            warnings.append(
-                f"Duplicate label '{label}' at positions {seen[label]} and {i}"
-            )
-        else:
-            seen[label] = i
-
-    return warnings
-
-
-def _validate_conditions(
-    conditions: List[dict], questions: List[dict]
-) -> List[str]:
-    """Check that referenced conditions are defined."""
-    warnings = []
-    defined = {f"condition.{c['label']}" for c in conditions if c.get("label")}
-
-    for q in questions:
-        cond = q.get("cond", "")
-        if cond and cond.startswith("condition.") and cond not in defined:
-            warnings.append(
-                f"Question '{q.get('label', '?')}' references undefined "
-                f"condition '{cond}'"
-            )
-
-    return warnings
-
-
-def _validate_xml_wellformed(xml: str) -> List[str]:
-    """Basic well-formedness checks on the generated XML."""
-    warnings = []
-
-    # Count opening vs closing tags for key elements
-    for tag in ("radio", "checkbox", "select", "text", "textarea", "number", "block"):
-        opens = len(re.findall(rf"<{tag}\b", xml))
-        closes = len(re.findall(rf"</{tag}>", xml))
-        if opens != closes:
-            warnings.append(
-                f"Tag mismatch: {opens} opening <{tag}> vs {closes} closing </{tag}>"
-            )
-
-    # Check for unescaped ampersands (common issue)
-    # Strip XML comments first -- they don't process entities
-    xml_no_comments = re.sub(r"<!--.*?-->", "", xml, flags=re.DOTALL)
-    bad_amps = re.findall(r"&(?!amp;|lt;|gt;|quot;|apos;|#)", xml_no_comments)
-    if bad_amps:
-        warnings.append(f"Found {len(bad_amps)} potentially unescaped ampersands")
-
-    return warnings
-
-
 # ---------------------------------------------------------------------------
-# Term suspend enforcement
+# Condition references
 # ---------------------------------------------------------------------------
 
-_COND_LABEL_RE = re.compile(r"\((\w+)[.=]")
-
-
-def _extract_referenced_labels(
-    cond_expr: str,
-    conditions: List[dict],
-) -> Set[str]:
-    """Extract question labels referenced by a term's ``cond`` expression.
+class _ReferenceGraph:
+    """What each ``cond`` expression refers to, extracted once.
 
-    Handles direct references like ``(qAge.ch1)`` and indirect references
-    through ``condition.XYZ`` definitions.
+    Expressions are parsed once (see :func:`condition_expr.parse`) and
+    their references memoised per expression text, so the passes over
+    questions and terms -- which mostly share a handful of conds -- pay one
+    dict lookup per element.  The question labels a ``condition.X``
+    definition depends on are resolved once per definition.
     """
-    if not cond_expr or cond_expr.strip() == "1":
-        return set()
 
-    # Indirect: condition.XYZ -> look up the condition and recurse
-    if cond_expr.startswith("condition."):
-        cond_label = cond_expr.split("condition.", 1)[1]
-        for c in conditions:
-            if c.get("label") == cond_label:
-                return _extract_referenced_labels(c.get("cond", ""), conditions)
-        return set()
+    def __init__(self, conditions: List[dict]):
+        self.definitions: Dict[str, str] = {
+            c["label"]: c.get("cond", "") for c in conditions if c.get("label")
+        }
+        self._conditions: Dict[str, FrozenSet[str]] = {}
+        self._questions: Dict[str, FrozenSet[str]] = {}
+        self._definition_questions: Dict[str, Set[str]] = {}
+
+    def conditions(self, expr: str) -> FrozenSet[str]:
+        """Labels of the ``condition.X`` definitions *expr* uses directly."""
+        refs = self._conditions.get(expr)
+        if refs is None:
+            refs = frozenset(condition_expr.condition_refs(condition_expr.parse(expr))) if expr else frozenset()
+            self._conditions[expr] = refs
+        return refs
+
+    def questions(self, expr: str) -> FrozenSet[str]:
+        """Question labels *expr* depends on, directly or via ``condition.X``."""
+        refs = self._questions.get(expr)
+        if refs is None:
+            if not expr or expr.strip() == "1":
+                refs = frozenset()
+            else:
+                labels = condition_expr.question_refs(condition_expr.parse(expr))
+                for label in self.conditions(expr):
+                    labels |= self._questions_of_definition(label)
+                refs = frozenset(labels)
+            self._questions[expr] = refs
+        return refs
+
+    def _questions_of_definition(self, label: str) -> Set[str]:
+        refs = self._definition_questions.get(label)
+        if refs is None:
+            expr = self.definitions.get(label)
+            refs = condition_expr.referenced_questions(expr, self.definitions) if expr else set()
+            self._definition_questions[label] = refs
+        return refs
+
+    def referenced_conditions(self, exprs: Iterable[str]) -> Set[str]:
+        """Definitions used by *exprs*, including those other definitions use."""
+        used: Set[str] = set()
+        pending: List[str] = []
+        for expr in exprs:
+            pending.extend(self.conditions(expr) - used)
+            used.update(pending)
+        while pending:
+            label = pending.pop()
+            new = self.conditions(self.definitions.get(label, "")) - used
+            used |= new
+            pending.extend(new)
+        return used
 
-    return set(_COND_LABEL_RE.findall(cond_expr))
 
+# ---------------------------------------------------------------------------
+# Term suspend enforcement
+# ---------------------------------------------------------------------------
 
 def _ensure_suspend_before_terms(
     questions: List[dict],
     conditions: List[dict],
+    graph: Optional[_ReferenceGraph] = None,
 ) -> List[dict]:
     """Inject ``suspend`` elements before terms that lack a page break
     after the question they reference.
@@ -163,42 +151,43 @@ def _ensure_suspend_before_terms(
     (separated by ``<suspend/>``) for ``<term>`` to evaluate correctly.
     """
     label_to_idx: Dict[str, int] = {}
+    # suspends_before[i] = number of suspends in questions[:i]
+    suspends_before = [0] * (len(questions) + 1)
     for i, q in enumerate(questions):
         lbl = q.get("label")
         if lbl:
             label_to_idx[lbl] = i
+        suspends_before[i + 1] = suspends_before[i] + (q.get("forsta_type") == "suspend")
 
-    insert_before: List[int] = []
+    graph = graph or _ReferenceGraph(conditions)
+    insert_before: Set[int] = set()
 
     for term_idx, q in enumerate(questions):
         if q.get("forsta_type") != "term":
             continue
 
-        ref_labels = _extract_referenced_labels(q.get("cond", ""), conditions)
-        if not ref_labels:
-            continue
-
-        for ref in ref_labels:
+        for ref in graph.questions(q.get("cond", "")):
             ref_idx = label_to_idx.get(ref)
             if ref_idx is None:
                 continue
-
-            has_suspend = any(
-                questions[j].get("forsta_type") == "suspend"
-                for j in range(ref_idx + 1, term_idx)
-            )
-            if not has_suspend:
-                insert_before.append(term_idx)
+            # Any suspend in questions[ref_idx + 1:term_idx]?
+            if suspends_before[term_idx] == suspends_before[ref_idx + 1]:
+                insert_before.add(term_idx)
                 break
 
-    # Insert from end to start so earlier indices stay valid.
-    for idx in reversed(sorted(set(insert_before))):
-        questions.insert(idx, {"forsta_type": "suspend"})
-        logger.info(
-            f"Injected suspend before term at position {idx} "
-            f"(label={questions[idx + 1].get('label', '?')})"
-        )
+    if not insert_before:
+        return questions
 
+    result: List[dict] = []
+    for i, q in enumerate(questions):
+        if i in insert_before:
+            result.append({"forsta_type": "suspend"})
+            logger.info(
+                f"Injected suspend before term at position {i} "
+                f"(label={q.get('label', '?')})"
+            )
+        result.append(q)
+    questions[:] = result
     return questions
 
 
@@ -209,6 +198,7 @@ def _ensure_suspend_before_terms(
 def _propagate_conditions_to_terms(
     questions: List[dict],
     conditions: List[dict],
+    graph: Optional[_ReferenceGraph] = None,
 ) -> List[dict]:
     """AND the parent question's visibility condition into dependent terms.
 
@@ -224,6 +214,7 @@ def _propagate_conditions_to_terms(
         termTripsP3Y  cond="(qTripsP3Y.check('0'))"
         ->  termTripsP3Y  cond="(qTripsP3Y.check('0')) and (condition.US_Respondent)"
     """
+    graph = graph or _ReferenceGraph(conditions)
     label_to_cond: Dict[str, str] = {}
     for q in questions:
         lbl = q.get("label")
@@ -239,28 +230,30 @@ def _propagate_conditions_to_terms(
         if not term_cond:
             continue
 
-        ref_labels = _extract_referenced_labels(term_cond, conditions)
+        ref_labels = graph.questions(term_cond)
         if not ref_labels:
             continue
 
-        extra_conds: List[str] = []
+        term_node = condition_expr.parse(term_cond)
+        present = set(condition_expr.conjuncts(term_node))
+        extra: List[condition_expr.Node] = []
         for ref in sorted(ref_labels):
             q_cond = label_to_cond.get(ref)
             if not q_cond:
                 continue
-            if q_cond in term_cond:
+            q_node = condition_expr.parse(q_cond)
+            if condition_expr.is_true(q_node):
                 continue
-            if q_cond not in extra_conds:
-                extra_conds.append(q_cond)
+            clauses = condition_expr.conjuncts(q_node)
+            if all(c in present for c in clauses):
+                continue
+            present.update(clauses)
+            extra.append(q_node)
 
-        if not extra_conds:
+        if not extra:
             continue
 
-        for ec in extra_conds:
-            wrapped = f"({ec})" if not ec.startswith("(") else ec
-            term_cond = f"{term_cond} and {wrapped}"
-
-        q["cond"] = term_cond
+        q["cond"] = condition_expr.to_string(condition_expr.conjoin(term_node, *extra))
         logger.info(
             f"Propagated condition to term '{q.get('label', '?')}': "
             f"{q['cond']}"
@@ -269,54 +262,35 @@ def _propagate_conditions_to_terms(
     return questions
 
 
-# ---------------------------------------------------------------------------
-# Block XML emission helper
-# ---------------------------------------------------------------------------
-
-def _emit_block_xml(block_xml: str, indent: str, xml_lines: List[str]):
-    """Append block XML lines, indenting XML tags but keeping exec/validate
-    content at column 0 (Forsta requires Python code to have no extra indent).
-    """
-    in_script = False
-    for line in block_xml.split("\n"):
-        stripped = line.strip()
-        if stripped.startswith(("<exec", "<validate")):
-            in_script = True
-            xml_lines.append(f"{indent}{line}")
-        elif stripped.startswith(("</exec", "</validate")):
-            in_script = False
-            xml_lines.append(f"{indent}{line}")
-        elif in_script:
-            xml_lines.append(line)
-        else:
-            xml_lines.append(f"{indent}{line}")
-    xml_lines.append("")
-
-
 # ---------------------------------------------------------------------------
 # Assembly
 # ---------------------------------------------------------------------------
 
-def assemble_xml(
+_SAMPLE_SOURCES = [
+    '<samplesources default="0">',
+    '  <samplesource list="0">',
+    '    <title>Open Survey</title>',
+    '    <invalid>You are missing information in the URL. Please verify the URL with the original invite.</invalid>',
+    '    <completed>It seems you have already completed this survey.</completed>',
+    '    <exit cond="terminated">Thank you for taking our survey.</exit>',
+    '    <exit cond="qualified">Thank you for taking our survey. Your efforts are greatly appreciated!</exit>',
+    '    <exit cond="overquota">Thank you for taking our survey.</exit>',
+    '  </samplesource>',
+    '</samplesources>',
+]
+
+
+def _write_survey(
     classified: Dict[str, List[dict]],
-    survey_name: str = "Survey",
-    progress_callback=None,
-) -> Tuple[str, List[str]]:
-    """Assemble final Forsta XML from classified questions and conditions.
-
-    Args:
-        classified: Dict with "conditions" and "questions" from classifier.py
-        survey_name: Name for the <survey> root element
-        progress_callback: Optional callable(message: str) for UI updates
-
-    Returns:
-        Tuple of (xml_string, warnings_list)
+    w: XmlWriter,
+    survey_name: str,
+    _report,
+) -> Tuple[List[dict], List[dict], List[str]]:
+    """Write the whole ``<survey>`` document into *w* in one pass.
+
+    Returns ``(conditions, questions, warnings)``, with ``questions`` as
+    emitted (labels de-duplicated, suspends and term conditions added).
     """
-    def _report(msg: str):
-        logger.info(msg)
-        if progress_callback:
-            progress_callback(msg)
-
     conditions = classified.get("conditions", [])
     questions = classified.get("questions", [])
     warnings: List[str] = []
@@ -328,11 +302,13 @@ def assemble_xml(
     for msg in dedup_info:
         logger.info(msg)
 
+    graph = _ReferenceGraph(conditions)
+
     # --- Ensure suspend before terms ---
-    questions = _ensure_suspend_before_terms(questions, conditions)
+    questions = _ensure_suspend_before_terms(questions, conditions, graph)
 
     # --- Propagate question visibility conditions to dependent terms ---
-    questions = _propagate_conditions_to_terms(questions, conditions)
+    questions = _propagate_conditions_to_terms(questions, conditions, graph)
 
     # --- Build root attributes ---
     root_attrs = dict(SURVEY_ROOT_DEFAULTS)
@@ -340,43 +316,30 @@ def assemble_xml(
     root_attrs.update(SURVEY_NAMESPACES)
 
     attr_str = " ".join(f'{k}="{v}"' for k, v in root_attrs.items())
-    xml_lines = [f"<survey {attr_str}>", ""]
+    w.line(f"<survey {attr_str}>")
+    w.blank()
+    w.indent()  # base level inside <survey>
 
     # --- Conditions section (only emit referenced conditions) ---
     if conditions:
-        referenced = set()
-        for q in questions:
-            cond_expr = q.get("cond") or ""
-            for c in conditions:
-                clabel = c.get("label", "")
-                if f"condition.{clabel}" in cond_expr:
-                    referenced.add(clabel)
+        referenced = graph.referenced_conditions(q.get("cond") or "" for q in questions)
         for cond in conditions:
             clabel = cond.get("label", "")
             if clabel not in referenced:
                 logger.info(f"Skipping unreferenced condition: {clabel}")
                 continue
             try:
-                xml_lines.append(f"  {build_condition(cond)}")
+                w.line(build_condition(cond))
             except Exception as e:
                 warnings.append(f"Error building condition '{cond.get('label', '?')}': {e}")
-        xml_lines.append("")
+        w.blank()
 
     # --- Sample sources ---
-    xml_lines.append('  <samplesources default="0">')
-    xml_lines.append('    <samplesource list="0">')
-    xml_lines.append('      <title>Open Survey</title>')
-    xml_lines.append('      <invalid>You are missing information in the URL. Please verify the URL with the original invite.</invalid>')
-    xml_lines.append('      <completed>It seems you have already completed this survey.</completed>')
-    xml_lines.append('      <exit cond="terminated">Thank you for taking our survey.</exit>')
-    xml_lines.append('      <exit cond="qualified">Thank you for taking our survey. Your efforts are greatly appreciated!</exit>')
-    xml_lines.append('      <exit cond="overquota">Thank you for taking our survey.</exit>')
-    xml_lines.append('    </samplesource>')
-    xml_lines.append('  </samplesources>')
-    xml_lines.append("")
+    for line in _SAMPLE_SOURCES:
+        w.line(line)
+    w.blank()
 
     # --- Questions section (with block nesting) ---
-    indent_level = 1  # base level inside <survey>
     block_stack: List[dict] = []  # stack of {"label": str, "is_parent": bool}
     skip_indices: set = set()
 
@@ -385,7 +348,6 @@ def assemble_xml(
             continue
 
         forsta_type = q.get("forsta_type", "").lower()
-        indent = "  " * indent_level
 
         if forsta_type == "block_start":
             is_parent = q.get("randomize_children", False)
@@ -394,73 +356,73 @@ def assemble_xml(
                 # Close any open sibling (non-parent) block
                 if block_stack and not block_stack[-1]["is_parent"]:
                     block_stack.pop()
-                    indent_level -= 1
-                    xml_lines.append(f"{'  ' * indent_level}{build_block_close()}")
-                    xml_lines.append("")
+                    w.dedent()
+                    w.line(build_block_close())
+                    w.blank()
 
-            indent = "  " * indent_level
             inside_randomize_parent = block_stack and block_stack[-1]["is_parent"]
-            xml_lines.append(
-                f"{indent}{build_block_open(q['label'], title=q.get('block_title'), randomize_children=is_parent, randomize=inside_randomize_parent and not is_parent, cond=q.get('cond'))}"
-            )
+            w.line(build_block_open(
+                q["label"],
+                title=q.get("block_title"),
+                randomize_children=is_parent,
+                randomize=inside_randomize_parent and not is_parent,
+                cond=q.get("cond"),
+            ))
             block_stack.append({"label": q["label"], "is_parent": is_parent})
-            indent_level += 1
+            w.indent()
             continue
 
         if forsta_type == "block_end":
             while block_stack:
                 block_stack.pop()
-                indent_level -= 1
-                xml_lines.append(f"{'  ' * indent_level}{build_block_close()}")
-                xml_lines.append("")
+                w.dedent()
+                w.line(build_block_close())
+                w.blank()
             continue
 
         if forsta_type == "suspend":
-            xml_lines.append(f"{indent}{build_suspend()}")
-            xml_lines.append("")
+            # XmlWriter drops a <suspend/> that follows another one
+            w.suspend()
+            w.blank()
             continue
 
         if forsta_type in ("note", "comment"):
             continue
 
-        # Replace zip code questions with the standard Forsta zip code block
-        if _is_zipcode_question(q):
-            zip_xml = build_zipcode_block(
-                label=q.get("label", "qZipCode"),
-                title=q.get("title", ""),
-                cond=q.get("cond", ""),
-            )
-            _emit_block_xml(zip_xml, indent, xml_lines)
-            continue
-
-        # Replace age questions with the standard Forsta age/generation block.
-        # Look ahead to absorb any term elements whose condition references
-        # the age question label (e.g., qAge) so they live inside the block.
-        if _is_age_question(q):
-            age_label = (q.get("label") or "qAge").lower()
-            age_terms: List[dict] = []
-            for j in range(qi + 1, len(questions)):
-                fj = (questions[j].get("forsta_type") or "").lower()
-                if fj == "suspend":
-                    continue
-                if fj == "term":
-                    term_cond = (questions[j].get("cond") or "").lower()
-                    if age_label in term_cond:
-                        age_terms.append(questions[j])
-                        skip_indices.add(j)
+        # Standard demographic questions (zip code, age, country, ...) are
+        # rendered from the registry's templates.  Blocks that absorb terms
+        # (age) look ahead for term elements whose condition references the
+        # question label (e.g., qAge) so they live inside the block.
+        standard = find_standard_block(q)
+        if standard is not None:
+            block_terms: List[dict] = []
+            if standard.absorbs_terms:
+                q_label = (q.get("label") or "qAge").lower()
+                for j in range(qi + 1, len(questions)):
+                    fj = (questions[j].get("forsta_type") or "").lower()
+                    if fj == "suspend":
                         continue
-                break
-            age_xml = build_age_block(q, terms=age_terms or None)
-            _emit_block_xml(age_xml, indent, xml_lines)
+                    if fj == "term":
+                        term_cond = (questions[j].get("cond") or "").lower()
+                        if q_label in term_cond:
+                            block_terms.append(questions[j])
+                            skip_indices.add(j)
+                            continue
+                    break
+            try:
+                standard.write(q, w, terms=block_terms or None)
+                w.blank()
+            except Exception as e:
+                warnings.append(
+                    f"Error building standard {standard.name} block "
+                    f"'{q.get('label', '?')}': {e}"
+                )
             continue
 
         # Build the question XML
         try:
-            xml = build_question(q)
-            if xml:
-                for line in xml.split("\n"):
-                    xml_lines.append(f"{indent}{line}")
-                xml_lines.append("")
+            if write_question(q, w):
+                w.blank()
             else:
                 warnings.append(
                     f"Unknown forsta_type '{forsta_type}' for "
@@ -475,38 +437,21 @@ def assemble_xml(
     # Close all remaining open blocks
     while block_stack:
         block_stack.pop()
-        indent_level -= 1
-        xml_lines.append(f"{'  ' * indent_level}{build_block_close()}")
-        xml_lines.append("")
-
-    # --- Strip consecutive <suspend/> tags ---
-    cleaned: List[str] = []
-    for line in xml_lines:
-        stripped = line.strip()
-        if stripped == "<suspend/>":
-            prev_meaningful = ""
-            for prev in reversed(cleaned):
-                if prev.strip():
-                    prev_meaningful = prev.strip()
-                    break
-            if prev_meaningful == "<suspend/>":
-                continue
-        cleaned.append(line)
-    xml_lines = cleaned
-
-    while xml_lines and not xml_lines[-1].strip():
-        xml_lines.pop()
+        w.dedent()
+        w.line(build_block_close())
+        w.blank()
 
-    xml_lines.append("")
-    xml_lines.append("</survey>")
+    w.dedent()
+    w.drop_blanks()
+    w.blank()
+    w.line("</survey>")
+    return conditions, questions, warnings
 
-    xml_output = "\n".join(xml_lines)
 
-    # --- Validation ---
+def _finish_assembly(warnings: List[str], validator: XmlValidator, _report) -> List[str]:
+    """Collect the validator's findings and report the outcome."""
     _report("Running validation checks...")
-    warnings.extend(_validate_labels(questions))
-    warnings.extend(_validate_conditions(conditions, questions))
-    warnings.extend(_validate_xml_wellformed(xml_output))
+    warnings.extend(validator.close())
 
     if warnings:
         _report(f"Assembly complete with {len(warnings)} warning(s)")
@@ -514,55 +459,232 @@ def assemble_xml(
             logger.warning(f"  - {w}")
     else:
         _report("Assembly complete -- no warnings")
+    return warnings
 
-    return xml_output, warnings
-
-
-# ---------------------------------------------------------------------------
-# Full pipeline: file -> XML
-# ---------------------------------------------------------------------------
 
-def process_file(
-    file_path: str,
+def assemble_xml(
+    classified: Dict[str, List[dict]],
     survey_name: str = "Survey",
-    model: Optional[str] = None,
     progress_callback=None,
-) -> Tuple[str, List[str], Dict[str, Any]]:
-    """Run the full pipeline: extract -> segment -> classify -> assemble.
+) -> Tuple[str, List[str]]:
+    """Assemble final Forsta XML from classified questions and conditions.
 
     Args:
-        file_path: Path to the .docx file
-        survey_name: Name for the survey root element
-        model: OpenAI model override
-        progress_callback: Optional callable for progress updates
+        classified: Dict with "conditions" and "questions" from classifier.py
+        survey_name: Name for the <survey> root element
+        progress_callback: Optional callable(message: str) for UI updates
 
     Returns:
-        Tuple of (xml_string, warnings, debug_info)
-        debug_info contains intermediate results for debugging.
+        Tuple of (xml_string, warnings_list)
+    """
+    xml_output, warnings, _ = _assemble(classified, survey_name, progress_callback)
+    return xml_output, warnings
+
+
+def _assemble(
+    classified: Dict[str, List[dict]],
+    survey_name: str,
+    progress_callback,
+) -> Tuple[str, List[str], XmlValidator]:
+    """:func:`assemble_xml`, also returning the validator (and its logic graph)."""
+    def _report(msg: str):
+        logger.info(msg)
+        if progress_callback:
+            progress_callback(msg)
+
+    w = XmlWriter()
+    _, _, warnings = _write_survey(classified, w, survey_name, _report)
+    xml_output = w.getvalue()
+    validator = XmlValidator(schema=SCHEMA_VALIDATION, logic=LOGIC_ANALYSIS)
+    validator.feed(xml_output)
+    warnings = _finish_assembly(warnings, validator, _report)
+    return xml_output, warnings, validator
+
+
+def write_xml(
+    classified: Dict[str, List[dict]],
+    path: str,
+    survey_name: str = "Survey",
+    progress_callback=None,
+) -> List[str]:
+    """Like :func:`assemble_xml`, but stream the XML to *path*.
+
+    Each line goes to the file as it is generated, so very large surveys
+    are never held in memory as one string.  Returns the warnings list.
     """
-    from .extractor import extract_from_file
+    def _report(msg: str):
+        logger.info(msg)
+        if progress_callback:
+            progress_callback(msg)
+
+    validator = XmlValidator(schema=SCHEMA_VALIDATION, logic=LOGIC_ANALYSIS)
+    with open(path, "w", encoding="utf-8", newline="\n") as fh:
+        # The validator parses the same text as it goes to the file
+        w = XmlWriter(_TeeStream(fh, validator))
+        _, _, warnings = _write_survey(classified, w, survey_name, _report)
+    _report(f"Wrote {w.line_count} lines of XML to {path}")
+    return _finish_assembly(warnings, validator, _report)
+
+
+class _TeeStream:
+    """Minimal text stream that forwards each write to several streams."""
+
+    def __init__(self, *streams):
+        self._writes = [s.write for s in streams]
+
+    def write(self, text: str) -> None:
+        for write in self._writes:
+            write(text)
+
+
+# ---------------------------------------------------------------------------
+# Full pipeline: file -> XML
+# ---------------------------------------------------------------------------
+
+def _segment_then_classify(
+    blocks: Sequence[Mapping],
+    model: Optional[str],
+    progress_callback,
+    debug_info: Dict[str, Any],
+    reference_questions: Optional[List[dict]] = None,
+    scope: str = "",
+) -> Tuple[List[dict], Dict[str, List[dict]]]:
+    """Stages 2-3 over ``blocks``: one combined AI call when they are small
+    enough (combined.py), otherwise segmentation then classification."""
     from .segmenter import segment_blocks
     from .classifier import classify_segments
+    from .combined import segment_and_classify
 
     def _report(msg: str):
         logger.info(msg)
         if progress_callback:
             progress_callback(msg)
 
-    debug_info: Dict[str, Any] = {}
+    timings = debug_info.setdefault("timings", {})
 
-    from .ai_client import get_client
-    get_client()
+    if COMBINED_SMALL_DOCUMENTS:
+        t0 = time.perf_counter()
+        combined = segment_and_classify(
+            blocks, model=model, progress_callback=progress_callback,
+            reference_questions=reference_questions, keep_sort_keys=True,
+        )
+        if combined is not None:
+            segments, classified = combined
+            timings["segment_classify"] = round(time.perf_counter() - t0, 3)
+            debug_info["combined"] = classified.pop("combined")
+            debug_info["postprocess"] = classified.pop("postprocess", {})
+            debug_info["question_library"] = classified.pop("library", {})
+            return segments, classified
+
+    _report(f"Stage 2: AI segmentation{scope}...")
+    t0 = time.perf_counter()
+    segments = segment_blocks(blocks, model=model, progress_callback=progress_callback)
+    timings["segment"] = round(time.perf_counter() - t0, 3)
+    _report(f"Stage 3: AI classification{scope}...")
+    t0 = time.perf_counter()
+    classified = classify_segments(
+        segments, model=model, progress_callback=progress_callback,
+        reference_questions=reference_questions, keep_sort_keys=True,
+    )
+    timings["classify"] = round(time.perf_counter() - t0, 3)
+    debug_info["postprocess"] = classified.pop("postprocess", {})
+    debug_info["question_library"] = classified.pop("library", {})
+    return segments, classified
+
+
+def _segment_and_classify(
+    blocks: Sequence[Mapping],
+    model: Optional[str],
+    progress_callback,
+    previous_store: Optional[Dict[str, Any]],
+    debug_info: Dict[str, Any],
+) -> Tuple[List[dict], Dict[str, List[dict]]]:
+    """Run Stages 2-3, reusing a previous run's results where possible.
+
+    The returned classified elements still carry ``_sort_key`` so the
+    caller can snapshot them into a run store before assembly.
+    """
+    from .incremental import (
+        is_usable_store, plan_incremental, splice_segments, splice_classified,
+    )
 
-    # Stage 1: Extract
-    _report("Stage 1: Extracting document...")
-    blocks = extract_from_file(file_path)
+    def _report(msg: str):
+        logger.info(msg)
+        if progress_callback:
+            progress_callback(msg)
+
+    if not is_usable_store(previous_store):
+        return _segment_then_classify(blocks, model, progress_callback, debug_info)
+
+    plan = plan_incremental(blocks, previous_store)
+    debug_info["incremental"] = plan.summary()
+    _report(
+        f"Incremental run: reusing {plan.blocks_reused}/{plan.blocks_total} "
+        f"blocks ({plan.reuse_fraction:.0%}); "
+        f"{len(plan.dirty_blocks)} changed blocks to re-process"
+    )
+
+    new_segments: List[dict] = []
+    new_classified: Dict[str, List[dict]] = {"conditions": [], "questions": []}
+    if plan.dirty_blocks:
+        new_segments, new_classified = _segment_then_classify(
+            plan.dirty_blocks, model, progress_callback, debug_info,
+            reference_questions=plan.reused_elements,
+            scope=" (changed regions only)",
+        )
+
+    segments = splice_segments(plan, new_segments)
+    classified = splice_classified(plan, new_classified)
+    renames = classified.pop("condition_renames", {})
+    if renames:
+        debug_info["incremental"]["condition_renames"] = renames
+        debug_info["incremental"]["warnings"] = [
+            f"Changed region redefined condition '{label}'; renamed it to '{renamed}' "
+            "so unchanged questions keep the previous definition"
+            for label, renamed in renames.items()
+        ]
+        for w in debug_info["incremental"]["warnings"]:
+            _report(f"WARNING: {w}")
+    return segments, classified
+
+
+def _run_pipeline(
+    blocks: Sequence[Mapping],
+    survey_name: str,
+    model: Optional[str],
+    progress_callback,
+    previous_store: Optional[Dict[str, Any]] = None,
+    priority: Optional[int] = None,
+) -> Tuple[str, List[str], Dict[str, Any]]:
+    """Stages 2-5 shared by :func:`process_file` and :func:`process_bytes`.
+
+    All AI chunk work of the run is queued as one job on the process-wide
+    scheduler; ``priority`` defaults to interactive.
+    """
+    from .ai_client import (
+        PRIORITY_INTERACTIVE,
+        ai_job,
+        concurrency_metrics,
+        hedge_metrics,
+    )
+    from .classifier import strip_sort_keys
+    from .incremental import build_run_store
+
+    def _report(msg: str):
+        logger.info(msg)
+        if progress_callback:
+            progress_callback(msg)
+
+    debug_info: Dict[str, Any] = {"timings": {}}
     debug_info["extracted_blocks"] = len(blocks)
-    _report(f"Extracted {len(blocks)} blocks")
 
-    # Stage 2: Segment
-    _report("Stage 2: AI segmentation...")
-    segments = segment_blocks(blocks, model=model, progress_callback=progress_callback)
+    # Stages 2-3: Segment + classify (incrementally when a store is given)
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE
+    with ai_job(survey_name, priority=priority):
+        segments, classified = _segment_and_classify(
+            blocks, model, progress_callback, previous_store, debug_info,
+        )
     debug_info["segments"] = len(segments)
     debug_info["segment_types"] = {}
     for seg in segments:
@@ -575,86 +697,112 @@ def process_file(
             "Check AI response parsing."
         )
 
-    # Stage 3: Classify
-    _report("Stage 3: AI classification...")
-    classified = classify_segments(segments, model=model, progress_callback=progress_callback)
+    # Snapshot before assembly mutates labels/suspends, for the next revision
+    debug_info["run_store"] = build_run_store(blocks, segments, classified)
+    strip_sort_keys(classified.get("questions", []))
     debug_info["conditions"] = len(classified.get("conditions", []))
     debug_info["classified_questions"] = len(classified.get("questions", []))
 
     # Stage 4+5: Build XML + Assemble
     _report("Stage 4-5: Building and assembling XML...")
-    xml_output, warnings = assemble_xml(
-        classified,
-        survey_name=survey_name,
-        progress_callback=progress_callback,
-    )
+    t0 = time.perf_counter()
+    xml_output, warnings, validator = _assemble(classified, survey_name, progress_callback)
+    debug_info["timings"]["assemble"] = round(time.perf_counter() - t0, 3)
+    warnings[:0] = debug_info.get("incremental", {}).get("warnings", [])
     debug_info["warnings"] = len(warnings)
+    if validator.graph is not None:
+        debug_info["logic_graph"] = validator.graph.to_dict()
     debug_info["xml_lines"] = xml_output.count("\n") + 1
 
+    debug_info["ai_concurrency"] = concurrency_metrics()
+    debug_info["ai_hedging"] = hedge_metrics()
+
     _report(f"Pipeline complete! {debug_info['xml_lines']} lines of XML generated.")
     return xml_output, warnings, debug_info
 
 
+def process_file(
+    file_path: str,
+    survey_name: str = "Survey",
+    model: Optional[str] = None,
+    progress_callback=None,
+    previous_store: Optional[Dict[str, Any]] = None,
+    priority: Optional[int] = None,
+) -> Tuple[str, List[str], Dict[str, Any]]:
+    """Run the full pipeline: extract -> segment -> classify -> assemble.
+
+    Args:
+        file_path: Path to the .docx file
+        survey_name: Name for the survey root element
+        model: OpenAI model override
+        progress_callback: Optional callable for progress updates
+        previous_store: ``debug_info["run_store"]`` from a run on an earlier
+            revision of the same document.  Only the changed question
+            regions are re-segmented and re-classified.
+        priority: Scheduler priority for this run's AI calls
+            (``ai_client.PRIORITY_INTERACTIVE`` by default,
+            ``PRIORITY_BATCH`` for background conversions).
+
+    Returns:
+        Tuple of (xml_string, warnings, debug_info)
+        debug_info contains intermediate results for debugging, plus
+        ``run_store`` (for the next incremental run) and, on incremental
+        runs, ``incremental`` with the fraction of blocks reused and
+        any fresh conditions renamed to avoid a carried-over label.
+        With ``LOGIC_ANALYSIS`` on, ``logic_graph`` holds the condition
+        dependency graph (see :func:`logic_graph.graph_to_dot`).
+        ``question_library`` reports the segments reused from the
+        question library.
+    """
+    from .extractor import extract_store_from_file
+
+    def _report(msg: str):
+        logger.info(msg)
+        if progress_callback:
+            progress_callback(msg)
+
+    from .ai_client import get_client
+    get_client()
+
+    # Stage 1: Extract
+    _report("Stage 1: Extracting document...")
+    blocks = extract_store_from_file(file_path)
+    _report(f"Extracted {len(blocks)} blocks")
+
+    return _run_pipeline(
+        blocks, survey_name, model, progress_callback, previous_store,
+        priority=priority,
+    )
+
+
 def process_bytes(
     file_bytes,
     survey_name: str = "Survey",
     model: Optional[str] = None,
     progress_callback=None,
+    previous_store: Optional[Dict[str, Any]] = None,
+    priority: Optional[int] = None,
 ) -> Tuple[str, List[str], Dict[str, Any]]:
     """Run the full pipeline from a file-like object (Streamlit upload).
 
     Same as process_file but accepts bytes/BytesIO instead of a path.
     """
-    from .extractor import extract_from_bytes
-    from .segmenter import segment_blocks
-    from .classifier import classify_segments
+    from .extractor import extract_store_from_bytes
 
     def _report(msg: str):
         logger.info(msg)
         if progress_callback:
             progress_callback(msg)
 
-    debug_info: Dict[str, Any] = {}
-
     from .ai_client import get_client
     get_client()
 
     # Stage 1: Extract
     _report("Stage 1: Extracting document...")
-    blocks = extract_from_bytes(file_bytes)
-    debug_info["extracted_blocks"] = len(blocks)
+    blocks = extract_store_from_bytes(file_bytes)
     _report(f"Extracted {len(blocks)} blocks")
 
-    # Stage 2: Segment
-    _report("Stage 2: AI segmentation...")
-    segments = segment_blocks(blocks, model=model, progress_callback=progress_callback)
-    debug_info["segments"] = len(segments)
-    debug_info["segment_types"] = {}
-    for seg in segments:
-        bt = seg.get("block_type", "unknown")
-        debug_info["segment_types"][bt] = debug_info["segment_types"].get(bt, 0) + 1
-
-    if not segments and blocks:
-        _report(
-            f"WARNING: Segmentation returned 0 segments from {len(blocks)} blocks. "
-            "Check AI response parsing."
-        )
-
-    # Stage 3: Classify
-    _report("Stage 3: AI classification...")
-    classified = classify_segments(segments, model=model, progress_callback=progress_callback)
-    debug_info["conditions"] = len(classified.get("conditions", []))
-    debug_info["classified_questions"] = len(classified.get("questions", []))
-
-    # Stage 4+5: Build XML + Assemble
-    _report("Stage 4-5: Building and assembling XML...")
-    xml_output, warnings = assemble_xml(
-        classified,
-        survey_name=survey_name,
-        progress_callback=progress_callback,
+    return _run_pipeline(
+        blocks, survey_name, model, progress_callback, previous_store,
+        priority=priority,
     )
-    debug_info["warnings"] = len(warnings)
-    debug_info["xml_lines"] = xml_output.count("\n") + 1
-
-    _report(f"Pipeline complete! {debug_info['xml_lines']} lines of XML generated.")
-    return xml_output, warnings, debug_info
@@ -0,0 +1,322 @@
+"""Compact, array-backed storage for extracted document blocks.
+
+Stage 1 historically produced one dict per paragraph with the same nine
+keys repeated hundreds of times.  ``BlockStore`` keeps the same data in
+parallel arrays (type code, paragraph index, text offsets into a single
+string pool, interned style id, formatting flags, indent level) so that
+several large documents can sit in memory at once in the multi-user
+Streamlit server.
+
+Downstream stages never copy the store: they receive ``BlockView`` /
+``BlockSelection`` objects that read straight from the arrays and behave
+like the old dicts (``view.get("text")``, ``view["index"]``,
+``dict(view)``), so existing code keeps working unchanged.
+"""
+
+from __future__ import annotations
+
+import json
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from .extractor import BlockType
+
+# ---------------------------------------------------------------------------
+# Encodings
+# ---------------------------------------------------------------------------
+
+_TYPE_CODES = {
+    BlockType.PARAGRAPH.value: 0,
+    BlockType.PAGEBREAK.value: 1,
+    BlockType.BLOCK_MARKER.value: 2,
+    BlockType.TABLE.value: 3,
+}
+_TYPE_NAMES = {code: name for name, code in _TYPE_CODES.items()}
+
+_PARAGRAPH, _PAGEBREAK, _BLOCK_MARKER, _TABLE = 0, 1, 2, 3
+
+_FLAG_BOLD = 1
+_FLAG_ITALIC = 2
+_FLAG_UNDERLINE = 4
+_FLAG_LIST_ITEM = 8
+
+# Keys each block type exposes, in the order the extractor emits them
+# (prompt JSON must stay byte-identical to the old dict serialisation).
+_KEYS = {
+    _PARAGRAPH: (
+        "block_type", "index", "text", "style", "bold", "italic",
+        "underline", "is_list_item", "indent_level",
+    ),
+    _PAGEBREAK: ("block_type", "index"),
+    _BLOCK_MARKER: ("block_type", "index", "text", "block_name"),
+    _TABLE: ("block_type", "index", "rows", "header_row", "num_rows", "num_cols"),
+}
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class BlockStore:
+    """Parallel-array storage for one document's extracted blocks."""
+
+    __slots__ = (
+        "_types", "_indices", "_text", "_text_offsets", "_styles",
+        "_style_ids", "_flags", "_indent", "_extras",
+    )
+
+    def __init__(self):
+        self._types = array("B")
+        self._indices = array("l")
+        self._text = ""
+        self._text_offsets = array("L", [0])
+        self._styles: List[str] = []
+        self._style_ids = array("H")
+        self._flags = array("B")
+        self._indent = array("B")
+        # Rarely-present payloads: table rows and block-marker names
+        self._extras: Dict[int, Any] = {}
+
+    # -- construction -------------------------------------------------------
+
+    @classmethod
+    def from_blocks(cls, blocks: Iterable[Mapping]) -> "BlockStore":
+        """Build a store from extractor-style block dicts (or views)."""
+        store = cls()
+        style_lookup: Dict[str, int] = {}
+        text_parts: List[str] = []
+        offset = 0
+
+        for pos, b in enumerate(blocks):
+            bt = b.get("block_type", BlockType.PARAGRAPH)
+            code = _TYPE_CODES[bt.value if isinstance(bt, BlockType) else str(bt)]
+            store._types.append(code)
+            store._indices.append(int(b.get("index", pos)))
+
+            text = b.get("text") or ""
+            text_parts.append(text)
+            offset += len(text)
+            store._text_offsets.append(offset)
+
+            style = b.get("style") or ""
+            sid = style_lookup.get(style)
+            if sid is None:
+                sid = style_lookup[style] = len(store._styles)
+                store._styles.append(style)
+            store._style_ids.append(sid)
+
+            flags = 0
+            if b.get("bold"):
+                flags |= _FLAG_BOLD
+            if b.get("italic"):
+                flags |= _FLAG_ITALIC
+            if b.get("underline"):
+                flags |= _FLAG_UNDERLINE
+            if b.get("is_list_item"):
+                flags |= _FLAG_LIST_ITEM
+            store._flags.append(flags)
+            store._indent.append(min(int(b.get("indent_level") or 0), 255))
+
+            if code == _TABLE:
+                store._extras[pos] = b.get("rows") or []
+            elif code == _BLOCK_MARKER:
+                store._extras[pos] = b.get("block_name", "")
+
+        store._text = "".join(text_parts)
+        return store
+
+    # -- sequence protocol ----------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return BlockSelection(self, range(len(self))[key])
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("block position out of range")
+        return BlockView(self, key)
+
+    def __iter__(self) -> Iterator["BlockView"]:
+        for pos in range(len(self)):
+            yield BlockView(self, pos)
+
+    def select(self, positions: Sequence[int]) -> "BlockSelection":
+        """Zero-copy view over an arbitrary ordered subset of positions."""
+        return BlockSelection(self, positions)
+
+    # -- field accessors (by list position) -----------------------------------
+
+    def block_type(self, pos: int) -> str:
+        return _TYPE_NAMES[self._types[pos]]
+
+    def index(self, pos: int) -> int:
+        return self._indices[pos]
+
+    def text(self, pos: int) -> str:
+        return self._text[self._text_offsets[pos]:self._text_offsets[pos + 1]]
+
+    def style(self, pos: int) -> str:
+        return self._styles[self._style_ids[pos]]
+
+    def has_content(self, pos: int) -> bool:
+        """Mirror of the segmenter's "non-empty block" filter."""
+        code = self._types[pos]
+        if code in (_PAGEBREAK, _BLOCK_MARKER):
+            return True
+        if code == _TABLE:
+            return bool(self._extras.get(pos))
+        return self._text_offsets[pos + 1] > self._text_offsets[pos]
+
+    def get_field(self, pos: int, key: str, default: Any = None) -> Any:
+        """Return one field of the block at *pos*, like ``dict.get``."""
+        code = self._types[pos]
+        if key not in _KEYS[code]:
+            return default
+        if key == "block_type":
+            return _TYPE_NAMES[code]
+        if key == "index":
+            return self._indices[pos]
+        if key == "text":
+            return self.text(pos)
+        if key == "style":
+            return self._styles[self._style_ids[pos]]
+        if key == "bold":
+            return bool(self._flags[pos] & _FLAG_BOLD)
+        if key == "italic":
+            return bool(self._flags[pos] & _FLAG_ITALIC)
+        if key == "underline":
+            return bool(self._flags[pos] & _FLAG_UNDERLINE)
+        if key == "is_list_item":
+            return bool(self._flags[pos] & _FLAG_LIST_ITEM)
+        if key == "indent_level":
+            return self._indent[pos]
+        if key == "block_name":
+            return self._extras.get(pos, "")
+        rows = self._extras.get(pos) or []
+        if key == "rows":
+            return rows
+        if key == "header_row":
+            return rows[0] if rows else []
+        if key == "num_rows":
+            return len(rows)
+        if key == "num_cols":
+            return len(rows[0]) if rows else 0
+        return default
+
+    def to_dict(self, pos: int) -> Dict[str, Any]:
+        """Materialise the block at *pos* as an extractor-style dict."""
+        return {k: self.get_field(pos, k) for k in _KEYS[self._types[pos]]}
+
+    def to_dicts(self) -> List[dict]:
+        return [self.to_dict(pos) for pos in range(len(self))]
+
+    # -- serialisation ------------------------------------------------------
+
+    def to_prompt_json(self, positions: Optional[Iterable[int]] = None) -> str:
+        """Compact JSON array for prompt building.
+
+        Byte-identical to ``json.dumps(blocks, separators=(",", ":"))`` over
+        the equivalent dicts, without materialising the whole list first.
+        """
+        if positions is None:
+            positions = range(len(self))
+        encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+        return "[" + ",".join(encode(self.to_dict(pos)) for pos in positions) + "]"
+
+    def memory_bytes(self) -> int:
+        """Approximate payload size of the arrays and string pool."""
+        total = len(self._text.encode("utf-8"))
+        for arr in (self._types, self._indices, self._text_offsets,
+                    self._style_ids, self._flags, self._indent):
+            total += arr.itemsize * len(arr)
+        total += sum(len(s) for s in self._styles)
+        return total
+
+
+# ---------------------------------------------------------------------------
+# Views
+# ---------------------------------------------------------------------------
+
+class BlockView(Mapping):
+    """Read-only, dict-compatible view of one block inside a ``BlockStore``."""
+
+    __slots__ = ("_store", "_pos")
+
+    def __init__(self, store: BlockStore, pos: int):
+        self._store = store
+        self._pos = pos
+
+    @property
+    def position(self) -> int:
+        return self._pos
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._store.get_field(self._pos, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _KEYS[self._store._types[self._pos]]:
+            raise KeyError(key)
+        return self._store.get_field(self._pos, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_KEYS[self._store._types[self._pos]])
+
+    def __len__(self) -> int:
+        return len(_KEYS[self._store._types[self._pos]])
+
+    def __repr__(self) -> str:
+        return f"BlockView({self._store.to_dict(self._pos)!r})"
+
+
+class BlockSelection(Sequence):
+    """Ordered, zero-copy subset of a ``BlockStore`` (a chunk, a filter)."""
+
+    __slots__ = ("_store", "_positions")
+
+    def __init__(self, store: BlockStore, positions: Union[Sequence[int], range]):
+        self._store = store
+        self._positions = positions
+
+    @property
+    def store(self) -> BlockStore:
+        return self._store
+
+    @property
+    def positions(self) -> Sequence[int]:
+        return self._positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return BlockSelection(self._store, self._positions[key])
+        return BlockView(self._store, self._positions[key])
+
+    def __iter__(self) -> Iterator[BlockView]:
+        store = self._store
+        for pos in self._positions:
+            yield BlockView(store, pos)
+
+    def to_prompt_json(self) -> str:
+        return self._store.to_prompt_json(self._positions)
+
+    def to_dicts(self) -> List[dict]:
+        return [self._store.to_dict(pos) for pos in self._positions]
+
+
+def as_block_store(blocks: Union[BlockStore, BlockSelection, Iterable[Mapping]]) -> BlockSelection:
+    """Normalise any block input into a ``BlockSelection``.
+
+    Stores and selections are wrapped without copying; plain lists of
+    dicts (the historical Stage 1 output) are packed into a new store.
+    """
+    if isinstance(blocks, BlockSelection):
+        return blocks
+    if isinstance(blocks, BlockStore):
+        return blocks[:]
+    return BlockStore.from_blocks(blocks)[:]
@@ -0,0 +1,285 @@
+"""Cost-aware chunk planning for the AI stages.
+
+Both AI stages split their input into chunks that run in parallel, so the
+stage finishes when its slowest worker does.  This module estimates what a
+chunk will cost (prompt tokens in, expected completion tokens out, plus a
+fixed per-call overhead), rebalances chunk boundaries so no single chunk
+dominates the critical path for the available worker count, and, when
+there are more chunks than workers, orders submission longest-first (LPT)
+so the biggest chunk never starts last.
+
+Costs are expressed in estimated seconds so makespans are comparable
+across stages; only their relative sizes matter for planning.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import math
+from collections.abc import Mapping
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Rough latency model for chat completions: decoding dominates, so an
+# output token costs far more than a prompt token.
+CHARS_PER_TOKEN = 4
+CALL_OVERHEAD_S = 1.5
+PROMPT_S_PER_TOKEN = 0.0003
+OUTPUT_S_PER_TOKEN = 0.015
+
+# Expected completion size relative to the input for segmentation, which
+# echoes the block text back inside segment JSON.
+SEGMENTATION_OUTPUT_RATIO = 1.3
+
+# Classification completion model, in tokens: a fixed part per element
+# (keys, type, label, comment), the echoed title/content, and a fixed part
+# per answer/row/column on top of its text.  Matrix statements and scale
+# points are each listed once, so they add up rather than multiply.  The
+# compact schema (compact_schema.py) drops nulls and long key names.
+_ELEMENT_OUTPUT_TOKENS = {False: 110, True: 18}
+_OPTION_OUTPUT_TOKENS = {False: 14, True: 5}
+
+# (per-item sizes, per-chunk cap) for plan_chunks
+Budget = Tuple[Sequence[float], float]
+
+# Keys and punctuation around a serialised block/segment, in characters
+_BLOCK_JSON_OVERHEAD = 130
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def call_cost(prompt_tokens: float, output_tokens: float) -> float:
+    """Estimated seconds for one AI call of the given size."""
+    return (
+        CALL_OVERHEAD_S
+        + prompt_tokens * PROMPT_S_PER_TOKEN
+        + output_tokens * OUTPUT_S_PER_TOKEN
+    )
+
+
+def _item_cost(chars: int, output_ratio: float) -> float:
+    """Marginal cost of one block/segment inside a chunk (no call overhead)."""
+    tokens = chars / CHARS_PER_TOKEN
+    return tokens * PROMPT_S_PER_TOKEN + tokens * output_ratio * OUTPUT_S_PER_TOKEN
+
+
+def block_cost(block: Mapping) -> float:
+    """Marginal cost of one extracted block in a segmentation chunk."""
+    chars = len(block.get("text") or "")
+    for row in block.get("rows") or []:
+        chars += sum(len(str(cell)) + 3 for cell in row)
+    return _item_cost(chars + _BLOCK_JSON_OVERHEAD, SEGMENTATION_OUTPUT_RATIO)
+
+
+def segment_tokens(segment: Mapping, compact: bool = False) -> Tuple[int, int]:
+    """Estimated ``(prompt, completion)`` tokens for one segment in a
+    classification chunk."""
+    prompt = estimate_tokens(json.dumps(segment, separators=(",", ":"), default=str))
+
+    completion = _ELEMENT_OUTPUT_TOKENS[compact]
+    for key in ("title_text", "content", "condition", "expression"):
+        completion += estimate_tokens(str(segment.get(key) or ""))
+    for key in ("answer_lines", "matrix_statements", "matrix_scale"):
+        for option in segment.get(key) or []:
+            completion += _OPTION_OUTPUT_TOKENS[compact] + estimate_tokens(str(option))
+    return prompt, completion
+
+
+def segment_cost(segment: Mapping, compact: bool = False) -> float:
+    """Marginal cost of one segment in a classification chunk."""
+    prompt, completion = segment_tokens(segment, compact)
+    return prompt * PROMPT_S_PER_TOKEN + completion * OUTPUT_S_PER_TOKEN
+
+
+def fixed_cost(system_prompt: str, template: str = "") -> float:
+    """Per-chunk cost that does not depend on the chunk's contents."""
+    return call_cost(estimate_tokens(system_prompt) + estimate_tokens(template), 0)
+
+
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+
+def lpt_order(costs: Sequence[float]) -> List[int]:
+    """Chunk indices, most expensive first (ties keep document order)."""
+    return sorted(range(len(costs)), key=lambda i: (-costs[i], i))
+
+
+def submission_order(costs: Sequence[float], workers: int) -> List[int]:
+    """Order to submit chunks in: LPT when some of them must queue,
+    document order when every chunk starts at once anyway."""
+    if len(costs) > workers:
+        return lpt_order(costs)
+    return list(range(len(costs)))
+
+
+def simulate_makespan(
+    costs: Sequence[float],
+    workers: int,
+    order: Optional[Iterable[int]] = None,
+) -> float:
+    """Finish time of list-scheduling *costs* onto *workers* in *order*.
+
+    ``order`` defaults to submission in index (document) order, which is
+    how a FIFO worker pool dispatches them.
+    """
+    if not costs:
+        return 0.0
+    free_at = [0.0] * max(1, min(workers, len(costs)))
+    heapq.heapify(free_at)
+    finish = 0.0
+    for i in (range(len(costs)) if order is None else order):
+        start = heapq.heappop(free_at)
+        end = start + costs[i]
+        finish = max(finish, end)
+        heapq.heappush(free_at, end)
+    return finish
+
+
+# ---------------------------------------------------------------------------
+# Boundary rebalancing
+# ---------------------------------------------------------------------------
+
+def _greedy_cut(
+    costs: Sequence[float],
+    limit: float,
+    max_items: int,
+    budgets: Sequence[Budget] = (),
+) -> List[Tuple[int, int]]:
+    """Fewest contiguous parts with sum <= limit, size <= max_items and
+    every budget respected.
+
+    A single item larger than *limit* (or a budget) gets a part of its own.
+    """
+    parts: List[Tuple[int, int]] = []
+    start, total = 0, 0.0
+    used = [0.0] * len(budgets)
+    for i, c in enumerate(costs):
+        if i > start and (
+            total + c > limit
+            or i - start >= max_items
+            or any(used[b] + sizes[i] > cap for b, (sizes, cap) in enumerate(budgets))
+        ):
+            parts.append((start, i))
+            start, total = i, 0.0
+            used = [0.0] * len(budgets)
+        total += c
+        for b, (sizes, _) in enumerate(budgets):
+            used[b] += sizes[i]
+    if start < len(costs):
+        parts.append((start, len(costs)))
+    return parts
+
+
+def _split_to(
+    parts: List[Tuple[int, int]], k: int, costs: Sequence[float],
+) -> List[Tuple[int, int]]:
+    """Split the most expensive parts at their cost midpoint until there are k."""
+    parts = list(parts)
+    while len(parts) < k:
+        splittable = [p for p in parts if p[1] - p[0] > 1]
+        if not splittable:
+            break
+        s, e = max(splittable, key=lambda p: sum(costs[p[0]:p[1]]))
+        half, acc, cut = sum(costs[s:e]) / 2, 0.0, s + 1
+        for i in range(s, e - 1):
+            acc += costs[i]
+            cut = i + 1
+            if acc >= half:
+                break
+        idx = parts.index((s, e))
+        parts[idx:idx + 1] = [(s, cut), (cut, e)]
+    return parts
+
+
+def balanced_partition(
+    costs: Sequence[float],
+    k: int,
+    max_items: int,
+    budgets: Sequence[Budget] = (),
+) -> List[Tuple[int, int]]:
+    """Contiguous partition into k parts minimising the largest part cost.
+
+    Binary search on the part-cost limit with a greedy feasibility check;
+    returns ``(start, end)`` ranges.  Fewer than k parts are returned only
+    when there are fewer than k items; more only when the budgets need
+    more.
+    """
+    n = len(costs)
+    if n == 0:
+        return []
+    k = max(1, min(k, n))
+    max_items = max(1, max_items)
+    lo, hi = max(costs), sum(costs)
+    best = _greedy_cut(costs, hi, max_items, budgets)
+    for _ in range(40):
+        if hi - lo <= 1e-6 * max(hi, 1.0):
+            break
+        mid = (lo + hi) / 2
+        parts = _greedy_cut(costs, mid, max_items, budgets)
+        if len(parts) <= k:
+            best, hi = parts, mid
+        else:
+            lo = mid
+    return _split_to(best, k, costs)
+
+
+def plan_chunks(
+    costs: Sequence[float],
+    workers: int,
+    max_items: int,
+    base_cost: float = 0.0,
+    overlap: int = 0,
+    min_items: int = 1,
+    max_extra_chunks: Optional[int] = None,
+    budgets: Sequence[Budget] = (),
+) -> List[Tuple[int, int]]:
+    """Choose chunk ranges that minimise the estimated stage makespan.
+
+    Args:
+        costs: Marginal cost of each item (block or segment).
+        workers: Parallel AI calls available to this stage.
+        max_items: Hard cap on items per chunk (including overlap).
+        base_cost: Per-chunk fixed cost (call overhead, system prompt).
+        overlap: Items each chunk re-reads from the start of the next one
+            (segmentation context); they count towards cost and size.
+        min_items: Don't create extra chunks smaller than this on average.
+        max_extra_chunks: How many chunks beyond the minimum count to
+            consider (default ``workers - 1``; 0 only rebalances).
+        budgets: ``(sizes, cap)`` pairs, e.g. per-item token estimates and
+            a per-chunk token budget; every chunk stays within each cap
+            (overlap items excluded) unless a single item exceeds it.
+
+    Returns:
+        ``(start, end)`` ranges in document order, already extended by
+        ``overlap`` into the following chunk.
+    """
+    n = len(costs)
+    if n == 0:
+        return []
+    core_max = max(max_items - overlap, 1)
+    k_min = 1 if n <= max_items else math.ceil(n / core_max)
+    if budgets:
+        k_min = max(k_min, len(_greedy_cut(costs, math.inf, core_max, budgets)))
+    extra = workers - 1 if max_extra_chunks is None else max_extra_chunks
+    k_max = max(k_min, min(k_min + max(extra, 0), n // max(min_items, 1)))
+
+    best_key, best_ranges = None, [(0, n)]
+    for k in range(k_min, k_max + 1):
+        cores = balanced_partition(costs, k, core_max if k > 1 else max_items, budgets)
+        ranges = [
+            (s, min(e + overlap, n) if j < len(cores) - 1 else e)
+            for j, (s, e) in enumerate(cores)
+        ]
+        if any(e - s > max_items for s, e in ranges):
+            continue
+        chunk_costs = [base_cost + sum(costs[s:e]) for s, e in ranges]
+        makespan = simulate_makespan(chunk_costs, workers, submission_order(chunk_costs, workers))
+        # Prefer the shortest makespan, then the fewest tokens overall
+        key = (round(makespan, 3), round(sum(chunk_costs), 3))
+        if best_key is None or key < best_key:
+            best_key, best_ranges = key, ranges
+    return best_ranges
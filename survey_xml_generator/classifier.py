@@ -9,16 +9,45 @@ from __future__ import annotations
 
 import json
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from concurrent.futures import as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import re
 
 from .ai_client import call_ai
-from .config import OPENAI_MODEL, SEGMENTATION_CHUNK_SIZE, SEGMENTATION_CHUNK_OVERLAP, SELECT_TO_RADIO_MAX_OPTIONS
-from .data.countries import COUNTRIES, COUNTRY_NAME_TO_CODE
+from .config import (
+    CLASSIFICATION_CHUNK_INPUT_TOKENS,
+    CLASSIFICATION_CHUNK_OUTPUT_TOKENS,
+    CLASSIFICATION_COMPACT_OUTPUT,
+    OPENAI_MODEL,
+    SEGMENTATION_CHUNK_SIZE,
+    SEGMENTATION_CHUNK_OVERLAP,
+    SELECT_TO_RADIO_MAX_OPTIONS,
+    STANDARD_BLOCKS_SKIP_CLASSIFICATION,
+)
+from .data.countries import COUNTRIES
+from .data.place_lookup import country_choice_codes, country_code, us_state_name
 from .data.us_states import US_STATES
-from .prompts.classification import SYSTEM_PROMPT, build_classification_prompt
+from .compact_schema import expand_response
+from .chunk_planner import (
+    fixed_cost,
+    plan_chunks,
+    segment_cost,
+    segment_tokens,
+    submission_order,
+)
+from . import condition_expr
+from .condition_prepass import ConditionSpec, extract_conditions, segment_cond
+from .postprocess import SURVEY, PostProcessContext, RuleEngine
+from .question_library import QuestionLibrary, open_library
+from .standard_blocks import standard_question_for_segment
+from .prompts.classification import (
+    COMPACT_USER_PROMPT_TEMPLATE,
+    SYSTEM_PROMPT,
+    USER_PROMPT_TEMPLATE,
+    build_classification_prompt,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -106,33 +135,103 @@ def _convert_block_condition(raw_cond: str) -> Optional[Dict[str, str]]:
 # Chunking for classification (similar to segmenter but by segment count)
 # ---------------------------------------------------------------------------
 
-_CLASSIFICATION_CHUNK_SIZE = 30  # segments per chunk (questions are bigger than raw blocks)
+_CLASSIFICATION_MIN_CHUNK_SIZE = 8  # don't split further than this for parallelism
+
+# Per-call cost of a classification chunk regardless of its contents
+_CHUNK_FIXED_COST = fixed_cost(
+    SYSTEM_PROMPT,
+    COMPACT_USER_PROMPT_TEMPLATE if CLASSIFICATION_COMPACT_OUTPUT else USER_PROMPT_TEMPLATE,
+)
+
+
+def _segment_groups(segments: List[dict]) -> List[Tuple[int, int]]:
+    """Index ranges of segments that must be classified together.
+
+    A term belongs with the element before it: the model needs the
+    question's answers to write the term's condition.
+    """
+    groups: List[Tuple[int, int]] = []
+    for i, seg in enumerate(segments):
+        if groups and seg.get("block_type") == "term":
+            groups[-1] = (groups[-1][0], i + 1)
+        else:
+            groups.append((i, i + 1))
+    return groups
+
+
+def _plan_segment_chunks(
+    segments: List[dict],
+    workers: int,
+    input_budget: int = CLASSIFICATION_CHUNK_INPUT_TOKENS,
+    output_budget: int = CLASSIFICATION_CHUNK_OUTPUT_TOKENS,
+) -> List[Tuple[int, int]]:
+    """``(start, end)`` segment ranges for the classification chunks."""
+    groups = _segment_groups(segments)
+    if not groups:
+        return []
+    tokens = [segment_tokens(s, CLASSIFICATION_COMPACT_OUTPUT) for s in segments]
+    costs, prompt, completion = [], [], []
+    for start, end in groups:
+        costs.append(sum(segment_cost(s, CLASSIFICATION_COMPACT_OUTPUT) for s in segments[start:end]))
+        prompt.append(sum(t[0] for t in tokens[start:end]))
+        completion.append(sum(t[1] for t in tokens[start:end]))
+
+    ranges = plan_chunks(
+        costs,
+        workers=workers,
+        max_items=len(groups),
+        base_cost=_CHUNK_FIXED_COST,
+        min_items=_CLASSIFICATION_MIN_CHUNK_SIZE,
+        budgets=[(prompt, input_budget), (completion, output_budget)],
+    )
+    return [(groups[s][0], groups[e - 1][1]) for s, e in ranges]
 
 
 def _chunk_segments(
     segments: List[dict],
-    chunk_size: int = _CLASSIFICATION_CHUNK_SIZE,
+    workers: Optional[int] = None,
 ) -> List[List[dict]]:
     """Split segments into chunks for classification.
 
     No overlap needed here because segments are already self-contained
-    logical units from Stage 2.
+    logical units from Stage 2.  Chunks are packed by estimated tokens
+    (``CLASSIFICATION_CHUNK_INPUT_TOKENS`` / ``_OUTPUT_TOKENS``) rather
+    than segment count -- a 25-statement matrix fills a chunk that could
+    hold dozens of yes/no screeners -- and a term is never separated from
+    the question before it.  Boundaries are balanced by estimated cost,
+    and when there are idle workers the segments are spread over a few
+    more chunks if that shortens the estimated critical path.
     """
-    if len(segments) <= chunk_size:
-        return [segments]
+    if workers is None:
+        from .ai_client import get_scheduler
+        workers = get_scheduler().max_concurrency
 
-    chunks = []
-    for i in range(0, len(segments), chunk_size):
-        chunks.append(segments[i : i + chunk_size])
+    chunks = [segments[start:end] for start, end in _plan_segment_chunks(segments, workers)]
 
-    logger.info(f"Split {len(segments)} segments into {len(chunks)} classification chunks")
+    if len(chunks) > 1:
+        logger.info(
+            f"Split {len(segments)} segments into {len(chunks)} classification chunks "
+            f"(sizes={[len(c) for c in chunks]}, est. completion tokens="
+            f"{[sum(segment_tokens(s, CLASSIFICATION_COMPACT_OUTPUT)[1] for s in c) for c in chunks]})"
+        )
     return chunks
 
 
+def _chunk_cost(chunk: List[dict]) -> float:
+    """Estimated cost of sending one chunk through classification."""
+    return _CHUNK_FIXED_COST + sum(segment_cost(s, CLASSIFICATION_COMPACT_OUTPUT) for s in chunk)
+
+
 # ---------------------------------------------------------------------------
 # Post-processing helpers
 # ---------------------------------------------------------------------------
 
+# Deterministic guards run after classification, registered as rules
+# (see postprocess.py).  Dependencies reproduce the required ordering:
+# select -> radio before condition resolution, answer rewrites before the
+# formatting rules that inspect answers.
+_POSTPROCESS = RuleEngine()
+
 def _normalize_question(q: dict) -> dict:
     """Ensure all expected keys exist with sensible defaults."""
     defaults = {
@@ -196,10 +295,8 @@ def _recover_statement_from_segment(seg: dict) -> Optional[str]:
     return None
 
 
-def _fix_agree_disagree_statements(
-    questions: List[dict],
-    original_segments: List[dict] = None,
-) -> None:
+@_POSTPROCESS.rule("agree_disagree_statements", after=("explicit_answers",))
+def _fix_agree_disagree_statements(q: dict, ctx: PostProcessContext) -> bool:
     """Move misplaced statement text from answers into the title.
 
     Many agree/disagree questions arrive with the statement the respondent
@@ -209,123 +306,113 @@ def _fix_agree_disagree_statements(
     If the AI dropped the statement entirely, Case C recovers it from the
     original segment data.
     """
-    seg_by_label: Dict[str, dict] = {}
-    if original_segments:
-        for seg in original_segments:
-            lbl = seg.get("label", "")
-            if lbl:
-                seg_by_label[lbl] = seg
-
-    for q in questions:
-        ft = (q.get("forsta_type") or "").lower()
-        if ft != "radio":
-            continue
-        title = q.get("title") or ""
-        if not _FOLLOWING_STATEMENT_RE.search(title):
-            continue
-
-        statement_recovered = False
-
-        # Case A: non-matrix radio with statement sitting in answers[0]
-        if not q.get("is_matrix"):
-            answers = q.get("answers") or []
-            if len(answers) >= 2:
-                first_text = (answers[0].get("text") or "").strip()
-                if first_text.lower() not in _LIKERT_TERMS:
-                    answers.pop(0)
-                    for i, ans in enumerate(answers, 1):
-                        ans["label"] = f"r{i}"
-                    q["title"] = f"{title}\n\n{first_text}"
-                    statement_recovered = True
-                    logger.info(
-                        f"Moved statement into title for {q.get('label')}: "
-                        f"{first_text[:60]}..."
-                    )
-
-        # Case B: single-statement matrix -> convert to plain radio
-        if q.get("is_matrix"):
-            m_rows = q.get("matrix_rows") or []
-            if len(m_rows) == 1:
-                stmt = (m_rows[0].get("text") or str(m_rows[0])).strip()
-                q["title"] = f"{title}\n\n{stmt}"
-                q["is_matrix"] = False
-                cols = q.get("matrix_cols") or []
-                q["answers"] = [
-                    {"label": f"r{i}", "text": c.get("text", str(c))}
-                    for i, c in enumerate(cols, 1)
-                ]
-                q["matrix_cols"] = None
-                q["matrix_rows"] = None
+    ft = (q.get("forsta_type") or "").lower()
+    if ft != "radio":
+        return False
+    title = q.get("title") or ""
+    if not _FOLLOWING_STATEMENT_RE.search(title):
+        return False
+
+    statement_recovered = False
+
+    # Case A: non-matrix radio with statement sitting in answers[0]
+    if not q.get("is_matrix"):
+        answers = q.get("answers") or []
+        if len(answers) >= 2:
+            first_text = (answers[0].get("text") or "").strip()
+            if first_text.lower() not in _LIKERT_TERMS:
+                answers.pop(0)
+                for i, ans in enumerate(answers, 1):
+                    ans["label"] = f"r{i}"
+                q["title"] = f"{title}\n\n{first_text}"
                 statement_recovered = True
                 logger.info(
-                    f"Converted single-statement matrix to radio for "
-                    f"{q.get('label')}: {stmt[:60]}..."
+                    f"Moved statement into title for {q.get('label')}: "
+                    f"{first_text[:60]}..."
                 )
 
-        # Case C: AI dropped the statement entirely -- recover from segment
-        if not statement_recovered and seg_by_label:
-            current_title = q.get("title") or ""
-            m_title = _FOLLOWING_STATEMENT_RE.search(current_title)
-            if m_title:
-                remainder = current_title[m_title.end():]
-                remainder = re.sub(r'^[?.!:;\s]+', '', remainder).strip()
-                if len(remainder) > 10:
-                    continue
-
-            answers = q.get("answers") or []
-            all_likert = answers and all(
-                (a.get("text") or "").strip().lower() in _LIKERT_TERMS
-                for a in answers
+    # Case B: single-statement matrix -> convert to plain radio
+    if q.get("is_matrix"):
+        m_rows = q.get("matrix_rows") or []
+        if len(m_rows) == 1:
+            stmt = (m_rows[0].get("text") or str(m_rows[0])).strip()
+            q["title"] = f"{title}\n\n{stmt}"
+            q["is_matrix"] = False
+            cols = q.get("matrix_cols") or []
+            q["answers"] = [
+                {"label": f"r{i}", "text": c.get("text", str(c))}
+                for i, c in enumerate(cols, 1)
+            ]
+            q["matrix_cols"] = None
+            q["matrix_rows"] = None
+            statement_recovered = True
+            logger.info(
+                f"Converted single-statement matrix to radio for "
+                f"{q.get('label')}: {stmt[:60]}..."
             )
-            if all_likert:
-                seg = seg_by_label.get(q.get("label", ""))
-                if seg:
-                    statement = _recover_statement_from_segment(seg)
-                    if statement:
-                        q["title"] = f"{current_title}\n\n{statement}"
-                        logger.info(
-                            f"Recovered dropped statement for "
-                            f"{q.get('label')}: {statement[:60]}..."
-                        )
-
-
-def _recover_title_newlines(
-    questions: List[dict],
-    original_segments: List[dict],
-) -> None:
+
+    if statement_recovered:
+        return True
+
+    # Case C: AI dropped the statement entirely -- recover from segment
+    seg = ctx.segment_for(q)
+    if not seg:
+        return False
+    current_title = q.get("title") or ""
+    m_title = _FOLLOWING_STATEMENT_RE.search(current_title)
+    if m_title:
+        remainder = current_title[m_title.end():]
+        remainder = re.sub(r'^[?.!:;\s]+', '', remainder).strip()
+        if len(remainder) > 10:
+            return False
+
+    answers = q.get("answers") or []
+    all_likert = answers and all(
+        (a.get("text") or "").strip().lower() in _LIKERT_TERMS
+        for a in answers
+    )
+    if all_likert:
+        statement = _recover_statement_from_segment(seg)
+        if statement:
+            q["title"] = f"{current_title}\n\n{statement}"
+            logger.info(
+                f"Recovered dropped statement for "
+                f"{q.get('label')}: {statement[:60]}..."
+            )
+            return True
+    return False
+
+
+@_POSTPROCESS.rule("title_newlines", after=("agree_disagree_statements",))
+def _recover_title_newlines(q: dict, ctx: PostProcessContext) -> bool:
     """Restore newlines stripped by the classifier AI.
 
     If the segmenter preserved ``\\n`` characters in ``title_text`` but the
     classifier AI returned a flat single-line ``title``, this restores the
     original line breaks so ``_esc_title`` can render them as ``<br/>``.
     """
-    seg_by_label: Dict[str, dict] = {}
-    for seg in original_segments:
-        lbl = seg.get("label", "")
-        if lbl:
-            seg_by_label[lbl] = seg
-
-    for q in questions:
-        title = q.get("title") or ""
-        if not title or "\n" in title:
-            continue
-
-        seg = seg_by_label.get(q.get("label", ""))
-        if not seg:
-            continue
-
-        seg_title = seg.get("title_text") or ""
-        if "\n" not in seg_title:
-            continue
-
-        flat_seg = seg_title.replace("\r\n", " ").replace("\n", " ").replace("  ", " ").strip()
-        flat_q = title.replace("  ", " ").strip()
-        if flat_seg == flat_q or flat_q in flat_seg:
-            q["title"] = seg_title
-            logger.info(
-                f"Recovered newlines in title for {q.get('label')} "
-                f"from segment title_text"
-            )
+    title = q.get("title") or ""
+    if not title or "\n" in title:
+        return False
+
+    seg = ctx.segment_for(q)
+    if not seg:
+        return False
+
+    seg_title = seg.get("title_text") or ""
+    if "\n" not in seg_title:
+        return False
+
+    flat_seg = seg_title.replace("\r\n", " ").replace("\n", " ").replace("  ", " ").strip()
+    flat_q = title.replace("  ", " ").strip()
+    if flat_seg == flat_q or flat_q in flat_seg:
+        q["title"] = seg_title
+        logger.info(
+            f"Recovered newlines in title for {q.get('label')} "
+            f"from segment title_text"
+        )
+        return True
+    return False
 
 
 _STATEMENT_SPLIT_RE = re.compile(
@@ -334,7 +421,8 @@ _STATEMENT_SPLIT_RE = re.compile(
 )
 
 
-def _format_statement_titles(questions: List[dict]) -> None:
+@_POSTPROCESS.rule("statement_titles", after=("title_newlines",))
+def _format_statement_titles(q: dict, ctx: PostProcessContext) -> bool:
     """Insert a line break between the question stem and inline statement.
 
     When the AI returns a title like "How much do you agree with the
@@ -342,46 +430,52 @@ def _format_statement_titles(questions: List[dict]) -> None:
     this inserts ``\\n\\n`` so that ``_esc_title`` can later convert it to
     ``<br/><br/>`` for proper rendering in Forsta.
     """
-    for q in questions:
-        ft = (q.get("forsta_type") or "").lower()
-        if ft in ("suspend", "block_start", "block_end", "note", ""):
-            continue
-        title = q.get("title") or ""
-        if "\n" in title:
-            continue
+    ft = (q.get("forsta_type") or "").lower()
+    if ft in ("suspend", "block_start", "block_end", "note", ""):
+        return False
+    title = q.get("title") or ""
+    if "\n" in title:
+        return False
+
+    m = _STATEMENT_SPLIT_RE.search(title)
+    if not m:
+        return False
 
-        m = _STATEMENT_SPLIT_RE.search(title)
-        if not m:
-            continue
+    before = title[: m.end()].rstrip()
+    after = title[m.end() :].strip()
+    if len(after) > 10:
+        q["title"] = f"{before}\n\n{after}"
+        logger.info(
+            f"Formatted statement line break in {q.get('label')}: "
+            f"...{after[:50]}..."
+        )
+        return True
+    return False
 
-        before = title[: m.end()].rstrip()
-        after = title[m.end() :].strip()
-        if len(after) > 10:
-            q["title"] = f"{before}\n\n{after}"
-            logger.info(
-                f"Formatted statement line break in {q.get('label')}: "
-                f"...{after[:50]}..."
-            )
 
+_TRUE_FALSE = frozenset({"true", "false"})
 
-def _ensure_comments(questions: List[dict]) -> None:
+
+@_POSTPROCESS.rule("ensure_comments", after=("explicit_answers", "agree_disagree_statements"))
+def _ensure_comments(q: dict, ctx: PostProcessContext) -> bool:
     """Add default ``comment`` to radio/checkbox questions that lack one."""
-    _TF = frozenset({"true", "false"})
-    for q in questions:
-        if q.get("comment"):
-            continue
-        ft = (q.get("forsta_type") or "").lower()
-        if ft == "radio":
-            answers = q.get("answers") or []
-            texts = {(a.get("text") or "").strip().lower() for a in answers}
-            if texts == _TF:
-                continue
-            if q.get("is_matrix"):
-                q["comment"] = "Select one per row."
-            else:
-                q["comment"] = "Select one."
-        elif ft == "checkbox":
-            q["comment"] = "Select all that apply."
+    if q.get("comment"):
+        return False
+    ft = (q.get("forsta_type") or "").lower()
+    if ft == "radio":
+        answers = q.get("answers") or []
+        texts = {(a.get("text") or "").strip().lower() for a in answers}
+        if texts == _TRUE_FALSE:
+            return False
+        if q.get("is_matrix"):
+            q["comment"] = "Select one per row."
+        else:
+            q["comment"] = "Select one."
+        return True
+    if ft == "checkbox":
+        q["comment"] = "Select all that apply."
+        return True
+    return False
 
 
 _ANCHOR_EXCLUSIVE_RE = re.compile(
@@ -401,7 +495,8 @@ _ANCHOR_ONLY_RE = re.compile(
 )
 
 
-def _enforce_anchor_exclusive(questions: List[dict]) -> None:
+@_POSTPROCESS.rule("anchor_exclusive", after=("explicit_answers", "agree_disagree_statements"))
+def _enforce_anchor_exclusive(q: dict, ctx: PostProcessContext) -> bool:
     """Auto-anchor catch-all answers and mark them exclusive on checkboxes.
 
     Ensures answers like "None of the above", "Other (specify)", "I don't
@@ -409,28 +504,32 @@ def _enforce_anchor_exclusive(questions: List[dict]) -> None:
     ``exclusive="1"`` where appropriate -- even if the document or AI did
     not explicitly mark them.
     """
-    for q in questions:
-        ft = (q.get("forsta_type") or "").lower()
-        if ft not in ("radio", "checkbox"):
+    ft = (q.get("forsta_type") or "").lower()
+    if ft not in ("radio", "checkbox"):
+        return False
+
+    changed = False
+    is_checkbox = ft == "checkbox"
+    for ans in q.get("answers") or []:
+        text = (ans.get("text") or "").strip()
+        if not text:
             continue
 
-        is_checkbox = ft == "checkbox"
-        for ans in q.get("answers") or []:
-            text = (ans.get("text") or "").strip()
-            if not text:
-                continue
-
-            if _ANCHOR_EXCLUSIVE_RE.match(text):
-                if ans.get("randomize") is None:
-                    ans["randomize"] = "0"
-                    logger.info(f"Auto-anchored '{text}' in {q.get('label')}")
-                if is_checkbox and not ans.get("exclusive"):
-                    ans["exclusive"] = "1"
-                    logger.info(f"Auto-exclusive '{text}' in {q.get('label')}")
-            elif _ANCHOR_ONLY_RE.match(text):
-                if ans.get("randomize") is None:
-                    ans["randomize"] = "0"
-                    logger.info(f"Auto-anchored '{text}' in {q.get('label')}")
+        if _ANCHOR_EXCLUSIVE_RE.match(text):
+            if ans.get("randomize") is None:
+                ans["randomize"] = "0"
+                changed = True
+                logger.info(f"Auto-anchored '{text}' in {q.get('label')}")
+            if is_checkbox and not ans.get("exclusive"):
+                ans["exclusive"] = "1"
+                changed = True
+                logger.info(f"Auto-exclusive '{text}' in {q.get('label')}")
+        elif _ANCHOR_ONLY_RE.match(text):
+            if ans.get("randomize") is None:
+                ans["randomize"] = "0"
+                changed = True
+                logger.info(f"Auto-anchored '{text}' in {q.get('label')}")
+    return changed
 
 
 _OPEN_END_INDICATOR_RE = re.compile(
@@ -441,60 +540,53 @@ _OPEN_END_INDICATOR_RE = re.compile(
 _PLAIN_OTHER_RE = re.compile(r"^other$", re.IGNORECASE)
 
 
-def _guard_other_open_end(
-    questions: List[dict],
-    original_segments: List[dict],
-) -> None:
+@_POSTPROCESS.rule("other_open_end", after=("explicit_answers",))
+def _guard_other_open_end(q: dict, ctx: PostProcessContext) -> bool:
     """Strip ``open``/``openSize`` from "Other" rows unless the document
     explicitly requested an open-end (via "specify", "[OPEN END]", etc.).
 
     The AI sometimes adds ``open="1"`` to plain "Other" answers even when
     the questionnaire has no open-end indicator.
     """
-    seg_by_label: Dict[str, dict] = {}
-    for seg in original_segments:
-        lbl = seg.get("label", "")
-        if lbl:
-            seg_by_label[lbl] = seg
+    ft = (q.get("forsta_type") or "").lower()
+    if ft not in ("radio", "checkbox"):
+        return False
 
-    for q in questions:
-        ft = (q.get("forsta_type") or "").lower()
-        if ft not in ("radio", "checkbox"):
+    changed = False
+    for ans in q.get("answers") or []:
+        if not ans.get("open"):
             continue
 
-        for ans in q.get("answers") or []:
-            if not ans.get("open"):
-                continue
-
-            text = (ans.get("text") or "").strip()
-            if not _PLAIN_OTHER_RE.match(text):
-                continue
+        text = (ans.get("text") or "").strip()
+        if not _PLAIN_OTHER_RE.match(text):
+            continue
 
-            seg = seg_by_label.get(q.get("label", ""))
-            if seg:
-                for line in seg.get("answer_lines") or []:
-                    if "other" in line.lower() and _OPEN_END_INDICATOR_RE.search(line):
-                        break
-                else:
-                    ans.pop("open", None)
-                    ans.pop("openSize", None)
-                    logger.info(
-                        f"Stripped open-end from plain 'Other' in "
-                        f"{q.get('label')}: no open-end indicator in source"
-                    )
+        seg = ctx.segment_for(q)
+        if seg:
+            for line in seg.get("answer_lines") or []:
+                if "other" in line.lower() and _OPEN_END_INDICATOR_RE.search(line):
+                    break
             else:
                 ans.pop("open", None)
                 ans.pop("openSize", None)
+                changed = True
                 logger.info(
                     f"Stripped open-end from plain 'Other' in "
-                    f"{q.get('label')}: no source segment to verify"
+                    f"{q.get('label')}: no open-end indicator in source"
                 )
+        else:
+            ans.pop("open", None)
+            ans.pop("openSize", None)
+            changed = True
+            logger.info(
+                f"Stripped open-end from plain 'Other' in "
+                f"{q.get('label')}: no source segment to verify"
+            )
+    return changed
 
 
-def _guard_explicit_answers(
-    questions: List[dict],
-    original_segments: List[dict],
-) -> None:
+@_POSTPROCESS.rule("explicit_answers", after=("dedupe_conditions",))
+def _guard_explicit_answers(q: dict, ctx: PostProcessContext) -> bool:
     """Override special_handling when the source segment provided explicit answers.
 
     The AI sometimes marks questions with ``special_handling: "numeric_range"``
@@ -503,50 +595,43 @@ def _guard_explicit_answers(
     would auto-generate a different option set.  This guard converts the
     original ``answer_lines`` to proper answer dicts and clears
     ``special_handling`` so the document's actual options are preserved.
-    """
-    seg_by_label: Dict[str, dict] = {}
-    for seg in original_segments:
-        lbl = seg.get("label", "")
-        if lbl:
-            seg_by_label[lbl] = seg
 
-    for q in questions:
-        sh = q.get("special_handling")
-        if not sh:
-            continue
-        if sh in ("year_range", "us_states", "countries"):
-            continue
-
-        lbl = q.get("label", "")
-        seg = seg_by_label.get(lbl)
-        if not seg:
-            continue
+    Runs after condition resolution, which still sees the AI's choice list.
+    """
+    sh = q.get("special_handling")
+    if not sh:
+        return False
+    if sh in ("year_range", "us_states", "countries"):
+        return False
 
-        answer_lines = seg.get("answer_lines") or []
-        if len(answer_lines) < 2:
-            continue
+    seg = ctx.segment_for(q)
+    if not seg:
+        return False
 
-        logger.info(
-            f"Guard: '{lbl}' has special_handling='{sh}' but segment "
-            f"provided {len(answer_lines)} explicit answer_lines -- "
-            f"overriding with explicit answers"
-        )
-        q["special_handling"] = None
-        q["answers"] = [
-            {"label": f"ch{i}", "text": text}
-            for i, text in enumerate(answer_lines, 1)
-        ]
-        q["choices"] = []
+    answer_lines = seg.get("answer_lines") or []
+    if len(answer_lines) < 2:
+        return False
+
+    lbl = q.get("label", "")
+    logger.info(
+        f"Guard: '{lbl}' has special_handling='{sh}' but segment "
+        f"provided {len(answer_lines)} explicit answer_lines -- "
+        f"overriding with explicit answers"
+    )
+    q["special_handling"] = None
+    q["answers"] = [
+        {"label": f"ch{i}", "text": text}
+        for i, text in enumerate(answer_lines, 1)
+    ]
+    q["choices"] = []
+    return True
 
 
 _DROPDOWN_RE = re.compile(r"dropdown", re.IGNORECASE)
 
 
-def _guard_select_without_dropdown(
-    questions: List[dict],
-    original_segments: List[dict],
-    all_conditions: Optional[List[dict]] = None,
-) -> None:
+@_POSTPROCESS.rule("select_to_radio")
+def _guard_select_without_dropdown(q: dict, ctx: PostProcessContext) -> bool:
     """Convert ``select`` questions to ``radio`` when the source has no dropdown indicator.
 
     The LLM sometimes classifies short explicit-option single-select
@@ -557,80 +642,71 @@ def _guard_select_without_dropdown(
     force the question to ``radio``.
 
     Must run **before** ``_resolve_cond_references`` so the condition
-    resolver picks up the corrected ``r*`` labels naturally.
+    resolver picks up the corrected ``r*`` labels naturally.  Renamed
+    choice labels are recorded for ``rewrite_converted_refs``.
     """
-    seg_by_label: Dict[str, dict] = {}
-    for seg in original_segments:
-        lbl = seg.get("label", "")
-        if lbl:
-            seg_by_label[lbl] = seg
-
-    converted_labels: Dict[str, Dict[str, str]] = {}
-
-    for q in questions:
-        if q.get("forsta_type") != "select":
-            continue
-        if q.get("special_handling"):
-            continue
-
-        lbl = q.get("label", "")
-        seg = seg_by_label.get(lbl)
-        if not seg:
-            continue
-
-        modifiers = seg.get("inline_modifiers") or []
-        title = seg.get("title_text") or ""
-        if any(_DROPDOWN_RE.search(m) for m in modifiers) or _DROPDOWN_RE.search(title):
-            continue
+    if q.get("forsta_type") != "select":
+        return False
+    if q.get("special_handling"):
+        return False
+
+    seg = ctx.segment_for(q)
+    if not seg:
+        return False
+
+    modifiers = seg.get("inline_modifiers") or []
+    title = seg.get("title_text") or ""
+    if any(_DROPDOWN_RE.search(m) for m in modifiers) or _DROPDOWN_RE.search(title):
+        return False
+
+    options = q.get("choices") or q.get("answers") or []
+    if len(options) > SELECT_TO_RADIO_MAX_OPTIONS:
+        return False
+
+    lbl = q.get("label", "")
+    logger.info(
+        f"Guard: '{lbl}' is select with {len(options)} options and no "
+        f"[DROPDOWN] indicator -- converting to radio"
+    )
+    q["forsta_type"] = "radio"
 
-        options = q.get("choices") or q.get("answers") or []
-        if len(options) > SELECT_TO_RADIO_MAX_OPTIONS:
-            continue
+    if q.get("choices") and not q.get("answers"):
+        q["answers"] = q["choices"]
+    q["choices"] = []
 
-        logger.info(
-            f"Guard: '{lbl}' is select with {len(options)} options and no "
-            f"[DROPDOWN] indicator -- converting to radio"
-        )
-        q["forsta_type"] = "radio"
+    label_map: Dict[str, str] = {}
+    for i, ans in enumerate(q.get("answers") or [], 1):
+        old_label = ans.get("label", "")
+        if old_label.startswith("ch"):
+            new_label = f"r{i}"
+            label_map[old_label] = new_label
+            ans["label"] = new_label
 
-        if q.get("choices") and not q.get("answers"):
-            q["answers"] = q["choices"]
-        q["choices"] = []
+    if label_map:
+        ctx.state.setdefault("converted_labels", {})[lbl] = label_map
+    return True
 
-        label_map: Dict[str, str] = {}
-        for i, ans in enumerate(q.get("answers") or [], 1):
-            old_label = ans.get("label", "")
-            if old_label.startswith("ch"):
-                new_label = f"r{i}"
-                label_map[old_label] = new_label
-                ans["label"] = new_label
 
-        if label_map:
-            converted_labels[lbl] = label_map
+@_POSTPROCESS.rule("rewrite_converted_refs", scope=SURVEY, after=("select_to_radio",))
+def _rewrite_converted_refs(ctx: PostProcessContext) -> int:
+    """Safety-net sweep after select -> radio conversion.
 
+    Updates any stale ``(qLabel.chN)`` references that the LLM may have
+    emitted directly instead of using match= syntax.
+    """
+    converted_labels: Dict[str, Dict[str, str]] = ctx.state.get("converted_labels") or {}
     if not converted_labels:
-        return
-
-    # Safety-net sweep: update any stale (qLabel.chN) references that the
-    # LLM may have emitted directly instead of using match= syntax.
-    def _rewrite_cond(expr: str) -> str:
-        if not expr:
-            return expr
-        for qlabel, lmap in converted_labels.items():
-            for old, new in lmap.items():
-                expr = expr.replace(f"{qlabel}.{old}", f"{qlabel}.{new}")
-        return expr
-
-    if all_conditions:
-        for cond in all_conditions:
-            c = cond.get("cond")
-            if c:
-                cond["cond"] = _rewrite_cond(c)
+        return 0
 
-    for q in questions:
-        c = q.get("cond")
+    changes = 0
+    for item in list(ctx.conditions) + list(ctx.questions):
+        c = item.get("cond")
         if c:
-            q["cond"] = _rewrite_cond(c)
+            rewritten = condition_expr.rename_expr(c, choices=converted_labels)
+            if rewritten != c:
+                item["cond"] = rewritten
+                changes += 1
+    return changes
 
 
 def _merge_conditions(all_conditions: List[dict]) -> List[dict]:
@@ -645,69 +721,94 @@ def _merge_conditions(all_conditions: List[dict]) -> List[dict]:
     return merged
 
 
-def _build_conditions_context(conditions: List[dict]) -> str:
+def _build_conditions_context(
+    conditions: List[dict],
+    terms: Optional[List[Tuple[str, str]]] = None,
+) -> str:
     """Build a text summary of known conditions for the AI prompt.
 
-    This gives subsequent chunks awareness of conditions already defined
-    in earlier chunks, preventing duplicate definitions and enabling
-    cross-references.
+    Every chunk gets the same document-wide conditions from the pre-pass,
+    so parallel chunks reference shared labels instead of each defining
+    their own.  ``terms`` are ``(raw line, expression)`` pairs for
+    ``[TERM IF ...]`` lines that were already resolved.
     """
-    if not conditions:
+    if not conditions and not terms:
         return "None identified yet."
 
-    lines = ["Previously identified conditions:"]
-    for c in conditions:
-        lines.append(
-            f"  - {c.get('label', '?')}: {c.get('cond', '?')} "
-            f"({c.get('description', '')})"
-        )
+    lines = []
+    if conditions:
+        lines.append("Previously identified conditions:")
+        for c in conditions:
+            lines.append(
+                f"  - {c.get('label', '?')}: {c.get('cond', '?')} "
+                f"({c.get('description', '')})"
+            )
+    if terms:
+        lines.append("Termination expressions (use as the term element's cond):")
+        for raw, expr in terms:
+            lines.append(f"  - [{raw}] -> {expr}")
     return "\n".join(lines)
 
 
+def _rename_condition_refs(value: Any, renames: Dict[str, str]) -> None:
+    """Point ``condition.X`` references at their new labels in every
+    ``cond`` of *value*, including answer / row / column / choice conds."""
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k == "cond" and isinstance(v, str):
+                if v:
+                    value[k] = condition_expr.rename_expr(v, conditions=renames)
+            else:
+                _rename_condition_refs(v, renames)
+    elif isinstance(value, list):
+        for v in value:
+            _rename_condition_refs(v, renames)
+
+
+def _dedupe_condition_expressions(conditions: List[dict], questions: List[dict]) -> List[dict]:
+    """Drop conditions whose expression duplicates an earlier one.
+
+    References to a dropped label are pointed at the surviving label, so a
+    chunk that re-defined a shared condition under its own name still ends
+    up using the document-wide definition.
+    """
+    by_expr: Dict[str, str] = {}
+    renames: Dict[str, str] = {}
+    kept = []
+    for cond in conditions:
+        key = condition_expr.key(str(cond.get("cond", "")))
+        label = cond.get("label", "")
+        if key and key in by_expr and by_expr[key] != label:
+            renames[label] = by_expr[key]
+            continue
+        if key:
+            by_expr[key] = label
+        kept.append(cond)
+    if not renames:
+        return kept
+
+    for item in list(questions) + kept:
+        _rename_condition_refs(item, renames)
+    logger.info(f"Merged {len(renames)} duplicate condition definitions: {renames}")
+    return kept
+
+
 # ---------------------------------------------------------------------------
 # Condition reference resolver  (match=Value -> chN)
 # ---------------------------------------------------------------------------
 
-_MATCH_PATTERN = re.compile(
-    r"(?P<neg>not)?\((?P<label>\w+)\.match=(?P<value>[^)]+)\)(?P<close>\))?"
-)
+_CHOICE_FOLD_RE = re.compile(r"[\W_]+")
 
 
-def _build_question_lookup(
-    questions: List[dict],
-) -> Dict[str, dict]:
-    """Build label -> question dict for quick lookups."""
-    lookup: Dict[str, dict] = {}
-    for q in questions:
-        lbl = q.get("label")
-        if lbl:
-            lookup[lbl] = q
-    return lookup
+def _normalize_choice_text(text: str) -> str:
+    """Lowercase and fold whitespace/punctuation for choice text lookups."""
+    return " ".join(_CHOICE_FOLD_RE.sub(" ", str(text).lower()).split())
 
 
-def _resolve_single_match(
-    label: str,
-    value: str,
-    negated: bool,
-    question: dict,
-) -> Optional[str]:
-    """Resolve one ``qLabel.match=Value`` expression to ``(qLabel.CODE)`` or ``(qLabel.chN)``."""
+def _choice_pairs(question: dict) -> Optional[List[Tuple[str, str]]]:
+    """``(label, text)`` for every option the question will render."""
     sh = question.get("special_handling")
-    value_lower = value.strip().lower()
-
-    # --- Country lookups use ISO alpha-3 codes as labels ---
-    if sh == "countries":
-        code = COUNTRY_NAME_TO_CODE.get(value_lower)
-        if code:
-            ref = f"({label}.{code})"
-            return f"not{ref}" if negated else ref
-        logger.warning(
-            f"Cannot resolve match='{value}' for {label}: country not found"
-        )
-        return None
-
-    # --- Build a (label, text) pair list for other special_handling types ---
-    choice_pairs: Optional[List[tuple]] = None  # [(choice_label, text), ...]
+    choice_pairs: Optional[List[tuple]] = None
 
     if sh == "us_states":
         choice_pairs = [(f"ch{i}", s) for i, s in enumerate(US_STATES, 1)]
@@ -740,127 +841,246 @@ def _resolve_single_match(
         answers = question.get("choices") or question.get("answers") or []
         if answers:
             choice_pairs = []
-            country_hits = 0
             for a in answers:
                 if isinstance(a, dict):
-                    a_text = a.get("text", "")
-                    code = COUNTRY_NAME_TO_CODE.get(a_text.lower())
-                    if code:
-                        country_hits += 1
-                    choice_pairs.append((a.get("label", ""), a_text, code))
+                    choice_pairs.append((a.get("label", ""), a.get("text", "")))
                 else:
-                    choice_pairs.append((f"ch{len(choice_pairs) + 1}", str(a), None))
-            if country_hits >= 2:
-                import re as _re
+                    choice_pairs.append((f"ch{len(choice_pairs) + 1}", str(a)))
+            # Mirror xml_builder._apply_country_codes, which relabels
+            # country lists with ISO codes
+            codes = country_choice_codes(text for _, text in choice_pairs)
+            if codes is not None:
                 choice_pairs = [
-                    (code if code else _re.sub(r"[^A-Za-z0-9_]", "", text) or lbl, text, None)
-                    for lbl, text, code in choice_pairs
+                    (code if code else re.sub(r"[^A-Za-z0-9_]", "", text) or lbl, text)
+                    for (lbl, text), code in zip(choice_pairs, codes)
                 ]
             else:
                 choice_pairs = [
-                    (lbl or f"ch{i}", text, None)
-                    for i, (lbl, text, _) in enumerate(choice_pairs, 1)
+                    (lbl or f"ch{i}", text)
+                    for i, (lbl, text) in enumerate(choice_pairs, 1)
                 ]
-            choice_pairs = [(lbl, text) for lbl, text, _ in choice_pairs]
 
-    if not choice_pairs:
+    return choice_pairs
+
+
+def _build_choice_index(question: dict) -> Optional[Dict[str, str]]:
+    """Normalised option text -> row/choice label (first option wins)."""
+    if question.get("special_handling") == "countries":
+        return None  # resolved through the shared country index
+    pairs = _choice_pairs(question)
+    if not pairs:
+        return None
+    index: Dict[str, str] = {}
+    for ch_label, text in pairs:
+        index.setdefault(_normalize_choice_text(text), ch_label)
+    return index
+
+
+class _QuestionLookup(dict):
+    """label -> question dict, plus choice indexes built on first use.
+
+    Surveys often have dozens of conditions against the same dropdown;
+    the question's option list is indexed once and every ``match=`` after
+    that is a dict lookup.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._choice_indexes: Dict[str, Optional[Dict[str, str]]] = {}
+
+    def choice_index(self, label: str) -> Optional[Dict[str, str]]:
+        if label not in self._choice_indexes:
+            question = self.get(label)
+            self._choice_indexes[label] = (
+                None if question is None else _build_choice_index(question)
+            )
+        return self._choice_indexes[label]
+
+
+def _build_question_lookup(
+    questions: List[dict],
+    reference_questions: Optional[List[dict]] = None,
+) -> _QuestionLookup:
+    """Build label -> question dict for quick lookups.
+
+    ``reference_questions`` (e.g. questions reused from a previous run)
+    are indexed first so that questions classified in this run win on
+    label collisions.
+    """
+    lookup = _QuestionLookup()
+    for q in list(reference_questions or []) + list(questions):
+        lbl = q.get("label")
+        if lbl:
+            lookup[lbl] = q
+    return lookup
+
+
+def _resolve_single_match(
+    label: str,
+    value: str,
+    question: dict,
+    index: Optional[Dict[str, str]] = None,
+) -> Optional[str]:
+    """Resolve one ``qLabel.match=Value`` to the row/choice label (``CODE``, ``chN``...).
+
+    ``index`` is the question's prebuilt choice index, if the caller has one.
+    """
+    # --- Country lookups use ISO alpha-3 codes as labels ---
+    if question.get("special_handling") == "countries":
+        code = country_code(value)
+        if code:
+            return code
+        logger.warning(
+            f"Cannot resolve match='{value}' for {label}: country not found"
+        )
+        return None
+
+    if index is None:
+        index = _build_choice_index(question)
+    if not index:
         logger.warning(
             f"Cannot resolve match='{value}' for {label}: no choice list available"
         )
         return None
 
-    for ch_label, item in choice_pairs:
-        if item.strip().lower() == value_lower:
-            ref = f"({label}.{ch_label})"
-            return f"not{ref}" if negated else ref
+    ch_label = index.get(_normalize_choice_text(value))
+    if ch_label is None:
+        ch_label = _resolve_place_alias(value, question, index)
+    if ch_label is not None:
+        return ch_label
 
     logger.warning(
         f"Cannot resolve match='{value}' for {label}: "
-        f"value not found in {len(choice_pairs)}-item list"
+        f"value not found in {len(index)}-item list"
     )
     return None
 
 
+def _resolve_place_alias(value: str, question: dict, index: Dict[str, str]) -> Optional[str]:
+    """Second chance for state/country values spelt differently from the
+    option text ("NY", "U.S.", "Massachusets")."""
+    if question.get("special_handling") == "us_states":
+        name = us_state_name(value)
+        return index.get(_normalize_choice_text(name)) if name else None
+    code = country_code(value)
+    if code and code in index.values():
+        return code
+    return None
+
+
 def _resolve_cond_expr(
     expr: str,
-    q_lookup: Dict[str, dict],
+    q_lookup: _QuestionLookup,
 ) -> str:
-    """Resolve all ``match=`` references inside a single cond expression string."""
-    if not expr or "match=" not in expr:
+    """Resolve ``match=`` references and normalise syntax in one cond expression."""
+    if not expr:
         return expr
 
-    def _replacer(m: re.Match) -> str:
-        neg = m.group("neg") is not None
-        label = m.group("label")
-        value = m.group("value")
+    def _resolver(label: str, value: str) -> Optional[str]:
         question = q_lookup.get(label)
         if question is None:
             logger.warning(f"Condition references unknown question '{label}' -- defaulting to 1")
-            return "1"
-        resolved = _resolve_single_match(label, value, neg, question)
+            return None
+        resolved = _resolve_single_match(label, value, question, q_lookup.choice_index(label))
         if resolved is None:
             logger.warning(f"Unresolvable match='{value}' for {label} -- defaulting to 1")
-            return "1"
         return resolved
 
-    return _MATCH_PATTERN.sub(_replacer, expr)
-
-
-def _normalize_cond_syntax(expr: str) -> str:
-    """Fix common syntax issues in condition expressions.
-
-    - Bare ``condition.X`` refs -> ``(condition.X)``
-    - ``!(...)`` -> ``not(...)``
-    - Numeric equality/comparison ``(qLabel=N)`` or ``(qLabel==N)``
-      -> ``(qLabel.check('N'))``
-    - Numeric inequality ``(qLabel<N)`` or ``(qLabel>N)`` or ``<=``/``>=``
-      -> ``(qLabel.check('<N'))`` etc.
-    """
-    expr = re.sub(r"(?<!\()condition\.\w+", r"(\g<0>)", expr)
-    expr = re.sub(r"!\(", "not(", expr)
-
-    def _to_check(m: re.Match) -> str:
-        label = m.group(1)
-        op = m.group(2)
-        value = m.group(3)
-        if op in ("=", "=="):
-            return f"{label}.check('{value}')"
-        return f"{label}.check('{op}{value}')"
-
-    expr = re.sub(
-        r"(\b[a-zA-Z_]\w*)(==?|[<>]=?)\s*(\d[\d,\-]*)",
-        _to_check,
-        expr,
-    )
-    return expr
+    node = condition_expr.parse(expr)
+    resolved = condition_expr.normalize(condition_expr.resolve_matches(node, _resolver))
+    return condition_expr.to_string(resolved)
 
 
 def _resolve_cond_references(
     conditions: List[dict],
     questions: List[dict],
+    reference_questions: Optional[List[dict]] = None,
 ) -> None:
     """Resolve all ``match=Value`` references in conditions and questions in-place."""
-    q_lookup = _build_question_lookup(questions)
+    q_lookup = _build_question_lookup(questions, reference_questions)
 
-    for cond in conditions:
-        expr = cond.get("cond")
+    for item in list(conditions) + list(questions):
+        expr = item.get("cond")
         if expr:
-            cond["cond"] = _normalize_cond_syntax(_resolve_cond_expr(expr, q_lookup))
+            item["cond"] = _resolve_cond_expr(expr, q_lookup)
+
+
+@_POSTPROCESS.rule("resolve_cond_references", scope=SURVEY, after=("rewrite_converted_refs",))
+def _resolve_cond_references_rule(ctx: PostProcessContext) -> int:
+    """Resolve ``match=Value`` references once every question is settled."""
+    items = list(ctx.conditions) + list(ctx.questions)
+    before = [item.get("cond") for item in items]
+    _resolve_cond_references(ctx.conditions, ctx.questions, ctx.reference_questions)
+    return sum(1 for item, old in zip(items, before) if item.get("cond") != old)
 
-    for q in questions:
-        expr = q.get("cond")
-        if expr:
-            q["cond"] = _normalize_cond_syntax(_resolve_cond_expr(expr, q_lookup))
+
+@_POSTPROCESS.rule("dedupe_conditions", scope=SURVEY, after=("resolve_cond_references",))
+def _dedupe_conditions_rule(ctx: PostProcessContext) -> int:
+    """Chunks that re-defined a shared condition under another label now
+    resolve to the same expression -- fold them into the shared one."""
+    before = len(ctx.conditions)
+    ctx.conditions = _dedupe_condition_expressions(ctx.conditions, ctx.questions)
+    return before - len(ctx.conditions)
 
 
 # ---------------------------------------------------------------------------
 # Main classification function
 # ---------------------------------------------------------------------------
 
+def parse_classification(result: Any, where: str = "Response") -> Tuple[List[dict], List[dict]]:
+    """``(conditions, questions)`` from a classification response.
+
+    Expands the compact schema and normalizes each question; anything that
+    is not the expected shape is logged and treated as empty.
+    """
+    if not isinstance(result, dict):
+        logger.warning(f"Unexpected response type from {where.lower()}: {type(result)}")
+        return [], []
+    logger.info(f"Classification {where.lower()}: response keys = {list(result.keys())}")
+    result = expand_response(result)
+    conditions = result.get("conditions", [])
+    questions = result.get("questions", [])
+    if not isinstance(conditions, list):
+        logger.warning(f"{where}: 'conditions' is {type(conditions).__name__}, not list")
+        conditions = []
+    if not isinstance(questions, list):
+        logger.warning(f"{where}: 'questions' is {type(questions).__name__}, not list")
+        questions = []
+    return conditions, [_normalize_question(q) for q in questions]
+
+
+def _attach_sort_keys(chunk: List[dict], questions: List[dict]) -> None:
+    """Attach ``_sort_key`` from the input segments' paragraph_indices.
+
+    Lets the interleaver place questions in correct document order even
+    when the AI returns more/fewer questions than input segments.  Uses
+    label matching; AI-generated extras (e.g. term elements) inherit the
+    sort key of the nearest preceding match.
+    """
+    seg_label_to_idx = {}
+    for seg in chunk:
+        seg_lbl = seg.get("label", "")
+        if seg_lbl and seg_lbl != "?":
+            seg_label_to_idx[seg_lbl] = seg.get("paragraph_indices", [0])[0]
+
+    last_key = chunk[0].get("paragraph_indices", [0])[0] if chunk else 0
+    for q in questions:
+        qlabel = q.get("label", "")
+        matched_key = seg_label_to_idx.get(qlabel)
+        if matched_key is not None:
+            q["_sort_key"] = matched_key
+            last_key = matched_key
+        else:
+            q["_sort_key"] = last_key
+
+
 def classify_segments(
     segments: List[dict],
     model: Optional[str] = None,
     progress_callback=None,
+    reference_questions: Optional[List[dict]] = None,
+    keep_sort_keys: bool = False,
+    classified: Optional[Tuple[List[dict], List[dict]]] = None,
 ) -> Dict[str, List[dict]]:
     """Run AI classification on segmented blocks.
 
@@ -868,11 +1088,22 @@ def classify_segments(
         segments: Segmented blocks from segmenter.py
         model: OpenAI model override
         progress_callback: Optional callable(message: str) for UI updates
+        reference_questions: Already-classified questions (e.g. reused from
+            a previous run) that conditions in these segments may reference
+        keep_sort_keys: Keep each element's ``_sort_key`` (first paragraph
+            index) so the output can be spliced with other runs
+        classified: ``(conditions, questions)`` the AI already returned for
+            these segments (see combined.py); no classification calls are
+            made and only the deterministic passes run over them
 
     Returns:
         Dict with:
             - "conditions": List of condition definition dicts
             - "questions": List of classified question dicts (in document order)
+            - "postprocess": Per-rule ``{"scope", "changes", "seconds"}``
+              from the deterministic post-processing run
+            - "library": Question library lookups, hits and stores (empty
+              when the library is off)
     """
     model = model or OPENAI_MODEL
 
@@ -947,62 +1178,84 @@ def classify_segments(
         _report("WARNING: No classifiable segments found -- nothing to send to AI.")
         return {
             "conditions": [],
-            "questions": list(passthrough),
+            "questions": _interleave_passthrough(
+                segments, [], passthrough, keep_sort_keys=keep_sort_keys,
+            ),
         }
 
-    # Chunk the classifiable segments
-    chunks = _chunk_segments(classifiable)
+    # Phase 1: extract all [IF]/[TERM IF] logic document-wide, so every
+    # chunk works from the same condition definitions
+    shared_conditions, specs = extract_conditions(segments, use_model=classified is None)
+    shared_conditions = _merge_conditions(shared_conditions + block_conditions)
+    conditions_context = _build_conditions_context(
+        shared_conditions,
+        [(s.raw, s.cond) for s in specs if s.kind == "term" and s.resolved],
+    )
+    if specs:
+        _report(
+            f"Condition pre-pass: {len(shared_conditions)} shared conditions, "
+            f"{sum(1 for s in specs if s.resolved)}/{len(specs)} logic lines resolved"
+        )
 
-    all_conditions: List[dict] = []
+    # Standard demographic questions whose logic the pre-pass resolved are
+    # built from their segments; only the rest go to the AI
+    standard_segments: List[dict] = []
+    standard_questions: List[dict] = []
+    if STANDARD_BLOCKS_SKIP_CLASSIFICATION and classified is None:
+        classifiable, standard_segments, standard_questions = _split_standard_segments(
+            classifiable, specs,
+        )
+        if standard_questions:
+            _report(
+                f"Standard blocks: {len(standard_questions)} segments built without the AI "
+                f"({', '.join(q['label'] for q in standard_questions)})"
+            )
+
+    # Segments classified in an earlier survey are reused from the library
+    library = open_library() if classifiable else None
+    library_segments: List[dict] = []
+    library_questions: List[dict] = []
+    library_stats: Dict[str, Any] = {}
+    if library is not None and classified is None:
+        classifiable, library_segments, library_questions, library_stats = _split_library_segments(
+            classifiable, specs, library,
+        )
+        if library_questions:
+            _report(
+                f"Question library: {len(library_questions)}/{library_stats['lookups']} "
+                "segments reused without the AI"
+            )
+
+    # Phase 2: chunk the classifiable segments (a combined segment+classify
+    # call already answered for all of them as one chunk)
+    chunk_results: List[Tuple[List[dict], List[dict]]]
+    if classified is not None:
+        chunks = [classifiable]
+        classified_conditions, classified_questions = classified
+        _attach_sort_keys(classifiable, classified_questions)
+        chunk_results = [(list(classified_conditions), classified_questions)]
+    else:
+        chunks = _chunk_segments(classifiable) if classifiable else []
+        chunk_results = [([], []) for _ in chunks]
+
+    all_conditions: List[dict] = list(shared_conditions)
     all_questions: List[dict] = []
 
     def _classify_chunk(i: int, chunk: List[dict]) -> Tuple[List[dict], List[dict]]:
         """Classify a single chunk through the AI (thread-safe)."""
         logger.info(f"Classifying chunk {i + 1}/{len(chunks)} ({len(chunk)} segments)...")
         blocks_json = json.dumps(chunk, separators=(",", ":"), default=str)
-        user_prompt = build_classification_prompt(blocks_json)
+        user_prompt = build_classification_prompt(
+            blocks_json, conditions_context, compact=CLASSIFICATION_COMPACT_OUTPUT,
+        )
         result = call_ai(
             system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
             model=model,
             expect_json=True,
         )
-        if isinstance(result, dict):
-            logger.info(f"Classification chunk {i + 1}: response keys = {list(result.keys())}")
-            chunk_conditions = result.get("conditions", [])
-            chunk_questions = result.get("questions", [])
-            if not isinstance(chunk_conditions, list):
-                logger.warning(f"Chunk {i + 1}: 'conditions' is {type(chunk_conditions).__name__}, not list")
-                chunk_conditions = []
-            if not isinstance(chunk_questions, list):
-                logger.warning(f"Chunk {i + 1}: 'questions' is {type(chunk_questions).__name__}, not list")
-                chunk_questions = []
-        else:
-            logger.warning(f"Unexpected response type from chunk {i + 1}: {type(result)}")
-            chunk_conditions = []
-            chunk_questions = []
-        chunk_questions = [_normalize_question(q) for q in chunk_questions]
-
-        # Attach _sort_key from input segment paragraph_indices so
-        # the interleaver can place questions in correct document order
-        # even when the AI returns more/fewer questions than input segments.
-        # Uses label matching; AI-generated extras (e.g. term elements)
-        # inherit the sort key of the nearest preceding match.
-        seg_label_to_idx = {}
-        for seg in chunk:
-            seg_lbl = seg.get("label", "")
-            if seg_lbl and seg_lbl != "?":
-                seg_label_to_idx[seg_lbl] = seg.get("paragraph_indices", [0])[0]
-
-        last_key = chunk[0].get("paragraph_indices", [0])[0] if chunk else 0
-        for q in chunk_questions:
-            qlabel = q.get("label", "")
-            matched_key = seg_label_to_idx.get(qlabel)
-            if matched_key is not None:
-                q["_sort_key"] = matched_key
-                last_key = matched_key
-            else:
-                q["_sort_key"] = last_key
+        chunk_conditions, chunk_questions = parse_classification(result, f"Chunk {i + 1}")
+        _attach_sort_keys(chunk, chunk_questions)
 
         logger.info(
             f"Chunk {i + 1}: {len(chunk_questions)} questions, "
@@ -1010,58 +1263,67 @@ def classify_segments(
         )
         return chunk_conditions, chunk_questions
 
-    if len(chunks) == 1:
-        _report(f"Classifying chunk 1/1 ({len(chunks[0])} segments)...")
-        conds, qs = _classify_chunk(0, chunks[0])
-        all_conditions.extend(conds)
-        all_questions.extend(qs)
-        _report(f"Chunk 1: {len(qs)} questions, {len(conds)} conditions")
-    else:
-        max_workers = min(len(chunks), 5)
-        _report(f"Classifying {len(chunks)} chunks in parallel (max_workers={max_workers})...")
-
-        from .ai_client import get_client
+    if classified is None:
+        from .ai_client import ai_job, get_client, get_scheduler
         get_client()
 
-        chunk_results: List[Tuple[List[dict], List[dict]]] = [([], []) for _ in chunks]
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if len(chunks) == 1:
+            _report(f"Classifying chunk 1/1 ({len(chunks[0])} segments)...")
+        elif chunks:
+            _report(f"Classifying {len(chunks)} chunks via the AI scheduler...")
+
+        # Most expensive chunks first (LPT) when some must queue; results
+        # are merged in document order
+        order = submission_order([_chunk_cost(c) for c in chunks], get_scheduler().max_concurrency)
+        with ai_job("classification") as job:
             future_to_idx = {
-                executor.submit(_classify_chunk, i, chunk): i
-                for i, chunk in enumerate(chunks)
+                job.submit(_classify_chunk, i, chunks[i]): i
+                for i in order
             }
             for future in as_completed(future_to_idx):
                 idx = future_to_idx[future]
                 chunk_results[idx] = future.result()
-                _report(f"Classification chunk {idx + 1}/{len(chunks)} complete")
-        for conds, qs in chunk_results:
-            all_conditions.extend(conds)
-            all_questions.extend(qs)
+                conds, qs = chunk_results[idx]
+                _report(
+                    f"Classification chunk {idx + 1}/{len(chunks)} complete "
+                    f"({len(qs)} questions, {len(conds)} conditions)"
+                )
+    if library is not None:
+        # Before post-processing, which edits the questions in place
+        library_stats["stored"] = library.add(
+            _library_pairs(chunks, chunk_results, specs), model=model,
+        )
+    for conds, qs in chunk_results:
+        all_conditions.extend(conds)
+        all_questions.extend(qs)
+    if standard_questions or library_questions:
+        all_questions.extend(standard_questions)
+        all_questions.extend(library_questions)
+        all_questions.sort(key=lambda q: q.get("_sort_key", 0))
 
     # Include conditions generated from block markers (deterministic)
     all_conditions.extend(block_conditions)
 
-    # Merge and deduplicate conditions
+    # Merge and deduplicate conditions (shared pre-pass definitions first)
     all_conditions = _merge_conditions(all_conditions)
 
-    # Convert select → radio when source has no [DROPDOWN] indicator
-    _guard_select_without_dropdown(all_questions, classifiable, all_conditions)
-
-    # Resolve any match=Value condition references to actual chN/rN indices
-    _resolve_cond_references(all_conditions, all_questions)
-
-    # Deterministic post-processing
-    _guard_explicit_answers(all_questions, classifiable)
-    _fix_agree_disagree_statements(all_questions, classifiable)
-    _recover_title_newlines(all_questions, classifiable)
-    _format_statement_titles(all_questions)
-    _ensure_comments(all_questions)
-    _enforce_anchor_exclusive(all_questions)
-    _guard_other_open_end(all_questions, classifiable)
+    # Deterministic post-processing: all guards in one rule-engine run
+    ctx = PostProcessContext(
+        all_questions, classifiable + standard_segments + library_segments, all_conditions,
+        reference_questions,
+    )
+    rule_stats = _POSTPROCESS.run(ctx)
+    all_conditions = ctx.conditions
+    changed = {name: st["changes"] for name, st in rule_stats.items() if st["changes"]}
+    if changed:
+        logger.info(f"Post-processing changes: {changed}")
 
     # Now interleave passthrough elements (pagebreaks, comments) back
     # into the question list in their original document order.
     # We do this by tracking segment indices.
-    final_questions = _interleave_passthrough(segments, all_questions, passthrough)
+    final_questions = _interleave_passthrough(
+        segments, all_questions, passthrough, keep_sort_keys=keep_sort_keys,
+    )
 
     _report(
         f"Classification complete: {len(final_questions)} elements, "
@@ -1071,13 +1333,143 @@ def classify_segments(
     return {
         "conditions": all_conditions,
         "questions": final_questions,
+        "postprocess": rule_stats,
+        "library": library_stats,
+    }
+
+
+def _split_standard_segments(
+    segments: List[dict],
+    specs: List[ConditionSpec],
+) -> Tuple[List[dict], List[dict], List[dict]]:
+    """Separate segments the standard-block registry can build on its own.
+
+    Returns ``(for_ai, standard_segments, standard_questions)``.  A segment
+    stays with the AI unless a registry entry recognises it and every
+    condition on it was resolved by the pre-pass.
+    """
+    for_ai: List[dict] = []
+    standard_segments: List[dict] = []
+    standard_questions: List[dict] = []
+    for seg in segments:
+        found = standard_question_for_segment(seg)
+        cond = segment_cond(seg, specs) if found else None
+        if cond is None:
+            for_ai.append(seg)
+            continue
+        block, q = found
+        if cond:
+            q["cond"] = cond
+        q["_sort_key"] = seg.get("paragraph_indices", [0])[0]
+        logger.info(f"Standard {block.name} block: {q['label']} (no AI classification)")
+        standard_segments.append(seg)
+        standard_questions.append(q)
+    return for_ai, standard_segments, standard_questions
+
+
+_LIBRARY_BLOCK_TYPES = ("question", "text_screen")
+
+
+def _library_cond(seg: dict, specs: List[ConditionSpec]) -> Optional[str]:
+    """Like :func:`segment_cond`, or None when the segment cannot go
+    through the library (type, or answer-level terminations)."""
+    if seg.get("block_type") not in _LIBRARY_BLOCK_TYPES or seg.get("answer_terminations"):
+        return None
+    return segment_cond(seg, specs)
+
+
+def _split_library_segments(
+    segments: List[dict],
+    specs: List[ConditionSpec],
+    library: QuestionLibrary,
+) -> Tuple[List[dict], List[dict], List[dict], Dict[str, Any]]:
+    """Separate segments whose classification the library already holds.
+
+    Returns ``(for_ai, library_segments, library_questions, stats)``.  Only
+    segments whose logic the pre-pass resolved are looked up; the reused
+    question takes the segment's texts (see ``retext_question``), label
+    and the pre-pass ``cond``.
+    """
+    t0 = time.perf_counter()
+    eligible = [(seg, cond) for seg in segments for cond in [_library_cond(seg, specs)] if cond is not None]
+    matches = library.lookup([seg for seg, _ in eligible])
+    found = {id(seg): (cond, match) for (seg, cond), match in zip(eligible, matches) if match is not None}
+
+    for_ai: List[dict] = []
+    library_segments: List[dict] = []
+    library_questions: List[dict] = []
+    reused: List[Dict[str, Any]] = []
+    for seg in segments:
+        hit = found.get(id(seg))
+        if hit is None:
+            for_ai.append(seg)
+            continue
+        cond, match = hit
+        q = match.question
+        label = seg.get("label", "")
+        if label and label != "?":
+            q["label"] = label
+        if cond:
+            q["cond"] = cond
+        q["_sort_key"] = seg.get("paragraph_indices", [0])[0]
+        library_segments.append(seg)
+        library_questions.append(q)
+        reused.append({
+            "label": q.get("label", ""),
+            "entry": match.entry,
+            "similarity": round(match.similarity, 3),
+            "hits": match.hits,
+        })
+    stats = {
+        "lookups": len(eligible),
+        "hits": len(library_questions),
+        "reused": reused,
+        "seconds": round(time.perf_counter() - t0, 3),
     }
+    return for_ai, library_segments, library_questions, stats
+
+
+def _library_pairs(
+    chunks: List[List[dict]],
+    chunk_results: List[Tuple[List[dict], List[dict]]],
+    specs: List[ConditionSpec],
+) -> Iterator[Tuple[dict, dict]]:
+    """``(segment, question)`` pairs worth storing in the library.
+
+    A segment qualifies when it could be looked up (see
+    :func:`_library_cond`) and the AI turned it into exactly one element,
+    carrying its label -- a segment that also produced terms would lose
+    them on reuse.  The question is stored without its ``cond``; questions
+    with row-level conditions or ``match=`` placeholders are skipped, as
+    those refer to other questions of this survey.
+    """
+    for chunk, (_, questions) in zip(chunks, chunk_results):
+        by_key: Dict[Any, List[dict]] = {}
+        for q in questions:
+            by_key.setdefault(q.get("_sort_key"), []).append(q)
+        for seg in chunk:
+            label = seg.get("label", "")
+            produced = by_key.get(seg.get("paragraph_indices", [0])[0], [])
+            if (
+                len(produced) != 1 or not label or produced[0].get("label") != label
+                or _library_cond(seg, specs) is None
+            ):
+                continue
+            q = produced[0]
+            if (q.get("forsta_type") or "").lower() == "term":
+                continue
+            stored = {k: v for k, v in q.items() if k not in ("cond", "_sort_key")}
+            text = json.dumps(stored, default=str)
+            if '"cond"' in text or "match=" in text:
+                continue
+            yield seg, stored
 
 
 def _interleave_passthrough(
     original_segments: List[dict],
     classified_questions: List[dict],
     passthrough_elements: List[dict],
+    keep_sort_keys: bool = False,
 ) -> List[dict]:
     """Reconstruct document order by merging classified questions with
     passthrough elements using their ``_sort_key`` (paragraph index).
@@ -1089,12 +1481,19 @@ def _interleave_passthrough(
     all_elements.sort(key=lambda x: x.get("_sort_key", 0))
 
     # Strip the internal sort key from the final output
-    for el in all_elements:
-        el.pop("_sort_key", None)
+    if not keep_sort_keys:
+        strip_sort_keys(all_elements)
 
     return all_elements
 
 
+def strip_sort_keys(elements: List[dict]) -> List[dict]:
+    """Remove the internal ``_sort_key`` from classified elements in-place."""
+    for el in elements:
+        el.pop("_sort_key", None)
+    return elements
+
+
 # ---------------------------------------------------------------------------
 # Convenience: full pipeline from segments
 # ---------------------------------------------------------------------------
@@ -0,0 +1,391 @@
+"""Batch command line interface: convert many questionnaires at once.
+
+Usage::
+
+    python -m survey_xml_generator waves/ -o out/ --jobs 4
+    python -m survey_xml_generator "waves/*W3*.docx" -o out/ --resume
+    python -m survey_xml_generator waves/ -o out/ --dry-run
+
+Extraction runs in a process pool (python-docx parsing is CPU bound), the
+AI stages for all documents share one process-wide request limit (batch
+priority, so interactive runs in the same process go first), and every
+run writes ``manifest.json`` next to the XML files with per-document
+timings, token usage and warnings.  ``--resume`` skips documents whose
+source is unchanged since a successful run recorded in that manifest.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import AI_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+# ---------------------------------------------------------------------------
+# Input discovery
+# ---------------------------------------------------------------------------
+
+def _glob_root(pattern: str) -> Path:
+    """The directory part of a glob pattern before its first wildcard."""
+    parts = []
+    for part in Path(pattern).parts[:-1]:
+        if any(ch in part for ch in "*?["):
+            break
+        parts.append(part)
+    return Path(*parts) if parts else Path(".")
+
+
+def _discover_inputs(patterns: List[str]) -> List[Tuple[Path, Path]]:
+    """Expand directories and glob patterns into a sorted list of .docx files.
+
+    Returns ``(source, relative)`` pairs, ``relative`` being the source's
+    path below the directory or glob root it was found under (just the
+    file name for files given directly).  Word lock files
+    (``~$name.docx``) are skipped.
+    """
+    found: Dict[str, Tuple[Path, Path]] = {}
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            root, candidates = path, sorted(path.glob("*.docx"))
+        elif any(ch in pattern for ch in "*?["):
+            root = _glob_root(pattern)
+            candidates = [Path(p) for p in sorted(glob.glob(pattern, recursive=True))]
+        else:
+            root, candidates = path.parent, [path]
+        for c in candidates:
+            if c.suffix.lower() != ".docx" or c.name.startswith("~$") or not c.is_file():
+                continue
+            try:
+                relative = c.relative_to(root)
+            except ValueError:
+                relative = Path(c.name)
+            found.setdefault(str(c.resolve()), (c, relative))
+    return [found[k] for k in sorted(found)]
+
+
+def _plan_outputs(inputs: List[Tuple[Path, Path]], out_dir: Path) -> Dict[Path, Path]:
+    """Output XML path per source, mirroring its relative path under
+    ``out_dir``.
+
+    Raises ValueError when two sources would still write the same file
+    (e.g. ``a/survey.docx`` and ``b/survey.docx`` passed as two inputs).
+    """
+    outputs: Dict[Path, Path] = {}
+    claimed: Dict[str, Path] = {}
+    for src, relative in inputs:
+        output = out_dir / relative.with_suffix(".xml")
+        key = os.path.normcase(str(output.resolve())).lower()
+        if key in claimed:
+            raise ValueError(f"{claimed[key]} and {src} would both be written to {output}")
+        claimed[key] = src
+        outputs[src] = output
+    return outputs
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _survey_name_for(path: Path) -> str:
+    """Derive a Forsta-friendly survey name from the file name."""
+    name = re.sub(r"[^A-Za-z0-9_]+", "_", path.stem).strip("_")
+    return name or "Survey"
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+class _Manifest:
+    """Thread-safe manifest that is rewritten after every finished document."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data: Dict[str, Any] = {"documents": {}}
+        if path.is_file():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.data = json.load(f)
+                self.data.setdefault("documents", {})
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+
+    def entry(self, source: Path) -> Optional[dict]:
+        return self.data["documents"].get(str(source))
+
+    def update(self, source: Path, entry: dict) -> None:
+        with self._lock:
+            self.data["documents"][str(source)] = entry
+            self._write()
+
+    def set_run_info(self, info: dict) -> None:
+        with self._lock:
+            self.data["run"] = info
+            self._write()
+
+    def _write(self) -> None:
+        tmp = self.path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, default=str)
+        os.replace(tmp, self.path)
+
+
+def _is_up_to_date(entry: Optional[dict], sha: str) -> bool:
+    return bool(
+        entry
+        and entry.get("status") == "ok"
+        and entry.get("sha256") == sha
+        and entry.get("output")
+        and Path(entry["output"]).is_file()
+    )
+
+
+# ---------------------------------------------------------------------------
+# Workers
+# ---------------------------------------------------------------------------
+
+def _extract_worker(path: str) -> Tuple[str, Any, float, Optional[str]]:
+    """Process-pool worker: extract one document into a ``BlockStore``."""
+    from .extractor import extract_store_from_file
+
+    t0 = time.perf_counter()
+    try:
+        store = extract_store_from_file(path)
+        return path, store, time.perf_counter() - t0, None
+    except Exception as e:  # reported in the manifest, never fatal for the batch
+        return path, None, time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
+
+def _convert_document(
+    source: Path,
+    store,
+    output: Path,
+    model: Optional[str],
+) -> Dict[str, Any]:
+    """Run Stages 2-5 for one extracted document and write its XML."""
+    from .ai_client import PRIORITY_BATCH, track_usage
+    from .assembler import _run_pipeline
+
+    prefix = source.name
+
+    def _progress(msg: str):
+        logger.info(f"[{prefix}] {msg}")
+
+    with track_usage() as usage:
+        xml_output, warnings, debug_info = _run_pipeline(
+            store, _survey_name_for(source), model, _progress,
+            priority=PRIORITY_BATCH,
+        )
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(xml_output)
+
+    return {
+        "tokens": dict(usage),
+        "warnings": warnings,
+        "timings": debug_info.get("timings", {}),
+        "segments": debug_info.get("segments", 0),
+        "questions": debug_info.get("classified_questions", 0),
+        "conditions": debug_info.get("conditions", 0),
+        "xml_lines": debug_info.get("xml_lines", 0),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="survey-xml",
+        description="Convert a directory or glob of .docx questionnaires to Forsta XML.",
+    )
+    parser.add_argument(
+        "inputs", nargs="+",
+        help="Directories, .docx files, or glob patterns (quote globs).",
+    )
+    parser.add_argument(
+        "-o", "--output-dir", default="xml_output",
+        help=(
+            "Where to write manifest.json and the XML files, which mirror each "
+            "input's path below its directory or glob root (default: xml_output)."
+        ),
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 2,
+        help="Extraction processes and documents converted concurrently.",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=AI_MAX_CONCURRENCY,
+        help=(
+            "Ceiling on in-flight AI requests shared by all documents; the "
+            f"adaptive limit grows towards it while calls are healthy (default: {AI_MAX_CONCURRENCY})."
+        ),
+    )
+    parser.add_argument("--model", default=None, help="OpenAI model override.")
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip documents already converted successfully with unchanged source.",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Extract and report what would be converted; make no AI calls.",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Verbose logging.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _build_parser().parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s  %(name)s  %(levelname)s  %(message)s",
+    )
+
+    inputs = _discover_inputs(args.inputs)
+    if not inputs:
+        print("No .docx files found.", file=sys.stderr)
+        return 1
+    sources = [src for src, _ in inputs]
+
+    out_dir = Path(args.output_dir)
+    try:
+        outputs = _plan_outputs(inputs, out_dir)
+    except ValueError as e:
+        print(f"Output name clash: {e}. Pass the inputs under one common directory.", file=sys.stderr)
+        return 1
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _Manifest(out_dir / MANIFEST_NAME)
+    jobs = max(1, args.jobs)
+
+    # --- Plan: hash sources, apply --resume ---
+    pending: List[Path] = []
+    shas: Dict[Path, str] = {}
+    for src in sources:
+        shas[src] = _file_sha256(src)
+        if args.resume and _is_up_to_date(manifest.entry(src.resolve()), shas[src]):
+            print(f"skip     {src} (up to date)")
+            continue
+        pending.append(src)
+
+    manifest.set_run_info({
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "inputs": [str(s) for s in sources],
+        "pending": len(pending),
+        "jobs": jobs,
+        "max_concurrency": args.max_concurrency,
+        "dry_run": args.dry_run,
+    })
+    if not pending:
+        print("Nothing to do.")
+        return 0
+
+    if not args.dry_run:
+        from .ai_client import get_client, set_max_concurrency
+        get_client()
+        set_max_concurrency(args.max_concurrency)
+
+    # --- Stage 1 for every document in a process pool ---
+    extracted: Dict[Path, Tuple[Any, float, Optional[str]]] = {}
+    by_path = {str(p): p for p in pending}
+    with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+        for path, store, seconds, error in pool.map(_extract_worker, list(by_path)):
+            extracted[by_path[path]] = (store, seconds, error)
+
+    failures = 0
+    convert: List[Path] = []
+    for src in pending:
+        store, seconds, error = extracted[src]
+        output = outputs[src]
+        entry: Dict[str, Any] = {
+            "source": str(src),
+            "output": str(output.resolve()),
+            "sha256": shas[src],
+            "blocks": len(store) if store is not None else 0,
+            "timings": {"extract": round(seconds, 3)},
+        }
+        if error:
+            failures += 1
+            entry.update(status="error", error=error)
+            manifest.update(src.resolve(), entry)
+            print(f"error    {src}: {error}")
+        elif args.dry_run:
+            entry["status"] = "dry-run"
+            manifest.update(src.resolve(), entry)
+            print(f"would    {src} -> {output} ({entry['blocks']} blocks)")
+        else:
+            convert.append(src)
+            manifest.update(src.resolve(), dict(entry, status="running"))
+
+    if args.dry_run or not convert:
+        return 1 if failures else 0
+
+    # --- Stages 2-5, documents in parallel sharing the AI request limit ---
+    def _run_one(src: Path) -> Tuple[Path, Dict[str, Any]]:
+        store, seconds, _ = extracted.pop(src)
+        output = outputs[src]
+        entry = dict(manifest.entry(src.resolve()) or {})
+        t0 = time.perf_counter()
+        try:
+            result = _convert_document(src, store, output, args.model)
+            entry.update(result, status="ok")
+            entry["timings"] = dict({"extract": round(seconds, 3)}, **result["timings"])
+        except Exception as e:
+            logger.exception(f"Failed to convert {src}")
+            entry.update(status="error", error=f"{type(e).__name__}: {e}")
+        entry["timings"]["total"] = round(time.perf_counter() - t0 + seconds, 3)
+        manifest.update(src.resolve(), entry)
+        return src, entry
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(convert))) as executor:
+        futures = [executor.submit(_run_one, src) for src in convert]
+        for future in as_completed(futures):
+            src, entry = future.result()
+            if entry["status"] == "ok":
+                print(
+                    f"ok       {src} -> {entry['output']} "
+                    f"({entry['questions']} elements, {len(entry['warnings'])} warnings, "
+                    f"{entry['tokens'].get('total_tokens', 0)} tokens, "
+                    f"{entry['timings']['total']:.1f}s)"
+                )
+            else:
+                failures += 1
+                print(f"error    {src}: {entry.get('error')}")
+
+    from .ai_client import concurrency_metrics, hedge_metrics
+    manifest.set_run_info(dict(
+        manifest.data.get("run", {}),
+        finished=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        ai_concurrency=concurrency_metrics(),
+        ai_hedging=hedge_metrics(),
+    ))
+    print(f"Manifest: {manifest.path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Stages 2+3 in one AI call for small documents.
+
+A short screener fits in a single segmentation chunk, yet the two-stage
+path still makes two sequential round trips: segment, then classify the
+segments.  When the document's content blocks fit one chunk and
+``COMBINED_MAX_DOCUMENT_TOKENS``, a single call returns the segments and
+their classification together.  Everything deterministic around the AI
+calls runs on that answer exactly as on the two-stage path: pagebreak and
+block-marker injection and question reconciliation
+(:func:`segmenter.finish_segments`), then the condition pre-pass,
+post-processing rules, question library store and passthrough interleave
+(:func:`classifier.classify_segments` with ``classified=``).
+
+Larger documents, failed calls and answers without usable segments fall
+back to the two stages.  When the segments are usable but some question
+is missing from the classification, only the classification stage runs.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .ai_client import ai_job, call_ai
+from .block_store import BlockSelection, BlockStore
+from .chunk_planner import estimate_tokens
+from .classifier import classify_segments, parse_classification
+from .config import (
+    CLASSIFICATION_COMPACT_OUTPUT,
+    COMBINED_MAX_DOCUMENT_TOKENS,
+    OPENAI_MODEL,
+    SEGMENTATION_CHUNK_SIZE,
+)
+from .prompts.combined import SYSTEM_PROMPT, build_combined_prompt
+from .segmenter import finish_segments, prepare_blocks
+
+logger = logging.getLogger(__name__)
+
+# Segment types classify_segments sends to the AI
+_CLASSIFIABLE_TYPES = ("question", "text_screen", "term")
+
+# Classified segments whose element keeps the segment's label (term
+# segments have none; the AI names their elements)
+_LABELLED_TYPES = ("question", "text_screen")
+
+
+def _unclassified_labels(segments: List[dict], questions: List[dict]) -> List[str]:
+    """Labels of classifiable segments the combined answer left out."""
+    answered = {q.get("label") for q in questions}
+    return [
+        seg["label"] for seg in segments
+        if seg.get("block_type") in _LABELLED_TYPES
+        and seg.get("label") and seg["label"] != "?"
+        and seg["label"] not in answered
+    ]
+
+
+def segment_and_classify(
+    blocks: Union[List[dict], BlockStore, BlockSelection],
+    model: Optional[str] = None,
+    progress_callback=None,
+    reference_questions: Optional[List[dict]] = None,
+    keep_sort_keys: bool = False,
+) -> Optional[Tuple[List[dict], Dict[str, Any]]]:
+    """Segment and classify a small document with one AI call.
+
+    Args:
+        blocks: Raw extracted blocks, as for ``segment_blocks``
+        model: OpenAI model override
+        progress_callback: Optional callable(message: str) for UI updates
+        reference_questions: As for ``classify_segments``
+        keep_sort_keys: As for ``classify_segments``
+
+    Returns:
+        ``(segments, classified)`` as ``segment_blocks`` and
+        ``classify_segments`` would return them, with
+        ``classified["combined"]`` describing the call; or None when the
+        document is too large or the answer has no usable segments, in
+        which case the caller runs the two stages.
+    """
+    model = model or OPENAI_MODEL
+
+    def _report(msg: str):
+        logger.info(msg)
+        if progress_callback:
+            progress_callback(msg)
+
+    prepared = prepare_blocks(blocks)
+    n_blocks = len(prepared.content_blocks)
+    if not 0 < n_blocks <= SEGMENTATION_CHUNK_SIZE:
+        logger.info(f"Combined segment+classify skipped: {n_blocks} content blocks")
+        return None
+    blocks_json = prepared.content_blocks.to_prompt_json()
+    tokens = estimate_tokens(blocks_json)
+    if tokens > COMBINED_MAX_DOCUMENT_TOKENS:
+        logger.info(
+            f"Combined segment+classify skipped: ~{tokens} tokens "
+            f"(COMBINED_MAX_DOCUMENT_TOKENS={COMBINED_MAX_DOCUMENT_TOKENS})"
+        )
+        return None
+
+    _report(f"Segmenting and classifying {n_blocks} blocks in one call...")
+    try:
+        # A truncated or malformed answer is not retried: the two-stage
+        # path is the retry
+        with ai_job("segment_classify") as job:
+            result = job.submit(
+                call_ai,
+                system_prompt=SYSTEM_PROMPT,
+                user_prompt=build_combined_prompt(blocks_json, compact=CLASSIFICATION_COMPACT_OUTPUT),
+                model=model,
+                expect_json=True,
+                max_retries=1,
+            ).result()
+    except Exception as e:
+        _report(f"Combined call failed ({e}); using separate segmentation and classification")
+        return None
+
+    raw_segments = result.get("segments") if isinstance(result, dict) else None
+    if not isinstance(raw_segments, list) or not raw_segments:
+        _report("Combined answer has no segments; using separate segmentation and classification")
+        return None
+    segments = finish_segments(raw_segments, prepared)
+
+    conditions, questions = parse_classification(result, "Combined call")
+    missing = _unclassified_labels(segments, questions)
+    if not questions:
+        missing = [seg.get("label", "") for seg in segments if seg.get("block_type") in _CLASSIFIABLE_TYPES]
+    if missing:
+        # Segments are fine; classify them the usual way
+        _report(
+            f"Combined answer left {len(missing)} segment(s) unclassified; "
+            "classifying the segments separately"
+        )
+        classified = classify_segments(
+            segments, model=model, progress_callback=progress_callback,
+            reference_questions=reference_questions, keep_sort_keys=keep_sort_keys,
+        )
+        classified_by = "classifier"
+    else:
+        classified = classify_segments(
+            segments, model=model, progress_callback=progress_callback,
+            reference_questions=reference_questions, keep_sort_keys=keep_sort_keys,
+            classified=(conditions, questions),
+        )
+        classified_by = "combined"
+
+    classified["combined"] = {
+        "document_tokens": tokens,
+        "segments": len(segments),
+        "classified_by": classified_by,
+    }
+    return segments, classified
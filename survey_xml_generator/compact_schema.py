@@ -0,0 +1,153 @@
+"""Compact response schema for Stage 3 classification.
+
+Completion tokens dominate classification latency, and the long schema
+makes the AI spell out every key of every question, nulls included.  The
+compact schema uses short keys, omits anything at its default, and
+writes answers/rows/columns as ``[label, text, flags, {attributes}]``
+arrays::
+
+    {"c": [["US_Respondent", "(qCountry.match=United States)", "US"]],
+     "q": [{"t": "radio", "l": "qKids", "ti": "Do you have children?",
+            "a": [["r1", "Yes"], ["r2", "No"], ["r3", "None of these", "xa"]]}]}
+
+:func:`expand_response` turns that back into the dicts the rest of the
+pipeline uses (``{"conditions": [...], "questions": [...]}`` with long
+keys); responses already in the long form pass through unchanged, so a
+model that ignores the instruction still works.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# short key -> long key
+QUESTION_KEYS: Dict[str, str] = {
+    "t": "forsta_type",
+    "l": "label",
+    "ti": "title",
+    "cm": "comment",
+    "c": "cond",
+    "sh": "shuffle",
+    "m": "is_matrix",
+    "a": "answers",
+    "mr": "matrix_rows",
+    "mc": "matrix_cols",
+    "ch": "choices",
+    "sp": "special_handling",
+    "v": "verify",
+    "sz": "size",
+    "o": "optional",
+    "al": "atleast",
+    "am": "atmost",
+    "ct": "content",
+    "ys": "year_start",
+    "ye": "year_end",
+    "rs": "range_start",
+    "re": "range_end",
+    "fl": "floor_label",
+    "cl": "ceiling_label",
+    "w": "width",
+    "h": "height",
+    "rw": "rows",
+    "vl": "values",
+}
+
+# short key -> long key in an option's attribute object
+OPTION_KEYS: Dict[str, str] = {
+    "c": "cond",
+    "v": "value",
+    "vf": "verify",
+    "o": "optional",
+}
+
+_OPTION_LIST_KEYS = frozenset({"answers", "matrix_rows", "matrix_cols", "choices", "rows"})
+
+# Single-character answer flags -> attributes they stand for
+ANSWER_FLAGS: Dict[str, Tuple[str, Any]] = {
+    "x": ("exclusive", "1"),
+    "a": ("randomize", "0"),
+    "o": ("open", "1"),
+    "p": ("openOptional", "1"),
+}
+
+
+def expand_option(item: Any, index: int, prefix: str = "r") -> Any:
+    """``[label, text, flags, {attributes}]`` -> ``{"label", "text", ...}``.
+
+    Dicts pass through; a bare string becomes ``{"label": prefix+index}``.
+    Attribute keys are expanded with :data:`OPTION_KEYS`; an attribute
+    object in place of the flags is accepted too.
+    """
+    if isinstance(item, dict):
+        return item
+    if isinstance(item, str):
+        return {"label": f"{prefix}{index}", "text": item}
+    if not isinstance(item, (list, tuple)) or not item:
+        return item
+    option: Dict[str, Any] = {
+        "label": str(item[0]) if item[0] is not None else f"{prefix}{index}",
+        "text": str(item[1]) if len(item) > 1 and item[1] is not None else "",
+    }
+    if len(item) > 2 and isinstance(item[2], str):
+        for flag in item[2]:
+            attr = ANSWER_FLAGS.get(flag)
+            if attr:
+                option[attr[0]] = attr[1]
+        if option.get("open"):
+            option.setdefault("openSize", 25)
+    for extra in item[2:4]:
+        if isinstance(extra, dict):
+            option.update((OPTION_KEYS.get(k, k), v) for k, v in extra.items())
+    return option
+
+
+_OPTION_PREFIX = {"answers": "r", "matrix_rows": "r", "matrix_cols": "c", "choices": "ch", "rows": "r"}
+
+
+def expand_question(q: Any) -> Any:
+    """Map short keys to long ones and expand option arrays."""
+    if not isinstance(q, dict):
+        return q
+    expanded: Dict[str, Any] = {}
+    for key, value in q.items():
+        expanded[QUESTION_KEYS.get(key, key)] = value
+    for key in _OPTION_LIST_KEYS:
+        options = expanded.get(key)
+        if isinstance(options, list):
+            prefix = _OPTION_PREFIX[key]
+            expanded[key] = [expand_option(o, i, prefix) for i, o in enumerate(options, 1)]
+    if "is_matrix" not in expanded and (expanded.get("matrix_rows") or expanded.get("matrix_cols")):
+        expanded["is_matrix"] = True
+    return expanded
+
+
+def expand_condition(c: Any) -> Optional[Dict[str, str]]:
+    """``[label, cond, description]`` (or a dict) -> condition dict."""
+    if isinstance(c, dict):
+        return {
+            "label": c.get("label", c.get("l", "")),
+            "cond": c.get("cond", c.get("c", "")),
+            "description": c.get("description", c.get("d", "")),
+        }
+    if isinstance(c, (list, tuple)) and len(c) >= 2:
+        return {
+            "label": str(c[0]),
+            "cond": str(c[1]),
+            "description": str(c[2]) if len(c) > 2 and c[2] is not None else "",
+        }
+    return None
+
+
+def expand_response(result: Dict[str, Any]) -> Dict[str, List]:
+    """Compact or long classification response -> long-form dict.
+
+    Keys whose value is not a list are passed through for the caller's
+    type checks.
+    """
+    conditions = result.get("conditions", result.get("c", []))
+    questions = result.get("questions", result.get("q", []))
+    if isinstance(conditions, list):
+        conditions = [e for e in (expand_condition(c) for c in conditions) if e]
+    if isinstance(questions, list):
+        questions = [expand_question(q) for q in questions]
+    return {"conditions": conditions, "questions": questions}
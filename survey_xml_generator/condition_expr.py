@@ -0,0 +1,612 @@
+"""Parsed Forsta ``cond`` expressions.
+
+Conditions travel through the pipeline as strings (``"(qAge.r2) and
+(condition.US_Respondent)"``), but several stages need to look inside
+them: resolving ``qX.match=Value`` placeholders, renaming choice labels
+after a select -> radio conversion, pointing duplicate condition labels
+at a shared one, finding which questions a term depends on, and AND-ing
+extra clauses in.  This module parses an expression once into a small
+immutable tree and implements each of those as a single tree walk.
+
+Grammar (Python-flavoured, as Forsta evaluates conditions as Python)::
+
+    expr    := and ("or" and)*
+    and     := not ("and" not)*
+    not     := ("not" | "!") not | compare
+    compare := primary (op primary)?
+    primary := "(" expr ")" | ref | number | string
+    ref     := NAME ("." NAME | "(" ... ")" | "[" ... "]")*
+
+``qX.match=Value`` (the classifier's placeholder syntax) is a ref whose
+value runs to the next closing parenthesis.  Anything the parser does
+not understand is kept verbatim as a :class:`Raw` leaf, so serialising
+never loses text.  Parsing is cached per expression string.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, List, Mapping, Optional, Set, Tuple
+
+# ---------------------------------------------------------------------------
+# Nodes
+# ---------------------------------------------------------------------------
+
+
+class Node:
+    """Base class; nodes are immutable and compare by serialised form."""
+
+    __slots__ = ()
+
+    def children(self) -> Tuple["Node", ...]:
+        return ()
+
+    def __str__(self) -> str:
+        return to_string(self)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Node) and to_string(self) == to_string(other)
+
+    def __hash__(self) -> int:
+        return hash(to_string(self))
+
+
+class Literal(Node):
+    """Number, string, or the ``1``/``0`` constants."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class Ref(Node):
+    """``root`` followed by accessor parts (``.r1``, ``.check``, ``('0')``)."""
+
+    __slots__ = ("root", "parts")
+
+    def __init__(self, root: str, parts: Tuple[str, ...] = ()):
+        self.root = root
+        self.parts = tuple(parts)
+
+    @property
+    def condition(self) -> Optional[str]:
+        """Label for ``condition.X`` refs, else None."""
+        if self.root == "condition" and self.parts and self.parts[0].startswith("."):
+            return self.parts[0][1:]
+        return None
+
+    @property
+    def question(self) -> Optional[str]:
+        """Question label for ``qX...`` refs, else None."""
+        if self.root == "condition" or self.root in _NAMES_NOT_QUESTIONS:
+            return None
+        return self.root
+
+
+class Match(Node):
+    """Unresolved ``label.match=Value`` placeholder."""
+
+    __slots__ = ("label", "value")
+
+    def __init__(self, label: str, value: str):
+        self.label = label
+        self.value = value
+
+
+class Compare(Node):
+    __slots__ = ("left", "op", "right")
+
+    def __init__(self, left: Node, op: str, right: Node):
+        self.left = left
+        self.op = op
+        self.right = right
+
+    def children(self):
+        return (self.left, self.right)
+
+
+class Not(Node):
+    __slots__ = ("operand",)
+
+    def __init__(self, operand: Node):
+        self.operand = operand
+
+    def children(self):
+        return (self.operand,)
+
+
+class BoolOp(Node):
+    """``and`` / ``or`` over two or more operands."""
+
+    __slots__ = ("op", "operands")
+
+    def __init__(self, op: str, operands: Iterable[Node]):
+        self.op = op
+        self.operands = tuple(operands)
+
+    def children(self):
+        return self.operands
+
+
+class Group(Node):
+    """Parentheses from the source, kept so round-trips preserve them."""
+
+    __slots__ = ("inner",)
+
+    def __init__(self, inner: Node):
+        self.inner = inner
+
+    def children(self):
+        return (self.inner,)
+
+
+class Raw(Node):
+    """Text the parser could not interpret; serialised unchanged."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+TRUE = Literal("1")
+
+_NAMES_NOT_QUESTIONS = frozenset({
+    "and", "or", "not", "in", "is", "True", "False", "None",
+    "len", "any", "all", "sum", "min", "max", "int", "str", "gv", "p",
+})
+
+
+# ---------------------------------------------------------------------------
+# Tokenizer / parser
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<num>\d+(?:[.,\-]\d+)*)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>==|!=|<>|<=|>=|[<>=!])
+  | (?P<punct>[().\[\],])
+  | (?P<other>.)
+""", re.VERBOSE)
+
+_COMPARE_OPS = frozenset({"==", "=", "!=", "<>", "<", ">", "<=", ">="})
+
+
+class _ParseError(Exception):
+    pass
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.toks: List[Tuple[str, str, int, int]] = []
+        for m in _TOKEN_RE.finditer(text):
+            kind = m.lastgroup
+            if kind != "ws":
+                self.toks.append((kind, m.group(), m.start(), m.end()))
+        self.i = 0
+
+    # -- token helpers --
+
+    def _peek(self, offset: int = 0) -> Tuple[str, str, int, int]:
+        j = self.i + offset
+        return self.toks[j] if j < len(self.toks) else ("eof", "", len(self.text), len(self.text))
+
+    def _take(self) -> Tuple[str, str, int, int]:
+        tok = self._peek()
+        self.i += 1
+        return tok
+
+    def _is(self, value: str, offset: int = 0) -> bool:
+        kind, text, _, _ = self._peek(offset)
+        return kind != "str" and text == value
+
+    def _balanced(self, open_ch: str, close_ch: str) -> str:
+        """Source text of a bracketed span starting at the current token."""
+        _, _, start, _ = self._take()
+        depth = 1
+        while depth:
+            kind, text, _, end = self._take()
+            if kind == "eof":
+                raise _ParseError("unbalanced brackets")
+            if kind == "punct" and text == open_ch:
+                depth += 1
+            elif kind == "punct" and text == close_ch:
+                depth -= 1
+        return self.text[start:end]
+
+    # -- grammar --
+
+    def parse(self) -> Node:
+        node = self._or()
+        if self._peek()[0] != "eof":
+            raise _ParseError("trailing tokens")
+        return node
+
+    def _or(self) -> Node:
+        operands = [self._and()]
+        while self._is("or"):
+            self._take()
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else BoolOp("or", operands)
+
+    def _and(self) -> Node:
+        operands = [self._not()]
+        while self._is("and"):
+            self._take()
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else BoolOp("and", operands)
+
+    def _not(self) -> Node:
+        if self._is("not") and not self._is("in", 1):
+            self._take()
+            return Not(self._not())
+        if self._is("!") and self._is("(", 1):
+            self._take()
+            return Not(self._not())
+        return self._compare()
+
+    def _compare(self) -> Node:
+        left = self._primary()
+        kind, text, _, _ = self._peek()
+        if kind == "op" and text in _COMPARE_OPS:
+            self._take()
+            return Compare(left, text, self._primary())
+        if kind == "name" and text == "in":
+            self._take()
+            return Compare(left, "in", self._primary())
+        if self._is("not") and self._is("in", 1):
+            self._take()
+            self._take()
+            return Compare(left, "not in", self._primary())
+        return left
+
+    def _primary(self) -> Node:
+        kind, text, start, _ = self._peek()
+        if kind == "punct" and text == "(":
+            self._take()
+            inner = self._or()
+            if not self._is(")"):
+                raise _ParseError("missing ')'")
+            self._take()
+            return Group(inner)
+        if kind == "punct" and text == "[":
+            return Literal(self._balanced("[", "]"))
+        if kind in ("num", "str"):
+            self._take()
+            return Literal(text)
+        if kind == "name" and text not in ("and", "or", "not"):
+            return self._ref()
+        raise _ParseError(f"unexpected {text!r} at {start}")
+
+    def _ref(self) -> Node:
+        _, root, _, _ = self._take()
+        parts: List[str] = []
+        while True:
+            if self._is(".") and self._peek(1)[0] == "name":
+                name = self._peek(1)[1]
+                if name == "match" and self._is("=", 2):
+                    return self._match(root, parts)
+                self._take()
+                self._take()
+                parts.append("." + name)
+            elif self._is("("):
+                parts.append(self._balanced("(", ")"))
+            elif self._is("["):
+                parts.append(self._balanced("[", "]"))
+            else:
+                return Ref(root, tuple(parts))
+
+    def _match(self, root: str, parts: List[str]) -> Node:
+        if parts:
+            raise _ParseError("match= on a sub-reference")
+        self.i += 3  # '.', 'match', '='
+        _, _, start, _ = self._peek()
+        end = self.text.find(")", start)
+        end = len(self.text) if end < 0 else end
+        value = self.text[start:end].strip()
+        while self._peek()[2] < end:
+            self._take()
+        return Match(root, value)
+
+
+@lru_cache(maxsize=8192)
+def parse(expr: str) -> Node:
+    """Parse a cond expression; unparseable text becomes a :class:`Raw` leaf."""
+    text = (expr or "").strip()
+    if not text:
+        return Raw("")
+    try:
+        return _Parser(text).parse()
+    except _ParseError:
+        return Raw(text)
+
+
+# ---------------------------------------------------------------------------
+# Serialisation
+# ---------------------------------------------------------------------------
+
+def to_string(node: Node) -> str:
+    """Serialise back to Forsta syntax."""
+    if isinstance(node, (Literal, Raw)):
+        return node.text
+    if isinstance(node, Ref):
+        return node.root + "".join(node.parts)
+    if isinstance(node, Match):
+        return f"{node.label}.match={node.value}"
+    if isinstance(node, Group):
+        return f"({to_string(node.inner)})"
+    if isinstance(node, Not):
+        inner = to_string(node.operand)
+        return f"not{inner}" if isinstance(node.operand, Group) else f"not {inner}"
+    if isinstance(node, Compare):
+        return f"{to_string(node.left)} {node.op} {to_string(node.right)}"
+    if isinstance(node, BoolOp):
+        return f" {node.op} ".join(to_string(o) for o in node.operands)
+    raise TypeError(f"Unknown node {node!r}")
+
+
+# ---------------------------------------------------------------------------
+# Traversal
+# ---------------------------------------------------------------------------
+
+def walk(node: Node) -> Iterable[Node]:
+    """Pre-order iteration over every node."""
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        stack.extend(reversed(n.children()))
+
+
+def transform(node: Node, fn: Callable[[Node], Optional[Node]]) -> Node:
+    """Rebuild bottom-up; ``fn`` returns a replacement or None to keep.
+
+    Unchanged subtrees are shared with the input.
+    """
+    if isinstance(node, Group):
+        inner = transform(node.inner, fn)
+        node = node if inner is node.inner else Group(inner)
+    elif isinstance(node, Not):
+        operand = transform(node.operand, fn)
+        node = node if operand is node.operand else Not(operand)
+    elif isinstance(node, Compare):
+        left, right = transform(node.left, fn), transform(node.right, fn)
+        if left is not node.left or right is not node.right:
+            node = Compare(left, node.op, right)
+    elif isinstance(node, BoolOp):
+        operands = tuple(transform(o, fn) for o in node.operands)
+        if any(a is not b for a, b in zip(operands, node.operands)):
+            node = BoolOp(node.op, operands)
+    replaced = fn(node)
+    return node if replaced is None else replaced
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+_RAW_QUESTION_RE = re.compile(r"\((\w+)[.=]")
+_RAW_CONDITION_RE = re.compile(r"\bcondition\.(\w+)")
+
+
+def question_refs(node: Node) -> Set[str]:
+    """Question labels referenced directly (not through ``condition.X``)."""
+    refs: Set[str] = set()
+    for n in walk(node):
+        if isinstance(n, Ref) and n.question:
+            refs.add(n.question)
+        elif isinstance(n, Match):
+            refs.add(n.label)
+        elif isinstance(n, Raw):
+            refs.update(r for r in _RAW_QUESTION_RE.findall(n.text) if r != "condition")
+    return refs
+
+
+def condition_refs(node: Node) -> Set[str]:
+    """Labels of ``condition.X`` definitions the expression uses."""
+    refs: Set[str] = set()
+    for n in walk(node):
+        if isinstance(n, Ref) and n.condition:
+            refs.add(n.condition)
+        elif isinstance(n, Raw):
+            refs.update(_RAW_CONDITION_RE.findall(n.text))
+    return refs
+
+
+def referenced_questions(expr: str, condition_exprs: Mapping[str, str]) -> Set[str]:
+    """Question labels an expression depends on, following ``condition.X``
+    definitions (from ``condition_exprs``: label -> cond) transitively."""
+    questions: Set[str] = set()
+    seen: Set[str] = set()
+    pending = [parse(expr)]
+    while pending:
+        node = pending.pop()
+        questions |= question_refs(node)
+        for label in condition_refs(node) - seen:
+            seen.add(label)
+            if label in condition_exprs:
+                pending.append(parse(condition_exprs[label]))
+    return questions
+
+
+def strip_groups(node: Node) -> Node:
+    while isinstance(node, Group):
+        node = node.inner
+    return node
+
+
+def conjuncts(node: Node) -> List[Node]:
+    """Top-level ``and`` operands, with redundant parentheses removed."""
+    node = strip_groups(node)
+    if isinstance(node, BoolOp) and node.op == "and":
+        out: List[Node] = []
+        for operand in node.operands:
+            out.extend(conjuncts(operand))
+        return out
+    return [node]
+
+
+def is_true(node: Node) -> bool:
+    node = strip_groups(node)
+    return isinstance(node, Literal) and node.text in ("1", "True")
+
+
+# ---------------------------------------------------------------------------
+# Rewrites
+# ---------------------------------------------------------------------------
+
+def rename(
+    node: Node,
+    questions: Optional[Mapping[str, str]] = None,
+    choices: Optional[Mapping[str, Mapping[str, str]]] = None,
+    conditions: Optional[Mapping[str, str]] = None,
+) -> Node:
+    """Rename references in one walk.
+
+    Args:
+        questions: old question label -> new label
+        choices: question label -> {old row/choice label: new label}
+            (applied to the first accessor, e.g. ``qX.ch2`` -> ``qX.r2``)
+        conditions: old condition label -> new label
+    """
+    questions = questions or {}
+    choices = choices or {}
+    conditions = conditions or {}
+
+    def _fn(n: Node) -> Optional[Node]:
+        if isinstance(n, Match) and n.label in questions:
+            return Match(questions[n.label], n.value)
+        if not isinstance(n, Ref):
+            return None
+        cond = n.condition
+        if cond is not None:
+            if cond in conditions:
+                return Ref("condition", ("." + conditions[cond],) + n.parts[1:])
+            return None
+        root, parts = n.root, n.parts
+        lmap = choices.get(root)
+        if lmap and parts and parts[0][1:] in lmap and parts[0].startswith("."):
+            parts = ("." + lmap[parts[0][1:]],) + parts[1:]
+        root = questions.get(root, root)
+        if root is n.root and parts is n.parts:
+            return None
+        return Ref(root, parts)
+
+    return transform(node, _fn)
+
+
+def resolve_matches(
+    node: Node,
+    resolver: Callable[[str, str], Optional[str]],
+) -> Node:
+    """Replace ``label.match=Value`` with ``label.<choice>``.
+
+    ``resolver(label, value)`` returns the choice label or None; an
+    unresolved placeholder (and any ``not`` around it) becomes ``1`` so
+    the element is shown rather than breaking the survey.
+    """
+    def _resolved(match: Match) -> Optional[Node]:
+        choice = resolver(match.label, match.value)
+        return None if choice is None else Ref(match.label, ("." + choice,))
+
+    def _fn(n: Node) -> Optional[Node]:
+        if isinstance(n, Not) and isinstance(n.operand, _Unresolved):
+            return TRUE
+        if isinstance(n, Group) and isinstance(n.inner, _Unresolved):
+            return n.inner
+        if isinstance(n, Match):
+            ref = _resolved(n)
+            return _Unresolved("1") if ref is None else ref
+        return None
+
+    result = transform(node, _fn)
+    return transform(result, lambda n: TRUE if isinstance(n, _Unresolved) else None)
+
+
+class _Unresolved(Literal):
+    """Marker for a failed match resolution, folded into ``1``."""
+
+    __slots__ = ()
+
+
+def normalize(node: Node) -> Node:
+    """Fix common syntax slips in AI-written expressions.
+
+    - bare ``condition.X`` -> ``(condition.X)``
+    - ``!(...)`` -> ``not(...)`` (always serialised as ``not``)
+    - ``qX=N`` / ``qX==N`` -> ``qX.check('N')``; ``qX<N`` etc. ->
+      ``qX.check('<N')``
+    """
+    def _fn(n: Node) -> Optional[Node]:
+        if isinstance(n, Compare) and n.op in ("=", "==", "<", ">", "<=", ">="):
+            left, right = n.left, n.right
+            if (
+                isinstance(left, Ref) and not left.parts and left.question
+                and isinstance(right, Literal) and right.text[:1].isdigit()
+            ):
+                value = right.text if n.op in ("=", "==") else f"{n.op}{right.text}"
+                return Ref(left.root, (".check", f"('{value}')"))
+        if isinstance(n, (Not, BoolOp, Compare)):
+            return _wrap_condition_refs(n)
+        return None
+
+    result = transform(node, _fn)
+    return Group(result) if _is_cond_ref(result) else result
+
+
+def _is_cond_ref(n: Node) -> bool:
+    return isinstance(n, Ref) and n.condition is not None
+
+
+def _wrap_condition_refs(n: Node) -> Optional[Node]:
+    wrap = lambda c: Group(c) if _is_cond_ref(c) else c  # noqa: E731
+    if isinstance(n, Not) and _is_cond_ref(n.operand):
+        return Not(Group(n.operand))
+    if isinstance(n, BoolOp) and any(_is_cond_ref(o) for o in n.operands):
+        return BoolOp(n.op, [wrap(o) for o in n.operands])
+    if isinstance(n, Compare) and (_is_cond_ref(n.left) or _is_cond_ref(n.right)):
+        return Compare(wrap(n.left), n.op, wrap(n.right))
+    return None
+
+
+def negate(node: Node) -> Node:
+    """Logical negation, unwrapping an existing ``not``."""
+    if isinstance(node, Not):
+        return node.operand
+    return Not(node if isinstance(node, Group) else Group(node))
+
+
+def conjoin(first: Node, *more: Node) -> Node:
+    """AND clauses onto ``first``; each added clause is parenthesised.
+
+    ``first`` keeps its text unless it is an ``or``, which needs
+    parentheses to bind correctly.
+    """
+    if not more:
+        return first
+    head = Group(first) if isinstance(first, BoolOp) and first.op == "or" else first
+    operands: List[Node] = list(head.operands) if isinstance(head, BoolOp) else [head]
+    for clause in more:
+        operands.append(clause if isinstance(clause, Group) else Group(clause))
+    return BoolOp("and", operands)
+
+
+def key(expr: str) -> str:
+    """Canonical text for comparing expressions (whitespace-insensitive)."""
+    return "".join(to_string(parse(expr)).split())
+
+
+# ---------------------------------------------------------------------------
+# String-level conveniences
+# ---------------------------------------------------------------------------
+
+def rename_expr(expr: str, **maps: Mapping) -> str:
+    """:func:`rename` on a string; returns ``expr`` itself when unchanged."""
+    node = parse(expr)
+    renamed = rename(node, **maps)
+    return expr if renamed is node else to_string(renamed)
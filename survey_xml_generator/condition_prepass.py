@@ -0,0 +1,334 @@
+"""Condition-first pre-pass for Stage 3.
+
+Before the parallel classification chunks run, collect every ``[IF ...]``
+and ``[TERM IF ...]`` line the segmenter attached to the document's
+segments and turn them into condition definitions once, document-wide.
+Simple comparisons against a known question are converted
+deterministically (``IF QCOUNTRY == UNITED STATES`` ->
+``(qCountry.match=UNITED STATES)``, resolved to real row labels by
+``_resolve_cond_references`` later); anything else is sent in a single
+batched call to the mini model.
+
+The result is rendered into the ``conditions_context`` of every chunk
+prompt, so chunks reference shared labels instead of each inventing
+their own overlapping definitions.
+"""
+
+from __future__ import annotations
+
+import difflib
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PREFIX_RE = re.compile(r"^\[?\s*(?:(?:ASK|SHOW|TERM(?:INATE)?)\s+)?IF\s+", re.IGNORECASE)
+_CLAUSE_RE = re.compile(
+    r"^Q\.?\s*(?P<name>\w[\w\s]*?)\s*(?P<op>==|=|<>|!=|<=|>=|<|>)\s*(?P<values>.+)$",
+    re.IGNORECASE,
+)
+# AND/OR that starts a new "QNAME op value" clause (not a value list)
+_CONNECTOR_RE = re.compile(
+    r"\s+(AND|OR)\s+(?=Q\.?\s*\w[\w\s]*?\s*(?:==|=|<>|!=|<=|>=|<|>))",
+    re.IGNORECASE,
+)
+_VALUE_SPLIT_RE = re.compile(r"\s*(?:,|\bOR\b)\s*", re.IGNORECASE)
+_MODIFIER_RE = re.compile(r"\[[^\]]*\]")
+
+
+class ConditionSpec:
+    """One raw condition line and what the pre-pass made of it."""
+
+    __slots__ = ("raw", "kind", "label", "cond", "description")
+
+    def __init__(self, raw: str, kind: str):
+        self.raw = raw
+        self.kind = kind  # "condition" (ask/show logic) or "term"
+        self.label: Optional[str] = None
+        self.cond: Optional[str] = None
+        self.description = raw
+
+    @property
+    def resolved(self) -> bool:
+        return bool(self.cond)
+
+    def as_condition(self) -> Dict[str, str]:
+        return {"label": self.label or "", "cond": self.cond or "", "description": self.description}
+
+
+# ---------------------------------------------------------------------------
+# Collection
+# ---------------------------------------------------------------------------
+
+def _clean_raw(raw: str) -> str:
+    return " ".join(str(raw).strip().strip("[]").split())
+
+
+def collect_raw_conditions(segments: List[dict]) -> List[ConditionSpec]:
+    """Unique ``[IF]`` / ``[TERM IF]`` lines across all segments, in document order."""
+    specs: Dict[Tuple[str, str], ConditionSpec] = {}
+
+    def _add(raw: Any, kind: str):
+        text = _clean_raw(raw or "")
+        if not text or not re.search(r"\bIF\b", text, re.IGNORECASE):
+            return
+        key = (kind, text.upper())
+        if key not in specs:
+            specs[key] = ConditionSpec(text, kind)
+
+    for seg in segments:
+        bt = seg.get("block_type")
+        if bt == "term":
+            _add(seg.get("condition") or seg.get("expression"), "term")
+        elif bt == "condition":
+            _add(seg.get("expression"), "condition")
+        for raw in seg.get("conditions") or []:
+            _add(raw, "term" if _clean_raw(raw).upper().startswith("TERM") else "condition")
+        for raw in seg.get("termination_conditions") or []:
+            _add(raw, "term")
+    return list(specs.values())
+
+
+# ---------------------------------------------------------------------------
+# Deterministic conversion
+# ---------------------------------------------------------------------------
+
+def _name_key(text: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+class _QuestionIndex:
+    """Segment lookup by normalised label, with fuzzy fallback for typos."""
+
+    def __init__(self, segments: List[dict]):
+        self._by_key: Dict[str, dict] = {}
+        for seg in segments:
+            label = seg.get("label")
+            if label and seg.get("block_type") == "question":
+                self._by_key.setdefault(_name_key(label), seg)
+
+    def find(self, name: str) -> Optional[dict]:
+        key = _name_key("q" + name)
+        if key in self._by_key:
+            return self._by_key[key]
+        close = difflib.get_close_matches(key, list(self._by_key), n=1, cutoff=0.85)
+        return self._by_key[close[0]] if close else None
+
+
+def _is_dropdown(seg: dict) -> bool:
+    mods = " ".join(str(m) for m in seg.get("inline_modifiers") or [])
+    return "DROPDOWN" in (mods + " " + str(seg.get("title_text") or "")).upper()
+
+
+def _answer_texts(seg: dict) -> List[str]:
+    lines = seg.get("matrix_scale") if seg.get("is_matrix") else seg.get("answer_lines")
+    return [_MODIFIER_RE.sub("", str(a)).strip().lower() for a in lines or []]
+
+
+def _convert_clause(clause: str, questions: _QuestionIndex) -> Optional[Tuple[str, str]]:
+    """Convert ``QNAME op V1, V2`` to a Forsta expression and a label fragment."""
+    m = _CLAUSE_RE.match(clause.strip())
+    if not m:
+        return None
+    seg = questions.find(m.group("name"))
+    if seg is None:
+        return None
+    label = seg["label"]
+    op = m.group("op")
+    values = [v.strip() for v in _VALUE_SPLIT_RE.split(m.group("values")) if v.strip()]
+    if not values:
+        return None
+    negate = op in ("<>", "!=")
+    answers = _answer_texts(seg)
+
+    parts = []
+    for value in values:
+        if _is_dropdown(seg) or value.lower() in answers:
+            # Text match is resolved against the classified question's real
+            # row/choice labels after Stage 3 (they may be ISO codes, chN...)
+            if op not in ("==", "=", "<>", "!="):
+                return None
+            parts.append(f"({label}.match={value})")
+        elif re.fullmatch(r"\d+", value):
+            if answers and op in ("==", "=", "<>", "!="):
+                parts.append(f"({label}.r{value})")
+            elif not answers:
+                check = value if op in ("==", "=", "<>", "!=") else f"{op}{value}"
+                parts.append(f"({label}.check('{check}'))")
+            else:
+                return None
+        else:
+            return None
+
+    expr = parts[0] if len(parts) == 1 else "(" + " or ".join(parts) + ")"
+    if negate:
+        expr = f"not{expr}" if expr.startswith("(") else f"not({expr})"
+    fragment = (label[1:] if label.startswith("q") else label) + "_" + "_Or_".join(
+        "_".join(w.capitalize() for w in re.sub(r"[^A-Za-z0-9\s]", " ", v).split()) or "X"
+        for v in values
+    )
+    if negate:
+        fragment = f"Not_{fragment}"
+    return expr, fragment
+
+
+def convert_condition(raw: str, questions: _QuestionIndex) -> Optional[Tuple[str, str]]:
+    """Deterministically convert one raw line; ``(expr, label)`` or None."""
+    body = _PREFIX_RE.sub("", raw.strip().strip("[]")).strip()
+    if body == raw.strip().strip("[]").strip():
+        return None  # no IF prefix we understand
+    pieces = _CONNECTOR_RE.split(body)
+    clauses, connectors = pieces[0::2], [c.lower() for c in pieces[1::2]]
+    converted = [_convert_clause(c, questions) for c in clauses]
+    if not converted or any(c is None for c in converted):
+        return None
+    expr, label = converted[0]
+    for conn, (e, frag) in zip(connectors, converted[1:]):
+        expr = f"{expr} {conn} {e}"
+        label = f"{label}_{conn.capitalize()}_{frag}"
+    return expr, label[:60].rstrip("_")
+
+
+# ---------------------------------------------------------------------------
+# Mini-model fallback
+# ---------------------------------------------------------------------------
+
+def _question_summary(segments: List[dict]) -> List[dict]:
+    summary = []
+    for seg in segments:
+        if seg.get("block_type") != "question" or not seg.get("label"):
+            continue
+        summary.append({
+            "label": seg["label"],
+            "title": str(seg.get("title_text") or "")[:120],
+            "dropdown": _is_dropdown(seg),
+            "answers": (seg.get("matrix_scale") if seg.get("is_matrix") else seg.get("answer_lines")) or [],
+            "modifiers": seg.get("inline_modifiers") or [],
+        })
+    return summary
+
+
+def _resolve_with_model(
+    specs: List[ConditionSpec],
+    segments: List[dict],
+    model: Optional[str],
+) -> None:
+    """One batched mini-model call for the lines the parser couldn't convert."""
+    from .ai_client import ai_job, call_ai
+    from .config import OPENAI_MODEL_MINI
+    from .prompts.classification import CONDITIONS_SYSTEM_PROMPT, build_conditions_prompt
+
+    prompt = build_conditions_prompt(
+        json.dumps([{"id": i, "kind": s.kind, "raw": s.raw} for i, s in enumerate(specs)]),
+        json.dumps(_question_summary(segments), separators=(",", ":")),
+    )
+    try:
+        with ai_job("conditions") as job:
+            result = job.submit(
+                call_ai,
+                system_prompt=CONDITIONS_SYSTEM_PROMPT,
+                user_prompt=prompt,
+                model=model or OPENAI_MODEL_MINI,
+                expect_json=True,
+            ).result()
+    except Exception as e:
+        logger.warning(f"Condition pre-pass fallback failed ({e}); chunks will define these themselves")
+        return
+
+    items = result.get("conditions", []) if isinstance(result, dict) else result
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            spec = specs[int(item.get("id"))]
+        except (TypeError, ValueError, IndexError):
+            continue
+        if item.get("cond"):
+            spec.cond = str(item["cond"]).strip()
+            spec.label = str(item.get("label") or "").strip() or None
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def _unique_label(label: str, used: Dict[str, str], expr: str) -> str:
+    label = re.sub(r"[^A-Za-z0-9_]", "_", label).strip("_") or "Condition"
+    candidate, n = label, 2
+    while candidate in used and used[candidate] != expr:
+        candidate = f"{label}_{n}"
+        n += 1
+    used[candidate] = expr
+    return candidate
+
+
+def extract_conditions(
+    segments: List[dict],
+    model: Optional[str] = None,
+    use_model: bool = True,
+) -> Tuple[List[dict], List[ConditionSpec]]:
+    """Run the pre-pass over all segments.
+
+    Returns ``(conditions, specs)``: condition definitions for the ask/show
+    logic (ready to merge with the classifier's output), and every spec
+    including resolved termination expressions for the prompt context.
+    """
+    specs = collect_raw_conditions(segments)
+    if not specs:
+        return [], []
+
+    index = _QuestionIndex(segments)
+    unresolved = []
+    for spec in specs:
+        converted = convert_condition(spec.raw, index)
+        if converted:
+            spec.cond, spec.label = converted
+        else:
+            unresolved.append(spec)
+
+    logger.info(
+        f"Condition pre-pass: {len(specs) - len(unresolved)}/{len(specs)} "
+        f"converted deterministically"
+    )
+    if unresolved and use_model:
+        _resolve_with_model(unresolved, segments, model)
+
+    used: Dict[str, str] = {}
+    label_for_expr: Dict[str, str] = {}
+    conditions = []
+    for spec in specs:
+        if spec.kind != "condition" or not spec.resolved:
+            continue
+        key = "".join(spec.cond.split())
+        if key in label_for_expr:
+            spec.label = label_for_expr[key]
+            continue
+        spec.label = label_for_expr[key] = _unique_label(spec.label or spec.raw, used, key)
+        conditions.append(spec.as_condition())
+    return conditions, specs
+
+
+def segment_cond(seg: dict, specs: List[ConditionSpec]) -> Optional[str]:
+    """``cond`` for a segment built without the AI, from the pre-pass specs.
+
+    Returns "" when the segment has no logic, ``condition.X`` references
+    (joined with ``and``) when every ask/show line was resolved, and None
+    when a line is unresolved or is termination logic.
+    """
+    if seg.get("termination_conditions"):
+        return None
+    by_raw = {(s.kind, s.raw.upper()): s for s in specs}
+    refs = []
+    for raw in seg.get("conditions") or []:
+        text = _clean_raw(raw)
+        if not text:
+            continue
+        spec = by_raw.get(("condition", text.upper()))
+        if spec is None or not spec.resolved or not spec.label:
+            return None
+        ref = f"condition.{spec.label}"
+        if ref not in refs:
+            refs.append(ref)
+    return " and ".join(refs)
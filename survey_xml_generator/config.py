@@ -19,14 +19,80 @@ OPENAI_MODEL_MINI = os.getenv("OPENAI_MODEL_MINI", "gpt-4o-mini")
 SEGMENTATION_CHUNK_SIZE = 150
 SEGMENTATION_CHUNK_OVERLAP = 25
 
+# Classification chunks are packed by estimated tokens instead of a fixed
+# segment count: the segment JSON sent per chunk, and the completion the
+# model is expected to write (which is what truncates and what is slow).
+CLASSIFICATION_CHUNK_INPUT_TOKENS = int(os.getenv("CLASSIFICATION_CHUNK_INPUT_TOKENS", "12000"))
+CLASSIFICATION_CHUNK_OUTPUT_TOKENS = int(os.getenv("CLASSIFICATION_CHUNK_OUTPUT_TOKENS", "6000"))
+
+# Documents whose extracted blocks fit one segmentation chunk and about
+# this many prompt tokens are segmented and classified in a single AI call
+# (combined.py) instead of two sequential ones; larger documents, and
+# combined answers that can't be used, take the two-stage path.  Past the
+# budget the two-stage path is as fast: its classification chunks decode
+# in parallel, a combined answer in one stream (bench_combined.py).  Off
+# by default: the modelled saving is only 1-13% of Stage 2+3 latency.
+COMBINED_SMALL_DOCUMENTS = os.getenv("COMBINED_SMALL_DOCUMENTS", "0").lower() in ("1", "true", "yes")
+COMBINED_MAX_DOCUMENT_TOKENS = int(os.getenv("COMBINED_MAX_DOCUMENT_TOKENS", "3000"))
+
 # Temperature for AI calls (low = more deterministic)
 AI_TEMPERATURE = 0.1
 
+# In-flight AI requests, shared by every concurrent pipeline run (Streamlit
+# sessions, batch CLI documents).  An AIMD controller starts at the initial
+# limit, adds one slot per window of healthy calls up to the maximum, and
+# halves the limit (down to the minimum) on 429s and timeouts.  With
+# AI_ADAPTIVE_CONCURRENCY=0 the limit stays at AI_INITIAL_CONCURRENCY.
+AI_INITIAL_CONCURRENCY = int(os.getenv("AI_INITIAL_CONCURRENCY", "5"))
+AI_MIN_CONCURRENCY = int(os.getenv("AI_MIN_CONCURRENCY", "1"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "32"))
+AI_ADAPTIVE_CONCURRENCY = os.getenv("AI_ADAPTIVE_CONCURRENCY", "1").lower() not in ("0", "false", "no")
+
+# Hedged requests: when a call runs past the AI_HEDGE_PERCENTILE latency of
+# recent calls with the same model and prompt size, send a duplicate (only if
+# a concurrency slot is idle) and keep whichever answers first.  Off by
+# default because the duplicate's tokens are billed too.
+AI_HEDGE_REQUESTS = os.getenv("AI_HEDGE_REQUESTS", "0").lower() in ("1", "true", "yes")
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "95"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "10"))
+
+# How the AI scheduler shares that cap between concurrent runs of the same
+# priority: "weighted_fair" (least-served job first) or "round_robin".
+AI_SCHEDULER_POLICY = os.getenv("AI_SCHEDULER_POLICY", "weighted_fair")
+
+# Ask the classifier for the compact response schema (short keys, defaults
+# omitted, answers as [label, text, flags]); completion tokens dominate
+# per-chunk latency.  Set to 0 to use the long, fully spelled-out schema.
+CLASSIFICATION_COMPACT_OUTPUT = os.getenv("CLASSIFICATION_COMPACT_OUTPUT", "1").lower() not in ("0", "false", "no")
+
+# Build standard demographic questions (zip code, country dropdown, and
+# gender / income / ethnicity with a house answer list) straight from their
+# segments instead of sending them to the classifier, when the condition
+# pre-pass resolved all of their logic.  See standard_blocks.py.
+STANDARD_BLOCKS_SKIP_CLASSIFICATION = os.getenv("STANDARD_BLOCKS_SKIP_CLASSIFICATION", "1").lower() not in ("0", "false", "no")
+
 # When a select (dropdown) question has no [DROPDOWN] indicator in the
 # source and its explicit option count is at or below this threshold,
 # the classifier guard converts it to radio (single-select buttons).
 SELECT_TO_RADIO_MAX_OPTIONS = int(os.getenv("SELECT_TO_RADIO_MAX_OPTIONS", "10"))
 
+# Check the assembled XML against the Forsta schema (data/forsta_schema.py)
+# and report violations as warnings.
+SCHEMA_VALIDATION = os.getenv("SCHEMA_VALIDATION", "1").lower() not in ("0", "false", "no")
+
+# Statically analyse the skip logic of the assembled XML (logic_graph.py):
+# cycles, forward references, contradictory or always-true conditions.
+LOGIC_ANALYSIS = os.getenv("LOGIC_ANALYSIS", "1").lower() not in ("0", "false", "no")
+
+# Local library of classified questions (question_library.py).  Segments
+# whose word 3-gram Jaccard similarity to a stored segment reaches the
+# threshold reuse its classification, with their own texts, instead of
+# going to the AI.  Off by default: the file is shared by every user of
+# the deployment and keeps the questionnaires' wording.
+QUESTION_LIBRARY = os.getenv("QUESTION_LIBRARY", "0").lower() in ("1", "true", "yes")
+QUESTION_LIBRARY_PATH = os.getenv("QUESTION_LIBRARY_PATH", str(_PROJECT_ROOT / "question_library.sqlite3"))
+QUESTION_LIBRARY_THRESHOLD = float(os.getenv("QUESTION_LIBRARY_THRESHOLD", "0.9"))
+
 # --- Forsta XML defaults ---
 SURVEY_NAMESPACES = {
     "xmlns:builder": "http://decipherinc.com/builder",
@@ -0,0 +1,319 @@
+"""XML Schema for the Forsta (Decipher) survey elements this project emits.
+
+Covers ``<survey>`` and everything the builders, standard blocks and the
+assembler write: conditions, sample sources, blocks, the question
+elements, ``<html>``, ``<term>``, ``<exec>``/``<validate>`` and
+``<suspend>``.  Attributes are closed per element, so a typo or an
+attribute on the wrong element is reported; title, comment and html
+content may hold markup.  Attributes in the builder/ss/html namespaces
+are accepted on ``<survey>`` and ``<block>`` without further checks.
+
+Compiled once per process by :func:`xml_validator.forsta_schema`.
+"""
+
+FORSTA_XSD = """\
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" elementFormDefault="unqualified">
+
+  <!-- Simple types -->
+
+  <xs:simpleType name="label">
+    <xs:restriction base="xs:string">
+      <xs:pattern value="[A-Za-z_][A-Za-z0-9_]*"/>
+    </xs:restriction>
+  </xs:simpleType>
+
+  <xs:simpleType name="optionLabel">
+    <xs:restriction base="xs:string">
+      <xs:pattern value="[A-Za-z0-9_]+"/>
+    </xs:restriction>
+  </xs:simpleType>
+
+  <xs:simpleType name="flag">
+    <xs:restriction base="xs:string">
+      <xs:enumeration value="0"/>
+      <xs:enumeration value="1"/>
+    </xs:restriction>
+  </xs:simpleType>
+
+  <xs:simpleType name="where">
+    <xs:restriction base="xs:string">
+      <xs:pattern value="(execute|survey|report|data|notdp|none|summary)(,(execute|survey|report|data|notdp|none|summary))*"/>
+    </xs:restriction>
+  </xs:simpleType>
+
+  <xs:simpleType name="shuffle">
+    <xs:restriction base="xs:string">
+      <xs:pattern value="(rows|cols|choices)(,(rows|cols|choices))*"/>
+    </xs:restriction>
+  </xs:simpleType>
+
+  <xs:simpleType name="execWhen">
+    <xs:restriction base="xs:string">
+      <xs:enumeration value="init"/>
+      <xs:enumeration value="started"/>
+      <xs:enumeration value="survey"/>
+      <xs:enumeration value="submit"/>
+      <xs:enumeration value="verified"/>
+      <xs:enumeration value="finished"/>
+      <xs:enumeration value="virtual"/>
+      <xs:enumeration value="flow"/>
+    </xs:restriction>
+  </xs:simpleType>
+
+  <xs:simpleType name="cond">
+    <xs:restriction base="xs:string">
+      <xs:minLength value="1"/>
+    </xs:restriction>
+  </xs:simpleType>
+
+  <!-- Shared content -->
+
+  <xs:complexType name="markup" mixed="true">
+    <xs:sequence>
+      <xs:any minOccurs="0" maxOccurs="unbounded" processContents="skip"/>
+    </xs:sequence>
+  </xs:complexType>
+
+  <xs:complexType name="script">
+    <xs:simpleContent>
+      <xs:extension base="xs:string">
+        <xs:attribute name="when" type="execWhen"/>
+        <xs:attribute name="cond" type="cond"/>
+      </xs:extension>
+    </xs:simpleContent>
+  </xs:complexType>
+
+  <xs:attributeGroup name="elementAttrs">
+    <xs:attribute name="label" type="label" use="required"/>
+    <xs:attribute name="cond" type="cond"/>
+    <xs:attribute name="where" type="where"/>
+    <xs:attribute name="randomize" type="flag"/>
+  </xs:attributeGroup>
+
+  <xs:attributeGroup name="questionAttrs">
+    <xs:attributeGroup ref="elementAttrs"/>
+    <xs:attribute name="optional" type="flag"/>
+    <xs:attribute name="shuffle" type="shuffle"/>
+  </xs:attributeGroup>
+
+  <xs:group name="questionHead">
+    <xs:sequence>
+      <xs:element name="title" type="markup"/>
+      <xs:element name="comment" type="markup" minOccurs="0"/>
+    </xs:sequence>
+  </xs:group>
+
+  <xs:complexType name="row">
+    <xs:simpleContent>
+      <xs:extension base="xs:string">
+        <xs:attribute name="label" type="optionLabel" use="required"/>
+        <xs:attribute name="cond" type="cond"/>
+        <xs:attribute name="exclusive" type="flag"/>
+        <xs:attribute name="randomize" type="flag"/>
+        <xs:attribute name="open" type="flag"/>
+        <xs:attribute name="openSize" type="xs:positiveInteger"/>
+        <xs:attribute name="openOptional" type="flag"/>
+        <xs:attribute name="optional" type="flag"/>
+        <xs:attribute name="verify" type="xs:string"/>
+        <xs:attribute name="value" type="xs:string"/>
+      </xs:extension>
+    </xs:simpleContent>
+  </xs:complexType>
+
+  <xs:complexType name="col">
+    <xs:simpleContent>
+      <xs:extension base="xs:string">
+        <xs:attribute name="label" type="optionLabel" use="required"/>
+        <xs:attribute name="cond" type="cond"/>
+        <xs:attribute name="exclusive" type="flag"/>
+        <xs:attribute name="randomize" type="flag"/>
+        <xs:attribute name="value" type="xs:string"/>
+      </xs:extension>
+    </xs:simpleContent>
+  </xs:complexType>
+
+  <xs:complexType name="choice">
+    <xs:simpleContent>
+      <xs:extension base="xs:string">
+        <xs:attribute name="label" type="optionLabel" use="required"/>
+        <xs:attribute name="cond" type="cond"/>
+      </xs:extension>
+    </xs:simpleContent>
+  </xs:complexType>
+
+  <!-- Question elements -->
+
+  <xs:complexType name="radio">
+    <xs:sequence>
+      <xs:group ref="questionHead"/>
+      <xs:choice minOccurs="0" maxOccurs="unbounded">
+        <xs:element name="col" type="col"/>
+        <xs:element name="row" type="row"/>
+        <xs:element name="exec" type="script"/>
+        <xs:element name="validate" type="script"/>
+      </xs:choice>
+    </xs:sequence>
+    <xs:attributeGroup ref="questionAttrs"/>
+    <xs:attribute name="values" type="xs:string"/>
+    <xs:attribute name="averages" type="xs:string"/>
+  </xs:complexType>
+
+  <xs:complexType name="checkbox">
+    <xs:sequence>
+      <xs:group ref="questionHead"/>
+      <xs:choice minOccurs="0" maxOccurs="unbounded">
+        <xs:element name="col" type="col"/>
+        <xs:element name="row" type="row"/>
+        <xs:element name="exec" type="script"/>
+        <xs:element name="validate" type="script"/>
+      </xs:choice>
+    </xs:sequence>
+    <xs:attributeGroup ref="questionAttrs"/>
+    <xs:attribute name="atleast" type="xs:nonNegativeInteger"/>
+    <xs:attribute name="atmost" type="xs:positiveInteger"/>
+  </xs:complexType>
+
+  <xs:complexType name="select">
+    <xs:sequence>
+      <xs:group ref="questionHead"/>
+      <xs:choice minOccurs="0" maxOccurs="unbounded">
+        <xs:element name="choice" type="choice"/>
+        <xs:element name="exec" type="script"/>
+        <xs:element name="validate" type="script"/>
+      </xs:choice>
+    </xs:sequence>
+    <xs:attributeGroup ref="questionAttrs"/>
+  </xs:complexType>
+
+  <xs:complexType name="text">
+    <xs:sequence>
+      <xs:group ref="questionHead"/>
+      <xs:choice minOccurs="0" maxOccurs="unbounded">
+        <xs:element name="row" type="row"/>
+        <xs:element name="exec" type="script"/>
+        <xs:element name="validate" type="script"/>
+      </xs:choice>
+    </xs:sequence>
+    <xs:attributeGroup ref="questionAttrs"/>
+    <xs:attribute name="size" type="xs:positiveInteger"/>
+    <xs:attribute name="verify" type="xs:string"/>
+  </xs:complexType>
+
+  <xs:complexType name="textarea">
+    <xs:sequence>
+      <xs:group ref="questionHead"/>
+      <xs:choice minOccurs="0" maxOccurs="unbounded">
+        <xs:element name="exec" type="script"/>
+        <xs:element name="validate" type="script"/>
+      </xs:choice>
+    </xs:sequence>
+    <xs:attributeGroup ref="questionAttrs"/>
+    <xs:attribute name="width" type="xs:positiveInteger"/>
+    <xs:attribute name="height" type="xs:positiveInteger"/>
+  </xs:complexType>
+
+  <xs:complexType name="html" mixed="true">
+    <xs:complexContent>
+      <xs:extension base="markup">
+        <xs:attributeGroup ref="elementAttrs"/>
+      </xs:extension>
+    </xs:complexContent>
+  </xs:complexType>
+
+  <xs:complexType name="term">
+    <xs:simpleContent>
+      <xs:extension base="xs:string">
+        <xs:attribute name="label" type="label" use="required"/>
+        <xs:attribute name="cond" type="cond"/>
+      </xs:extension>
+    </xs:simpleContent>
+  </xs:complexType>
+
+  <xs:complexType name="suspend"/>
+
+  <xs:group name="surveyElement">
+    <xs:choice>
+      <xs:element name="block" type="block"/>
+      <xs:element name="radio" type="radio"/>
+      <xs:element name="checkbox" type="checkbox"/>
+      <xs:element name="select" type="select"/>
+      <xs:element name="text" type="text"/>
+      <xs:element name="textarea" type="textarea"/>
+      <xs:element name="number" type="text"/>
+      <xs:element name="html" type="html"/>
+      <xs:element name="term" type="term"/>
+      <xs:element name="exec" type="script"/>
+      <xs:element name="suspend" type="suspend"/>
+    </xs:choice>
+  </xs:group>
+
+  <xs:complexType name="block">
+    <xs:group ref="surveyElement" minOccurs="0" maxOccurs="unbounded"/>
+    <xs:attribute name="label" type="label" use="required"/>
+    <xs:attribute name="cond" type="cond"/>
+    <xs:attribute name="randomize" type="flag"/>
+    <xs:attribute name="randomizeChildren" type="flag"/>
+    <xs:anyAttribute namespace="##other" processContents="skip"/>
+  </xs:complexType>
+
+  <!-- Survey root -->
+
+  <xs:complexType name="condition">
+    <xs:simpleContent>
+      <xs:extension base="xs:string">
+        <xs:attribute name="label" type="label" use="required"/>
+        <xs:attribute name="cond" type="cond" use="required"/>
+      </xs:extension>
+    </xs:simpleContent>
+  </xs:complexType>
+
+  <xs:complexType name="exit">
+    <xs:simpleContent>
+      <xs:extension base="xs:string">
+        <xs:attribute name="cond" type="cond"/>
+      </xs:extension>
+    </xs:simpleContent>
+  </xs:complexType>
+
+  <xs:complexType name="samplesources">
+    <xs:sequence>
+      <xs:element name="samplesource" maxOccurs="unbounded">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="title" type="xs:string"/>
+            <xs:element name="invalid" type="xs:string" minOccurs="0"/>
+            <xs:element name="completed" type="xs:string" minOccurs="0"/>
+            <xs:element name="exit" type="exit" minOccurs="0" maxOccurs="unbounded"/>
+          </xs:sequence>
+          <xs:attribute name="list" type="xs:string" use="required"/>
+        </xs:complexType>
+      </xs:element>
+    </xs:sequence>
+    <xs:attribute name="default" type="xs:string"/>
+  </xs:complexType>
+
+  <xs:element name="survey">
+    <xs:complexType>
+      <xs:sequence>
+        <xs:element name="condition" type="condition" minOccurs="0" maxOccurs="unbounded"/>
+        <xs:element name="samplesources" type="samplesources" minOccurs="0"/>
+        <xs:group ref="surveyElement" minOccurs="0" maxOccurs="unbounded"/>
+      </xs:sequence>
+      <xs:attribute name="name" type="xs:string" use="required"/>
+      <xs:attribute name="alt" type="xs:string"/>
+      <xs:attribute name="autosave" type="flag"/>
+      <xs:attribute name="builderCompatible" type="flag"/>
+      <xs:attribute name="compat" type="xs:positiveInteger"/>
+      <xs:attribute name="delphi" type="flag"/>
+      <xs:attribute name="fir" type="xs:string"/>
+      <xs:attribute name="mobile" type="xs:string"/>
+      <xs:attribute name="mobileDevices" type="xs:string"/>
+      <xs:attribute name="secure" type="flag"/>
+      <xs:attribute name="setup" type="xs:string"/>
+      <xs:attribute name="state" type="xs:string"/>
+      <xs:anyAttribute namespace="##other" processContents="skip"/>
+    </xs:complexType>
+  </xs:element>
+
+</xs:schema>
+"""
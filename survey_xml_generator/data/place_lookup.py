@@ -0,0 +1,260 @@
+"""Alias-aware, typo-tolerant lookup of country and US state names.
+
+Questionnaires and AI output spell places many ways ("USA", "U.S.",
+"United States of America", "Bahamas" for "The Bahamas", "Massachusets").
+A :class:`PlaceIndex` resolves text to a canonical key in three steps:
+
+1. exact match on the normalised name (lowercase, dots and apostrophes
+   dropped, other punctuation folded to spaces, leading "the" removed);
+2. the alias table;
+3. character bigram similarity (Dice coefficient) over an inverted
+   index, accepted only above a score threshold and when the best
+   candidate is unambiguous.  Bigrams tolerate the usual typos (dropped
+   or transposed letters) better than trigrams at the same threshold.
+
+Everything is precomputed when the index is built; the module-level
+indexes are built once on first use.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter, defaultdict
+from itertools import chain
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from .countries import COUNTRIES
+from .us_states import US_STATES
+
+_DROP_RE = re.compile(r"[.'’`]")
+_FOLD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_place(text: str) -> str:
+    """Canonical form used for every key: ``"The U.S.A."`` -> ``"usa"``."""
+    text = _DROP_RE.sub("", str(text).lower()).replace("&", " and ")
+    words = _FOLD_RE.sub(" ", text).split()
+    if len(words) > 1 and words[0] == "the":
+        words = words[1:]
+    return " ".join(words)
+
+
+def _ngrams(text: str, n: int) -> Set[str]:
+    padded = f"{' ' * (n - 1)}{text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class PlaceIndex:
+    """Exact + alias + n-gram lookup from free text to a canonical key.
+
+    Args:
+        entries: ``(key, name)`` pairs; ``name`` is the canonical spelling.
+        aliases: alternative spelling -> key.
+        threshold: minimum Dice similarity for a fuzzy match.
+        margin: the best fuzzy score must beat the runner-up (for a
+            different key) by at least this much.
+        min_length: queries shorter than this are never fuzzy-matched
+            (abbreviations must come from the alias table).
+        n: character n-gram size for fuzzy matching.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[Tuple[str, str]],
+        aliases: Optional[Mapping[str, str]] = None,
+        threshold: float = 0.75,
+        margin: float = 0.08,
+        min_length: int = 4,
+        n: int = 2,
+    ):
+        self.n = n
+        self.threshold = threshold
+        self.margin = margin
+        self.min_length = min_length
+        self._exact: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+        for key, name in entries:
+            self._exact.setdefault(normalize_place(name), key)
+            self._names.setdefault(key, name)
+        for alias, key in (aliases or {}).items():
+            self._exact.setdefault(normalize_place(alias), key)
+
+        # Inverted n-gram index over every exact/alias spelling
+        self._spellings: List[Tuple[str, int]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for spelling, key in self._exact.items():
+            grams = _ngrams(spelling, n)
+            idx = len(self._spellings)
+            self._spellings.append((key, len(grams)))
+            for g in grams:
+                self._postings[g].append(idx)
+        self._postings = dict(self._postings)
+
+    def name(self, key: str) -> Optional[str]:
+        """Canonical spelling for a key."""
+        return self._names.get(key)
+
+    def exact(self, text: str) -> Optional[str]:
+        """Key for an exact or alias spelling, without fuzzy matching."""
+        return self._exact.get(normalize_place(text))
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Key for ``text``, or None when nothing is close enough."""
+        norm = normalize_place(text)
+        key = self._exact.get(norm)
+        if key is not None or len(norm) < self.min_length:
+            return key
+        match = self.best_match(norm)
+        return match[0] if match and match[1] >= self.threshold else None
+
+    def best_match(self, norm: str) -> Optional[Tuple[str, float]]:
+        """Best fuzzy ``(key, score)`` for normalised text (None if ambiguous)."""
+        grams = _ngrams(norm, self.n)
+        postings = self._postings
+        counts = Counter(chain.from_iterable(postings[g] for g in grams if g in postings))
+        if not counts:
+            return None
+
+        n = len(grams)
+        best = second = (None, 0.0)
+        spellings = self._spellings
+        for idx, shared in counts.items():
+            key, size = spellings[idx]
+            score = 2.0 * shared / (n + size)
+            if score > best[1]:
+                if key != best[0]:
+                    second = best
+                best = (key, score)
+            elif score > second[1] and key != best[0]:
+                second = (key, score)
+        if second[0] is not None and best[1] - second[1] < self.margin:
+            return None
+        return best
+
+
+# ---------------------------------------------------------------------------
+# Countries (keys are ISO alpha-3 codes)
+# ---------------------------------------------------------------------------
+
+COUNTRY_ALIASES: Dict[str, str] = {
+    "US": "USA", "U.S.": "USA", "USA": "USA", "U.S.A.": "USA",
+    "United States of America": "USA", "America": "USA", "US of A": "USA",
+    "UK": "GBR", "U.K.": "GBR", "Great Britain": "GBR", "Britain": "GBR",
+    "England": "GBR", "Scotland": "GBR", "Wales": "GBR", "Northern Ireland": "GBR",
+    "United Kingdom of Great Britain and Northern Ireland": "GBR",
+    "UAE": "ARE", "Emirates": "ARE",
+    "Holland": "NLD", "The Netherlands": "NLD",
+    "Korea": "KOR", "Republic of Korea": "KOR", "Korea, South": "KOR",
+    "Korea, North": "PRK", "DPRK": "PRK",
+    "Russian Federation": "RUS",
+    "Czechia": "CZE",
+    "Ivory Coast": "CIV", "Côte d'Ivoire": "CIV",
+    "Myanmar": "MMR",
+    "Cabo Verde": "CPV",
+    "DRC": "COD", "DR Congo": "COD", "Congo-Kinshasa": "COD",
+    "Congo": "COG", "Congo-Brazzaville": "COG",
+    "North Macedonia": "MKD",
+    "Eswatini": "SWZ",
+    "Vatican": "VAT", "Holy See": "VAT",
+    "Macao": "MAC",
+    "Lao PDR": "LAO",
+    "Viet Nam": "VNM",
+    "Turkiye": "TUR", "Türkiye": "TUR",
+    "Brunei Darussalam": "BRN",
+    "Iran, Islamic Republic of": "IRN",
+    "Syrian Arab Republic": "SYR",
+    "Republic of Moldova": "MDA",
+    "St Lucia": "LCA", "St Vincent and the Grenadines": "VCT",
+    "Trinidad": "TTO",
+    "Bosnia": "BIH",
+    "PRC": "CHN", "People's Republic of China": "CHN", "Mainland China": "CHN",
+    "ROC": "TWN",
+    "US Virgin Islands": "VIR",
+    "Hong Kong SAR": "HKG",
+    "Deutschland": "DEU",
+    "Espana": "ESP", "España": "ESP",
+    "Brasil": "BRA",
+}
+
+
+@lru_cache(maxsize=1)
+def country_index() -> PlaceIndex:
+    return PlaceIndex(COUNTRIES, COUNTRY_ALIASES)
+
+
+def country_code(text: str) -> Optional[str]:
+    """ISO alpha-3 code for a country name, alias or near-miss spelling."""
+    if not text:
+        return None
+    return country_index().lookup(text)
+
+
+# ---------------------------------------------------------------------------
+# US states (keys are the canonical names from US_STATES)
+# ---------------------------------------------------------------------------
+
+US_STATE_ABBREVIATIONS: Dict[str, str] = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas",
+    "CA": "California", "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware",
+    "DC": "District of Columbia", "FL": "Florida", "GA": "Georgia", "HI": "Hawaii",
+    "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa",
+    "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine",
+    "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska",
+    "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico",
+    "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio",
+    "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island",
+    "SC": "South Carolina", "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas",
+    "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington",
+    "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+}
+
+US_STATE_ALIASES: Dict[str, str] = {
+    **US_STATE_ABBREVIATIONS,
+    "Washington DC": "District of Columbia", "Washington D.C.": "District of Columbia",
+    "D.C.": "District of Columbia",
+    "Washington State": "Washington",
+    "New York State": "New York",
+}
+
+
+@lru_cache(maxsize=1)
+def us_state_index() -> PlaceIndex:
+    return PlaceIndex(((s, s) for s in US_STATES), US_STATE_ALIASES)
+
+
+def us_state_name(text: str) -> Optional[str]:
+    """Canonical US_STATES spelling for a state name, abbreviation or typo."""
+    if not text:
+        return None
+    return us_state_index().lookup(text)
+
+
+# ---------------------------------------------------------------------------
+# Country answer lists
+# ---------------------------------------------------------------------------
+
+def country_choice_codes(texts: Iterable[str]) -> Optional[List[Optional[str]]]:
+    """ISO codes for the options of a country list, or None if it isn't one.
+
+    A list counts as a country list when at least two options are exact
+    or alias country names (so "American"/"Indian" ethnicity options are
+    not mistaken for one).  Within a country list, misspelt names are
+    matched fuzzily.  Options with no code, or whose code is already
+    taken by an earlier option, get None.
+    """
+    texts = list(texts)
+    index = country_index()
+    if sum(1 for t in texts if t and index.exact(t)) < 2:
+        return None
+    codes: List[Optional[str]] = []
+    used: Set[str] = set()
+    for text in texts:
+        code = country_code(text)
+        if code in used:
+            code = None
+        if code:
+            used.add(code)
+        codes.append(code)
+    return codes
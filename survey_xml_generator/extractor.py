@@ -9,7 +9,7 @@ from __future__ import annotations
 import re
 from dataclasses import dataclass, field, asdict
 from enum import Enum
-from typing import List, Optional
+from typing import TYPE_CHECKING, Iterator, List, Optional
 
 from docx import Document
 from docx.oxml.table import CT_Tbl
@@ -17,6 +17,9 @@ from docx.oxml.text.paragraph import CT_P
 from docx.text.paragraph import Paragraph
 from docx.table import Table
 
+if TYPE_CHECKING:
+    from .block_store import BlockStore
+
 
 # ---------------------------------------------------------------------------
 # Block types
@@ -260,13 +263,8 @@ def _iter_block_items(doc: Document):
             yield Table(child, doc)
 
 
-def extract_blocks(doc: Document) -> List[dict]:
-    """Extract all blocks from a Word document.
-
-    Returns a list of dicts (serialisable to JSON) representing every
-    paragraph, table, and page break in document order.
-    """
-    blocks: List[dict] = []
+def _iter_extracted_blocks(doc: Document) -> Iterator[dict]:
+    """Yield one block dict per paragraph, table, and page break in order."""
     idx = 0
 
     for block in _iter_block_items(doc):
@@ -277,36 +275,36 @@ def extract_blocks(doc: Document) -> List[dict]:
             if not text:
                 # But check for Word-native page breaks (section breaks)
                 if _has_section_break(block):
-                    blocks.append({
+                    yield {
                         "block_type": BlockType.PAGEBREAK,
                         "index": idx,
-                    })
+                    }
                     idx += 1
                 continue
 
             # Check for text-based page break markers
             if _is_pagebreak(text):
-                blocks.append({
+                yield {
                     "block_type": BlockType.PAGEBREAK,
                     "index": idx,
-                })
+                }
                 idx += 1
                 continue
 
             # Check for block markers like [BLOCK SUN CHASERS]
             if _is_block_marker(text):
-                blocks.append({
+                yield {
                     "block_type": BlockType.BLOCK_MARKER,
                     "index": idx,
                     "text": text,
                     "block_name": _parse_block_marker(text),
-                })
+                }
                 idx += 1
                 continue
 
             style_name = block.style.name if block.style else "Normal"
 
-            blocks.append({
+            yield {
                 "block_type": BlockType.PARAGRAPH,
                 "index": idx,
                 "text": text,
@@ -316,7 +314,7 @@ def extract_blocks(doc: Document) -> List[dict]:
                 "underline": _paragraph_has_underline(block),
                 "is_list_item": _is_list_item(block) or style_name.lower().startswith("list"),
                 "indent_level": _indent_level(block),
-            })
+            }
             idx += 1
 
         elif isinstance(block, Table):
@@ -328,17 +326,36 @@ def extract_blocks(doc: Document) -> List[dict]:
             if not rows_data:
                 continue
 
-            blocks.append({
+            yield {
                 "block_type": BlockType.TABLE,
                 "index": idx,
                 "rows": rows_data,
                 "header_row": rows_data[0] if rows_data else [],
                 "num_rows": len(rows_data),
                 "num_cols": len(rows_data[0]) if rows_data else 0,
-            })
+            }
             idx += 1
 
-    return blocks
+
+def extract_blocks(doc: Document) -> List[dict]:
+    """Extract all blocks from a Word document.
+
+    Returns a list of dicts (serialisable to JSON) representing every
+    paragraph, table, and page break in document order.
+    """
+    return list(_iter_extracted_blocks(doc))
+
+
+def extract_block_store(doc: Document) -> "BlockStore":
+    """Extract all blocks straight into a compact :class:`BlockStore`.
+
+    Same content as :func:`extract_blocks`, but no per-block dicts are
+    kept alive, which matters when several large documents are held in
+    memory at once.
+    """
+    from .block_store import BlockStore
+
+    return BlockStore.from_blocks(_iter_extracted_blocks(doc))
 
 
 def extract_from_file(file_path: str) -> List[dict]:
@@ -354,6 +371,19 @@ def extract_from_bytes(file_bytes) -> List[dict]:
     return extract_blocks(doc)
 
 
+def extract_store_from_file(file_path: str) -> "BlockStore":
+    """Convenience: extract a .docx file path into a :class:`BlockStore`."""
+    doc = Document(file_path)
+    return extract_block_store(doc)
+
+
+def extract_store_from_bytes(file_bytes) -> "BlockStore":
+    """Convenience: extract a file-like object into a :class:`BlockStore`."""
+    from io import BytesIO
+    doc = Document(BytesIO(file_bytes) if isinstance(file_bytes, bytes) else file_bytes)
+    return extract_block_store(doc)
+
+
 # ---------------------------------------------------------------------------
 # CLI test
 # ---------------------------------------------------------------------------
@@ -0,0 +1,325 @@
+"""Incremental re-runs between revisions of the same questionnaire.
+
+Researchers usually send v3, v4, v5 of a document with small edits.  This
+module aligns the extracted blocks of a new revision against the run store
+of the previous revision (a sequence diff over per-block content hashes),
+reuses every segment and classified element whose source paragraphs did not
+change, and only sends the dirty regions back through the AI stages.
+
+The run store is a plain JSON-serialisable dict so callers can persist it
+between runs (``json.dump(debug_info["run_store"], f)``).
+"""
+
+from __future__ import annotations
+
+import copy
+import difflib
+import hashlib
+import json
+import logging
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from . import condition_expr
+
+logger = logging.getLogger(__name__)
+
+RUN_STORE_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# Block hashing + alignment
+# ---------------------------------------------------------------------------
+
+def block_hash(block: Mapping) -> str:
+    """Content hash of an extracted block (dict or ``BlockView``),
+    independent of its position."""
+    content = {k: v for k, v in block.items() if k != "index"}
+    payload = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _align_blocks(
+    old_hashes: List[str],
+    new_hashes: List[str],
+) -> Tuple[Dict[int, int], List[Tuple[int, int]]]:
+    """Align old and new block lists by content hash.
+
+    Returns ``(old_to_new, equal_ranges)`` where ``old_to_new`` maps every
+    unchanged old position to its new position and ``equal_ranges`` lists the
+    ``(old_start, old_end)`` spans of each unchanged run.
+    """
+    matcher = difflib.SequenceMatcher(a=old_hashes, b=new_hashes, autojunk=False)
+    old_to_new: Dict[int, int] = {}
+    equal_ranges: List[Tuple[int, int]] = []
+    for tag, i1, i2, j1, _j2 in matcher.get_opcodes():
+        if tag != "equal":
+            continue
+        equal_ranges.append((i1, i2))
+        for offset in range(i2 - i1):
+            old_to_new[i1 + offset] = j1 + offset
+    return old_to_new, equal_ranges
+
+
+# ---------------------------------------------------------------------------
+# Run store
+# ---------------------------------------------------------------------------
+
+def build_run_store(
+    blocks: Sequence[Mapping],
+    segments: List[dict],
+    classified: Dict[str, List[dict]],
+) -> Dict[str, Any]:
+    """Snapshot a finished run so the next revision can reuse it.
+
+    ``classified`` must still carry the ``_sort_key`` of every element
+    (see ``classify_segments(keep_sort_keys=True)``) so elements can be
+    traced back to the paragraphs they came from.
+    """
+    return {
+        "version": RUN_STORE_VERSION,
+        "block_hashes": [block_hash(b) for b in blocks],
+        "block_indices": [b.get("index", i) for i, b in enumerate(blocks)],
+        "segments": copy.deepcopy(segments),
+        "classified": {
+            "conditions": copy.deepcopy(classified.get("conditions", [])),
+            "questions": copy.deepcopy(classified.get("questions", [])),
+        },
+    }
+
+
+def is_usable_store(store: Optional[Dict[str, Any]]) -> bool:
+    """True if *store* looks like a run store this version can reuse."""
+    return (
+        isinstance(store, dict)
+        and store.get("version") == RUN_STORE_VERSION
+        and bool(store.get("block_hashes"))
+    )
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+def _cond_exprs(value: Any) -> Iterator[str]:
+    """Every ``cond`` in a classified element, including row / answer conds."""
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k == "cond" and isinstance(v, str):
+                if v:
+                    yield v
+            else:
+                yield from _cond_exprs(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _cond_exprs(v)
+
+
+def _conditions_used_by(elements: List[dict], conditions: List[dict]) -> List[dict]:
+    """The *conditions* that *elements* reference, directly or through
+    other ``condition.X`` definitions, in their original order."""
+    definitions = {c.get("label"): c.get("cond", "") for c in conditions if c.get("label")}
+    pending = [
+        label
+        for el in elements
+        for expr in _cond_exprs(el)
+        for label in condition_expr.condition_refs(condition_expr.parse(expr))
+    ]
+    used: Set[str] = set()
+    while pending:
+        label = pending.pop()
+        if label in used or label not in definitions:
+            continue
+        used.add(label)
+        expr = definitions[label]
+        if expr:
+            pending.extend(condition_expr.condition_refs(condition_expr.parse(expr)))
+    return [c for c in conditions if c.get("label") in used]
+
+
+class IncrementalPlan:
+    """Outcome of aligning a new revision against a previous run store."""
+
+    def __init__(
+        self,
+        dirty_blocks: Sequence[Mapping],
+        reused_segments: List[dict],
+        reused_elements: List[dict],
+        reused_conditions: List[dict],
+        blocks_total: int,
+    ):
+        self.dirty_blocks = dirty_blocks
+        self.reused_segments = reused_segments
+        self.reused_elements = reused_elements
+        self.reused_conditions = reused_conditions
+        self.blocks_total = blocks_total
+
+    @property
+    def blocks_reused(self) -> int:
+        return self.blocks_total - len(self.dirty_blocks)
+
+    @property
+    def reuse_fraction(self) -> float:
+        if not self.blocks_total:
+            return 0.0
+        return self.blocks_reused / self.blocks_total
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "blocks_total": self.blocks_total,
+            "blocks_reused": self.blocks_reused,
+            "blocks_dirty": len(self.dirty_blocks),
+            "reuse_fraction": round(self.reuse_fraction, 4),
+            "segments_reused": len(self.reused_segments),
+            "elements_reused": len(self.reused_elements),
+        }
+
+
+def plan_incremental(
+    blocks: Sequence[Mapping],
+    store: Dict[str, Any],
+) -> IncrementalPlan:
+    """Work out which blocks must go back through the AI stages.
+
+    An old segment is reused when all of its paragraphs fall inside a single
+    unchanged run of the diff (so nothing was inserted, removed or edited
+    inside it).  Every other segment touching the diff is dirty, and all of
+    its surviving paragraphs are re-segmented together with any inserted or
+    edited blocks.  Unchanged blocks that no old segment claimed (e.g.
+    programming notes the AI skipped) stay clean.  Only the old condition
+    definitions the reused elements reference are carried over.
+    """
+    old_hashes: List[str] = store["block_hashes"]
+    old_indices: List[int] = store.get("block_indices") or list(range(len(old_hashes)))
+    new_hashes = [block_hash(b) for b in blocks]
+
+    old_to_new, equal_ranges = _align_blocks(old_hashes, new_hashes)
+
+    old_pos = {idx: pos for pos, idx in enumerate(old_indices)}
+    new_index_at = [b.get("index", i) for i, b in enumerate(blocks)]
+
+    range_of: Dict[int, int] = {}
+    for r, (start, end) in enumerate(equal_ranges):
+        for p in range(start, end):
+            range_of[p] = r
+
+    dirty_new: Set[int] = set(range(len(blocks))) - set(old_to_new.values())
+
+    reused_segments: List[dict] = []
+    reusable_keys: Dict[int, int] = {}  # old first paragraph index -> new index
+    for seg in store.get("segments", []):
+        indices = seg.get("paragraph_indices") or []
+        positions = [old_pos[i] for i in indices if i in old_pos]
+        if not positions:
+            continue
+        ranges = {range_of.get(p) for p in positions}
+        if len(positions) == len(indices) and len(ranges) == 1 and None not in ranges:
+            new_seg = copy.deepcopy(seg)
+            new_seg["paragraph_indices"] = [
+                new_index_at[old_to_new[p]] for p in positions
+            ]
+            reused_segments.append(new_seg)
+            reusable_keys[indices[0]] = new_seg["paragraph_indices"][0]
+        else:
+            for p in positions:
+                if p in old_to_new:
+                    dirty_new.add(old_to_new[p])
+
+    reused_elements: List[dict] = []
+    for el in store.get("classified", {}).get("questions", []):
+        key = el.get("_sort_key")
+        if key in reusable_keys:
+            new_el = copy.deepcopy(el)
+            new_el["_sort_key"] = reusable_keys[key]
+            reused_elements.append(new_el)
+
+    if hasattr(blocks, "select"):
+        dirty_blocks = blocks.select(sorted(dirty_new))
+    else:
+        dirty_blocks = [blocks[p] for p in sorted(dirty_new)]
+
+    plan = IncrementalPlan(
+        dirty_blocks=dirty_blocks,
+        reused_segments=reused_segments,
+        reused_elements=reused_elements,
+        reused_conditions=copy.deepcopy(_conditions_used_by(
+            reused_elements, store.get("classified", {}).get("conditions", []),
+        )),
+        blocks_total=len(blocks),
+    )
+    logger.info(
+        f"Incremental plan: {plan.blocks_reused}/{plan.blocks_total} blocks reused "
+        f"({plan.reuse_fraction:.0%}), {len(reused_segments)} segments and "
+        f"{len(reused_elements)} classified elements carried over"
+    )
+    return plan
+
+
+# ---------------------------------------------------------------------------
+# Splicing
+# ---------------------------------------------------------------------------
+
+def splice_segments(plan: IncrementalPlan, new_segments: List[dict]) -> List[dict]:
+    """Merge reused and freshly segmented segments back into document order."""
+    from .segmenter import _sort_segments
+
+    return _sort_segments(list(plan.reused_segments) + list(new_segments))
+
+
+def splice_classified(
+    plan: IncrementalPlan,
+    new_classified: Dict[str, List[dict]],
+) -> Dict[str, Any]:
+    """Merge reused classified elements with the re-classified dirty regions.
+
+    Both sides still carry ``_sort_key`` values in the new document's index
+    space.  The dirty regions were classified without the carried-over
+    conditions, so a fresh condition may reuse one of their labels for a
+    different expression; it is renamed (``adult`` -> ``adult_2``) along
+    with every reference in the fresh elements, and the renames are
+    returned under ``"condition_renames"``.
+    """
+    from .classifier import _rename_condition_refs
+
+    reused = {c.get("label"): str(c.get("cond", "")) for c in plan.reused_conditions}
+    new_conditions = list(new_classified.get("conditions", []))
+    taken = set(reused) | {c.get("label") for c in new_conditions}
+
+    # A fresh definition that reads the same as the carried-over one is not
+    # a clash -- unless it refers to a label that was itself renamed.
+    renames: Dict[str, str] = {}
+    changed = True
+    while changed:
+        changed = False
+        for cond in new_conditions:
+            label = cond.get("label", "")
+            if label not in reused or label in renames:
+                continue
+            expr = condition_expr.rename_expr(str(cond.get("cond", "")), conditions=renames)
+            if condition_expr.key(expr) != condition_expr.key(reused[label]):
+                n = 2
+                while f"{label}_{n}" in taken:
+                    n += 1
+                renames[label] = f"{label}_{n}"
+                taken.add(renames[label])
+                changed = True
+
+    fresh_conditions = [
+        dict(c, label=renames[c.get("label")]) if c.get("label") in renames else c
+        for c in new_conditions
+        if c.get("label") not in reused or c.get("label") in renames
+    ]
+
+    fresh_questions = list(new_classified.get("questions", []))
+    if renames:
+        for item in fresh_questions + fresh_conditions:
+            _rename_condition_refs(item, renames)
+        logger.warning(f"Renamed fresh conditions that clashed with carried-over labels: {renames}")
+
+    questions = list(plan.reused_elements) + fresh_questions
+    questions.sort(key=lambda x: x.get("_sort_key", 0))
+    return {
+        "conditions": fresh_conditions + list(plan.reused_conditions),
+        "questions": questions,
+        "condition_renames": renames,
+    }
@@ -0,0 +1,671 @@
+"""Static analysis of survey skip logic.
+
+Researchers' skip logic can leave questions that are never shown and
+terms that never fire, which otherwise only shows up in field.
+:class:`LogicGraph` is fed the same start/end tag events as the
+validator's expat pass and records every block, question, html and term
+with its ``cond``, page (``<suspend/>`` count), enclosing block and
+row/col/choice labels, plus the ``<condition>`` definitions.  From those
+it builds a dependency graph -- element -> question or ``condition.X``
+its ``cond`` (or a row ``cond``) reads, definition -> what it reads,
+element -> enclosing block, element -> the term before it -- and
+:meth:`LogicGraph.analyze` reports:
+
+- cycles: definitions or questions whose conditions depend on themselves;
+- forward references: a condition reading a question asked on the same
+  or a later page, so it is still unanswered when evaluated;
+- contradictory conjunctions (``X and not X``, two rows of one
+  single-select question, disjoint numeric ranges), with the enclosing
+  block conditions and ``condition.X`` definitions expanded inline;
+- always-true conditions -- ``1`` left behind when a ``match=``
+  placeholder could not be resolved, or a term with no condition -- and
+  the elements a term that always fires makes unreachable;
+- references to questions, rows, columns or choices that do not exist.
+
+:meth:`LogicGraph.to_dict` and :func:`graph_to_dot` export the graph.
+
+Usage::
+
+    python -m survey_xml_generator.logic_graph survey.xml [--json | --dot]
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.parsers import expat
+
+from . import condition_expr as ce
+
+ELEMENT_TAGS = frozenset({
+    "radio", "checkbox", "select", "text", "textarea", "number", "float", "html", "block", "term",
+})
+OPTION_TAGS = frozenset({"row", "col", "choice"})
+SINGLE_SELECT_TAGS = frozenset({"radio", "select"})
+
+# Accessor names that look like option labels; anything else after a
+# question label (``.val``, ``.any``, ``.check``...) is an attribute.
+_OPTION_RE = re.compile(r"(?:r|c|ch)\d+|[A-Z]{3}")
+_NUMERIC_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_FLIPPED = {"<": ">", ">": "<", "<=": ">=", ">=": "<=", "==": "==", "=": "=="}
+
+
+@dataclass
+class _Element:
+    tag: str
+    label: str
+    cond: str
+    line: int
+    column: int
+    page: int
+    order: int
+    block: Optional["_Element"] = None
+    options: Dict[str, str] = field(default_factory=dict)  # label -> row/col/choice
+    option_conds: List[Tuple[str, str]] = field(default_factory=list)  # (option, cond)
+
+    @property
+    def where_text(self) -> str:
+        return f"'{self.label}' at line {self.line}, column {self.column}"
+
+    @property
+    def is_question(self) -> bool:
+        return self.tag not in ("block", "html", "term")
+
+    def blocks(self) -> Iterator["_Element"]:
+        block = self.block
+        while block is not None:
+            yield block
+            block = block.block
+
+
+@dataclass
+class _Definition:
+    label: str
+    cond: str
+    line: int
+    column: int
+
+    @property
+    def where_text(self) -> str:
+        return f"'condition.{self.label}' at line {self.line}, column {self.column}"
+
+
+class LogicGraph:
+    """Dependency graph of a survey's conditions; see the module docstring.
+
+    Feed it with :meth:`start` / :meth:`end` (the validator does this from
+    its expat handlers) or build one with :meth:`from_xml`.
+    """
+
+    def __init__(self):
+        self.elements: List[_Element] = []
+        self.by_label: Dict[str, _Element] = {}
+        self.definitions: Dict[str, _Definition] = {}
+        self._page = 0
+        self._blocks: List[_Element] = []
+        self._question: Optional[_Element] = None
+        self._expanded: Dict[str, List[ce.Node]] = {}
+        self._expr_refs: Dict[str, Tuple[Set[str], Set[str]]] = {}
+
+    # --- Building -----------------------------------------------------------
+
+    def start(self, tag: str, attrs: Dict[str, str], line: int, column: int) -> None:
+        if tag in OPTION_TAGS:
+            q = self._question
+            label = attrs.get("label")
+            if q is not None and label:
+                q.options.setdefault(label, tag)
+                if attrs.get("cond"):
+                    q.option_conds.append((label, attrs["cond"]))
+            return
+        if tag == "suspend":
+            self._page += 1
+            return
+        if tag == "condition":
+            label = attrs.get("label")
+            if label:
+                self.definitions[label] = _Definition(label, attrs.get("cond", ""), line, column)
+            return
+        if tag not in ELEMENT_TAGS:
+            return
+        el = _Element(
+            tag, attrs.get("label", ""), attrs.get("cond", ""), line, column, self._page,
+            len(self.elements), self._blocks[-1] if self._blocks else None,
+        )
+        self.elements.append(el)
+        if el.label:
+            self.by_label.setdefault(el.label, el)
+        if tag == "block":
+            self._blocks.append(el)
+        elif el.is_question:
+            self._question = el
+
+    def end(self, tag: str) -> None:
+        if tag == "block":
+            if self._blocks:
+                self._blocks.pop()
+        elif tag in ELEMENT_TAGS:
+            self._question = None
+
+    @classmethod
+    def from_xml(cls, xml) -> "LogicGraph":
+        """Build the graph for a complete document (str or bytes)."""
+        graph = cls()
+        parser = expat.ParserCreate()
+        parser.StartElementHandler = lambda tag, attrs: graph.start(
+            tag, attrs, parser.CurrentLineNumber, parser.CurrentColumnNumber + 1,
+        )
+        parser.EndElementHandler = graph.end
+        parser.Parse(xml, True)
+        return graph
+
+    # --- References ---------------------------------------------------------
+
+    def _refs(self, expr: str) -> Tuple[Set[str], Set[str]]:
+        """(question labels, condition labels) *expr* reads directly."""
+        refs = self._expr_refs.get(expr)
+        if refs is None:
+            node = ce.parse(expr) if expr else None
+            refs = (ce.question_refs(node), ce.condition_refs(node)) if node else (set(), set())
+            self._expr_refs[expr] = refs
+        return refs
+
+    def _questions_via(self, expr: str) -> Set[str]:
+        """Question labels *expr* reads, following definitions."""
+        questions, conditions = self._refs(expr)
+        questions = set(questions)
+        seen: Set[str] = set()
+        pending = list(conditions)
+        while pending:
+            label = pending.pop()
+            if label in seen or label not in self.definitions:
+                continue
+            seen.add(label)
+            refs = self._refs(self.definitions[label].cond)
+            questions |= refs[0]
+            pending.extend(refs[1])
+        return questions
+
+    def edges(self) -> Iterator[Tuple[str, str, str]]:
+        """``(source, target, kind)``: *source* depends on *target*.
+
+        Kinds: ``cond`` (display/term/definition condition), ``row`` (a
+        row/col/choice condition), ``block`` (enclosing block) and
+        ``term`` (the last term before the element).
+        """
+        last_term: Optional[_Element] = None
+        for el in self.elements:
+            if not el.label:
+                continue
+            questions, conditions = self._refs(el.cond)
+            for q in sorted(questions):
+                yield el.label, q, "cond"
+            for c in sorted(conditions):
+                yield el.label, f"condition.{c}", "cond"
+            row_refs: Set[str] = set()
+            for _, cond in el.option_conds:
+                questions, conditions = self._refs(cond)
+                row_refs |= questions | {f"condition.{c}" for c in conditions}
+            for target in sorted(row_refs):
+                yield el.label, target, "row"
+            if el.block is not None:
+                yield el.label, el.block.label, "block"
+            if last_term is not None:
+                yield el.label, last_term.label, "term"
+            if el.tag == "term":
+                last_term = el
+        for d in self.definitions.values():
+            questions, conditions = self._refs(d.cond)
+            for q in sorted(questions):
+                yield f"condition.{d.label}", q, "cond"
+            for c in sorted(conditions):
+                yield f"condition.{d.label}", f"condition.{c}", "cond"
+
+    # --- Export -------------------------------------------------------------
+
+    def to_dict(self) -> Dict[str, List[dict]]:
+        """JSON-ready ``{"nodes": [...], "edges": [...]}``.
+
+        Targets that are not defined anywhere appear as ``undefined`` nodes.
+        """
+        nodes = [
+            {"id": f"condition.{d.label}", "kind": "condition", "line": d.line, "cond": d.cond}
+            for d in self.definitions.values()
+        ]
+        nodes += [
+            {
+                "id": el.label, "kind": el.tag, "line": el.line, "page": el.page,
+                "block": el.block.label if el.block is not None else None, "cond": el.cond,
+            }
+            for el in self.elements if el.label
+        ]
+        known = {n["id"] for n in nodes}
+        edges = []
+        for source, target, kind in self.edges():
+            if target not in known:
+                known.add(target)
+                nodes.append({"id": target, "kind": "undefined"})
+            edges.append({"source": source, "target": target, "kind": kind})
+        return {"nodes": nodes, "edges": edges}
+
+    def to_dot(self) -> str:
+        return graph_to_dot(self.to_dict())
+
+    # --- Analysis -----------------------------------------------------------
+
+    def analyze(self) -> List[str]:
+        """Run every check; returns warnings in the validator's style."""
+        warnings: List[str] = []
+        warnings += self._check_cycles()
+        warnings += self._check_undefined()
+        warnings += self._check_forward_refs()
+        warnings += self._check_always_true()
+        warnings += self._check_contradictions()
+        return warnings
+
+    def _check_cycles(self) -> List[str]:
+        # Only condition edges: blocks and terms are ordered by position
+        # and cannot form loops.
+        graph: Dict[str, List[str]] = {}
+        for source, target, kind in self.edges():
+            if kind in ("cond", "row"):
+                graph.setdefault(source, []).append(target)
+        warnings = []
+        for component in _strongly_connected(graph):
+            if len(component) == 1:
+                node = component[0]
+                if node not in graph.get(node, ()):
+                    continue
+                cycle = [node, node]
+            else:
+                cycle = _cycle_in(component, graph)
+            warnings.append("Circular condition dependency: " + " -> ".join(cycle))
+        return warnings
+
+    def _check_undefined(self) -> List[str]:
+        lower = {label.lower(): label for label in self.by_label}
+        warnings = []
+        # One warning per owner and undefined question / missing option,
+        # however often the expressions (cond and row conds) repeat it
+        seen: Set[Tuple[str, str]] = set()
+        for owner, expr in self._owned_conds():
+            for ref in ce.walk(ce.parse(expr)):
+                if not isinstance(ref, ce.Ref) or ref.question is None:
+                    continue
+                if ref.parts and not ref.parts[0].startswith("."):
+                    continue  # function call, e.g. hasMarker('x')
+                q = self.by_label.get(ref.root)
+                if q is None:
+                    if not ref.parts and ref.root.lower() not in lower:
+                        continue  # bare name: a Python global, not a question
+                    if (owner.where_text, ref.root) in seen:
+                        continue
+                    seen.add((owner.where_text, ref.root))
+                    hint = lower.get(ref.root.lower())
+                    warnings.append(
+                        f"{owner.where_text} references undefined question '{ref.root}'"
+                        + (f" (did you mean '{hint}'?)" if hint else "")
+                    )
+                    continue
+                missing = _missing_option(q, ref)
+                if missing and (owner.where_text, f"{q.label}.{missing}") not in seen:
+                    seen.add((owner.where_text, f"{q.label}.{missing}"))
+                    warnings.append(
+                        f"{owner.where_text} references {ce.to_string(ref)}, but "
+                        f"{q.label} has no row, column or choice '{missing}'"
+                    )
+        return warnings
+
+    def _check_forward_refs(self) -> List[str]:
+        warnings = []
+        for el in self.elements:
+            exprs = [el.cond] + [cond for _, cond in el.option_conds]
+            refs: Set[str] = set()
+            for expr in exprs:
+                refs |= self._questions_via(expr)
+            for label in sorted(refs):
+                q = self.by_label.get(label)
+                if q is None or q is el or not q.is_question or q.page < el.page:
+                    continue
+                if q.page > el.page:
+                    where = f"a later page (line {q.line})"
+                else:
+                    where = f"the same page (line {q.line}); it is still unanswered there"
+                warnings.append(f"{el.where_text} depends on {label}, which is asked on {where}")
+        return warnings
+
+    def _check_always_true(self) -> List[str]:
+        warnings = []
+        for owner, expr in self._owned_conds():
+            node = ce.parse(expr)
+            if isinstance(owner, _Element) and owner.tag == "term":
+                continue  # reported below with what the term cuts off
+            if _always_true(node):
+                warnings.append(
+                    f"{owner.where_text} has condition '{expr}', which is always true "
+                    "(an unresolved match= placeholder?)"
+                )
+            elif _has_true_clause(node):
+                warnings.append(
+                    f"{owner.where_text} has an always-true '1' clause in '{expr}' "
+                    "(an unresolved match= placeholder?)"
+                )
+        for el in self.elements:
+            if el.tag != "term":
+                continue
+            node = ce.parse(el.cond) if el.cond else ce.TRUE
+            if _always_true(node):
+                after = self._unreachable_after(el)
+                reason = "has no condition" if not el.cond else f"has condition '{el.cond}'"
+                warnings.append(
+                    f"{el.where_text} {reason} and terminates every respondent who reaches it"
+                    + (f"; {after} element(s) after it are unreachable" if after else "")
+                )
+            elif _has_true_clause(node):
+                warnings.append(
+                    f"{el.where_text} has an always-true '1' clause in '{el.cond}' "
+                    "(an unresolved match= placeholder?)"
+                )
+        return warnings
+
+    def _unreachable_after(self, term: _Element) -> int:
+        """Elements only reachable through *term*: the rest of the innermost
+        conditional block around it, or of the survey."""
+        scope = next(
+            (b for b in term.blocks() if b.cond and not _always_true(ce.parse(b.cond))), None,
+        )
+        count = 0
+        for el in self.elements[term.order + 1:]:
+            if scope is not None and scope not in el.blocks():
+                break
+            count += 1
+        return count
+
+    def _check_contradictions(self) -> List[str]:
+        warnings = []
+        dead: Set[int] = set()  # orders of blocks already reported
+        for el in self.elements:
+            if any(b.order in dead for b in el.blocks()):
+                continue
+            own = self._expand(el.cond)
+            if not own:
+                continue
+            inherited = [clause for b in el.blocks() for clause in self._expand(b.cond)]
+            conflict = _contradiction(own + inherited, self.by_label)
+            if conflict is None:
+                continue
+            if el.tag == "block":
+                dead.add(el.order)
+            outcome = "can never fire" if el.tag == "term" else "can never be shown"
+            first, second = conflict
+            warnings.append(
+                f"{el.where_text} {outcome}: its condition requires "
+                + (f"both {first} and {second}" if second else first)
+            )
+        return warnings
+
+    def _expand(self, expr: str, seen: Optional[Set[str]] = None) -> List[ce.Node]:
+        """Conjuncts of *expr*, with ``condition.X`` clauses inlined."""
+        if not expr:
+            return []
+        cached = self._expanded.get(expr) if seen is None else None
+        if cached is not None:
+            return cached
+        seen = set() if seen is None else seen
+        clauses: List[ce.Node] = []
+        for clause in ce.conjuncts(ce.parse(expr)):
+            label = clause.condition if isinstance(clause, ce.Ref) and len(clause.parts) == 1 else None
+            if label is not None and label in self.definitions and label not in seen:
+                clauses.extend(self._expand(self.definitions[label].cond, seen | {label}))
+            else:
+                clauses.append(clause)
+        if not seen:
+            self._expanded[expr] = clauses
+        return clauses
+
+    def _owned_conds(self) -> Iterator[Tuple[object, str]]:
+        for d in self.definitions.values():
+            if d.cond:
+                yield d, d.cond
+        for el in self.elements:
+            if el.cond:
+                yield el, el.cond
+            for _, cond in el.option_conds:
+                yield el, cond
+
+
+# ---------------------------------------------------------------------------
+# Expression checks
+# ---------------------------------------------------------------------------
+
+
+def _always_true(node: ce.Node) -> bool:
+    node = ce.strip_groups(node)
+    if ce.is_true(node):
+        return True
+    if isinstance(node, ce.BoolOp):
+        test = any if node.op == "or" else all
+        return test(_always_true(o) for o in node.operands)
+    return False
+
+
+def _has_true_clause(node: ce.Node) -> bool:
+    return any(
+        isinstance(n, ce.BoolOp) and any(ce.is_true(o) for o in n.operands)
+        for n in ce.walk(node)
+    )
+
+
+def _missing_option(q: _Element, ref: ce.Ref) -> Optional[str]:
+    """The option label *ref* names that *q* does not define, if any."""
+    if not q.options:
+        return None
+    names = [p[1:] for p in ref.parts if p.startswith(".")]
+    for name in names[:2]:
+        if name in q.options:
+            continue
+        return name if _OPTION_RE.fullmatch(name) else None
+    return None
+
+
+def _numeric_bound(clause: ce.Node) -> Optional[Tuple[str, str, float]]:
+    """``(subject, op, value)`` for ``qX.val >= 18``-style clauses."""
+    if not isinstance(clause, ce.Compare):
+        return None
+    left, op, right = ce.strip_groups(clause.left), clause.op, ce.strip_groups(clause.right)
+    if isinstance(left, ce.Literal) and isinstance(right, ce.Ref):
+        left, right, op = right, left, _FLIPPED.get(op)
+    if (
+        op not in _FLIPPED
+        or not isinstance(left, ce.Ref) or left.question is None
+        or not isinstance(right, ce.Literal) or not _NUMERIC_RE.fullmatch(right.text)
+    ):
+        return None
+    return ce.to_string(left), "==" if op == "=" else op, float(right.text)
+
+
+def _interval(op: str, value: float) -> Tuple[float, bool, float, bool]:
+    """``(low, low inclusive, high, high inclusive)`` for ``x <op> value``."""
+    inf = float("inf")
+    return {
+        "==": (value, True, value, True),
+        ">": (value, False, inf, False),
+        ">=": (value, True, inf, False),
+        "<": (-inf, False, value, False),
+        "<=": (-inf, False, value, True),
+    }[op]
+
+
+def _disjoint(a: Tuple[str, float], b: Tuple[str, float]) -> bool:
+    lo1, lo1_in, hi1, hi1_in = _interval(*a)
+    lo2, lo2_in, hi2, hi2_in = _interval(*b)
+    if lo1 == lo2:
+        lo, lo_in = lo1, lo1_in and lo2_in
+    else:
+        lo, lo_in = (lo1, lo1_in) if lo1 > lo2 else (lo2, lo2_in)
+    if hi1 == hi2:
+        hi, hi_in = hi1, hi1_in and hi2_in
+    else:
+        hi, hi_in = (hi1, hi1_in) if hi1 < hi2 else (hi2, hi2_in)
+    return lo > hi or (lo == hi and not (lo_in and hi_in))
+
+
+def _contradiction(
+    clauses: Iterable[ce.Node], questions: Dict[str, _Element]
+) -> Optional[Tuple[str, Optional[str]]]:
+    """Two clauses that cannot both hold (or one that never does), as text."""
+    positive: Dict[str, str] = {}
+    negative: Dict[str, str] = {}
+    selected: Dict[str, str] = {}
+    bounds: Dict[str, List[Tuple[str, float, str]]] = {}
+    for clause in clauses:
+        clause = ce.strip_groups(clause)
+        text = ce.to_string(clause)
+        if isinstance(clause, ce.Literal) and clause.text in ("0", "False"):
+            return f"'{text}'", None
+        if isinstance(clause, ce.Not):
+            inner = ce.to_string(ce.strip_groups(clause.operand))
+            if inner in positive:
+                return positive[inner], text
+            negative[inner] = text
+            continue
+        if text in negative:
+            return text, negative[text]
+        positive.setdefault(text, text)
+
+        if isinstance(clause, ce.Ref) and len(clause.parts) == 1 and clause.question:
+            q = questions.get(clause.root)
+            option = clause.parts[0][1:]
+            if (
+                q is not None and q.tag in SINGLE_SELECT_TAGS and option in q.options
+                and "col" not in q.options.values()
+            ):
+                other = selected.setdefault(q.label, text)
+                if other != text:
+                    return other, text
+            continue
+
+        bound = _numeric_bound(clause)
+        if bound is not None:
+            subject, op, value = bound
+            for op2, value2, text2 in bounds.get(subject, ()):
+                if _disjoint((op, value), (op2, value2)):
+                    return text2, text
+            bounds.setdefault(subject, []).append((op, value, text))
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Graph helpers
+# ---------------------------------------------------------------------------
+
+
+def _strongly_connected(graph: Dict[str, List[str]]) -> List[List[str]]:
+    """Tarjan's algorithm, iterative so long chains do not hit the recursion limit."""
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    stack: List[str] = []
+    components: List[List[str]] = []
+    counter = 0
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, targets = work[-1]
+            for target in targets:
+                if target not in index:
+                    index[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(graph.get(target, ()))))
+                    break
+                if target in on_stack:
+                    low[node] = min(low[node], index[target])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component[::-1])
+    return components
+
+
+def _cycle_in(component: List[str], graph: Dict[str, List[str]]) -> List[str]:
+    """One cycle through the first node of a strongly connected component."""
+    members = set(component)
+    path = [component[0]]
+    position = {component[0]: 0}
+    while True:
+        nxt = next(t for t in graph[path[-1]] if t in members)
+        if nxt in position:
+            return path[position[nxt]:] + [nxt]
+        position[nxt] = len(path)
+        path.append(nxt)
+
+
+_DOT_SHAPES = {
+    "condition": "diamond", "block": "folder", "term": "octagon",
+    "html": "note", "undefined": "plaintext",
+}
+_DOT_STYLES = {"cond": "solid", "row": "dashed", "block": "dotted", "term": "bold"}
+
+
+def graph_to_dot(graph: Dict[str, List[dict]]) -> str:
+    """Graphviz source for a :meth:`LogicGraph.to_dict` export."""
+    lines = ["digraph logic {", "  rankdir=LR;", "  node [fontname=Helvetica fontsize=10];"]
+    for node in graph["nodes"]:
+        shape = _DOT_SHAPES.get(node["kind"], "box")
+        lines.append(f'  "{node["id"]}" [shape={shape}];')
+    for edge in graph["edges"]:
+        style = _DOT_STYLES.get(edge["kind"], "solid")
+        lines.append(f'  "{edge["source"]}" -> "{edge["target"]}" [style={style}];')
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m survey_xml_generator.logic_graph",
+        description="Report dead or unreachable logic in an assembled survey XML.",
+    )
+    parser.add_argument("xml", help="assembled survey XML file")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--json", action="store_true", help="print the dependency graph as JSON")
+    output.add_argument("--dot", action="store_true", help="print the dependency graph as Graphviz")
+    args = parser.parse_args(argv)
+
+    with open(args.xml, "rb") as fh:
+        graph = LogicGraph.from_xml(fh.read())
+    if args.json:
+        import json
+        print(json.dumps(graph.to_dict(), indent=2))
+    elif args.dot:
+        print(graph.to_dot(), end="")
+    else:
+        warnings = graph.analyze()
+        for w in warnings:
+            print(w)
+        print(f"{len(graph.elements)} elements, {len(graph.definitions)} conditions, "
+              f"{len(warnings)} warning(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,156 @@
+"""Rule engine for Stage 3's deterministic post-processing.
+
+The classifier's guards used to be separate functions, each re-building
+its own ``label -> segment`` index and re-scanning every question.  Here
+they are rules registered with a :class:`RuleEngine`:
+
+- **question** rules take ``(question, ctx)`` and return ``True`` when they
+  changed something.  Consecutive question rules are fused into a single
+  traversal: each question goes through all of them in dependency order.
+- **survey** rules take ``ctx`` and return a change count.  They need every
+  question to be settled first (e.g. condition resolution looks up other
+  questions), so they act as barriers between traversals.
+
+Shared indexes live on :class:`PostProcessContext` and are built once.
+``RuleEngine.run`` returns per-rule timings and change counts.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+QUESTION = "question"
+SURVEY = "survey"
+
+
+class Rule:
+    """One registered post-processing step."""
+
+    __slots__ = ("name", "fn", "scope", "after", "order")
+
+    def __init__(self, name: str, fn: Callable, scope: str, after: Iterable[str], order: int):
+        if scope not in (QUESTION, SURVEY):
+            raise ValueError(f"Unknown rule scope '{scope}'")
+        self.name = name
+        self.fn = fn
+        self.scope = scope
+        self.after = tuple(after)
+        self.order = order
+
+    def __repr__(self) -> str:
+        return f"Rule({self.name!r}, scope={self.scope!r}, after={self.after})"
+
+
+class PostProcessContext:
+    """Inputs and shared indexes for one post-processing run."""
+
+    def __init__(
+        self,
+        questions: List[dict],
+        segments: List[dict],
+        conditions: List[dict],
+        reference_questions: Optional[List[dict]] = None,
+    ):
+        self.questions = questions
+        self.segments = segments
+        self.conditions = conditions
+        self.reference_questions = reference_questions or []
+        # Scratch space for rules that hand data to later rules
+        self.state: Dict[str, Any] = {}
+
+        self.seg_by_label: Dict[str, dict] = {}
+        for seg in segments:
+            lbl = seg.get("label", "")
+            if lbl:
+                self.seg_by_label[lbl] = seg
+
+    def segment_for(self, question: dict) -> Optional[dict]:
+        """The source segment a classified question came from, if known."""
+        return self.seg_by_label.get(question.get("label", ""))
+
+
+class RuleEngine:
+    """Registry of post-processing rules, run in dependency order."""
+
+    def __init__(self):
+        self._rules: Dict[str, Rule] = {}
+        self._plan: Optional[List[List[Rule]]] = None
+
+    def rule(self, name: str, scope: str = QUESTION, after: Iterable[str] = ()):
+        """Decorator registering ``fn`` as rule *name*."""
+        def decorator(fn: Callable) -> Callable:
+            if name in self._rules:
+                raise ValueError(f"Rule '{name}' already registered")
+            self._rules[name] = Rule(name, fn, scope, after, len(self._rules))
+            self._plan = None
+            return fn
+        return decorator
+
+    @property
+    def rules(self) -> List[Rule]:
+        return list(self._rules.values())
+
+    def plan(self) -> List[List[Rule]]:
+        """Topologically sorted rules, grouped into traversal stages.
+
+        Ties are broken by registration order, so rules without explicit
+        dependencies keep the order they were declared in.
+        """
+        if self._plan is not None:
+            return self._plan
+
+        for r in self._rules.values():
+            for dep in r.after:
+                if dep not in self._rules:
+                    raise ValueError(f"Rule '{r.name}' depends on unknown rule '{dep}'")
+
+        done: Dict[str, bool] = {}
+        ordered: List[Rule] = []
+        pending = sorted(self._rules.values(), key=lambda r: r.order)
+        while pending:
+            ready = [r for r in pending if all(d in done for d in r.after)]
+            if not ready:
+                names = ", ".join(r.name for r in pending)
+                raise ValueError(f"Dependency cycle among post-processing rules: {names}")
+            nxt = ready[0]
+            ordered.append(nxt)
+            done[nxt.name] = True
+            pending.remove(nxt)
+
+        stages: List[List[Rule]] = []
+        for r in ordered:
+            if r.scope == QUESTION and stages and stages[-1][0].scope == QUESTION:
+                stages[-1].append(r)
+            else:
+                stages.append([r])
+        self._plan = stages
+        return stages
+
+    def run(self, ctx: PostProcessContext) -> Dict[str, Dict[str, Any]]:
+        """Apply every rule; returns ``{rule: {"scope", "changes", "seconds"}}``."""
+        stats: Dict[str, Dict[str, Any]] = {
+            r.name: {"scope": r.scope, "changes": 0, "seconds": 0.0} for r in self.rules
+        }
+        clock = time.perf_counter
+
+        for stage in self.plan():
+            if stage[0].scope == SURVEY:
+                r = stage[0]
+                t0 = clock()
+                changed = r.fn(ctx) or 0
+                stats[r.name]["seconds"] += clock() - t0
+                stats[r.name]["changes"] += int(changed)
+                continue
+
+            for q in ctx.questions:
+                for r in stage:
+                    t0 = clock()
+                    changed = r.fn(q, ctx)
+                    stats[r.name]["seconds"] += clock() - t0
+                    if changed:
+                        stats[r.name]["changes"] += 1
+
+        for s in stats.values():
+            s["seconds"] = round(s["seconds"], 6)
+        return stats
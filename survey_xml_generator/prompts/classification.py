@@ -269,16 +269,125 @@ Here are the segmented question blocks:
 
 {blocks_json}
 
-Here is the context about conditions already identified from the document:
+Here is the context about conditions already identified from the document. Conditions listed here are defined once for the whole survey: reference them by label instead of defining new conditions for the same logic, and only add condition definitions for logic that is not listed.
 
 {conditions_context}
 
 Return ONLY the JSON object with "conditions" and "questions" arrays. No explanation, no markdown code fences."""
 
 
-def build_classification_prompt(blocks_json: str, conditions_context: str = "None identified yet.") -> str:
-    """Build the user prompt with segmented blocks inserted."""
-    return USER_PROMPT_TEMPLATE.format(
+COMPACT_USER_PROMPT_TEMPLATE = """Classify each question block below into Forsta XML format. Also generate any condition definitions needed for branching/termination logic.
+
+Answer in the COMPACT schema: short keys, and leave out every key whose value would be null, false, 0, "" or an empty list.
+
+Return a JSON object with two arrays:
+
+1. **"c"**: Condition definitions as [label, cond, description] arrays
+   [["US_Respondent", "(qCountry.match=United States)", "United States Respondent"]]
+
+2. **"q"**: Classified question objects with these keys:
+   t = forsta_type, l = label, ti = title, cm = comment, c = cond,
+   sh = shuffle, m = is_matrix, a = answers, mr = matrix_rows, mc = matrix_cols,
+   sp = special_handling, v = verify, sz = size, o = optional,
+   al = atleast, am = atmost, ct = content,
+   ys / ye = year_start / year_end, rs / re = range_start / range_end,
+   fl / cl = floor_label / ceiling_label, w / h = width / height,
+   rw = rows (the input rows of a multi-row text or number question),
+   vl = values (the radio's values attribute)
+
+   Answers, matrix rows, matrix columns and input rows are [label, text] arrays,
+   with an optional third element of flags: x = exclusive, a = anchored (randomize="0"),
+   o = open-end, p = open-end optional.  E.g. ["r6", "None of the above", "xa"],
+   ["r5", "Other (please specify)", "ao"].
+   An optional fourth element holds per-option attributes with these keys:
+   c = cond (show the option only when it is true), v = value (a matrix column's
+   scale value), vf = verify, o = optional.  Use "" for the flags when there are
+   none.  E.g. ["r3", "Kids club", "", {{"c": "(qChildren.r1)"}}], ["c1", "Strongly agree", "", {{"v": 5}}],
+   ["r2", "International", "", {{"vf": "range(0,99999)", "o": 1}}].
+
+   ```json
+   [
+     {{"t": "radio", "l": "qWarmWeatherImportance", "ti": "When you pick your vacation destinations, how important is it...", "cm": "Select one.",
+       "a": [["r1", "Very important"], ["r2", "Important"], ["r3", "Neutral"], ["r4", "Unimportant"], ["r5", "Very unimportant"]]}},
+     {{"t": "select", "l": "qAge", "ti": "In what year were you born?", "cm": "Select one.", "sp": "year_range", "ys": 2008, "ye": 1920}},
+     {{"t": "select", "l": "qHouseholdSize", "ti": "How many people live in your household?", "cm": "Select one.",
+       "sp": "numeric_range", "rs": 1, "re": 10, "cl": "10 or more"}},
+     {{"t": "select", "l": "qCountry", "ti": "In what country do you currently reside?", "cm": "Select one.", "sp": "countries"}},
+     {{"t": "checkbox", "l": "qActivities", "ti": "Which of these have you done? Select all that apply.", "cm": "Select all that apply.", "sh": true,
+       "a": [["r1", "Hiking"], ["r2", "Golf"], ["r3", "Other (please specify)", "ao"], ["r4", "None of these", "xa"]]}},
+     {{"t": "radio", "l": "qArizonaAgreement", "ti": "How much do you agree with the following statements?", "cm": "Select one per row.", "sh": true, "m": true,
+       "mr": [["r1", "An Arizona vacation is a perfect fit for travelers like me."], ["r2", "It is important that I travel in a manner that protects the environment."]],
+       "mc": [["c1", "Strongly agree"], ["c2", "Agree"], ["c3", "Neutral"], ["c4", "Disagree"], ["c5", "Strongly disagree"]]}},
+     {{"t": "html", "l": "textIntro", "ct": "Thank you for your help with this survey..."}},
+     {{"t": "suspend"}},
+     {{"t": "term", "l": "termUnder18", "c": "(qAge.match=2008)", "ct": "Under 18"}},
+     {{"t": "term", "l": "termItaly", "c": "(qCountry.match=Italy)", "ct": "Italy"}}
+   ]
+   ```
+
+For pagebreaks, output: {{"t": "suspend"}}
+For text screens, use t "html".
+For terminations, use t "term" with the proper cond expression in "c".
+
+Here are the segmented question blocks:
+
+{blocks_json}
+
+Here is the context about conditions already identified from the document. Conditions listed here are defined once for the whole survey: reference them by label instead of defining new conditions for the same logic, and only add condition definitions for logic that is not listed.
+
+{conditions_context}
+
+Return ONLY the JSON object with "c" and "q" arrays. No explanation, no markdown code fences."""
+
+
+def build_classification_prompt(
+    blocks_json: str,
+    conditions_context: str = "None identified yet.",
+    compact: bool = False,
+) -> str:
+    """Build the user prompt with segmented blocks inserted.
+
+    ``compact`` asks for the short-key schema expanded by
+    ``compact_schema.expand_response``.
+    """
+    template = COMPACT_USER_PROMPT_TEMPLATE if compact else USER_PROMPT_TEMPLATE
+    return template.format(
         blocks_json=blocks_json,
         conditions_context=conditions_context,
     )
+
+
+CONDITIONS_SYSTEM_PROMPT = """You convert questionnaire logic lines into Forsta/Decipher condition expressions.
+
+You will receive a list of raw logic lines (e.g. "IF QCOUNTRY == UNITED STATES", "TERM IF UNDER 18") and a summary of the survey's questions (label, title, whether it is a dropdown, answer list, modifiers).
+
+Expression syntax:
+- Radio/checkbox rows: (qLabel.rN), where N is the 1-based position in the answer list
+- Select/dropdown questions: (qLabel.match=Value Text) -- never guess chN indices
+- Number questions: (qLabel.check('0')), (qLabel.check('<45')), (qLabel.check('0-32'))
+- Combine with "and" / "or"; negate with not(...)
+
+Condition labels use Descriptive_With_Underscores (US_Respondent, Under_18).
+If a line cannot be expressed with the questions given, leave it out."""
+
+
+CONDITIONS_USER_PROMPT_TEMPLATE = """Convert each logic line below.
+
+Logic lines:
+{raw_json}
+
+Questions:
+{questions_json}
+
+Return a JSON object:
+{{"conditions": [{{"id": 0, "label": "Under_18", "cond": "(qAge.match=2008)"}}]}}
+
+Use the "id" of each line. No explanation, no markdown code fences."""
+
+
+def build_conditions_prompt(raw_json: str, questions_json: str) -> str:
+    """Build the user prompt for the condition pre-pass fallback."""
+    return CONDITIONS_USER_PROMPT_TEMPLATE.format(
+        raw_json=raw_json,
+        questions_json=questions_json,
+    )
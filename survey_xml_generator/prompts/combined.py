@@ -0,0 +1,90 @@
+"""Prompts for the combined Stage 2+3 call used on small documents.
+
+A short document is segmented and classified in one round trip instead
+of two.  The block schemas and rules are taken from the segmentation and
+classification prompts, so the combined call stays in step with the
+two-stage path when either prompt is edited.
+"""
+
+from . import classification, segmentation
+
+
+def _section(template: str, start: str, end: str) -> str:
+    """The part of a prompt template from ``start`` up to ``end``."""
+    _, found, rest = template.partition(start)
+    body, found_end, _ = rest.partition(end)
+    if not found or not found_end:
+        raise ValueError(f"Prompt section {start!r} .. {end!r} not found")
+    return (start + body).rstrip()
+
+
+SYSTEM_PROMPT = (
+    segmentation.SYSTEM_PROMPT
+    + "\n\nIn the same answer you then classify the segments you produced. "
+    "For that step you work as follows.\n\n"
+    + classification.SYSTEM_PROMPT
+)
+
+_SEGMENTS_SCHEMA = _section(
+    segmentation.USER_PROMPT_TEMPLATE,
+    "Return a JSON array where each element",
+    "Here are the extracted document blocks:",
+)
+
+_CLASSIFICATION_SCHEMA = {
+    False: _section(
+        classification.USER_PROMPT_TEMPLATE,
+        "Return a JSON object with two arrays:",
+        "Here are the segmented question blocks:",
+    ),
+    True: _section(
+        classification.COMPACT_USER_PROMPT_TEMPLATE,
+        "Answer in the COMPACT schema",
+        "Here are the segmented question blocks:",
+    ),
+}
+
+_RESPONSE_SHAPE = {
+    False: '{{"segments": [ ... ], "conditions": [ ... ], "questions": [ ... ]}}',
+    True: '{{"segments": [ ... ], "c": [ ... ], "q": [ ... ]}}',
+}
+
+_TEMPLATE = """Segment the following extracted document blocks into logical survey components, then classify every question, text_screen and term segment into Forsta XML format, in one answer.
+
+STEP 1 -- SEGMENTATION.
+
+{segments_schema}
+
+STEP 2 -- CLASSIFICATION. Classify the segments from step 1, not the raw blocks. Each classified question keeps the label of the segment it comes from, and questions are listed in document order. Also generate any condition definitions needed for branching/termination logic.
+
+{classification_schema}
+
+Here are the extracted document blocks:
+
+{{blocks_json}}
+
+Return ONE JSON object with the "segments" array from step 1 and the two arrays from step 2:
+{response_shape}
+
+No explanation, no markdown code fences -- only the JSON object."""
+
+USER_PROMPT_TEMPLATE = _TEMPLATE.format(
+    segments_schema=_SEGMENTS_SCHEMA,
+    classification_schema=_CLASSIFICATION_SCHEMA[False],
+    response_shape=_RESPONSE_SHAPE[False],
+)
+COMPACT_USER_PROMPT_TEMPLATE = _TEMPLATE.format(
+    segments_schema=_SEGMENTS_SCHEMA,
+    classification_schema=_CLASSIFICATION_SCHEMA[True],
+    response_shape=_RESPONSE_SHAPE[True],
+)
+
+
+def build_combined_prompt(blocks_json: str, compact: bool = False) -> str:
+    """Build the user prompt with the extracted blocks inserted.
+
+    ``compact`` asks for the short-key classification schema expanded by
+    ``compact_schema.expand_response``.
+    """
+    template = COMPACT_USER_PROMPT_TEMPLATE if compact else USER_PROMPT_TEMPLATE
+    return template.format(blocks_json=blocks_json)
@@ -0,0 +1,474 @@
+"""Local library of classified questions, reused across surveys.
+
+The same screeners and demographics come back in study after study, and
+each time Stage 3 would send them to the model again.  Every question the
+AI classifies is stored here (SQLite, ``QUESTION_LIBRARY_PATH``) with the
+segment it came from.  Segments are indexed by MinHash signatures over
+their word 3-grams in an LSH table (``_BANDS`` bands of ``_ROWS`` rows), so
+finding near-identical segments costs a few bucket lookups, not a scan of
+the library.
+
+On a new run, :meth:`QuestionLibrary.lookup` returns, for each segment,
+the stored classification of the most similar segment whose exact
+Jaccard similarity reaches ``QUESTION_LIBRARY_THRESHOLD`` and whose shape
+(type, number of answers, matrix rows/scale, modifiers) is the same.
+Only the structure is reused: the title, comment, content and answer
+texts are re-applied from the new segment (:func:`retext_question`), and
+a stored question whose text the new segment's edits can't be carried
+into is not a match -- the segment goes to the AI instead.
+Condition and termination logic is document-specific, so it is never
+stored: the classifier only asks the library about segments whose
+conditions the pre-pass resolved, and only stores questions without
+row-level conditions.
+
+Admin commands::
+
+    python -m survey_xml_generator.question_library stats
+    python -m survey_xml_generator.question_library rebuild
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .config import QUESTION_LIBRARY, QUESTION_LIBRARY_PATH, QUESTION_LIBRARY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Segment keys that carry logic or position rather than question content
+_NOT_CONTENT = frozenset({
+    "label", "paragraph_indices", "conditions", "termination_conditions", "answer_terminations",
+})
+_SHAPE_LISTS = ("answer_lines", "matrix_statements", "matrix_scale")
+
+_NUM_PERM = 128
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+_SEED = 20240601
+_PRIME = (1 << 61) - 1
+# Bump when the normalisation or hashing changes; stored indexes are
+# rebuilt on open when it differs.
+_INDEX_VERSION = f"1:{_NUM_PERM}:{_BANDS}:{_SEED}"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_QUESTION_NUMBER_RE = re.compile(r"^\s*[A-Za-z]{0,3}\d+[a-z]?[.):]\s+")
+_MODIFIER_RE = re.compile(r"\s*\[[^\]]*\]")
+
+# Segment text -> classified question text carried over by retext_question:
+# (question key, segment key) for single texts, and for lists of options
+# whose ``text`` follows the segment's lines one to one
+_TEXT_FIELDS = (("title", "title_text"), ("comment", "instruction_text"), ("content", "content"))
+_OPTION_FIELDS = (("answers", "answer_lines"), ("matrix_rows", "matrix_statements"), ("matrix_cols", "matrix_scale"))
+_RETEXT_KEYS = frozenset(k for _, k in _TEXT_FIELDS + _OPTION_FIELDS)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    shape TEXT NOT NULL,
+    text TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    question TEXT NOT NULL,
+    model TEXT NOT NULL DEFAULT '',
+    hits INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lsh (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    entry INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_bucket ON lsh (band, bucket);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+# ---------------------------------------------------------------------------
+# Segment text, shingles and signatures
+# ---------------------------------------------------------------------------
+
+
+def _strings(value: Any) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for k in sorted(value):
+            yield str(k)
+            yield from _strings(value[k])
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+    elif value is not None and not isinstance(value, bool):
+        yield str(value)
+
+
+def segment_text(seg: Dict[str, Any]) -> str:
+    """Normalised content of a segment: lower-case word tokens, without
+    the leading question number, label, logic and paragraph positions."""
+    parts = []
+    for key in sorted(seg):
+        if key in _NOT_CONTENT:
+            continue
+        value = seg[key]
+        if key == "title_text" and isinstance(value, str):
+            value = _QUESTION_NUMBER_RE.sub("", value)
+        parts.extend(_strings(value))
+    return " ".join(_TOKEN_RE.findall(" ".join(parts).lower()))
+
+
+def segment_shape(seg: Dict[str, Any]) -> str:
+    """What must match exactly for a classification to carry over."""
+    shape = [seg.get("block_type", ""), bool(seg.get("is_matrix"))]
+    shape += [len(seg.get(key) or ()) for key in _SHAPE_LISTS]
+    shape.append(sorted(str(m).upper() for m in seg.get("inline_modifiers") or ()))
+    return json.dumps(shape, separators=(",", ":"))
+
+
+def shingles(text: str) -> Set[str]:
+    """Word 3-grams (the whole text when it has fewer than three words)."""
+    words = text.split()
+    if len(words) < 3:
+        return {text} if text else set()
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _same(a: Any, b: Any) -> bool:
+    """Equal up to whitespace (and a leading question number)."""
+    return _plain(a) == _plain(b)
+
+
+def _plain(value: Any) -> str:
+    return " ".join(_QUESTION_NUMBER_RE.sub("", str(value or "")).split())
+
+
+def _cleaned(value: Any) -> str:
+    """Segment text as the classifier emits it: no question number, no
+    ``[MODIFIER]`` brackets, single spaces."""
+    return " ".join(_MODIFIER_RE.sub("", _QUESTION_NUMBER_RE.sub("", str(value or ""))).split())
+
+
+def _modifiers(value: Any) -> List[str]:
+    return sorted(" ".join(m.upper().split()) for m in _MODIFIER_RE.findall(str(value or "")))
+
+
+def _carry(old: Any, new: Any, emitted: Any) -> Tuple[bool, Any]:
+    """``(ok, text)`` for one emitted text when its source went from
+    ``old`` to ``new``: unchanged sources keep the emitted text, and a
+    changed one can only be carried when its ``[MODIFIER]`` brackets are
+    the same and the emitted text was the source text cleaned."""
+    if _same(old, new):
+        return True, emitted
+    if _modifiers(old) != _modifiers(new):
+        return False, None
+    if emitted is not None and " ".join(str(emitted).split()) == _cleaned(old):
+        return True, _cleaned(new)
+    return False, None
+
+
+def _other_content(seg: Dict[str, Any]) -> str:
+    """Segment content that :func:`retext_question` does not re-apply."""
+    return json.dumps(
+        {k: v for k, v in seg.items() if k not in _NOT_CONTENT and k not in _RETEXT_KEYS},
+        sort_keys=True, default=str,
+    )
+
+
+def retext_question(
+    stored_segment: Dict[str, Any],
+    question: Dict[str, Any],
+    segment: Dict[str, Any],
+) -> Optional[Dict[str, Any]]:
+    """The stored ``question`` with ``segment``'s texts in place of
+    ``stored_segment``'s, or None when an edit can't be carried over.
+
+    Title, comment, content and option texts are re-applied where the
+    stored classification shows how they were derived from the segment;
+    any other content difference (e.g. ``answer_modifiers``) rules the
+    match out, as does a changed text the AI had rewritten.
+    """
+    if _other_content(stored_segment) != _other_content(segment):
+        return None
+
+    q = json.loads(json.dumps(question))
+    for q_key, seg_key in _TEXT_FIELDS:
+        ok, text = _carry(stored_segment.get(seg_key), segment.get(seg_key), q.get(q_key))
+        if not ok:
+            return None
+        if q_key in q or text is not None:
+            q[q_key] = text
+
+    for q_key, seg_key in _OPTION_FIELDS:
+        old_lines = stored_segment.get(seg_key) or []
+        new_lines = segment.get(seg_key) or []
+        if len(old_lines) != len(new_lines):
+            return None
+        if all(_same(a, b) for a, b in zip(old_lines, new_lines)):
+            continue
+        options = q.get(q_key) or []
+        if len(options) != len(new_lines) or not all(isinstance(o, dict) for o in options):
+            return None
+        for option, old, new in zip(options, old_lines, new_lines):
+            ok, text = _carry(old, new, option.get("text"))
+            if not ok:
+                return None
+            option["text"] = text
+    return q
+
+
+class _MinHasher:
+    """``_NUM_PERM`` universal hashes ``(a*x + b) mod p`` over 32-bit shingle
+    hashes; ``a``/``b`` stay below 2**31 so the products fit in uint64."""
+
+    def __init__(self):
+        rng = np.random.default_rng(_SEED)
+        self.a = rng.integers(1, 1 << 31, _NUM_PERM, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, 1 << 31, _NUM_PERM, dtype=np.uint64)[:, None]
+
+    def signature(self, grams: Set[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little")
+             for g in grams),
+            dtype=np.uint64, count=len(grams),
+        )
+        return ((self.a * hashes[None, :] + self.b) % _PRIME).min(axis=1)
+
+    @staticmethod
+    def buckets(signature: np.ndarray) -> List[int]:
+        """One signed 64-bit bucket id per band (SQLite INTEGER range)."""
+        return [
+            int.from_bytes(
+                hashlib.blake2b(signature[i * _ROWS:(i + 1) * _ROWS].tobytes(), digest_size=8).digest(),
+                "little", signed=True,
+            )
+            for i in range(_BANDS)
+        ]
+
+
+_HASHER = _MinHasher()
+
+
+# ---------------------------------------------------------------------------
+# Library
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class LibraryMatch:
+    entry: int
+    similarity: float
+    question: Dict[str, Any]  # with the looked-up segment's texts
+    hits: int
+
+
+class QuestionLibrary:
+    """SQLite-backed question library with a MinHash LSH index.
+
+    A connection is opened per call, so one instance can be shared by the
+    threads of concurrent pipeline runs.
+
+    Args:
+        path: SQLite file (created on first use).
+        threshold: Minimum Jaccard similarity of the segments' word
+            3-grams for a stored classification to be reused.
+    """
+
+    def __init__(self, path: str, threshold: float = QUESTION_LIBRARY_THRESHOLD):
+        self.path = str(path)
+        self.threshold = threshold
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            row = conn.execute("SELECT value FROM meta WHERE name = 'index'").fetchone()
+        if row is None or row[0] != _INDEX_VERSION:
+            if row is not None:
+                logger.info(f"Question library index {row[0]} is out of date; rebuilding")
+            self.rebuild()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, segments: Sequence[Dict[str, Any]]) -> List[Optional[LibraryMatch]]:
+        """Best stored match per segment (None when nothing is similar
+        enough, or no similar entry takes the segment's texts).
+
+        Each match counts as a hit on its entry.
+        """
+        results: List[Optional[LibraryMatch]] = []
+        with self._connect() as conn:
+            for seg in segments:
+                results.append(self._lookup_one(conn, seg))
+            hit_ids = [m.entry for m in results if m is not None]
+            conn.executemany("UPDATE entries SET hits = hits + 1 WHERE id = ?", [(i,) for i in hit_ids])
+        return results
+
+    def _lookup_one(self, conn: sqlite3.Connection, seg: Dict[str, Any]) -> Optional[LibraryMatch]:
+        text = segment_text(seg)
+        grams = shingles(text)
+        if not grams:
+            return None
+        candidates: Set[int] = set()
+        for band, bucket in enumerate(_HASHER.buckets(_HASHER.signature(grams))):
+            candidates.update(
+                entry for (entry,) in conn.execute(
+                    "SELECT entry FROM lsh WHERE band = ? AND bucket = ?", (band, bucket),
+                )
+            )
+        if not candidates:
+            return None
+        shape = segment_shape(seg)
+        placeholders = ",".join("?" * len(candidates))
+        rows = conn.execute(
+            f"SELECT id, shape, text, segment, question, hits FROM entries WHERE id IN ({placeholders})",
+            tuple(candidates),
+        )
+        similar = []
+        for entry, entry_shape, entry_text, segment, question, hits in rows:
+            if entry_shape != shape:
+                continue
+            similarity = jaccard(grams, shingles(entry_text))
+            if similarity >= self.threshold:
+                similar.append((similarity, entry, segment, question, hits))
+        for similarity, entry, segment, question, hits in sorted(similar, key=lambda m: (-m[0], m[1])):
+            q = retext_question(json.loads(segment), json.loads(question), seg)
+            if q is not None:
+                return LibraryMatch(entry, similarity, q, hits + 1)
+        return None
+
+    def add(self, pairs: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]], model: str = "") -> int:
+        """Store ``(segment, question)`` pairs; returns how many were new.
+
+        A segment already in the library (same normalised text and shape)
+        keeps its hit count and takes the newer classification.
+        """
+        added = 0
+        now = time.time()
+        with self._connect() as conn:
+            for seg, question in pairs:
+                text = segment_text(seg)
+                grams = shingles(text)
+                if not grams:
+                    continue
+                shape = segment_shape(seg)
+                key = hashlib.sha1(f"{shape}\n{text}".encode("utf-8")).hexdigest()
+                stored = json.dumps(question, separators=(",", ":"), default=str)
+                row = conn.execute("SELECT id FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE entries SET question = ?, model = ?, updated = ? WHERE id = ?",
+                        (stored, model, now, row[0]),
+                    )
+                    continue
+                cur = conn.execute(
+                    "INSERT INTO entries (key, shape, text, segment, question, model, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, shape, text, json.dumps(seg, separators=(",", ":"), default=str),
+                     stored, model, now),
+                )
+                self._index(conn, cur.lastrowid, grams)
+                added += 1
+        return added
+
+    @staticmethod
+    def _index(conn: sqlite3.Connection, entry: int, grams: Set[str]) -> None:
+        conn.executemany(
+            "INSERT INTO lsh (band, bucket, entry) VALUES (?, ?, ?)",
+            [(band, bucket, entry) for band, bucket in enumerate(_HASHER.buckets(_HASHER.signature(grams)))],
+        )
+
+    def rebuild(self) -> int:
+        """Recompute every entry's text, shape and LSH buckets from its
+        stored segment; returns the number of entries indexed."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM lsh")
+            entries = conn.execute("SELECT id, segment FROM entries").fetchall()
+            for entry, segment in entries:
+                seg = json.loads(segment)
+                text = segment_text(seg)
+                conn.execute(
+                    "UPDATE entries SET text = ?, shape = ? WHERE id = ?",
+                    (text, segment_shape(seg), entry),
+                )
+                self._index(conn, entry, shingles(text))
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('index', ?)", (_INDEX_VERSION,),
+            )
+        with self._connect() as conn:
+            conn.execute("VACUUM")
+        return len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            entries, hits, reused = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0), COUNT(NULLIF(hits, 0)) FROM entries"
+            ).fetchone()
+            top = conn.execute(
+                "SELECT json_extract(question, '$.label'), hits FROM entries "
+                "WHERE hits > 0 ORDER BY hits DESC LIMIT 10"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "hits": hits,
+            "entries_reused": reused,
+            "top": [{"label": label, "hits": n} for label, n in top],
+        }
+
+
+def open_library() -> Optional[QuestionLibrary]:
+    """The configured library, or None when ``QUESTION_LIBRARY`` is off or
+    the file cannot be opened (the pipeline then classifies as usual)."""
+    if not QUESTION_LIBRARY:
+        return None
+    try:
+        return QuestionLibrary(QUESTION_LIBRARY_PATH)
+    except sqlite3.Error as e:
+        logger.warning(f"Question library unavailable ({QUESTION_LIBRARY_PATH}): {e}")
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m survey_xml_generator.question_library",
+        description="Inspect or rebuild the local question library.",
+    )
+    parser.add_argument("command", choices=("stats", "rebuild"))
+    parser.add_argument("--path", default=QUESTION_LIBRARY_PATH, help="library file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    library = QuestionLibrary(args.path)
+    if args.command == "rebuild":
+        t0 = time.perf_counter()
+        n = library.rebuild()
+        print(f"Rebuilt the index for {n} entries in {time.perf_counter() - t0:.2f}s")
+    print(json.dumps(library.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -12,55 +12,82 @@ from __future__ import annotations
 import json
 import logging
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, List, Optional
+from concurrent.futures import as_completed
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple, Union
 
 from .ai_client import call_ai
+from .block_store import BlockSelection, BlockStore, as_block_store
+from .chunk_planner import block_cost, fixed_cost, plan_chunks, submission_order
 from .config import (
     OPENAI_MODEL,
     SEGMENTATION_CHUNK_SIZE,
     SEGMENTATION_CHUNK_OVERLAP,
 )
-from .prompts.segmentation import SYSTEM_PROMPT, build_segmentation_prompt
+from .prompts.segmentation import (
+    SYSTEM_PROMPT,
+    USER_PROMPT_TEMPLATE,
+    build_segmentation_prompt,
+)
 
 logger = logging.getLogger(__name__)
 
+# Per-call cost of a segmentation chunk regardless of its contents
+_CHUNK_FIXED_COST = fixed_cost(SYSTEM_PROMPT, USER_PROMPT_TEMPLATE)
+
 
 # ---------------------------------------------------------------------------
 # Chunking helpers
 # ---------------------------------------------------------------------------
 
 def _chunk_blocks(
-    blocks: List[dict],
+    blocks: Sequence,
     chunk_size: int = SEGMENTATION_CHUNK_SIZE,
     overlap: int = SEGMENTATION_CHUNK_OVERLAP,
-) -> List[List[dict]]:
+    workers: Optional[int] = None,
+) -> List[Sequence]:
     """Split blocks into overlapping chunks for AI processing.
 
     Overlap ensures that a question block sitting right at a boundary
-    isn't sliced in half.
+    isn't sliced in half.  Slicing a ``BlockSelection`` yields views, so
+    chunks share the underlying store instead of copying blocks.
+
+    Chunk boundaries are balanced by estimated cost rather than block
+    count, so a run of long matrix tables doesn't land in one oversized
+    chunk.  When workers would otherwise sit idle, the blocks may be
+    spread over a few more chunks, as long as each stays well above the
+    overlap it re-sends.
     """
     if len(blocks) <= chunk_size:
         return [blocks]
 
-    chunks = []
-    start = 0
-    while start < len(blocks):
-        end = min(start + chunk_size, len(blocks))
-        chunks.append(blocks[start:end])
-        # Advance by (chunk_size - overlap) so the tail of one chunk
-        # overlaps with the head of the next
-        start += chunk_size - overlap
-        if start >= len(blocks):
-            break
+    if workers is None:
+        from .ai_client import get_scheduler
+        workers = get_scheduler().max_concurrency
+
+    ranges = plan_chunks(
+        [block_cost(b) for b in blocks],
+        workers=workers,
+        max_items=chunk_size,
+        base_cost=_CHUNK_FIXED_COST,
+        overlap=overlap,
+        min_items=2 * overlap,
+    )
+    chunks = [blocks[start:end] for start, end in ranges]
 
     logger.info(
         f"Split {len(blocks)} blocks into {len(chunks)} chunks "
-        f"(size={chunk_size}, overlap={overlap})"
+        f"(size<={chunk_size}, overlap={overlap}, "
+        f"sizes={[len(c) for c in chunks]})"
     )
     return chunks
 
 
+def _chunk_cost(chunk: Sequence) -> float:
+    """Estimated cost of sending one chunk through segmentation."""
+    return _CHUNK_FIXED_COST + sum(block_cost(b) for b in chunk)
+
+
 # ---------------------------------------------------------------------------
 # Deduplication for overlapping chunks
 # ---------------------------------------------------------------------------
@@ -188,7 +215,7 @@ _Q_LABEL_RE = re.compile(
 )
 
 
-def _detect_question_labels(blocks: List[dict]) -> List[dict]:
+def _detect_question_labels(blocks: Sequence) -> List[dict]:
     """Scan extracted blocks for ``Q. LABEL`` patterns and return metadata
     about each detected question (block index, raw label text, and the
     next block's text which is typically the question title).
@@ -229,7 +256,7 @@ def _label_to_camel(raw: str) -> str:
 
 def _reconcile_missing_questions(
     all_segments: List[dict],
-    blocks: List[dict],
+    blocks: Sequence,
 ) -> List[dict]:
     """Check that every ``Q. LABEL`` found in extracted blocks has a
     corresponding question segment.  Inject synthetic segments for any
@@ -239,6 +266,10 @@ def _reconcile_missing_questions(
     if not detected:
         return all_segments
 
+    # Blocks may be a subset of the document (incremental runs), so map
+    # paragraph indices to list positions instead of indexing directly.
+    pos_of = {b.get("index", i): i for i, b in enumerate(blocks)}
+
     covered_indices: set = set()
     for seg in all_segments:
         if seg.get("block_type") == "question":
@@ -259,13 +290,14 @@ def _reconcile_missing_questions(
         label = _label_to_camel(det["raw_label"])
         title = det["title_text"]
 
-        scan_start = idx + 1
+        pos = pos_of.get(idx, idx)
+        scan_start = pos + 1
         answer_lines = []
         paragraph_indices = [idx]
         condition_block = None
 
-        if idx > 0:
-            prev = blocks[idx - 1] if idx - 1 < len(blocks) else None
+        if pos > 0:
+            prev = blocks[pos - 1] if pos - 1 < len(blocks) else None
             if prev and (prev.get("text") or "").strip().startswith("[IF"):
                 condition_block = (prev.get("text") or "").strip()
 
@@ -312,12 +344,106 @@ def _reconcile_missing_questions(
     return all_segments
 
 
+# ---------------------------------------------------------------------------
+# Deterministic pre- and post-processing around the AI calls
+# ---------------------------------------------------------------------------
+
+@dataclass
+class PreparedBlocks:
+    """Blocks ready for segmentation, with the parts handled without the AI."""
+    blocks: BlockSelection
+    content_blocks: BlockSelection
+    pagebreak_indices: List[int] = field(default_factory=list)
+    block_markers: List[Tuple[int, str, str]] = field(default_factory=list)
+
+
+def prepare_blocks(blocks: Union[List[dict], BlockStore, BlockSelection]) -> PreparedBlocks:
+    """Drop empty blocks and pull out pagebreaks and block markers.
+
+    Pagebreaks are handled deterministically and not sent to the AI.
+    Block markers are recorded for deterministic injection but KEPT in the
+    AI input so the model has section-boundary context for segmentation.
+    """
+    # Work on zero-copy views over the compact block store
+    selection = as_block_store(blocks)
+    store = selection.store
+
+    # Filter out completely empty blocks (shouldn't happen, but be safe)
+    blocks = store.select([p for p in selection.positions if store.has_content(p)])
+
+    prepared = PreparedBlocks(blocks=blocks, content_blocks=blocks)
+    content_positions = []
+    for pos in blocks.positions:
+        bt = store.block_type(pos)
+        if bt == "pagebreak":
+            prepared.pagebreak_indices.append(store.index(pos))
+        else:
+            content_positions.append(pos)
+            if bt == "block_marker":
+                prepared.block_markers.append((
+                    store.index(pos),
+                    store.get_field(pos, "block_name", ""),
+                    store.text(pos),
+                ))
+    prepared.content_blocks = store.select(content_positions)
+
+    logger.info(
+        f"Separated {len(prepared.pagebreak_indices)} pagebreaks; "
+        f"recorded {len(prepared.block_markers)} block markers; "
+        f"sending {len(prepared.content_blocks)} content blocks to AI"
+    )
+    return prepared
+
+
+def finish_segments(all_segments: List[dict], prepared: PreparedBlocks) -> List[dict]:
+    """Turn the AI's segments into the final list, in document order.
+
+    Injects the pagebreaks and block markers pulled out by
+    :func:`prepare_blocks`, drops duplicates from overlapping chunks and
+    adds any ``Q. LABEL`` question the AI missed.
+    """
+    # Strip any AI-generated pagebreak/block_marker segments (we inject deterministically)
+    all_segments = [
+        s for s in all_segments
+        if s.get("block_type") not in ("pagebreak", "block_marker")
+    ]
+
+    # Inject deterministic pagebreak segments from the extractor
+    for idx in prepared.pagebreak_indices:
+        all_segments.append({
+            "block_type": "pagebreak",
+            "paragraph_indices": [idx],
+        })
+
+    # Inject deterministic block_marker segments from the extractor
+    for idx, block_name, original_text in prepared.block_markers:
+        seg = {
+            "block_type": "block_marker",
+            "marker_type": "block_start",
+            "block_name": block_name,
+            "paragraph_indices": [idx],
+        }
+        block_cond = _extract_block_condition(original_text)
+        if block_cond:
+            seg["block_condition"] = block_cond
+            logger.info(f"Block marker '{block_name}' has condition: {block_cond}")
+        all_segments.append(seg)
+
+    # Dedup overlapping segments and restore document order
+    all_segments = _dedup_segments(all_segments)
+
+    # Reconcile: ensure every Q. LABEL from the source has a segment
+    all_segments = _reconcile_missing_questions(all_segments, prepared.blocks)
+
+    return _sort_segments(all_segments)
+
+
 # ---------------------------------------------------------------------------
 # Main segmentation function
 # ---------------------------------------------------------------------------
 
 def segment_blocks(
-    blocks: List[dict],
+    blocks: Union[List[dict], BlockStore, BlockSelection],
     model: Optional[str] = None,
     chunk_size: Optional[int] = None,
     chunk_overlap: Optional[int] = None,
@@ -326,7 +452,8 @@ def segment_blocks(
     """Run AI segmentation on extracted document blocks.
 
     Args:
-        blocks: Raw extracted blocks from extractor.py
+        blocks: Raw extracted blocks from extractor.py -- a list of block
+            dicts, a ``BlockStore``, or a ``BlockSelection`` of one
         model: OpenAI model override (defaults to config)
         chunk_size: Override chunk size (defaults to config)
         chunk_overlap: Override overlap (defaults to config)
@@ -344,49 +471,24 @@ def segment_blocks(
         if progress_callback:
             progress_callback(msg)
 
-    # Filter out completely empty blocks (shouldn't happen, but be safe)
-    blocks = [b for b in blocks if b.get("text") or b.get("rows") or b.get("block_type") in ("pagebreak", "block_marker")]
-
-    # Pull pagebreak blocks out -- handled deterministically, not sent to AI.
-    # Block markers are recorded for deterministic injection but KEPT in the
-    # AI input so the model has section-boundary context for segmentation.
-    pagebreak_indices = []
-    block_markers = []  # list of (index, block_name, original_text)
-    content_blocks = []
-    for b in blocks:
-        bt = b.get("block_type")
-        if bt == "pagebreak":
-            pagebreak_indices.append(b.get("index", 0))
-        else:
-            content_blocks.append(b)
-            if bt == "block_marker":
-                block_markers.append((
-                    b.get("index", 0),
-                    b.get("block_name", ""),
-                    b.get("text", ""),
-                ))
-
-    logger.info(
-        f"Separated {len(pagebreak_indices)} pagebreaks; "
-        f"recorded {len(block_markers)} block markers; "
-        f"sending {len(content_blocks)} content blocks to AI"
-    )
+    prepared = prepare_blocks(blocks)
+    content_blocks = prepared.content_blocks
 
     _report(f"Segmenting {len(content_blocks)} blocks...")
 
-    # Split into chunks
-    chunks = _chunk_blocks(content_blocks, chunk_size=cs, overlap=co)
+    # Split into chunks (nothing to send when only pagebreaks remain)
+    chunks = _chunk_blocks(content_blocks, chunk_size=cs, overlap=co) if content_blocks else []
 
     all_segments: List[dict] = []
 
-    def _process_chunk(i: int, chunk: List[dict]) -> List[dict]:
+    def _process_chunk(i: int, chunk: BlockSelection) -> List[dict]:
         """Process a single chunk through the AI (thread-safe).
 
         Only uses the logger for progress inside worker threads;
         the Streamlit progress_callback is called from the main thread.
         """
         logger.info(f"Processing chunk {i + 1}/{len(chunks)} ({len(chunk)} blocks)...")
-        blocks_json = json.dumps(chunk, separators=(",", ":"), default=str)
+        blocks_json = chunk.to_prompt_json()
         user_prompt = build_segmentation_prompt(blocks_json)
         result = call_ai(
             system_prompt=SYSTEM_PROMPT,
@@ -398,64 +500,35 @@ def segment_blocks(
         logger.info(f"Chunk {i + 1} returned {len(segments)} segments")
         return segments
 
-    if len(chunks) == 1:
-        _report(f"Processing chunk 1/1 ({len(chunks[0])} blocks)...")
-        all_segments = _process_chunk(0, chunks[0])
-        _report(f"Chunk 1 returned {len(all_segments)} segments")
-    else:
-        max_workers = min(len(chunks), 5)
-        _report(f"Processing {len(chunks)} chunks in parallel (max_workers={max_workers})...")
-
-        from .ai_client import get_client
+    if chunks:
+        from .ai_client import ai_job, get_client, get_scheduler
         get_client()
 
+        if len(chunks) == 1:
+            _report(f"Processing chunk 1/1 ({len(chunks[0])} blocks)...")
+        else:
+            _report(f"Processing {len(chunks)} chunks via the AI scheduler...")
+
+        # Chunks go through the process-wide scheduler, which enforces the
+        # global concurrency limit and shares it fairly with other runs.
+        # When some chunks must queue, submit the most expensive first so
+        # none of them starts last and sets the tail; results are still
+        # merged in document order.
+        order = submission_order([_chunk_cost(c) for c in chunks], get_scheduler().max_concurrency)
         chunk_results: List[List[dict]] = [[] for _ in chunks]
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with ai_job("segmentation") as job:
             future_to_idx = {
-                executor.submit(_process_chunk, i, chunk): i
-                for i, chunk in enumerate(chunks)
+                job.submit(_process_chunk, i, chunks[i]): i
+                for i in order
             }
             for future in as_completed(future_to_idx):
                 idx = future_to_idx[future]
                 chunk_results[idx] = future.result()
-                _report(f"Chunk {idx + 1}/{len(chunks)} complete")
+                _report(f"Chunk {idx + 1}/{len(chunks)} complete ({len(chunk_results[idx])} segments)")
         for segments in chunk_results:
             all_segments.extend(segments)
 
-    # Strip any AI-generated pagebreak/block_marker segments (we inject deterministically)
-    all_segments = [
-        s for s in all_segments
-        if s.get("block_type") not in ("pagebreak", "block_marker")
-    ]
-
-    # Inject deterministic pagebreak segments from the extractor
-    for idx in pagebreak_indices:
-        all_segments.append({
-            "block_type": "pagebreak",
-            "paragraph_indices": [idx],
-        })
-
-    # Inject deterministic block_marker segments from the extractor
-    for idx, block_name, original_text in block_markers:
-        seg = {
-            "block_type": "block_marker",
-            "marker_type": "block_start",
-            "block_name": block_name,
-            "paragraph_indices": [idx],
-        }
-        block_cond = _extract_block_condition(original_text)
-        if block_cond:
-            seg["block_condition"] = block_cond
-            logger.info(f"Block marker '{block_name}' has condition: {block_cond}")
-        all_segments.append(seg)
-
-    # Dedup overlapping segments and restore document order
-    all_segments = _dedup_segments(all_segments)
-
-    # Reconcile: ensure every Q. LABEL from the source has a segment
-    all_segments = _reconcile_missing_questions(all_segments, blocks)
-
-    all_segments = _sort_segments(all_segments)
+    all_segments = finish_segments(all_segments, prepared)
 
     _report(f"Segmentation complete: {len(all_segments)} segments identified")
     return all_segments
@@ -471,9 +544,9 @@ def segment_from_file(
     progress_callback=None,
 ) -> List[dict]:
     """Extract and segment a .docx file in one call."""
-    from .extractor import extract_from_file
+    from .extractor import extract_store_from_file
 
-    blocks = extract_from_file(file_path)
+    blocks = extract_store_from_file(file_path)
     return segment_blocks(blocks, model=model, progress_callback=progress_callback)
 
 
@@ -0,0 +1,719 @@
+"""Survey logic simulator: run synthetic respondents through the XML.
+
+Branching, terms and block conditions can otherwise only be checked by
+uploading to Forsta and clicking through.  :class:`SurveyPlan` parses the
+assembled XML (or assembles classified dicts first) into an evaluation
+plan -- blocks, questions, html and terms in document order, with every
+``cond`` compiled to a function over NumPy arrays -- and
+:meth:`SurveyPlan.run` pushes N respondents through it at once:
+
+- answers are drawn per question as arrays (one row index per respondent
+  for radio/select, a boolean matrix for checkbox, a value grid for
+  matrices and numbers), honouring row conditions, exclusive rows and
+  ``atleast``/``atmost``;
+- a question, html or block is reached by respondents who are not yet
+  terminated and for whom every enclosing block ``cond`` and its own
+  ``cond`` hold, evaluated against the answers given so far;
+- a term terminates the respondents reaching it for whom its ``cond``
+  holds.
+
+The report gives reach rates per element, termination rates per term and
+the elements no respondent reached.  Answers are uniform at random, so
+rates describe the logic, not expected incidence.  Expressions the
+simulator cannot evaluate (``gv``/``p`` helpers, exec-computed values,
+unresolved ``match=`` placeholders, references to rows or questions that
+do not exist) make the element *approximate*: its display condition
+counts as true and a term condition as false, and the report says which
+reference could not be evaluated.
+
+Usage::
+
+    python -m survey_xml_generator.simulator survey.xml -n 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from lxml import etree
+
+from . import condition_expr as ce
+
+QUESTION_TAGS = ("radio", "checkbox", "select", "text", "textarea", "number", "float")
+
+_RANGE_RE = re.compile(r"range\(\s*(-?\d+)\s*,\s*(-?\d+)\s*\)")
+_DEFAULT_NUMBER_RANGE = (0, 100)
+
+Values = np.ndarray
+Evaluator = Callable[["_Answers"], Values]
+
+
+class _Unsupported(Exception):
+    """Part of an expression the simulator cannot evaluate."""
+
+
+# ---------------------------------------------------------------------------
+# Plan elements
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class _Question:
+    label: str
+    kind: str
+    rows: List[str] = field(default_factory=list)
+    cols: List[str] = field(default_factory=list)
+    row_conds: List[Optional[str]] = field(default_factory=list)
+    exclusive: List[bool] = field(default_factory=list)
+    atleast: int = 1
+    atmost: Optional[int] = None
+    number_range: Tuple[int, int] = _DEFAULT_NUMBER_RANGE
+    hidden: bool = False
+
+    @property
+    def is_grid(self) -> bool:
+        return bool(self.cols) and self.kind in ("radio", "checkbox")
+
+
+@dataclass
+class _Step:
+    """One element in document order; ``kind`` is a tag or ``end``."""
+
+    kind: str
+    label: str = ""
+    cond: Optional[Evaluator] = None
+    unsupported: List[str] = field(default_factory=list)
+    question: Optional[_Question] = None
+    row_conds: List[Optional[Evaluator]] = field(default_factory=list)
+
+
+@dataclass
+class ElementResult:
+    """Simulation outcome for one block, question, html or term."""
+
+    label: str
+    kind: str
+    reached: int
+    terminated: int = 0
+    unsupported: List[str] = field(default_factory=list)
+    hidden: bool = False
+
+    @property
+    def approximate(self) -> bool:
+        return bool(self.unsupported)
+
+
+@dataclass
+class SimulationReport:
+    respondents: int
+    completed: int
+    elements: List[ElementResult]
+    seconds: float = 0.0
+
+    def reach_rate(self, label: str) -> float:
+        return self._find(label).reached / self.respondents
+
+    def termination_rate(self, label: str) -> float:
+        return self._find(label).terminated / self.respondents
+
+    def _find(self, label: str) -> ElementResult:
+        for e in self.elements:
+            if e.label == label:
+                return e
+        raise KeyError(label)
+
+    @property
+    def unreachable(self) -> List[ElementResult]:
+        """Elements (terms included) that no respondent reached."""
+        return [e for e in self.elements if e.reached == 0]
+
+    @property
+    def approximate(self) -> List[ElementResult]:
+        return [e for e in self.elements if e.approximate]
+
+    def summary(self) -> str:
+        n = self.respondents
+        lines = [
+            f"{n} respondents, {self.completed / n:.1%} completed "
+            f"({self.seconds:.2f}s)",
+            "",
+            f"{'element':<32} {'kind':<9} {'reach':>7} {'term':>7}",
+        ]
+        for e in self.elements:
+            term = f"{e.terminated / n:>7.1%}" if e.kind == "term" else " " * 7
+            flags = (" ~" if e.approximate else "") + (" hidden" if e.hidden else "")
+            lines.append(f"{e.label:<32} {e.kind:<9} {e.reached / n:>7.1%} {term}{flags}")
+        if self.unreachable:
+            lines += ["", "Never reached: " + ", ".join(e.label for e in self.unreachable)]
+        if self.approximate:
+            lines += ["", "~ conditions the simulator could not evaluate:"]
+            lines += [f"  {e.label}: {'; '.join(e.unsupported)}" for e in self.approximate]
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        n = self.respondents
+        return {
+            "respondents": n,
+            "completion_rate": self.completed / n,
+            "elements": [
+                {
+                    "label": e.label,
+                    "kind": e.kind,
+                    "reach_rate": e.reached / n,
+                    **({"termination_rate": e.terminated / n} if e.kind == "term" else {}),
+                    **({"unsupported": e.unsupported} if e.unsupported else {}),
+                    **({"hidden": True} if e.hidden else {}),
+                }
+                for e in self.elements
+            ],
+            "unreachable": [e.label for e in self.unreachable],
+            "seconds": round(self.seconds, 3),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Answer state
+# ---------------------------------------------------------------------------
+
+
+class _Answers:
+    """Answers of all respondents so far, one array (or matrix) per question.
+
+    Missing answers: ``-1`` in index arrays, NaN in numbers, False in
+    boolean matrices.
+    """
+
+    def __init__(self, n: int, rng: np.random.Generator, questions: Iterable[_Question]):
+        self.n = n
+        self.rng = rng
+        self.answered: Dict[str, np.ndarray] = {}
+        self.index: Dict[str, np.ndarray] = {}     # radio/select: (n,)
+        self.selected: Dict[str, np.ndarray] = {}  # checkbox, text rows: (n, R)
+        self.grid: Dict[str, np.ndarray] = {}      # matrix radio (n, R) / checkbox (n, R, C)
+        self.number: Dict[str, np.ndarray] = {}    # (n,) or (n, R)
+        # Everything starts unanswered, so conditions on questions later in
+        # the survey (or never reached) evaluate against missing answers.
+        nobody = np.zeros(n, dtype=bool)
+        for q in questions:
+            self.answer(q, nobody, None)
+
+    def ones(self) -> np.ndarray:
+        return np.ones(self.n, dtype=bool)
+
+    def answer(self, q: _Question, reached: np.ndarray, avail: Optional[np.ndarray]) -> None:
+        """Draw answers for the ``reached`` respondents (others: missing).
+
+        ``avail`` is an ``(n, rows)`` mask of rows whose ``cond`` holds.
+        """
+        n, rng = self.n, self.rng
+        m = int(reached.sum())
+        if avail is not None:
+            avail = avail[reached]
+        answered = np.zeros(n, dtype=bool)
+
+        if q.kind in ("radio", "select") and not q.is_grid:
+            values = np.full(n, -1, dtype=np.int32)
+            if q.rows and m:
+                scores = rng.random((m, len(q.rows)))
+                if avail is not None:
+                    scores[~avail] = -1.0
+                picked = scores.argmax(axis=1)
+                ok = scores[np.arange(m), picked] >= 0
+                values[reached] = np.where(ok, picked, -1)
+            self.index[q.label] = values
+            answered = values >= 0
+
+        elif q.kind == "checkbox" and not q.is_grid:
+            sel = np.zeros((n, len(q.rows)), dtype=bool)
+            if q.rows and m:
+                sel[reached] = self._tick(q, m, avail)
+            self.selected[q.label] = sel
+            answered = sel.any(axis=1)
+
+        elif q.is_grid:
+            r, c = len(q.rows), len(q.cols)
+            if q.kind == "radio":
+                grid = np.full((n, r), -1, dtype=np.int32)
+                draws = rng.integers(0, c, size=(m, r))
+                if avail is not None:
+                    draws[~avail] = -1
+                grid[reached] = draws
+                answered = (grid >= 0).any(axis=1)
+            else:
+                grid = np.zeros((n, r, c), dtype=bool)
+                draws = rng.random((m, r, c)) < 0.5
+                if avail is not None:
+                    draws &= avail[:, :, None]
+                grid[reached] = draws
+                answered = grid.any(axis=(1, 2))
+            self.grid[q.label] = grid
+
+        elif q.kind in ("number", "float"):
+            low, high = q.number_range
+            shape = (n, len(q.rows)) if q.rows else (n,)
+            values = np.full(shape, np.nan)
+            values[reached] = rng.integers(low, high + 1, size=(m,) + shape[1:])
+            self.number[q.label] = values
+            answered = reached.copy()
+
+        else:  # text, textarea: only "was it answered" matters to conditions
+            if q.rows:
+                sel = np.zeros((n, len(q.rows)), dtype=bool)
+                sel[reached] = True
+                self.selected[q.label] = sel
+            answered = reached.copy()
+
+        self.answered[q.label] = answered
+
+    def _tick(self, q: _Question, m: int, avail: Optional[np.ndarray]) -> np.ndarray:
+        """Checkbox rows for ``m`` respondents: some non-exclusive rows, or
+        one exclusive row (with probability = share of exclusive rows)."""
+        rng = self.rng
+        r = len(q.rows)
+        excl = np.array(q.exclusive, dtype=bool)
+        avail = np.ones((m, r), dtype=bool) if avail is None else avail
+        scores = rng.random((m, r))
+
+        # k ~ uniform[atleast, atmost] rows, taken where the scores are highest
+        regular = avail & ~excl
+        n_regular = regular.sum(axis=1)
+        high = n_regular if q.atmost is None else np.minimum(n_regular, q.atmost)
+        low = np.minimum(max(q.atleast, 1), high)
+        k = rng.integers(low, high + 1)
+        masked = np.where(regular, scores, -1.0)
+        ordered = -np.sort(-masked, axis=1)
+        kth = ordered[np.arange(m), np.maximum(k - 1, 0)]
+        sel = regular & (masked >= kth[:, None]) & (k > 0)[:, None]
+
+        exclusive = avail & excl
+        n_exclusive = exclusive.sum(axis=1)
+        if n_exclusive.any():
+            share = n_exclusive / np.maximum(avail.sum(axis=1), 1)
+            take = (rng.random(m) < share) | (n_regular == 0)
+            pick = np.where(exclusive, scores, -1.0).argmax(axis=1)
+            only = np.zeros((m, r), dtype=bool)
+            only[np.arange(m), pick] = True
+            only &= exclusive
+            sel = np.where(take[:, None], only, sel)
+        return sel
+
+
+# ---------------------------------------------------------------------------
+# Condition compiler
+# ---------------------------------------------------------------------------
+
+
+def _truth(values: Values) -> np.ndarray:
+    if values.dtype == bool:
+        return values
+    if values.dtype.kind == "f":
+        return ~np.isnan(values) & (values != 0)
+    return values != 0
+
+
+def _as_number(values: Values) -> np.ndarray:
+    return values.astype(float) if values.dtype == bool else values
+
+
+def _literal_value(text: str) -> Union[float, str, list]:
+    try:
+        if text.startswith("["):
+            return list(ast.literal_eval(text))
+        if text[:1] in ("'", '"'):
+            return ast.literal_eval(text)
+        return float(text.replace(",", ""))
+    except (ValueError, SyntaxError):
+        raise _Unsupported(text)
+
+
+def _check_spec(args: str) -> Callable[[np.ndarray], np.ndarray]:
+    """``check('0-5,9')`` -> predicate over numeric values."""
+    try:
+        spec = ast.literal_eval(args)
+    except (ValueError, SyntaxError):
+        raise _Unsupported(args)
+    ranges: List[Tuple[float, float]] = []
+    for part in str(spec).replace(" ", "").split(","):
+        if not part:
+            continue
+        low, sep, high = part.partition("-")
+        try:
+            lo = float(low) if low else -np.inf
+            hi = (float(high) if high else np.inf) if sep else lo
+        except ValueError:
+            raise _Unsupported(args)
+        ranges.append((lo, hi))
+
+    def check(values: np.ndarray) -> np.ndarray:
+        hit = np.zeros(values.shape, dtype=bool)
+        for lo, hi in ranges:
+            hit |= (values >= lo) & (values <= hi)
+        return hit
+
+    return check
+
+
+_COMPARE = {
+    "==": np.equal, "=": np.equal, "!=": np.not_equal, "<>": np.not_equal,
+    "<": np.less, ">": np.greater, "<=": np.less_equal, ">=": np.greater_equal,
+}
+
+
+class _Compiler:
+    """Turns cond expressions into functions ``_Answers -> array``."""
+
+    def __init__(self, questions: Dict[str, _Question], definitions: Dict[str, str]):
+        self.questions = questions
+        self.definitions = definitions
+        self._conditions: Dict[str, Evaluator] = {}
+        self._compiling: Set[str] = set()
+
+    def compile(self, expr: Optional[str]) -> Tuple[Optional[Evaluator], Optional[str]]:
+        """``(evaluator, problem)``.
+
+        The evaluator is None for no condition (or ``1``) and for
+        expressions that cannot be evaluated; ``problem`` names the part
+        that could not be.
+        """
+        node = ce.parse(expr or "")
+        if ce.is_true(node) or (isinstance(node, ce.Raw) and not node.text):
+            return None, None
+        try:
+            fn = self._node(node)
+        except _Unsupported as e:
+            return None, str(e)
+        return (lambda a: _truth(fn(a))), None
+
+    def _node(self, node: ce.Node) -> Evaluator:
+        if isinstance(node, ce.Group):
+            return self._node(node.inner)
+        if isinstance(node, ce.Not):
+            inner = self._node(node.operand)
+            return lambda a: ~_truth(inner(a))
+        if isinstance(node, ce.BoolOp):
+            parts = [self._node(o) for o in node.operands]
+            if node.op == "and":
+                def conj(a):
+                    out = _truth(parts[0](a))
+                    for p in parts[1:]:
+                        out = out & _truth(p(a))
+                    return out
+                return conj
+
+            def disj(a):
+                out = _truth(parts[0](a))
+                for p in parts[1:]:
+                    out = out | _truth(p(a))
+                return out
+            return disj
+        if isinstance(node, ce.Compare):
+            return self._compare(node)
+        if isinstance(node, ce.Literal):
+            value = _literal_value(node.text)
+            if not isinstance(value, float):
+                raise _Unsupported(node.text)
+            return lambda a: np.full(a.n, value)
+        if isinstance(node, ce.Ref):
+            return self._ref(node)
+        raise _Unsupported(ce.to_string(node))  # Raw, Match
+
+    def _compare(self, node: ce.Compare) -> Evaluator:
+        left = self._node(node.left)
+        if node.op in ("in", "not in"):
+            if not isinstance(node.right, ce.Literal):
+                raise _Unsupported(ce.to_string(node))
+            items = _literal_value(node.right.text)
+            if not isinstance(items, list) or not all(isinstance(i, (int, float)) for i in items):
+                raise _Unsupported(ce.to_string(node))
+            negate = node.op == "not in"
+            return lambda a: np.isin(_as_number(left(a)), items) ^ negate
+        op = _COMPARE[node.op]
+        right = self._node(node.right)
+        return lambda a: op(_as_number(left(a)), _as_number(right(a)))
+
+    def _ref(self, ref: ce.Ref) -> Evaluator:
+        if ref.root in ("True", "False") and not ref.parts:
+            value = ref.root == "True"
+            return lambda a: np.full(a.n, value)
+        label = ref.condition
+        if label is not None:
+            return self._condition(label)
+        q = self.questions.get(ref.root)
+        if q is None:
+            raise _Unsupported(f"no question '{ref.root}'")
+
+        names = [p[1:] for p in ref.parts if p.startswith(".")]
+        calls = [p for p in ref.parts if p.startswith("(")]
+        if len(names) + len(calls) != len(ref.parts):
+            raise _Unsupported(ce.to_string(ref))
+        return self._question_ref(q, names, calls)
+
+    def _condition(self, label: str) -> Evaluator:
+        fn = self._conditions.get(label)
+        if fn is not None:
+            return fn
+        expr = self.definitions.get(label)
+        if expr is None:
+            raise _Unsupported(f"no condition '{label}'")
+        if label in self._compiling:
+            raise _Unsupported(f"condition.{label} refers to itself")
+        self._compiling.add(label)
+        try:
+            fn = self._node(ce.parse(expr))
+        finally:
+            self._compiling.discard(label)
+        self._conditions[label] = fn
+        return fn
+
+    def _question_ref(self, q: _Question, names: List[str], calls: List[str]) -> Evaluator:
+        label = q.label
+        if not names:
+            return lambda a: a.answered[label]
+
+        first, rest = names[0], names[1:]
+        if first in ("any", "displayed") and not rest:
+            return lambda a: a.answered[label]
+        if first == "count" and not rest:
+            return self._count(q)
+        if first in ("val", "ival") and not rest:
+            return self._value(q)
+        if first == "check" and not rest and len(calls) == 1:
+            value, check = self._value(q), _check_spec(calls[0][1:-1])
+            return lambda a: check(value(a))
+
+        if first in q.rows:
+            return self._row_ref(q, q.rows.index(first), rest)
+        if first in q.cols and q.is_grid and not rest:
+            c = q.cols.index(first)
+            if q.kind == "radio":
+                return lambda a: (a.grid[label] == c).any(axis=1)
+            return lambda a: a.grid[label][:, :, c].any(axis=1)
+        if re.fullmatch(r"(?:r|c|ch)\d+|[A-Z]{3}", first):
+            raise _Unsupported(f"{label} has no row or column '{first}'")
+        raise _Unsupported(f"{label}.{'.'.join(names)}")
+
+    def _count(self, q: _Question) -> Evaluator:
+        label = q.label
+        if q.kind == "checkbox" and not q.is_grid:
+            return lambda a: a.selected[label].sum(axis=1).astype(float)
+        return lambda a: a.answered[label].astype(float)
+
+    def _value(self, q: _Question) -> Evaluator:
+        label = q.label
+        if q.kind in ("radio", "select") and not q.is_grid:
+            def index(a):
+                values = a.index[label].astype(float)
+                values[values < 0] = np.nan
+                return values
+            return index
+        if q.kind in ("number", "float") and not q.rows:
+            return lambda a: a.number[label]
+        raise _Unsupported(f"{label}.val")
+
+    def _row_ref(self, q: _Question, r: int, rest: List[str]) -> Evaluator:
+        label, kind = q.label, q.kind
+        if q.is_grid:
+            if not rest:
+                if kind == "radio":
+                    return lambda a: a.grid[label][:, r] >= 0
+                return lambda a: a.grid[label][:, r].any(axis=1)
+            if rest[0] in q.cols and len(rest) == 1:
+                c = q.cols.index(rest[0])
+                if kind == "radio":
+                    return lambda a: a.grid[label][:, r] == c
+                return lambda a: a.grid[label][:, r, c]
+            if rest == ["val"] and kind == "radio":
+                def col_index(a):
+                    values = a.grid[label][:, r].astype(float)
+                    values[values < 0] = np.nan
+                    return values
+                return col_index
+            raise _Unsupported(f"{label}.{q.rows[r]}.{'.'.join(rest)}")
+        if rest not in ([], ["val"]):
+            raise _Unsupported(f"{label}.{q.rows[r]}.{'.'.join(rest)}")
+        if kind in ("radio", "select"):
+            return lambda a: a.index[label] == r
+        if kind in ("number", "float"):
+            return lambda a: a.number[label][:, r]
+        return lambda a: a.selected[label][:, r]
+
+
+# ---------------------------------------------------------------------------
+# Plan
+# ---------------------------------------------------------------------------
+
+
+def _int_attr(el, name: str, default: Optional[int]) -> Optional[int]:
+    try:
+        return int(el.get(name))
+    except (TypeError, ValueError):
+        return default
+
+
+def _question_from_element(el) -> _Question:
+    tag = el.tag
+    option_tag = "choice" if tag == "select" else "row"
+    options = [o for o in el if o.tag == option_tag]
+    q = _Question(
+        label=el.get("label", ""),
+        kind=tag,
+        rows=[o.get("label", "") for o in options],
+        cols=[c.get("label", "") for c in el if c.tag == "col"],
+        row_conds=[o.get("cond") for o in options],
+        exclusive=[o.get("exclusive") == "1" for o in options],
+        atleast=_int_attr(el, "atleast", 1),
+        atmost=_int_attr(el, "atmost", None),
+    )
+    m = _RANGE_RE.search(el.get("verify") or "")
+    if m:
+        low, high = int(m.group(1)), int(m.group(2))
+        q.number_range = (min(low, high), max(low, high))
+    where = el.get("where")
+    q.hidden = where is not None and "survey" not in where.split(",")
+    return q
+
+
+class SurveyPlan:
+    """Evaluation plan for one survey; build once, :meth:`run` many times."""
+
+    def __init__(self, steps: List[_Step], questions: List[_Question]):
+        self.steps = steps
+        self.questions = questions
+
+    @classmethod
+    def from_xml(cls, xml: Union[str, bytes]) -> "SurveyPlan":
+        if isinstance(xml, str):
+            xml = xml.encode("utf-8")
+        root = etree.fromstring(xml, etree.XMLParser(huge_tree=True))
+
+        definitions = {
+            c.get("label"): c.get("cond", "")
+            for c in root.iter("condition") if c.get("label")
+        }
+        questions = {
+            el.get("label"): _question_from_element(el)
+            for el in root.iter(*QUESTION_TAGS) if el.get("label")
+        }
+        compiler = _Compiler(questions, definitions)
+
+        steps: List[_Step] = []
+
+        def visit(parent) -> None:
+            for el in parent:
+                tag = el.tag
+                if tag not in ("block", "html", "term") + QUESTION_TAGS:
+                    continue
+                cond, problem = compiler.compile(el.get("cond"))
+                step = _Step(tag, el.get("label", ""), cond, [problem] if problem else [])
+                if tag in QUESTION_TAGS:
+                    step.question = questions.get(step.label) or _question_from_element(el)
+                    for rc in step.question.row_conds:
+                        fn, problem = compiler.compile(rc)
+                        step.row_conds.append(fn)
+                        if problem:
+                            step.unsupported.append(problem)
+                steps.append(step)
+                if tag == "block":
+                    visit(el)
+                    steps.append(_Step("end"))
+
+        visit(root)
+        return cls(steps, list(questions.values()))
+
+    @classmethod
+    def from_classified(cls, classified: Dict[str, List[dict]]) -> "SurveyPlan":
+        from .assembler import assemble_xml
+
+        xml, _ = assemble_xml(classified)
+        return cls.from_xml(xml)
+
+    def run(self, respondents: int = 10000, seed: Optional[int] = 0) -> SimulationReport:
+        started = time.perf_counter()
+        n = respondents
+        answers = _Answers(n, np.random.default_rng(seed), self.questions)
+        alive = np.ones(n, dtype=bool)
+        scope = [alive]  # respondents inside the enclosing blocks
+        results: List[ElementResult] = []
+
+        for step in self.steps:
+            if step.kind == "end":
+                scope.pop()
+                continue
+
+            eligible = scope[-1] & alive
+            if step.kind == "term":
+                if step.unsupported:
+                    fires = np.zeros(n, dtype=bool)
+                elif step.cond is None:
+                    fires = eligible  # cond="1"
+                else:
+                    fires = eligible & step.cond(answers)
+                alive &= ~fires
+                results.append(ElementResult(
+                    step.label, "term", int(eligible.sum()), int(fires.sum()), step.unsupported,
+                ))
+                continue
+
+            reached = eligible if step.cond is None else eligible & step.cond(answers)
+            q = step.question
+            results.append(ElementResult(
+                step.label, step.kind, int(reached.sum()), unsupported=step.unsupported,
+                hidden=bool(q and q.hidden),
+            ))
+            if step.kind == "block":
+                scope.append(reached)
+            elif q is not None:
+                avail = None
+                if any(fn is not None for fn in step.row_conds):
+                    avail = np.column_stack([
+                        answers.ones() if fn is None else fn(answers) for fn in step.row_conds
+                    ])
+                answers.answer(q, reached, avail)
+
+        return SimulationReport(
+            respondents=n,
+            completed=int(alive.sum()),
+            elements=results,
+            seconds=time.perf_counter() - started,
+        )
+
+
+def simulate(
+    survey: Union[str, bytes, Dict[str, List[dict]]],
+    respondents: int = 10000,
+    seed: Optional[int] = 0,
+) -> SimulationReport:
+    """Simulate assembled XML (str/bytes) or classified dicts."""
+    plan = SurveyPlan.from_classified(survey) if isinstance(survey, dict) else SurveyPlan.from_xml(survey)
+    return plan.run(respondents, seed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m survey_xml_generator.simulator",
+        description="Run synthetic respondents through an assembled survey XML.",
+    )
+    parser.add_argument("xml", help="assembled survey XML file")
+    parser.add_argument("-n", "--respondents", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.xml, "rb") as fh:
+        report = simulate(fh.read(), args.respondents, args.seed)
+    if args.json:
+        import json
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        print(report.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
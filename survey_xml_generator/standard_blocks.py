@@ -0,0 +1,852 @@
+"""Registry of standard demographic blocks.
+
+Some questions come out the same in every survey: zip code (with hidden
+DMA / state / division / region recodes), age (with a hidden generation
+recode), gender, household income, ethnicity and country of residence.
+Each :class:`StandardBlock` in :data:`STANDARD_BLOCKS` provides
+
+- ``detect(q)``: whether a classified question is this block;
+- ``write(q, out, terms)``: its XML, streamed into an
+  :class:`~.xml_writer.XmlWriter` from a :class:`Template` that is built
+  once per process with ``{{slot}}`` placeholders for label, title and
+  cond -- the 208 DMA markets, 51 states or 195 countries are escaped
+  once, not on every call (``render`` returns the same as a string);
+- ``from_segment(seg)``: the classified question for a Stage 2 segment
+  that is unambiguously this block, or None.  Stage 3 uses it to skip
+  the AI for those segments (see ``STANDARD_BLOCKS_SKIP_CLASSIFICATION``).
+
+Gender, income and ethnicity are only treated as standard when every
+option is a known spelling of the house answer list; they are then
+rendered with the house structure (exclusive and open-ended rows) but
+keep each answer's source text.  Anything else goes through the normal
+builders.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .data.countries import COUNTRIES
+from .xml_builder import _esc, _esc_title, build_select, build_term
+from .xml_writer import XmlWriter
+
+_SLOT_RE = re.compile(r"\{\{(\w+)\}\}")
+
+
+class Template:
+    """XML lines with ``{{slot}}`` placeholders, split once at construction.
+
+    Lines between ``<exec>``/``<validate>`` and their closing tags are
+    Python and are written at column 0 (Forsta requires script code to
+    have no extra indent); every other line is indented by the writer.
+    Slot values are inserted verbatim; callers escape them.
+    """
+
+    __slots__ = ("_runs", "slots")
+
+    def __init__(self, lines: Iterable[str]):
+        # Runs of ("static", [lines]) are written with one XmlWriter.lines
+        # call; ("xml" | "script", parts) lines have slots or are script.
+        self._runs: List[Tuple[str, Any]] = []
+        slots = set()
+        in_script = False
+        for line in lines:
+            stripped = line.strip()
+            if stripped.startswith(("<exec", "<validate")):
+                script, in_script = False, True
+            elif stripped.startswith(("</exec", "</validate")):
+                script, in_script = False, False
+            else:
+                script = in_script
+            parts = _SLOT_RE.split(line)
+            slots.update(parts[1::2])
+            if script:
+                self._runs.append(("script", parts))
+            elif len(parts) > 1:
+                self._runs.append(("xml", parts))
+            elif self._runs and self._runs[-1][0] == "static":
+                self._runs[-1][1].append(line)
+            else:
+                self._runs.append(("static", [line]))
+        self.slots = frozenset(slots)
+
+    def write(self, out: XmlWriter, **values: str) -> None:
+        for kind, parts in self._runs:
+            if kind == "static":
+                out.lines(parts)
+                continue
+            text = "".join(values[p] if i % 2 else p for i, p in enumerate(parts))
+            if kind == "script":
+                out.script(text)
+            else:
+                out.line(text)
+
+    def render(self, **values: str) -> str:
+        w = XmlWriter()
+        self.write(w, **values)
+        return w.getvalue()
+
+
+def _cond_attr(q: Dict[str, Any]) -> str:
+    cond = q.get("cond")
+    return f' cond="{cond}"' if cond else ""
+
+
+def _write_head(head: str, q: Dict[str, Any], out: XmlWriter) -> None:
+    """Opening tag plus title / comment lines of a single question."""
+    out.line(head.format(label=q["label"], cond_attr=_cond_attr(q)))
+    with out.indented():
+        out.line(f"<title>{_esc_title(q.get('title', ''))}</title>")
+        if q.get("comment"):
+            out.line(f"<comment>{_esc(q['comment'])}</comment>")
+
+
+# ---------------------------------------------------------------------------
+# Segment helpers
+# ---------------------------------------------------------------------------
+
+_BRACKET_RE = re.compile(r"\s*\[[^\]]*\]")
+
+
+def _clean_text(text: Any) -> str:
+    """Segment text without ``[MODIFIER]`` tags or repeated whitespace."""
+    return " ".join(_BRACKET_RE.sub("", str(text or "")).split())
+
+
+def _segment_question(seg: Dict[str, Any], forsta_type: str) -> Optional[Dict[str, Any]]:
+    """Label / title / comment for a plain question segment.
+
+    None for segments the AI has to see: matrices, termination logic,
+    randomized lists, or no usable label.
+    """
+    if seg.get("block_type") != "question" or seg.get("is_matrix"):
+        return None
+    label = seg.get("label")
+    if not label or label == "?":
+        return None
+    if seg.get("termination_conditions") or seg.get("answer_terminations"):
+        return None
+    modifiers = [str(m).upper() for m in seg.get("inline_modifiers") or []]
+    for mods in (seg.get("answer_modifiers") or {}).values():
+        modifiers.extend(str(m).upper() for m in mods or [])
+    modifiers.extend(
+        m.upper() for a in seg.get("answer_lines") or [] for m in re.findall(r"\[([^\]]*)\]", str(a))
+    )
+    if any("TERM" in m or "RANDOM" in m for m in modifiers):
+        return None
+
+    q: Dict[str, Any] = {
+        "forsta_type": forsta_type,
+        "label": label,
+        "title": _clean_text(seg.get("title_text")),
+    }
+    instruction = _clean_text(seg.get("instruction_text"))
+    if instruction:
+        q["comment"] = instruction
+    return q
+
+
+def _modifier_text(seg: Dict[str, Any]) -> str:
+    mods = " ".join(str(m) for m in seg.get("inline_modifiers") or [])
+    return f"{mods} {seg.get('title_text') or ''}".upper()
+
+
+_VERB = r"(?:select|choose|check|mark|pick|tick)"
+_MULTI_SELECT_RE = re.compile(
+    rf"\b{_VERB}\s+all\b|\ball that apply\b|\bmulti(?:ple)?[\s-]*(?:select|choice|response|punch|answer)",
+    re.IGNORECASE,
+)
+_SINGLE_SELECT_RE = re.compile(
+    rf"\b{_VERB}\s+(?:only\s+)?one\b|\bone (?:answer|response)\b|\bsingle[\s-]*(?:select|choice|response|punch|answer)",
+    re.IGNORECASE,
+)
+# Limits the standard templates can't express (atmost / atleast)
+_SELECT_LIMIT_RE = re.compile(
+    rf"\bup to\b|\bat (?:least|most)\b|\b{_VERB}\s+(?:two|three|four|five|\d+)\b",
+    re.IGNORECASE,
+)
+
+
+def _choice_type(seg: Dict[str, Any]) -> Optional[str]:
+    """``"radio"`` or ``"checkbox"`` from the segment's instruction wording.
+
+    None unless exactly one of single- or multi-select is stated, so
+    anything less clear-cut is left to the AI.
+    """
+    text = " ".join(
+        [str(seg.get("title_text") or ""), str(seg.get("instruction_text") or "")]
+        + [str(m) for m in seg.get("inline_modifiers") or []]
+    )
+    if _SELECT_LIMIT_RE.search(text):
+        return None
+    multi = bool(_MULTI_SELECT_RE.search(text))
+    if multi == bool(_SINGLE_SELECT_RE.search(text)):
+        return None
+    return "checkbox" if multi else "radio"
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class StandardBlock:
+    """One standard block.  Subclasses override the three hooks."""
+
+    name = ""
+    # Terms right after the question whose cond references its label are
+    # moved inside the block (the assembler collects them for ``write``)
+    absorbs_terms = False
+
+    def detect(self, q: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def write(
+        self, q: Dict[str, Any], out: XmlWriter, terms: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        raise NotImplementedError
+
+    def render(self, q: Dict[str, Any], terms: Optional[List[Dict[str, Any]]] = None) -> str:
+        w = XmlWriter()
+        self.write(q, w, terms)
+        return w.getvalue()
+
+    def from_segment(self, seg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+
+STANDARD_BLOCKS: List[StandardBlock] = []
+
+
+def register(block: StandardBlock) -> StandardBlock:
+    """Add *block* to the registry (checked in registration order)."""
+    if any(b.name == block.name for b in STANDARD_BLOCKS):
+        raise ValueError(f"Standard block '{block.name}' already registered")
+    STANDARD_BLOCKS.append(block)
+    return block
+
+
+def find_standard_block(q: Dict[str, Any]) -> Optional[StandardBlock]:
+    """The registered block a classified question should be rendered as."""
+    for block in STANDARD_BLOCKS:
+        if block.detect(q):
+            return block
+    return None
+
+
+def standard_question_for_segment(
+    seg: Dict[str, Any],
+) -> Optional[Tuple[StandardBlock, Dict[str, Any]]]:
+    """``(block, question)`` for a segment that needs no AI classification."""
+    for block in STANDARD_BLOCKS:
+        q = block.from_segment(seg)
+        if q is not None:
+            return block, q
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Zip code
+# ---------------------------------------------------------------------------
+
+_ZIP_TITLE_RE = re.compile(r"\bzip\s*code\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _zipcode_template() -> Template:
+    from .data.zipcode_block import (
+        DMA_MARKETS, ZIP_STATES, ZIP_DIVISIONS, ZIP_REGIONS,
+    )
+
+    lines = [
+        '<block label="bZipCode"{{cond_attr}} builder:title="Zip Code">',
+        '  <exec when="init">',
+        'dataFile = File("FPzipcodes.dat", "ZIP")',
+        '  </exec>',
+        '',
+        '  <text',
+        '  label="{{label}}"',
+        '  optional="0"',
+        '  randomize="0"',
+        '  size="5"',
+        '  verify="zipcode">',
+        '    <title>{{title}}</title>',
+        '    <validate>',
+        '#RECORD = dataFile.get( {{label}}.val )',
+        '',
+        '#if not(RECORD):',
+        '  #error(res.zipError)',
+        '    </validate>',
+        '',
+        '  </text>',
+        '',
+        '  <suspend/>',
+        '',
+        '  <text',
+        '  label="vRESPDATA"',
+        '  randomize="0"',
+        '  where="execute,survey,report">',
+        '    <title>HIDDEN - Respondent Data</title>',
+        '    <exec>',
+        'zipx={{label}}.val',
+        'respData = dataFile.get(zipx)',
+        '',
+        'if respData:',
+        ' vRESPDATA.r1.val = zipx',
+        " vRESPDATA.r2.val = respData['state']",
+        " vRESPDATA.r3.val = respData['dma name']",
+        '    </exec>',
+        '',
+        '    <row label="r1">zip</row>',
+        '    <row label="r2">State</row>',
+        '    <row label="r3">DMA Name</row>',
+        '  </text>',
+        '',
+        '  <suspend/>',
+        '',
+        '  <exec>',
+        'for x in qZipMarket.rows:',
+        ' if x.text==vRESPDATA.r3.val:',
+        '  qZipMarket.val=x.index',
+        '  </exec>',
+        '',
+        '  <suspend/>',
+        '',
+        '  <radio',
+        '  label="qZipMarket"',
+        '  optional="1"',
+        '  randomize="0"',
+        '  where="execute,survey,report">',
+        '    <title><p>HIDDEN - Market by Zip Code</p></title>',
+    ]
+    lines += [f'    <row label="{lbl}">{_esc(name)}</row>' for lbl, name in DMA_MARKETS]
+    lines += [
+        '  </radio>',
+        '',
+        '  <exec>',
+        'for x in qZipState.rows:',
+        ' if x.text==vRESPDATA.r2.val:',
+        '  qZipState.val=x.index',
+        '  </exec>',
+        '',
+        '  <suspend/>',
+        '',
+        '  <radio',
+        '  label="qZipState"',
+        '  optional="1"',
+        '  randomize="0"',
+        '  where="execute,survey,report">',
+        '    <title>HIDDEN - State by Zip Code</title>',
+    ]
+    lines += [f'    <row label="{lbl}">{_esc(name)}</row>' for lbl, name in ZIP_STATES]
+    lines += [
+        '  </radio>',
+        '',
+        '  <suspend/>',
+        '',
+        '  <exec cond="qZipState.any">',
+        "cat = qZipState.selected.label",
+        "qZipRegion.val = int(cat[2:3]) - 1",
+        "qZipDivision.val = int(cat[3:4]) - 1",
+        '  </exec>',
+        '',
+        '  <radio',
+        '  label="qZipDivision"',
+        '  optional="1"',
+        '  randomize="0"',
+        '  where="execute,survey,report">',
+        '    <title>HIDDEN - Division by Zip Code</title>',
+    ]
+    lines += [f'    <row label="{lbl}">{_esc(name)}</row>' for lbl, name in ZIP_DIVISIONS]
+    lines += [
+        '  </radio>',
+        '',
+        '  <radio',
+        '  label="qZipRegion"',
+        '  optional="1"',
+        '  randomize="0"',
+        '  where="execute,survey,report">',
+        '    <title>HIDDEN - Region by Zip Code</title>',
+    ]
+    lines += [f'    <row label="{lbl}">{_esc(name)}</row>' for lbl, name in ZIP_REGIONS]
+    lines += [
+        '  </radio>',
+        '</block>',
+    ]
+    return Template(lines)
+
+
+def write_zipcode_block(out: XmlWriter, label: str, title: str, cond: str = "") -> None:
+    """Write the standard Forsta zip code block with hidden backend questions.
+
+    Includes the zip code text input with validation, plus hidden questions
+    for DMA market, state, division, and region derived from FPzipcodes.dat.
+    """
+    _zipcode_template().write(
+        out,
+        label=label,
+        title=_esc(title) if title else "What is your five-digit zip code?",
+        cond_attr=f' cond="{cond}"' if cond else "",
+    )
+
+
+def build_zipcode_block(label: str, title: str, cond: str = "") -> str:
+    """:func:`write_zipcode_block` as a string."""
+    w = XmlWriter()
+    write_zipcode_block(w, label, title, cond)
+    return w.getvalue()
+
+
+class ZipCodeBlock(StandardBlock):
+    name = "zipcode"
+
+    def detect(self, q: Dict[str, Any]) -> bool:
+        label = (q.get("label") or "").lower()
+        verify = (q.get("verify") or "").lower()
+        return (
+            "zip" in label
+            or verify == "zipcode"
+            or verify == "range(10000,99999)"
+        )
+
+    def write(
+        self, q: Dict[str, Any], out: XmlWriter, terms: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        write_zipcode_block(
+            out,
+            label=q.get("label", "qZipCode"),
+            title=q.get("title", ""),
+            cond=q.get("cond", ""),
+        )
+
+    def from_segment(self, seg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if seg.get("answer_lines"):
+            return None
+        label = (seg.get("label") or "").lower()
+        if "zip" not in label and not _ZIP_TITLE_RE.search(str(seg.get("title_text") or "")):
+            return None
+        q = _segment_question(seg, "text")
+        if q is not None:
+            q.update({"verify": "zipcode", "size": 5})
+        return q
+
+
+# ---------------------------------------------------------------------------
+# Age / generation
+# ---------------------------------------------------------------------------
+
+_GENERATIONS = [
+    ("r1", "Gen Z (1997+)"),
+    ("r2", "Millennials (1981-1996)"),
+    ("r3", "Gen X (1965-1980)"),
+    ("r4", "Baby Boomers+ (1964 or earlier)"),
+]
+
+
+@lru_cache(maxsize=1)
+def _generation_template() -> Template:
+    lines = [
+        '  <exec>',
+        'selectedText = {{label}}.selected.text if {{label}}.any else ""',
+        'year = 0',
+        'if selectedText:',
+        ' parts = selectedText.split()',
+        ' try:',
+        '  year = int(parts[0])',
+        ' except:',
+        '  year = 0',
+        '',
+        'if year >= 1997:',
+        ' qGeneration.val = 0',
+        'elif year >= 1981:',
+        ' qGeneration.val = 1',
+        'elif year >= 1965:',
+        ' qGeneration.val = 2',
+        'elif year > 0:',
+        ' qGeneration.val = 3',
+        '  </exec>',
+        '',
+        '  <radio',
+        '  label="qGeneration"',
+        '  optional="1"',
+        '  randomize="0"',
+        '  where="execute,survey,report">',
+        '    <title>HIDDEN - Generation by Age</title>',
+    ]
+    lines += [f'    <row label="{lbl}">{name}</row>' for lbl, name in _GENERATIONS]
+    lines += [
+        '  </radio>',
+        '</block>',
+    ]
+    return Template(lines)
+
+
+def write_age_block(
+    out: XmlWriter, q: Dict[str, Any], terms: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """Write the standard Forsta age block with a hidden generation question.
+
+    Wraps the original age select dropdown in a block and appends an exec
+    script that computes the respondent's generation from the selected birth
+    year, storing the result in a hidden ``qGeneration`` radio.
+
+    If *terms* is provided, they are emitted inside the block between the
+    age select suspend and the generation exec script.
+    """
+    out.line('<block label="bAge" builder:title="Age">')
+    with out.indented():
+        build_select(q, out)
+    out.line("")
+    out.line("  <suspend/>")
+    out.line("")
+    for t in terms or ():
+        out.line(f"  {build_term(t)}")
+        out.line("")
+        out.line("  <suspend/>")
+        out.line("")
+    _generation_template().write(out, label=q.get("label", "qAge"))
+
+
+def build_age_block(q: Dict[str, Any], terms: Optional[List[Dict[str, Any]]] = None) -> str:
+    """:func:`write_age_block` as a string."""
+    w = XmlWriter()
+    write_age_block(w, q, terms)
+    return w.getvalue()
+
+
+class AgeBlock(StandardBlock):
+    name = "age"
+    absorbs_terms = True
+
+    def detect(self, q: Dict[str, Any]) -> bool:
+        label = (q.get("label") or "").lower()
+        forsta_type = (q.get("forsta_type") or "").lower()
+        special = (q.get("special_handling") or "").lower()
+        return (
+            "age" in label
+            and forsta_type == "select"
+        ) or special == "year_range"
+
+    def write(
+        self, q: Dict[str, Any], out: XmlWriter, terms: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        write_age_block(out, q, terms)
+
+    # No from_segment: the year range and any age terminations come from
+    # the AI.
+
+
+# ---------------------------------------------------------------------------
+# Country dropdown
+# ---------------------------------------------------------------------------
+
+_COUNTRY_DROPDOWN_RE = re.compile(r"DROP\s*-?\s*DOWN\s+(?:OF\s+)?COUNTR")
+
+
+@lru_cache(maxsize=1)
+def _country_template() -> Template:
+    lines = [f'  <choice label="{code}">{_esc(name)}</choice>' for code, name in COUNTRIES]
+    lines.append('</select>')
+    return Template(lines)
+
+
+class CountryBlock(StandardBlock):
+    """Country dropdown auto-populated from ``data/countries.py``."""
+
+    name = "country"
+
+    def detect(self, q: Dict[str, Any]) -> bool:
+        return (
+            (q.get("forsta_type") or "").lower() == "select"
+            and q.get("special_handling") == "countries"
+            and not (q.get("choices") or q.get("answers"))
+        )
+
+    def write(
+        self, q: Dict[str, Any], out: XmlWriter, terms: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        _write_head('<select label="{label}"{cond_attr}>', q, out)
+        _country_template().write(out)
+
+    def from_segment(self, seg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if seg.get("answer_lines") or not _COUNTRY_DROPDOWN_RE.search(_modifier_text(seg)):
+            return None
+        q = _segment_question(seg, "select")
+        if q is not None:
+            q["special_handling"] = "countries"
+        return q
+
+
+# ---------------------------------------------------------------------------
+# Standard answer lists (gender, income, ethnicity)
+# ---------------------------------------------------------------------------
+
+_OPTION_FOLD_RE = re.compile(r"[^a-z0-9]+")
+_OPEN_END_TAG_RE = re.compile(r"\[\s*(?:open(?:[\s-]*end(?:ed)?)?|specify)\s*\]", re.IGNORECASE)
+
+
+def _fold_option(text: str, open_end: bool = False) -> str:
+    """``"Black / African-American"`` -> ``"black or african american"``.
+
+    With ``open_end``, an ``[OPEN END]`` / ``[SPECIFY]`` tag is kept as the
+    words "open end" instead of being dropped with the other modifiers.
+    """
+    if open_end:
+        text = _OPEN_END_TAG_RE.sub(" open end ", str(text or ""))
+    text = _clean_text(text).lower().replace("&", " and ").replace("/", " or ")
+    return " ".join(_OPTION_FOLD_RE.sub(" ", text).split())
+
+
+PREFER_NOT = "Prefer not to say"
+OTHER = "Other"
+OTHER_SPECIFY = "Other (please specify)"
+
+# A bare "Other" gets no text box; only wording that asks for one does
+_COMMON_SPELLINGS = {
+    PREFER_NOT: [
+        "prefer not to say", "prefer not to answer", "i prefer not to answer",
+        "prefer not to disclose", "decline to answer", "rather not say",
+    ],
+    OTHER: ["other", "something else"],
+    OTHER_SPECIFY: [
+        "other please specify", "other specify", "other open end", "other please specify open end",
+        "other specify open end", "something else please specify", "something else open end",
+    ],
+}
+
+
+class StandardChoiceBlock(StandardBlock):
+    """Radio / checkbox with a house answer list.
+
+    Args:
+        name: registry name.
+        keywords: regex matched against the question label and title.
+        options: canonical option text -> accepted spellings (compared
+            after :func:`_fold_option`).
+        exclusive: options that are exclusive / not randomized in a
+            checkbox.
+        open_ended: options with an open-end text box.
+        min_options: fewer known options than this is not the standard list.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        keywords: str,
+        options: Dict[str, Sequence[str]],
+        exclusive: Iterable[str] = (PREFER_NOT,),
+        open_ended: Iterable[str] = (OTHER_SPECIFY,),
+        min_options: int = 2,
+    ):
+        self.name = name
+        self._keywords = re.compile(keywords, re.IGNORECASE)
+        self._spellings: Dict[str, str] = {}
+        for canonical, spellings in options.items():
+            self._spellings[_fold_option(canonical)] = canonical
+            for s in spellings:
+                self._spellings[_fold_option(s)] = canonical
+        self.exclusive = frozenset(exclusive)
+        self.open_ended = frozenset(open_ended)
+        self.min_options = min_options
+
+    def canonical_options(self, texts: Sequence[str]) -> Optional[List[str]]:
+        """House wording for each option, or None if any is not a known spelling."""
+        canonical = [
+            self._spellings.get(_fold_option(t, open_end=True)) or self._spellings.get(_fold_option(t))
+            for t in texts
+        ]
+        if None in canonical or len(set(canonical)) != len(canonical):
+            return None
+        return canonical
+
+    def _matches_topic(self, label: str, title: str) -> bool:
+        return bool(self._keywords.search(f"{label} {title}"))
+
+    def _key(self, q: Dict[str, Any]) -> Optional[Tuple[str, Tuple[Tuple[str, str, str], ...]]]:
+        forsta_type = (q.get("forsta_type") or "").lower()
+        if forsta_type not in ("radio", "checkbox"):
+            return None
+        if q.get("is_matrix") or q.get("shuffle") or q.get("matrix_cols"):
+            return None
+        if forsta_type == "checkbox" and q.get("atmost") is not None:
+            return None
+        if forsta_type == "checkbox" and q.get("atleast") not in (None, 1, "1"):
+            return None
+        answers = q.get("answers") or []
+        if len(answers) < self.min_options or any(a.get("cond") for a in answers):
+            return None
+        if not self._matches_topic(q.get("label") or "", q.get("title") or ""):
+            return None
+        canonical = self.canonical_options([a.get("text", "") for a in answers])
+        if canonical is None:
+            return None
+        return forsta_type, tuple((a["label"], c, a.get("text", "")) for a, c in zip(answers, canonical))
+
+    def detect(self, q: Dict[str, Any]) -> bool:
+        return self._key(q) is not None
+
+    def write(
+        self, q: Dict[str, Any], out: XmlWriter, terms: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        forsta_type, rows = self._key(q)
+        head = '<checkbox label="{label}" atleast="1"{cond_attr}>' if forsta_type == "checkbox" else (
+            '<radio label="{label}"{cond_attr}>'
+        )
+        _write_head(head, q, out)
+        self._rows_template(forsta_type, rows).write(out)
+
+    @lru_cache(maxsize=128)
+    def _rows_template(self, forsta_type: str, rows: Tuple[Tuple[str, str, str], ...]) -> Template:
+        checkbox = forsta_type == "checkbox"
+        lines = []
+        for label, canonical, text in rows:
+            attrs = ""
+            if checkbox and canonical in self.exclusive:
+                attrs += ' exclusive="1" randomize="0"'
+            if canonical in self.open_ended:
+                attrs += (' randomize="0"' if checkbox else "") + ' open="1" openSize="25"'
+            lines.append(f'  <row label="{label}"{attrs}>{_esc(text)}</row>')
+        lines.append(f'</{forsta_type}>')
+        return Template(lines)
+
+    def from_segment(self, seg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        lines = seg.get("answer_lines") or []
+        if len(lines) < self.min_options:
+            return None
+        if not self._matches_topic(seg.get("label") or "", str(seg.get("title_text") or "")):
+            return None
+        canonical = self.canonical_options([str(a) for a in lines])
+        if canonical is None:
+            return None
+        forsta_type = _choice_type(seg)
+        if forsta_type is None:
+            return None
+        q = _segment_question(seg, forsta_type)
+        if q is None:
+            return None
+        q["answers"] = [{"label": f"r{i}", "text": _clean_text(text)} for i, text in enumerate(lines, 1)]
+        return q
+
+
+class IncomeBlock(StandardChoiceBlock):
+    """Household income brackets.
+
+    Instead of a fixed list, any set of contiguous ascending brackets is
+    accepted ("Under $25K", "$25,000 to $49,999", "$200,000+"); they are
+    compared in ``$25,000 - $49,999`` style.
+    """
+
+    def __init__(self):
+        super().__init__(
+            "income",
+            r"income",
+            {PREFER_NOT: _COMMON_SPELLINGS[PREFER_NOT], "Don't know": ["dont know", "not sure"]},
+            exclusive=(PREFER_NOT, "Don't know"),
+            open_ended=(),
+            min_options=3,
+        )
+
+    _AMOUNT_RE = re.compile(r"(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*([km])?\b", re.IGNORECASE)
+    _BELOW_RE = re.compile(r"\b(?:under|less than|below|up to)\b", re.IGNORECASE)
+    _ABOVE_RE = re.compile(r"\+|\b(?:or more|or over|or above|or higher|and over|and above|and up|over|more than|above)\b", re.IGNORECASE)
+
+    def _bracket(self, text: str) -> Optional[Tuple[int, Optional[int]]]:
+        """``(low, high)`` in dollars; high is None for the open-ended top bracket."""
+        amounts = []
+        for number, suffix in self._AMOUNT_RE.findall(text):
+            value = float(number.replace(",", ""))
+            if suffix:
+                value *= 1_000 if suffix.lower() == "k" else 1_000_000
+            amounts.append(int(round(value)))
+        if len(amounts) == 2:
+            low, high = amounts
+            # "$25,000 to under $50,000"
+            if self._BELOW_RE.search(text):
+                high -= 1
+            return (low, high) if low < high else None
+        if len(amounts) == 1:
+            if self._BELOW_RE.search(text):
+                return 0, amounts[0] - 1
+            if self._ABOVE_RE.search(text):
+                return amounts[0], None
+        return None
+
+    def canonical_options(self, texts: Sequence[str]) -> Optional[List[str]]:
+        canonical: List[str] = []
+        previous_high: Optional[int] = -1
+        brackets = 0
+        for text in texts:
+            fixed = self._spellings.get(_fold_option(text))
+            if fixed:
+                canonical.append(fixed)
+                continue
+            bracket = self._bracket(_clean_text(text))
+            if bracket is None or previous_high is None or canonical and canonical[-1] in self.exclusive:
+                return None
+            low, high = bracket
+            if brackets and low not in (previous_high, previous_high + 1):
+                return None
+            if low == 0:
+                canonical.append(f"Less than ${high + 1:,}")
+            elif high is None:
+                canonical.append(f"${low:,} or more")
+            else:
+                canonical.append(f"${low:,} - ${high:,}")
+            previous_high = high
+            brackets += 1
+        if brackets < self.min_options or len(set(canonical)) != len(canonical):
+            return None
+        return canonical
+
+
+register(ZipCodeBlock())
+register(AgeBlock())
+register(CountryBlock())
+register(StandardChoiceBlock(
+    "gender",
+    r"gender|\bsex\b",
+    {
+        "Male": ["man", "a man", "male"],
+        "Female": ["woman", "a woman", "female"],
+        "Non-binary / third gender": [
+            "non binary", "nonbinary", "non binary or third gender", "third gender",
+            "non binary or gender non conforming", "genderqueer or non binary",
+        ],
+        "Prefer to self-describe": ["prefer to self describe", "self describe", "i prefer to self describe"],
+        OTHER: _COMMON_SPELLINGS[OTHER],
+        OTHER_SPECIFY: _COMMON_SPELLINGS[OTHER_SPECIFY],
+        PREFER_NOT: _COMMON_SPELLINGS[PREFER_NOT],
+    },
+    open_ended=("Prefer to self-describe", OTHER_SPECIFY),
+))
+register(IncomeBlock())
+register(StandardChoiceBlock(
+    "ethnicity",
+    r"ethnic|\brac(?:e|ial)\b",
+    {
+        "White": ["white", "caucasian", "white or caucasian", "white caucasian"],
+        "Black or African American": ["black", "african american", "black african american"],
+        "Hispanic or Latino": [
+            "hispanic", "latino", "latina", "latinx", "latino or a", "latino or hispanic",
+            "hispanic or latina", "hispanic or latinx", "hispanic latino or spanish origin",
+        ],
+        "Asian": ["asian american", "asian or asian american"],
+        "American Indian or Alaska Native": [
+            "american indian or alaskan native", "native american", "native american or alaska native",
+            "american indian", "american indian alaska native",
+        ],
+        "Native Hawaiian or Other Pacific Islander": [
+            "native hawaiian or pacific islander", "pacific islander", "native hawaiian",
+        ],
+        "Middle Eastern or North African": ["middle eastern", "mena"],
+        "Two or more races": ["multiracial", "mixed race", "mixed", "multiracial or mixed", "biracial or multiracial"],
+        OTHER: _COMMON_SPELLINGS[OTHER],
+        OTHER_SPECIFY: _COMMON_SPELLINGS[OTHER_SPECIFY],
+        PREFER_NOT: _COMMON_SPELLINGS[PREFER_NOT],
+    },
+    min_options=3,
+))
@@ -1,17 +1,23 @@
 """Stage 4: Deterministic XML generation from classified question objects.
 
 Each build_* function takes a classified question dict and returns a Forsta
-XML string. No AI calls -- just clean template mapping.
+XML string. No AI calls -- just clean template mapping.  The multi-line
+builders also accept an :class:`XmlWriter` and then write into it
+directly; the assembler uses that to produce the document in one pass.
 """
 
 from __future__ import annotations
 
+import functools
 import html as html_mod
 import re
-from typing import Any, Dict, List, Optional
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from .data.us_states import US_STATES
-from .data.countries import COUNTRIES, COUNTRY_NAME_TO_CODE
+from .data.countries import COUNTRIES
+from .data.place_lookup import country_choice_codes
+from .xml_writer import XmlWriter
 
 
 # ---------------------------------------------------------------------------
@@ -65,30 +71,23 @@ def _str_or(value, default):
 def _apply_country_codes(choices: List[Dict]) -> List[Dict]:
     """Replace generic labels (ch1, ch2...) with ISO alpha-3 country codes.
 
-    Only activates when at least 2 choices match a known country name.
+    Only activates when at least 2 choices are known country names or
+    aliases ("USA", "Bahamas"); see ``country_choice_codes``.
     Non-country entries (e.g. "Other") get the text itself as the label.
     """
-    mapped = []
-    country_hits = 0
-    for ch in choices:
-        text = ch.get("text", "")
-        code = COUNTRY_NAME_TO_CODE.get(text.lower())
-        if code:
-            country_hits += 1
-            mapped.append({"label": code, "text": text, "_matched": True})
-        else:
-            mapped.append({**ch, "_matched": False})
-
-    if country_hits < 2:
+    codes = country_choice_codes(ch.get("text", "") for ch in choices)
+    if codes is None:
         return choices
 
     result = []
-    for m in mapped:
-        matched = m.pop("_matched", False)
-        if not matched:
+    for ch, code in zip(choices, codes):
+        if code:
+            result.append({"label": code, "text": ch.get("text", "")})
+        else:
+            m = dict(ch)
             text = m.get("text", m.get("label", ""))
             m["label"] = re.sub(r"[^A-Za-z0-9_]", "", text) or m.get("label", "other")
-        result.append(m)
+            result.append(m)
     return result
 
 
@@ -128,7 +127,31 @@ def _build_col(label: str, text: str, attrs: Optional[Dict] = None) -> str:
 # Question type builders
 # ---------------------------------------------------------------------------
 
-def build_radio(q: Dict[str, Any]) -> str:
+def _streaming(fn: Callable[[Dict[str, Any], XmlWriter], None]):
+    """Let a builder write into an :class:`XmlWriter` or return a string.
+
+    ``build_x(q)`` returns the XML; ``build_x(q, out)`` writes it into
+    *out* at its current indentation and returns None.
+    """
+    @functools.wraps(fn)
+    def builder(q: Dict[str, Any], out: Optional[XmlWriter] = None) -> Optional[str]:
+        if out is not None:
+            fn(q, out)
+            return None
+        w = XmlWriter()
+        fn(q, w)
+        return w.getvalue()
+    return builder
+
+
+def _write_title(q: Dict[str, Any], w: XmlWriter):
+    w.line(f"<title>{_esc_title(q.get('title', ''))}</title>")
+    if q.get("comment"):
+        w.line(f"<comment>{_esc(q['comment'])}</comment>")
+
+
+@_streaming
+def build_radio(q: Dict[str, Any], w: XmlWriter):
     """Single-select radio question."""
     attrs = {"label": q["label"]}
     if q.get("shuffle"):
@@ -140,25 +163,30 @@ def build_radio(q: Dict[str, Any]) -> str:
     if q.get("averages"):
         attrs["averages"] = q["averages"]
 
-    lines = [f"<radio {_attr_str(attrs)}>"]
-    lines.append(f"  <title>{_esc_title(q.get('title', ''))}</title>")
-    if q.get("comment"):
-        lines.append(f"  <comment>{_esc(q['comment'])}</comment>")
-
-    # Matrix: cols then rows
-    if q.get("is_matrix") and q.get("matrix_cols"):
-        for col in q["matrix_cols"]:
-            col_attrs = {}
-            if col.get("value"):
-                col_attrs["value"] = col["value"]
-            lines.append(f"  {_build_col(col['label'], col['text'], col_attrs or None)}")
-
-    # Rows (answers or matrix rows)
-    answer_key = "matrix_rows" if q.get("is_matrix") else "answers"
-    answers_list = q.get(answer_key, [])
-    if answer_key == "answers" and answers_list:
-        answers_list = _apply_country_codes(answers_list)
-    for ans in answers_list:
+    w.line(f"<radio {_attr_str(attrs)}>")
+    with w.indented():
+        _write_title(q, w)
+
+        # Matrix: cols then rows
+        if q.get("is_matrix") and q.get("matrix_cols"):
+            for col in q["matrix_cols"]:
+                col_attrs = {}
+                if col.get("value"):
+                    col_attrs["value"] = col["value"]
+                w.line(_build_col(col["label"], col["text"], col_attrs or None))
+
+        # Rows (answers or matrix rows)
+        answer_key = "matrix_rows" if q.get("is_matrix") else "answers"
+        answers_list = q.get(answer_key, [])
+        if answer_key == "answers" and answers_list:
+            answers_list = _apply_country_codes(answers_list)
+        w.lines(_radio_rows(answers_list))
+
+    w.line("</radio>")
+
+
+def _radio_rows(answers: List[Dict[str, Any]]) -> Iterator[str]:
+    for ans in answers:
         row_attrs = {}
         if ans.get("randomize") is not None:
             row_attrs["randomize"] = str(ans["randomize"])
@@ -167,13 +195,11 @@ def build_radio(q: Dict[str, Any]) -> str:
             row_attrs["openSize"] = str(ans.get("openSize", 25))
         if ans.get("cond"):
             row_attrs["cond"] = ans["cond"]
-        lines.append(f"  {_build_row(ans['label'], ans['text'], row_attrs or None)}")
+        yield _build_row(ans["label"], ans["text"], row_attrs or None)
 
-    lines.append("</radio>")
-    return "\n".join(lines)
 
-
-def build_checkbox(q: Dict[str, Any]) -> str:
+@_streaming
+def build_checkbox(q: Dict[str, Any], w: XmlWriter):
     """Multi-select checkbox question."""
     attrs = {"label": q["label"]}
     atleast = q.get("atleast")
@@ -189,22 +215,27 @@ def build_checkbox(q: Dict[str, Any]) -> str:
     if q.get("cond"):
         attrs["cond"] = q["cond"]
 
-    lines = [f"<checkbox {_attr_str(attrs)}>"]
-    lines.append(f"  <title>{_esc_title(q.get('title', ''))}</title>")
-    if q.get("comment"):
-        lines.append(f"  <comment>{_esc(q['comment'])}</comment>")
-
-    # If this is a matrix checkbox (cols present)
-    if q.get("matrix_cols"):
-        for col in q["matrix_cols"]:
-            col_attrs = {}
-            if col.get("exclusive"):
-                col_attrs["exclusive"] = "1"
-            if col.get("randomize") is not None:
-                col_attrs["randomize"] = str(col["randomize"])
-            lines.append(f"  {_build_col(col['label'], col['text'], col_attrs or None)}")
-
-    for ans in q.get("answers", []):
+    w.line(f"<checkbox {_attr_str(attrs)}>")
+    with w.indented():
+        _write_title(q, w)
+
+        # If this is a matrix checkbox (cols present)
+        if q.get("matrix_cols"):
+            for col in q["matrix_cols"]:
+                col_attrs = {}
+                if col.get("exclusive"):
+                    col_attrs["exclusive"] = "1"
+                if col.get("randomize") is not None:
+                    col_attrs["randomize"] = str(col["randomize"])
+                w.line(_build_col(col["label"], col["text"], col_attrs or None))
+
+        w.lines(_checkbox_rows(q.get("answers", [])))
+
+    w.line("</checkbox>")
+
+
+def _checkbox_rows(answers: List[Dict[str, Any]]) -> Iterator[str]:
+    for ans in answers:
         row_attrs = {}
         if ans.get("exclusive"):
             row_attrs["exclusive"] = "1"
@@ -217,38 +248,71 @@ def build_checkbox(q: Dict[str, Any]) -> str:
                 row_attrs["openOptional"] = "1"
         if ans.get("cond"):
             row_attrs["cond"] = ans["cond"]
-        lines.append(f"  {_build_row(ans['label'], ans['text'], row_attrs or None)}")
+        yield _build_row(ans["label"], ans["text"], row_attrs or None)
 
-    lines.append("</checkbox>")
-    return "\n".join(lines)
 
-
-def build_select(q: Dict[str, Any]) -> str:
+@_streaming
+def build_select(q: Dict[str, Any], w: XmlWriter):
     """Dropdown select question."""
     attrs = {"label": q["label"]}
     if q.get("cond"):
         attrs["cond"] = q["cond"]
 
-    lines = [f"<select {_attr_str(attrs)}>"]
-    lines.append(f"  <title>{_esc_title(q.get('title', ''))}</title>")
-    if q.get("comment"):
-        lines.append(f"  <comment>{_esc(q['comment'])}</comment>")
+    w.line(f"<select {_attr_str(attrs)}>")
+    with w.indented():
+        _write_title(q, w)
+        w.lines(_select_choice_lines(q))
+    w.line("</select>")
 
+
+def _select_choice_lines(q: Dict[str, Any]) -> Sequence[str]:
+    """Rendered ``<choice>`` lines: explicit choices, else auto-population."""
     # Explicit choices from the document always take precedence over auto-population.
     choices = q.get("choices") or q.get("answers") or []
     if choices:
-        choices = _apply_country_codes(choices)
-    elif q.get("special_handling") == "us_states":
-        choices = [{"label": f"ch{i}", "text": s} for i, s in enumerate(US_STATES, 1)]
-    elif q.get("special_handling") == "countries":
-        choices = [{"label": code, "text": name} for code, name in COUNTRIES]
-    elif q.get("special_handling") == "year_range":
-        from datetime import date
+        return [_build_choice(ch["label"], ch["text"]) for ch in _apply_country_codes(choices)]
+    key = _auto_choice_key(q)
+    return _auto_choice_lines(key) if key else ()
+
+
+def _auto_choice_key(q: Dict[str, Any]) -> Optional[tuple]:
+    """Everything the auto-populated list for ``special_handling`` depends on."""
+    special = q.get("special_handling")
+    if special in ("us_states", "countries"):
+        return (special,)
+    if special == "year_range":
         current_year = date.today().year
-        default_start = current_year - 17
-        default_end = current_year - 100
-        start = q.get("year_start", default_start)
-        end = q.get("year_end", default_end)
+        return (
+            special,
+            q.get("year_start", current_year - 17),
+            q.get("year_end", current_year - 100),
+            current_year,
+        )
+    if special == "numeric_range":
+        return (
+            special,
+            q.get("range_start", 1),
+            q.get("range_end", 10),
+            q.get("floor_label", ""),
+            q.get("ceiling_label", q.get("range_suffix", "")),
+        )
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _auto_choice_lines(key: tuple) -> Tuple[str, ...]:
+    """Auto-populated choice list, rendered once per distinct key.
+
+    The year is part of the ``year_range`` key so a long-running process
+    does not keep serving last year's defaults.
+    """
+    special = key[0]
+    if special == "us_states":
+        choices = [(f"ch{i}", s) for i, s in enumerate(US_STATES, 1)]
+    elif special == "countries":
+        choices = list(COUNTRIES)
+    elif special == "year_range":
+        _, start, end, _year = key
         step = -1 if start > end else 1
         years = list(range(start, end + step, step))
         choices = []
@@ -259,12 +323,9 @@ def build_select(q: Dict[str, Any]) -> str:
                 text = f"{y} or earlier"
             else:
                 text = str(y)
-            choices.append({"label": f"ch{i}", "text": text})
-    elif q.get("special_handling") == "numeric_range":
-        start = q.get("range_start", 1)
-        end = q.get("range_end", 10)
-        floor_label = q.get("floor_label", "")
-        ceiling_label = q.get("ceiling_label", q.get("range_suffix", ""))
+            choices.append((f"ch{i}", text))
+    else:
+        _, start, end, floor_label, ceiling_label = key
         step = 1 if start <= end else -1
         nums = list(range(start, end + step, step))
         choices = []
@@ -274,16 +335,12 @@ def build_select(q: Dict[str, Any]) -> str:
                 text = floor_label
             elif ceiling_label and n == nums[-1]:
                 text = ceiling_label
-            choices.append({"label": f"ch{i}", "text": text})
-
-    for ch in choices:
-        lines.append(f"  {_build_choice(ch['label'], ch['text'])}")
-
-    lines.append("</select>")
-    return "\n".join(lines)
+            choices.append((f"ch{i}", text))
+    return tuple(_build_choice(label, text) for label, text in choices)
 
 
-def build_text(q: Dict[str, Any]) -> str:
+@_streaming
+def build_text(q: Dict[str, Any], w: XmlWriter):
     """Open-ended text input."""
     attrs = {
         "label": q["label"],
@@ -295,24 +352,23 @@ def build_text(q: Dict[str, Any]) -> str:
     if q.get("cond"):
         attrs["cond"] = q["cond"]
 
-    lines = [f"<text {_attr_str(attrs)}>"]
-    lines.append(f"  <title>{_esc_title(q.get('title', ''))}</title>")
-    if q.get("comment"):
-        lines.append(f"  <comment>{_esc(q['comment'])}</comment>")
+    w.line(f"<text {_attr_str(attrs)}>")
+    with w.indented():
+        _write_title(q, w)
 
-    # Multi-row text (e.g., "first three words that come to mind")
-    if q.get("rows"):
-        for row in q["rows"]:
-            row_attrs = {}
-            if row.get("optional"):
-                row_attrs["optional"] = "1"
-            lines.append(f"  {_build_row(row['label'], row['text'], row_attrs or None)}")
+        # Multi-row text (e.g., "first three words that come to mind")
+        if q.get("rows"):
+            for row in q["rows"]:
+                row_attrs = {}
+                if row.get("optional"):
+                    row_attrs["optional"] = "1"
+                w.line(_build_row(row["label"], row["text"], row_attrs or None))
 
-    lines.append("</text>")
-    return "\n".join(lines)
+    w.line("</text>")
 
 
-def build_textarea(q: Dict[str, Any]) -> str:
+@_streaming
+def build_textarea(q: Dict[str, Any], w: XmlWriter):
     """Long-form open-ended textarea."""
     attrs = {
         "label": q["label"],
@@ -325,15 +381,14 @@ def build_textarea(q: Dict[str, Any]) -> str:
     if q.get("cond"):
         attrs["cond"] = q["cond"]
 
-    lines = [f"<textarea {_attr_str(attrs)}>"]
-    lines.append(f"  <title>{_esc_title(q.get('title', ''))}</title>")
-    if q.get("comment"):
-        lines.append(f"  <comment>{_esc(q['comment'])}</comment>")
-    lines.append("</textarea>")
-    return "\n".join(lines)
+    w.line(f"<textarea {_attr_str(attrs)}>")
+    with w.indented():
+        _write_title(q, w)
+    w.line("</textarea>")
 
 
-def build_number(q: Dict[str, Any]) -> str:
+@_streaming
+def build_number(q: Dict[str, Any], w: XmlWriter):
     """Numeric input."""
     attrs = {
         "label": q["label"],
@@ -345,21 +400,19 @@ def build_number(q: Dict[str, Any]) -> str:
     if q.get("cond"):
         attrs["cond"] = q["cond"]
 
-    lines = [f"<number {_attr_str(attrs)}>"]
-    lines.append(f"  <title>{_esc_title(q.get('title', ''))}</title>")
-    if q.get("comment"):
-        lines.append(f"  <comment>{_esc(q['comment'])}</comment>")
+    w.line(f"<number {_attr_str(attrs)}>")
+    with w.indented():
+        _write_title(q, w)
 
-    # Multi-row number (e.g., domestic + international spend)
-    if q.get("rows"):
-        for row in q["rows"]:
-            row_attrs = {}
-            if row.get("verify"):
-                row_attrs["verify"] = row["verify"]
-            lines.append(f"  {_build_row(row['label'], row['text'], row_attrs or None)}")
+        # Multi-row number (e.g., domestic + international spend)
+        if q.get("rows"):
+            for row in q["rows"]:
+                row_attrs = {}
+                if row.get("verify"):
+                    row_attrs["verify"] = row["verify"]
+                w.line(_build_row(row["label"], row["text"], row_attrs or None))
 
-    lines.append("</number>")
-    return "\n".join(lines)
+    w.line("</number>")
 
 
 def build_html_block(q: Dict[str, Any]) -> str:
@@ -420,261 +473,6 @@ def build_block_close() -> str:
     return "</block>"
 
 
-# ---------------------------------------------------------------------------
-# Standard zip code block
-# ---------------------------------------------------------------------------
-
-def build_zipcode_block(label: str, title: str, cond: str = "") -> str:
-    """Build the standard Forsta zip code block with hidden backend questions.
-
-    Includes the zip code text input with validation, plus hidden questions
-    for DMA market, state, division, and region derived from FPzipcodes.dat.
-    """
-    from .data.zipcode_block import (
-        DMA_MARKETS, ZIP_STATES, ZIP_DIVISIONS, ZIP_REGIONS,
-    )
-
-    cond_attr = f' cond="{cond}"' if cond else ""
-    title_esc = _esc(title) if title else "What is your five-digit zip code?"
-
-    lines = [
-        f'<block label="bZipCode"{cond_attr} builder:title="Zip Code">',
-        '  <exec when="init">',
-        'dataFile = File("FPzipcodes.dat", "ZIP")',
-        '  </exec>',
-        '',
-        f'  <text',
-        f'  label="{label}"',
-        '  optional="0"',
-        '  randomize="0"',
-        '  size="5"',
-        '  verify="zipcode">',
-        f'    <title>{title_esc}</title>',
-        '    <validate>',
-        f'#RECORD = dataFile.get( {label}.val )',
-        '',
-        '#if not(RECORD):',
-        '  #error(res.zipError)',
-        '    </validate>',
-        '',
-        '  </text>',
-        '',
-        '  <suspend/>',
-        '',
-        '  <text',
-        '  label="vRESPDATA"',
-        '  randomize="0"',
-        '  where="execute,survey,report">',
-        '    <title>HIDDEN - Respondent Data</title>',
-        '    <exec>',
-        f'zipx={label}.val',
-        'respData = dataFile.get(zipx)',
-        '',
-        'if respData:',
-        ' vRESPDATA.r1.val = zipx',
-        " vRESPDATA.r2.val = respData['state']",
-        " vRESPDATA.r3.val = respData['dma name']",
-        '    </exec>',
-        '',
-        '    <row label="r1">zip</row>',
-        '    <row label="r2">State</row>',
-        '    <row label="r3">DMA Name</row>',
-        '  </text>',
-        '',
-        '  <suspend/>',
-        '',
-        '  <exec>',
-        'for x in qZipMarket.rows:',
-        ' if x.text==vRESPDATA.r3.val:',
-        '  qZipMarket.val=x.index',
-        '  </exec>',
-        '',
-        '  <suspend/>',
-        '',
-        '  <radio',
-        '  label="qZipMarket"',
-        '  optional="1"',
-        '  randomize="0"',
-        '  where="execute,survey,report">',
-        '    <title><p>HIDDEN - Market by Zip Code</p></title>',
-    ]
-
-    for lbl, name in DMA_MARKETS:
-        lines.append(f'    <row label="{lbl}">{_esc(name)}</row>')
-
-    lines += [
-        '  </radio>',
-        '',
-        '  <exec>',
-        'for x in qZipState.rows:',
-        ' if x.text==vRESPDATA.r2.val:',
-        '  qZipState.val=x.index',
-        '  </exec>',
-        '',
-        '  <suspend/>',
-        '',
-        '  <radio',
-        '  label="qZipState"',
-        '  optional="1"',
-        '  randomize="0"',
-        '  where="execute,survey,report">',
-        '    <title>HIDDEN - State by Zip Code</title>',
-    ]
-
-    for lbl, name in ZIP_STATES:
-        lines.append(f'    <row label="{lbl}">{_esc(name)}</row>')
-
-    lines += [
-        '  </radio>',
-        '',
-        '  <suspend/>',
-        '',
-        '  <exec cond="qZipState.any">',
-        "cat = qZipState.selected.label",
-        "qZipRegion.val = int(cat[2:3]) - 1",
-        "qZipDivision.val = int(cat[3:4]) - 1",
-        '  </exec>',
-        '',
-        '  <radio',
-        '  label="qZipDivision"',
-        '  optional="1"',
-        '  randomize="0"',
-        '  where="execute,survey,report">',
-        '    <title>HIDDEN - Division by Zip Code</title>',
-    ]
-
-    for lbl, name in ZIP_DIVISIONS:
-        lines.append(f'    <row label="{lbl}">{_esc(name)}</row>')
-
-    lines += [
-        '  </radio>',
-        '',
-        '  <radio',
-        '  label="qZipRegion"',
-        '  optional="1"',
-        '  randomize="0"',
-        '  where="execute,survey,report">',
-        '    <title>HIDDEN - Region by Zip Code</title>',
-    ]
-
-    for lbl, name in ZIP_REGIONS:
-        lines.append(f'    <row label="{lbl}">{_esc(name)}</row>')
-
-    lines += [
-        '  </radio>',
-        '</block>',
-    ]
-
-    return "\n".join(lines)
-
-
-def _is_zipcode_question(q: Dict[str, Any]) -> bool:
-    """Detect whether a classified question is a zip code question."""
-    label = (q.get("label") or "").lower()
-    verify = (q.get("verify") or "").lower()
-    return (
-        "zip" in label
-        or verify == "zipcode"
-        or verify == "range(10000,99999)"
-    )
-
-
-# ---------------------------------------------------------------------------
-# Standard age / generation block
-# ---------------------------------------------------------------------------
-
-_GENERATIONS = [
-    ("r1", "Gen Z (1997+)"),
-    ("r2", "Millennials (1981-1996)"),
-    ("r3", "Gen X (1965-1980)"),
-    ("r4", "Baby Boomers+ (1964 or earlier)"),
-]
-
-
-def build_age_block(q: Dict[str, Any], terms: Optional[List[Dict[str, Any]]] = None) -> str:
-    """Build the standard Forsta age block with a hidden generation question.
-
-    Wraps the original age select dropdown in a block and appends an exec
-    script that computes the respondent's generation from the selected birth
-    year, storing the result in a hidden ``qGeneration`` radio.
-
-    If *terms* is provided, they are emitted inside the block between the
-    age select suspend and the generation exec script.
-    """
-    label = q.get("label", "qAge")
-    select_xml = build_select(q)
-
-    lines = [
-        '<block label="bAge" builder:title="Age">',
-    ]
-
-    for line in select_xml.split("\n"):
-        lines.append(f"  {line}")
-
-    lines += [
-        '',
-        '  <suspend/>',
-        '',
-    ]
-
-    if terms:
-        for t in terms:
-            lines.append(f"  {build_term(t)}")
-            lines.append('')
-            lines.append('  <suspend/>')
-            lines.append('')
-
-    lines += [
-        '  <exec>',
-        f'selectedText = {label}.selected.text if {label}.any else ""',
-        'year = 0',
-        'if selectedText:',
-        ' parts = selectedText.split()',
-        ' try:',
-        '  year = int(parts[0])',
-        ' except:',
-        '  year = 0',
-        '',
-        'if year >= 1997:',
-        ' qGeneration.val = 0',
-        'elif year >= 1981:',
-        ' qGeneration.val = 1',
-        'elif year >= 1965:',
-        ' qGeneration.val = 2',
-        'elif year > 0:',
-        ' qGeneration.val = 3',
-        '  </exec>',
-        '',
-        '  <radio',
-        '  label="qGeneration"',
-        '  optional="1"',
-        '  randomize="0"',
-        '  where="execute,survey,report">',
-        '    <title>HIDDEN - Generation by Age</title>',
-    ]
-
-    for lbl, name in _GENERATIONS:
-        lines.append(f'    <row label="{lbl}">{name}</row>')
-
-    lines += [
-        '  </radio>',
-        '</block>',
-    ]
-
-    return "\n".join(lines)
-
-
-def _is_age_question(q: Dict[str, Any]) -> bool:
-    """Detect whether a classified question is an age/birth-year question."""
-    label = (q.get("label") or "").lower()
-    forsta_type = (q.get("forsta_type") or "").lower()
-    special = (q.get("special_handling") or "").lower()
-    return (
-        "age" in label
-        and forsta_type == "select"
-    ) or special == "year_range"
-
-
 # ---------------------------------------------------------------------------
 # Dispatcher
 # ---------------------------------------------------------------------------
@@ -686,18 +484,35 @@ _BUILDERS = {
     "text": build_text,
     "textarea": build_textarea,
     "number": build_number,
+}
+
+# Single-element builders that return one line
+_LINE_BUILDERS = {
     "html": build_html_block,
     "term": build_term,
 }
 
 
+def write_question(q: Dict[str, Any], out: XmlWriter) -> bool:
+    """Write a classified question into *out*; False if the type is unknown."""
+    forsta_type = q.get("forsta_type", "").lower()
+    builder = _BUILDERS.get(forsta_type)
+    if builder:
+        builder(q, out)
+        return True
+    line_builder = _LINE_BUILDERS.get(forsta_type)
+    if line_builder:
+        out.line(line_builder(q))
+        return True
+    return False
+
+
 def build_question(q: Dict[str, Any]) -> Optional[str]:
     """Route a classified question dict to the right builder.
 
     Returns the XML string, or None if the type is unknown.
     """
-    forsta_type = q.get("forsta_type", "").lower()
-    builder = _BUILDERS.get(forsta_type)
-    if builder:
-        return builder(q)
+    w = XmlWriter()
+    if write_question(q, w):
+        return w.getvalue()
     return None
@@ -0,0 +1,187 @@
+"""Single-pass validation of generated survey XML.
+
+One expat parse checks everything the assembler reports about the output:
+
+- well-formedness (unbalanced or crossed tags, unescaped ``&`` or ``<``);
+- nesting: questions, blocks, terms and page breaks must sit directly in
+  ``<survey>`` or a ``<block>``, rows/cols/choices in a question, and
+  condition definitions in ``<survey>``;
+- duplicate element labels;
+- ``condition.X`` references (in any ``cond`` attribute) to a condition
+  that is never defined.
+
+Every issue carries the line and column of the offending tag.  The parser
+is fed incrementally, so :func:`write_xml` can validate while it streams
+to disk and an in-memory document is validated with a single call.
+
+With ``schema=True`` the same chunks also feed an lxml parser, and the
+finished tree is checked against the Forsta XML Schema
+(:mod:`.data.forsta_schema`): unknown attributes, elements in the wrong
+place, bad ``where=``/flag values.  The schema is compiled once per
+process.
+
+With ``logic=True`` the tag events also build a
+:class:`.logic_graph.LogicGraph`, and its static analysis of the skip
+logic (cycles, forward references, contradictions, always-true
+conditions, references to missing questions or rows) is added to the
+warnings.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, List, Set, Tuple
+from xml.parsers import expat
+
+from lxml import etree
+
+from . import condition_expr
+from .data.forsta_schema import FORSTA_XSD
+from .logic_graph import LogicGraph
+
+QUESTION_TAGS = frozenset({"radio", "checkbox", "select", "text", "textarea", "number", "float", "html"})
+CONTAINER_TAGS = frozenset({"survey", "block"})
+LABELLED_TAGS = QUESTION_TAGS | {"block", "term"}
+
+# child tag -> tags it may appear in
+_ALLOWED_PARENTS: Dict[str, frozenset] = {
+    **{tag: CONTAINER_TAGS for tag in LABELLED_TAGS | {"suspend"}},
+    **{tag: QUESTION_TAGS - {"html"} for tag in ("row", "col", "choice")},
+    "condition": frozenset({"survey"}),
+}
+
+_FEED_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=1)
+def forsta_schema() -> etree.XMLSchema:
+    """The compiled Forsta schema (built on first use)."""
+    return etree.XMLSchema(etree.fromstring(FORSTA_XSD.encode("utf-8")))
+
+
+class XmlValidator:
+    """Incremental validator; :meth:`feed` text, then :meth:`close`.
+
+    ``write`` is an alias of ``feed`` so the validator can sit behind a
+    stream wrapper next to the output file.
+
+    Args:
+        schema: Also validate against the Forsta schema.
+        logic: Also analyse the skip logic; the graph is kept on
+            :attr:`graph` for export.
+    """
+
+    def __init__(self, schema: bool = False, logic: bool = False):
+        self._parser = expat.ParserCreate()
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._stack: List[str] = []
+        self._labels: Dict[str, int] = {}
+        self._defined: Set[str] = set()
+        self._refs: List[Tuple[int, int, str, str]] = []
+        self._failed = False
+        self._tree_parser = etree.XMLParser(huge_tree=True) if schema else None
+        self.graph = LogicGraph() if logic else None
+        self.warnings: List[str] = []
+
+    def _where(self) -> str:
+        p = self._parser
+        return f"line {p.CurrentLineNumber}, column {p.CurrentColumnNumber + 1}"
+
+    def _start(self, tag: str, attrs: Dict[str, str]) -> None:
+        if self.graph is not None:
+            p = self._parser
+            self.graph.start(tag, attrs, p.CurrentLineNumber, p.CurrentColumnNumber + 1)
+        stack = self._stack
+        allowed = _ALLOWED_PARENTS.get(tag)
+        if allowed is not None and stack and stack[-1] not in allowed:
+            self.warnings.append(
+                f"Nesting error at {self._where()}: <{tag}"
+                + (f" label='{attrs['label']}'" if "label" in attrs else "")
+                + f"> inside <{stack[-1]}>"
+            )
+        stack.append(tag)
+
+        label = attrs.get("label")
+        if label:
+            if tag == "condition":
+                self._defined.add(label)
+            elif tag in LABELLED_TAGS:
+                first = self._labels.get(label)
+                if first is None:
+                    self._labels[label] = self._parser.CurrentLineNumber
+                else:
+                    self.warnings.append(
+                        f"Duplicate label '{label}' at {self._where()} "
+                        f"(first used at line {first})"
+                    )
+
+        cond = attrs.get("cond")
+        if cond and "condition." in cond:
+            p = self._parser
+            for ref in sorted(condition_expr.condition_refs(condition_expr.parse(cond))):
+                self._refs.append((p.CurrentLineNumber, p.CurrentColumnNumber + 1, label or tag, ref))
+
+    def _end(self, tag: str) -> None:
+        self._stack.pop()
+        if self.graph is not None:
+            self.graph.end(tag)
+
+    def _parse(self, data: str, final: bool = False) -> None:
+        if self._failed:
+            return
+        try:
+            self._parser.Parse(data, final)
+        except expat.ExpatError as e:
+            self._failed = True
+            self.warnings.append(
+                f"XML not well-formed at line {e.lineno}, column {e.offset + 1}: "
+                f"{expat.ErrorString(e.code)}"
+            )
+            return
+        if self._tree_parser is not None:
+            self._tree_parser.feed(data)
+
+    def feed(self, data: str) -> None:
+        # Small writes (one per line) are batched: each Parse call has a
+        # fixed cost far above that of buffering a line.
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= _FEED_SIZE:
+            self._parse("".join(self._pending))
+            self._pending.clear()
+            self._pending_size = 0
+
+    write = feed
+
+    def close(self) -> List[str]:
+        """Finish parsing and return all warnings."""
+        self._parse("".join(self._pending), final=True)
+        self._pending.clear()
+        if self._tree_parser is not None and not self._failed:
+            self._check_schema(self._tree_parser.close())
+        for line, column, owner, ref in self._refs:
+            if ref not in self._defined:
+                self.warnings.append(
+                    f"'{owner}' at line {line}, column {column} references "
+                    f"undefined condition 'condition.{ref}'"
+                )
+        if self.graph is not None and not self._failed:
+            self.warnings.extend(self.graph.analyze())
+        return self.warnings
+
+    def _check_schema(self, root: etree._Element) -> None:
+        schema = forsta_schema()
+        if schema.validate(root):
+            return
+        for error in schema.error_log:
+            self.warnings.append(f"Schema violation at line {error.line}: {error.message}")
+
+
+def validate_xml(xml: str, schema: bool = False, logic: bool = False) -> List[str]:
+    """Validate a complete document; returns the list of warnings."""
+    validator = XmlValidator(schema=schema, logic=logic)
+    validator.feed(xml)
+    return validator.close()
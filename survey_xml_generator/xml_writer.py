@@ -0,0 +1,150 @@
+"""Line-oriented XML writer used by the build and assembly stages.
+
+Builders write their lines straight into an :class:`XmlWriter` instead of
+returning strings that the assembler splits, re-indents and joins again.
+The writer keeps the current indentation level and two bits of state that
+used to need whole-document passes:
+
+- blank lines are held back until the next line is written, so trailing
+  blank lines can be dropped when the document is finished;
+- a ``<suspend/>`` whose previous non-blank line is also ``<suspend/>``
+  is skipped as it is written.
+
+Output goes to any object with a ``write`` method (e.g. an open file, for
+streaming large surveys to disk) or to an in-memory buffer.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+SUSPEND = "<suspend/>"
+
+
+class XmlWriter:
+    """Indentation-aware line writer.
+
+    Args:
+        out: Text stream to write to; None collects into a buffer
+            (see :meth:`getvalue`).
+        level: Starting indentation level.
+        unit: Indentation per level.
+    """
+
+    def __init__(self, out: Optional[TextIO] = None, level: int = 0, unit: str = "  "):
+        self._buffer: List[str] = []
+        self._write = out.write if out is not None else self._buffer.append
+        self._unit = unit
+        self._level = 0
+        self._prefix = ""
+        self.level = level
+        self._sep = ""  # becomes "\n" once the first line is written
+        self._pending_blanks = 0
+        self._after_suspend = False
+        self.line_count = 0
+
+    # -- indentation -------------------------------------------------------
+
+    @property
+    def level(self) -> int:
+        return self._level
+
+    @level.setter
+    def level(self, value: int) -> None:
+        self._level = max(0, value)
+        self._prefix = self._unit * self._level
+
+    def indent(self, levels: int = 1) -> None:
+        self.level = self._level + levels
+
+    def dedent(self, levels: int = 1) -> None:
+        self.level = self._level - levels
+
+    @contextmanager
+    def indented(self, levels: int = 1) -> Iterator["XmlWriter"]:
+        self.indent(levels)
+        try:
+            yield self
+        finally:
+            self.dedent(levels)
+
+    # -- output ------------------------------------------------------------
+
+    def _put(self, text: str) -> None:
+        if self._pending_blanks:
+            self._flush_blanks()
+        self._write(self._sep + text)
+        self._sep = "\n"
+        self.line_count += 1
+
+    def _flush_blanks(self) -> None:
+        self._write(self._sep + "\n" * (self._pending_blanks - 1))
+        self._sep = "\n"
+        self.line_count += self._pending_blanks
+        self._pending_blanks = 0
+
+    def _track(self, text: str) -> bool:
+        """Update the suspend state; False if *text* is a duplicate suspend."""
+        stripped = text.strip()
+        if not stripped:
+            return True
+        if stripped == SUSPEND:
+            if self._after_suspend:
+                return False
+            self._after_suspend = True
+        else:
+            self._after_suspend = False
+        return True
+
+    def line(self, text: str = "") -> None:
+        """Write *text* at the current indentation.
+
+        Newlines inside *text* (multi-line answer or HTML text) are written
+        as they are, so element content is not padded with indentation.
+        ``line("")`` writes the indentation only; use :meth:`blank` for an
+        empty separator line.
+        """
+        # Only lines after a suspend, or suspends themselves, touch the state
+        if (self._after_suspend or text.endswith(SUSPEND)) and not self._track(text):
+            return
+        if self._pending_blanks:
+            self._flush_blanks()
+        self._write(self._sep + self._prefix + text)
+        self._sep = "\n"
+        self.line_count += 1
+
+    def lines(self, texts: Iterable[str]) -> None:
+        """Write each of *texts* at the current indentation (e.g. a row list)."""
+        write, prefix = self._write, self._prefix
+        count = 0
+        for text in texts:
+            if (self._after_suspend or text.endswith(SUSPEND)) and not self._track(text):
+                continue
+            if self._pending_blanks:
+                self._flush_blanks()
+            write(self._sep + prefix + text)
+            self._sep = "\n"
+            count += 1
+        self.line_count += count
+
+    def script(self, text: str) -> None:
+        """Write a line of ``<exec>``/``<validate>`` code at column 0."""
+        if (self._after_suspend or text.endswith(SUSPEND)) and not self._track(text):
+            return
+        self._put(text)
+
+    def blank(self) -> None:
+        """Empty separator line (written only if another line follows)."""
+        self._pending_blanks += 1
+
+    def suspend(self) -> None:
+        self.line(SUSPEND)
+
+    def drop_blanks(self) -> None:
+        """Discard blank lines not yet followed by a line."""
+        self._pending_blanks = 0
+
+    def getvalue(self) -> str:
+        """Everything written so far (buffered writers only)."""
+        return "".join(self._buffer)
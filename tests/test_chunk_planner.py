@@ -0,0 +1,64 @@
+"""Cost-aware chunk planning."""
+
+from survey_xml_generator.chunk_planner import (
+    balanced_partition,
+    lpt_order,
+    plan_chunks,
+    simulate_makespan,
+    submission_order,
+)
+
+
+def _covers(ranges, n):
+    return ranges[0][0] == 0 and ranges[-1][1] == n and all(
+        a[1] == b[0] for a, b in zip(ranges, ranges[1:])
+    )
+
+
+def test_makespan_is_list_scheduling_in_document_order():
+    assert simulate_makespan([], 3) == 0
+    assert simulate_makespan([4, 1, 1, 1], 2) == 4
+    assert simulate_makespan([1, 1, 1, 4], 2) == 5
+    assert simulate_makespan([1, 1, 1, 4], 2, order=[3, 0, 1, 2]) == 4
+
+
+def test_longest_first_only_when_chunks_must_queue():
+    assert lpt_order([1, 4, 2, 4]) == [1, 3, 2, 0]
+    assert submission_order([1, 1, 4], 3) == [0, 1, 2]
+    order = submission_order([1, 1, 1, 4], 2)
+    assert order == [3, 0, 1, 2] and simulate_makespan([1, 1, 1, 4], 2, order) == 4
+
+
+def test_balanced_partition_minimises_the_largest_part():
+    costs = [1, 1, 1, 1, 8, 1, 1, 1, 1]
+    parts = balanced_partition(costs, 3, max_items=9)
+    assert _covers(parts, len(costs)) and len(parts) == 3
+    assert max(sum(costs[s:e]) for s, e in parts) == 8
+
+
+def test_partition_respects_budgets():
+    costs = [1.0] * 6
+    parts = balanced_partition(costs, 1, max_items=6, budgets=[([5] * 6, 10)])
+    assert parts == [(0, 2), (2, 4), (4, 6)]
+
+
+def test_plan_adds_chunks_for_idle_workers_up_to_min_items():
+    costs = [1.0] * 40
+    assert len(plan_chunks(costs, workers=1, max_items=40)) == 1
+    ranges = plan_chunks(costs, workers=4, max_items=40, base_cost=0.5, min_items=10)
+    assert len(ranges) == 4 and _covers(ranges, 40)
+    assert len(plan_chunks(costs, workers=8, max_items=40, base_cost=0.5, min_items=10)) == 4
+
+
+def test_plan_overlap_reaches_into_the_next_chunk():
+    ranges = plan_chunks([1.0] * 30, workers=2, max_items=20, overlap=3)
+    assert len(ranges) == 2
+    (s1, e1), (s2, e2) = ranges
+    assert s1 == 0 and e2 == 30 and e1 == s2 + 3
+    assert all(e - s <= 20 for s, e in ranges)
+
+
+def test_no_more_chunks_than_shorten_the_stage():
+    # With no fixed cost more chunks than workers cannot shorten the stage
+    ranges = plan_chunks([1.0] * 20, workers=2, max_items=20, max_extra_chunks=5)
+    assert len(ranges) == 2
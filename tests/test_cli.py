@@ -0,0 +1,59 @@
+"""Batch CLI: input discovery and output planning."""
+
+from pathlib import Path
+
+import pytest
+
+from survey_xml_generator import cli
+
+
+def _touch(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+    return path
+
+
+def test_recursive_glob_mirrors_paths_below_its_root(tmp_path):
+    a = _touch(tmp_path / "waves" / "a" / "survey.docx")
+    b = _touch(tmp_path / "waves" / "b" / "survey.docx")
+    _touch(tmp_path / "waves" / "a" / "~$survey.docx")
+
+    inputs = cli._discover_inputs([str(tmp_path / "waves" / "**" / "*.docx")])
+    assert inputs == [(a, Path("a/survey.docx")), (b, Path("b/survey.docx"))]
+
+    outputs = cli._plan_outputs(inputs, tmp_path / "out")
+    assert outputs == {
+        a: tmp_path / "out" / "a" / "survey.xml",
+        b: tmp_path / "out" / "b" / "survey.xml",
+    }
+
+
+def test_same_file_name_from_two_inputs_is_an_error(tmp_path):
+    a = _touch(tmp_path / "a" / "survey.docx")
+    b = _touch(tmp_path / "b" / "survey.docx")
+    inputs = cli._discover_inputs([str(tmp_path / "a"), str(b)])
+    assert inputs == [(a, Path("survey.docx")), (b, Path("survey.docx"))]
+    with pytest.raises(ValueError, match="survey.xml"):
+        cli._plan_outputs(inputs, tmp_path / "out")
+
+
+def test_main_stops_before_converting_on_a_clash(tmp_path, capsys):
+    _touch(tmp_path / "a" / "survey.docx")
+    _touch(tmp_path / "b" / "survey.docx")
+    out = tmp_path / "out"
+    code = cli.main([str(tmp_path / "a"), str(tmp_path / "b"), "-o", str(out), "--dry-run"])
+    assert code == 1
+    assert "Output name clash" in capsys.readouterr().err
+    assert not out.exists()
+
+
+def test_a_file_listed_twice_is_converted_once(tmp_path):
+    a = _touch(tmp_path / "survey.docx")
+    inputs = cli._discover_inputs([str(a), str(tmp_path), str(tmp_path / "*.docx")])
+    assert inputs == [(a, Path("survey.docx"))]
+
+
+def test_glob_root_stops_at_the_first_wildcard():
+    assert cli._glob_root("waves/2024/*W3*.docx") == Path("waves/2024")
+    assert cli._glob_root("waves/**/x.docx") == Path("waves")
+    assert cli._glob_root("*.docx") == Path(".")
@@ -0,0 +1,131 @@
+"""Combined segment+classify call for small documents."""
+
+import threading
+
+import pytest
+
+from survey_xml_generator import ai_client, combined
+
+_BLOCKS = [
+    {"block_type": "paragraph", "index": 0, "text": "Q. AGE"},
+    {"block_type": "paragraph", "index": 1, "text": "How old are you?"},
+    {"block_type": "paragraph", "index": 2, "text": "Under 18", "is_list_item": True},
+    {"block_type": "paragraph", "index": 3, "text": "18 or older", "is_list_item": True},
+    {"block_type": "pagebreak", "index": 4, "text": ""},
+    {"block_type": "paragraph", "index": 5, "text": "Q. REGION"},
+    {"block_type": "paragraph", "index": 6, "text": "Where do you live?"},
+    {"block_type": "paragraph", "index": 7, "text": "North", "is_list_item": True},
+    {"block_type": "paragraph", "index": 8, "text": "South", "is_list_item": True},
+]
+
+_SEGMENTS = [
+    {
+        "block_type": "question", "label": "qAge", "title_text": "How old are you?",
+        "answer_lines": ["Under 18", "18 or older"], "paragraph_indices": [0, 1, 2, 3],
+    },
+    {
+        "block_type": "question", "label": "qRegion", "title_text": "Where do you live?",
+        "answer_lines": ["North", "South"], "paragraph_indices": [5, 6, 7, 8],
+    },
+]
+
+
+def _question(label, title, answers):
+    return {
+        "forsta_type": "radio", "label": label, "title": title,
+        "answers": [{"label": f"r{i}", "text": a} for i, a in enumerate(answers, 1)],
+    }
+
+
+_QUESTIONS = [
+    _question("qAge", "How old are you?", ["Under 18", "18 or older"]),
+    _question("qRegion", "Where do you live?", ["North", "South"]),
+]
+
+
+@pytest.fixture
+def fake_ai(monkeypatch):
+    """Replace the AI call; the test sets ``answer`` (or an exception)."""
+    state = {"answer": None, "calls": []}
+
+    def call_ai(**kwargs):
+        state["calls"].append({
+            "kwargs": kwargs,
+            "thread": threading.current_thread().name,
+            "job": ai_client._current_job.get(),
+        })
+        if isinstance(state["answer"], Exception):
+            raise state["answer"]
+        return state["answer"]
+
+    monkeypatch.setattr(combined, "call_ai", call_ai)
+    return state
+
+
+@pytest.fixture
+def separate_classify(monkeypatch):
+    """Record fallbacks to the classification stage instead of calling the AI."""
+    calls = []
+    real = combined.classify_segments
+
+    def classify_segments(segments, **kwargs):
+        if kwargs.get("classified") is not None:
+            return real(segments, **kwargs)
+        calls.append([s.get("label") for s in segments])
+        return {"conditions": [], "questions": []}
+
+    monkeypatch.setattr(combined, "classify_segments", classify_segments)
+    return calls
+
+
+def test_one_call_segments_and_classifies(fake_ai, separate_classify):
+    fake_ai["answer"] = {"segments": _SEGMENTS, "conditions": [], "questions": _QUESTIONS}
+    segments, classified = combined.segment_and_classify(_BLOCKS)
+
+    assert [s["block_type"] for s in segments] == ["question", "pagebreak", "question"]
+    assert [q["label"] for q in classified["questions"] if "label" in q] == ["qAge", "qRegion"]
+    assert classified["combined"]["classified_by"] == "combined"
+    assert len(fake_ai["calls"]) == 1 and separate_classify == []
+
+
+def test_call_runs_on_the_scheduler(fake_ai, separate_classify):
+    fake_ai["answer"] = {"segments": _SEGMENTS, "conditions": [], "questions": _QUESTIONS}
+    combined.segment_and_classify(_BLOCKS)
+
+    (call,) = fake_ai["calls"]
+    assert call["thread"] == "ai-scheduler"
+    assert call["job"] is not None and call["job"].name == "segment_classify"
+    assert call["kwargs"]["max_retries"] == 1
+
+
+def test_call_joins_the_runs_job(fake_ai, separate_classify):
+    fake_ai["answer"] = {"segments": _SEGMENTS, "conditions": [], "questions": _QUESTIONS}
+    with ai_client.ai_job("survey") as job:
+        combined.segment_and_classify(_BLOCKS)
+    assert fake_ai["calls"][0]["job"] is job
+
+
+@pytest.mark.parametrize("answer", [
+    RuntimeError("truncated JSON"),
+    {"segments": [], "conditions": [], "questions": _QUESTIONS},
+    ["not", "an", "object"],
+])
+def test_unusable_answer_falls_back_to_two_stages(fake_ai, separate_classify, answer):
+    fake_ai["answer"] = answer
+    assert combined.segment_and_classify(_BLOCKS) is None
+    assert separate_classify == []
+
+
+def test_missing_question_classifies_the_segments_separately(fake_ai, separate_classify):
+    fake_ai["answer"] = {"segments": _SEGMENTS, "conditions": [], "questions": _QUESTIONS[:1]}
+    segments, classified = combined.segment_and_classify(_BLOCKS)
+
+    assert separate_classify == [["qAge", None, "qRegion"]]
+    assert classified["combined"]["classified_by"] == "classifier"
+    assert len(segments) == 3
+
+
+def test_large_document_is_not_sent(fake_ai, monkeypatch):
+    monkeypatch.setattr(combined, "COMBINED_MAX_DOCUMENT_TOKENS", 10)
+    assert combined.segment_and_classify(_BLOCKS) is None
+    assert fake_ai["calls"] == []
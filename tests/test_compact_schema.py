@@ -0,0 +1,79 @@
+"""Compact classification schema: short keys expand to the long form."""
+
+from survey_xml_generator.compact_schema import expand_option, expand_response
+from survey_xml_generator.prompts.classification import COMPACT_USER_PROMPT_TEMPLATE
+from survey_xml_generator.xml_builder import build_number, build_radio
+
+
+def test_questions_conditions_and_flags():
+    result = expand_response({
+        "c": [["US_Respondent", "(qCountry.match=United States)", "US"]],
+        "q": [{
+            "t": "checkbox", "l": "qActivities", "ti": "Which?", "sh": True,
+            "a": [["r1", "Hiking"], ["r2", "Other (please specify)", "ao"], ["r3", "None", "xa"]],
+        }],
+    })
+    assert result["conditions"] == [
+        {"label": "US_Respondent", "cond": "(qCountry.match=United States)", "description": "US"},
+    ]
+    (q,) = result["questions"]
+    assert q["forsta_type"] == "checkbox" and q["shuffle"] is True
+    assert q["answers"] == [
+        {"label": "r1", "text": "Hiking"},
+        {"label": "r2", "text": "Other (please specify)", "randomize": "0", "open": "1", "openSize": 25},
+        {"label": "r3", "text": "None", "exclusive": "1", "randomize": "0"},
+    ]
+
+
+def test_answer_cond():
+    (q,) = expand_response({"q": [{
+        "t": "radio", "l": "qStay", "ti": "Where?",
+        "a": [["r1", "Hotel"], ["r2", "Kids club", "", {"c": "(qChildren.r1)"}], ["r3", "Other", "ao", {"c": "1"}]],
+    }]})["questions"]
+    assert q["answers"][1] == {"label": "r2", "text": "Kids club", "cond": "(qChildren.r1)"}
+    assert q["answers"][2]["cond"] == "1" and q["answers"][2]["open"] == "1"
+    assert '<row label="r2" cond="(qChildren.r1)">Kids club</row>' in build_radio(q)
+
+
+def test_matrix_column_values_and_question_values():
+    (q,) = expand_response({"q": [{
+        "t": "radio", "l": "qAgree", "ti": "Agree?", "vl": "order",
+        "mr": [["r1", "Statement"]],
+        "mc": [["c1", "Agree", "", {"v": 2}], ["c2", "Disagree", {"v": 1}]],
+    }]})["questions"]
+    assert q["is_matrix"] is True and q["values"] == "order"
+    assert [c.get("value") for c in q["matrix_cols"]] == [2, 1]
+    xml = build_radio(q)
+    assert 'values="order"' in xml
+    assert '<col label="c1" value="2">Agree</col>' in xml
+
+
+def test_input_rows():
+    (q,) = expand_response({"q": [{
+        "t": "number", "l": "qSpend", "ti": "How much?",
+        "rw": [["r1", "Domestic", "", {"vf": "range(0,99999)"}], "International"],
+    }]})["questions"]
+    assert q["rows"] == [
+        {"label": "r1", "text": "Domestic", "verify": "range(0,99999)"},
+        {"label": "r2", "text": "International"},
+    ]
+    assert '<row label="r1" verify="range(0,99999)">Domestic</row>' in build_number(q)
+
+
+def test_long_form_passes_through():
+    long = {
+        "conditions": [{"label": "a", "cond": "qA.r1", "description": ""}],
+        "questions": [{"forsta_type": "radio", "label": "qA", "answers": [{"label": "r1", "text": "Yes", "cond": "1"}]}],
+    }
+    assert expand_response(long) == long
+
+
+def test_option_edge_cases():
+    assert expand_option("Yes", 3, "ch") == {"label": "ch3", "text": "Yes"}
+    assert expand_option([None, "Yes"], 2) == {"label": "r2", "text": "Yes"}
+    assert expand_option([], 1) == []
+
+
+def test_prompt_documents_every_short_key():
+    for key in ("rw = rows", "vl = values", "c = cond", "v = value", "vf = verify", "o = optional"):
+        assert key in COMPACT_USER_PROMPT_TEMPLATE
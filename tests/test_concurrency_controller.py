@@ -0,0 +1,80 @@
+"""Adaptive (AIMD) limit on in-flight AI calls."""
+
+import time
+
+from survey_xml_generator.ai_client import AdaptiveConcurrencyController
+
+
+def _controller(**kwargs):
+    kwargs = {"initial": 4, "min_limit": 1, "max_limit": 8, "adaptive": True, **kwargs}
+    return AdaptiveConcurrencyController(**kwargs)
+
+
+def test_one_step_up_per_round_of_healthy_calls():
+    c = _controller()
+    for _ in range(3):
+        c.record_success(time.monotonic())
+    assert c.limit == 4
+    c.record_success(time.monotonic())
+    assert c.limit == 5
+    for _ in range(5):
+        c.record_success(time.monotonic())
+    assert c.limit == 6 and c.metrics()["increases"] == 2
+
+
+def test_growth_stops_at_the_ceiling():
+    c = _controller(initial=8)
+    for _ in range(20):
+        c.record_success(time.monotonic())
+    assert c.limit == 8
+
+
+def test_throttle_halves_and_ignores_calls_started_before():
+    c = _controller(initial=8)
+    started = time.monotonic()
+    c.record_throttle(started)
+    assert c.limit == 4
+    # issued under the old limit: no second cut, no growth credit
+    c.record_timeout(started)
+    for _ in range(8):
+        c.record_success(started)
+    assert c.limit == 4
+    m = c.metrics()
+    assert (m["throttles"], m["timeouts"], m["decreases"]) == (1, 1, 1)
+
+
+def test_floor_and_plain_errors():
+    c = _controller(initial=1)
+    c.record_throttle(time.monotonic())
+    c.record_error(time.monotonic())
+    assert c.limit == 1 and c.metrics()["errors"] == 1
+
+
+def test_inflated_per_token_latency_pauses_growth():
+    c = _controller(initial=2)
+    now = time.monotonic()
+    c.record_success(now - 1.0, completion_tokens=100)  # baseline 0.01 s/token
+    c.record_success(now - 5.0, completion_tokens=100)  # 5x slower
+    assert c.limit == 2
+    c.record_success(time.monotonic() - 1.0, completion_tokens=100)
+    c.record_success(time.monotonic() - 1.0, completion_tokens=100)
+    assert c.limit == 3
+
+
+def test_listeners_and_ceiling_changes():
+    c = _controller(initial=6)
+    seen = []
+    c.add_listener(seen.append)
+    c.set_max_limit(3)
+    assert c.limit == 3 and seen == [3]
+    c.set_max_limit(10)
+    assert c.limit == 3 and seen == [3]
+
+
+def test_fixed_limit_when_not_adaptive():
+    c = _controller(adaptive=False)
+    c.record_throttle(time.monotonic())
+    for _ in range(10):
+        c.record_success(time.monotonic())
+    assert c.limit == 4
+    assert c.metrics()["throttles"] == 1
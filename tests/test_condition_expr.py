@@ -0,0 +1,78 @@
+"""Condition expressions: parse / serialise round-trips and rewrites."""
+
+import pytest
+
+from survey_xml_generator import condition_expr as ce
+
+
+@pytest.mark.parametrize("expr", [
+    "(qAge.r2) and (condition.US_Respondent)",
+    "not(qA.r1 or qA.r2)",
+    "qX.check('1') and qY.r1.c2",
+    "(qCountry.match=United States) and qAge.r3",
+    "qA.count >= 2 or not qB.any",
+    "qA.r1 and (",
+])
+def test_round_trip_keeps_the_text(expr):
+    assert ce.to_string(ce.parse(expr)) == expr
+
+
+def test_unparseable_text_is_kept_raw():
+    node = ce.parse("qA.r1 and (")
+    assert isinstance(node, ce.Raw)
+    assert ce.rename_expr("qA.r1 and (", questions={"qA": "qB"}) == "qA.r1 and ("
+
+
+def test_references():
+    node = ce.parse("(qCountry.match=France) and (condition.adult) and qX.check('2')")
+    assert ce.question_refs(node) == {"qCountry", "qX"}
+    assert ce.condition_refs(node) == {"adult"}
+    assert ce.referenced_questions(
+        "condition.a and qZ.r1", {"a": "qA.r1 or condition.b", "b": "qB.r2 and condition.a"},
+    ) == {"qA", "qB", "qZ"}
+
+
+def test_rename_questions_choices_and_conditions():
+    expr = "(qA.ch2) and not(condition.old) or qB.r1"
+    renamed = ce.rename_expr(
+        expr, questions={"qB": "qB2"}, choices={"qA": {"ch2": "r2"}}, conditions={"old": "new"},
+    )
+    assert renamed == "(qA.r2) and not(condition.new) or qB2.r1"
+    # and back again
+    assert ce.rename_expr(
+        renamed, questions={"qB2": "qB"}, choices={"qA": {"r2": "ch2"}}, conditions={"new": "old"},
+    ) == expr
+
+
+def test_rename_without_a_match_returns_the_same_string():
+    expr = "(qA.r1)  and  qB.r2"
+    assert ce.rename_expr(expr, questions={"qC": "qD"}) is expr
+
+
+def test_resolve_matches_folds_unresolved_placeholders_to_true():
+    node = ce.parse("(qC.match=France) and not(qC.match=Mars)")
+    resolved = ce.resolve_matches(node, lambda label, value: {"France": "FRA"}.get(value))
+    assert ce.to_string(resolved) == "(qC.FRA) and 1"
+
+
+@pytest.mark.parametrize("expr, expected", [
+    ("qA=2", "qA.check('2')"),
+    ("qA<18", "qA.check('<18')"),
+    ("condition.X", "(condition.X)"),
+    ("!(condition.X)", "not(condition.X)"),
+    ("condition.X and qA.r1", "(condition.X) and qA.r1"),
+])
+def test_normalize(expr, expected):
+    assert ce.to_string(ce.normalize(ce.parse(expr))) == expected
+
+
+def test_conjoin_and_negate():
+    joined = ce.conjoin(ce.parse("qA.r1 or qA.r2"), ce.parse("qB.r1"))
+    assert ce.to_string(joined) == "(qA.r1 or qA.r2) and (qB.r1)"
+    assert ce.to_string(ce.negate(ce.parse("qA.r1"))) == "not(qA.r1)"
+    assert ce.to_string(ce.negate(ce.negate(ce.parse("qA.r1")))) == "(qA.r1)"
+    assert [ce.to_string(c) for c in ce.conjuncts(joined)] == ["qA.r1 or qA.r2", "qB.r1"]
+
+
+def test_key_ignores_whitespace():
+    assert ce.key("( qA.r1 )and qB.r2") == ce.key("(qA.r1) and qB.r2")
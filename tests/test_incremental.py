@@ -0,0 +1,144 @@
+"""Incremental runs: planning against a run store and splicing results."""
+
+from survey_xml_generator.incremental import (
+    build_run_store,
+    is_usable_store,
+    plan_incremental,
+    splice_classified,
+    splice_segments,
+)
+
+
+def _blocks(*texts):
+    return [{"block_type": "paragraph", "index": i, "text": t} for i, t in enumerate(texts)]
+
+
+_OLD = _blocks("Q. AGE", "How old are you?", "Q. REGION", "Where do you live?", "Q. PETS", "Any pets?")
+_SEGMENTS = [
+    {"block_type": "question", "label": "qAge", "paragraph_indices": [0, 1]},
+    {"block_type": "question", "label": "qRegion", "paragraph_indices": [2, 3]},
+    {"block_type": "question", "label": "qPets", "paragraph_indices": [4, 5]},
+]
+_CONDITIONS = [
+    {"label": "adult", "cond": "qAge.r2"},
+    {"label": "adultNorth", "cond": "(condition.adult) and qRegion.r1"},
+    {"label": "south", "cond": "qRegion.r2"},
+    {"label": "unused", "cond": "qAge.r1"},
+]
+_QUESTIONS = [
+    {"label": "qAge", "forsta_type": "radio", "_sort_key": 0},
+    {"label": "qRegion", "forsta_type": "radio", "_sort_key": 2, "cond": "(condition.adult)"},
+    {
+        "label": "qPets", "forsta_type": "radio", "_sort_key": 4,
+        "answers": [{"label": "r1", "text": "Dog", "cond": "(condition.adultNorth)"}],
+    },
+]
+
+
+def _store():
+    return build_run_store(_OLD, _SEGMENTS, {"conditions": _CONDITIONS, "questions": _QUESTIONS})
+
+
+def test_unchanged_document_reuses_everything():
+    plan = plan_incremental(_OLD, _store())
+    assert len(plan.dirty_blocks) == 0 and plan.reuse_fraction == 1
+    assert [q["label"] for q in plan.reused_elements] == ["qAge", "qRegion", "qPets"]
+
+
+def test_edit_and_insertion_shift_reused_indices():
+    new = _blocks("Intro", "Q. AGE", "How old are you?", "Q. REGION", "Where do you live now?", "Q. PETS", "Any pets?")
+    plan = plan_incremental(new, _store())
+
+    assert [b["text"] for b in plan.dirty_blocks] == ["Intro", "Q. REGION", "Where do you live now?"]
+    assert [(s["label"], s["paragraph_indices"]) for s in plan.reused_segments] == [
+        ("qAge", [1, 2]), ("qPets", [5, 6]),
+    ]
+    assert [(q["label"], q["_sort_key"]) for q in plan.reused_elements] == [("qAge", 1), ("qPets", 5)]
+
+
+def test_only_conditions_of_reused_elements_are_carried():
+    new = list(_OLD)
+    new[3] = dict(new[3], text="Where do you live now?")
+    plan = plan_incremental(new, _store())
+    # qPets' answer uses adultNorth, which uses adult; qRegion was dirty
+    assert [c["label"] for c in plan.reused_conditions] == ["adult", "adultNorth"]
+    assert plan.reused_conditions[0] is not _CONDITIONS[0]
+
+
+def test_clashing_fresh_conditions_are_renamed():
+    new = list(_OLD)
+    new[3] = dict(new[3], text="Where do you live now?")
+    plan = plan_incremental(new, _store())
+    fresh = {
+        "conditions": [
+            {"label": "adult", "cond": "qAge.r3"},
+            {"label": "adultNorth", "cond": "(condition.adult) and qRegion.r1"},
+            {"label": "south", "cond": "qRegion.r2"},
+        ],
+        "questions": [{
+            "label": "qRegion", "forsta_type": "radio", "_sort_key": 2, "cond": "(condition.adult)",
+            "answers": [{"label": "r1", "text": "North", "cond": "(condition.adult)"}],
+        }],
+    }
+    merged = splice_classified(plan, fresh)
+    assert [q["label"] for q in merged["questions"]] == ["qAge", "qRegion", "qPets"]
+    # adultNorth reads the same but now refers to the fresh adult
+    assert merged["conditions"] == [
+        {"label": "adult_2", "cond": "qAge.r3"},
+        {"label": "adultNorth_2", "cond": "(condition.adult_2) and qRegion.r1"},
+        {"label": "south", "cond": "qRegion.r2"},
+        {"label": "adult", "cond": "qAge.r2"},
+        {"label": "adultNorth", "cond": "(condition.adult) and qRegion.r1"},
+    ]
+    assert merged["condition_renames"] == {"adult": "adult_2", "adultNorth": "adultNorth_2"}
+    region = merged["questions"][1]
+    assert region["cond"] == "(condition.adult_2)"
+    assert region["answers"][0]["cond"] == "(condition.adult_2)"
+    assert merged["questions"][2]["answers"][0]["cond"] == "(condition.adultNorth)"
+
+    new_segments = [{"block_type": "question", "label": "qRegion", "paragraph_indices": [2, 3]}]
+    assert [s["label"] for s in splice_segments(plan, new_segments)] == ["qAge", "qRegion", "qPets"]
+
+
+def test_identical_fresh_conditions_are_not_clashes():
+    new = list(_OLD)
+    new[3] = dict(new[3], text="Where do you live now?")
+    plan = plan_incremental(new, _store())
+    fresh = {
+        "conditions": [{"label": "adult", "cond": "qAge.r2 "}],
+        "questions": [{"label": "qRegion", "forsta_type": "radio", "_sort_key": 2, "cond": "(condition.adult)"}],
+    }
+    merged = splice_classified(plan, fresh)
+    assert [c["label"] for c in merged["conditions"]] == ["adult", "adultNorth"]
+    assert merged["condition_renames"] == {}
+    assert merged["questions"][1]["cond"] == "(condition.adult)"
+
+
+def test_store_usability():
+    assert is_usable_store(_store())
+    assert not is_usable_store(None)
+    assert not is_usable_store(dict(_store(), version=0))
+
+
+def test_pipeline_with_a_fully_reused_store():
+    from survey_xml_generator import assembler
+
+    questions = [
+        {
+            "forsta_type": "radio", "label": "qAge", "title": "How old are you?", "_sort_key": 0,
+            "answers": [{"label": "r1", "text": "Under 18"}, {"label": "r2", "text": "18 or older"}],
+        },
+        {"forsta_type": "html", "label": "iThanks", "content": "Thanks", "_sort_key": 2, "cond": "(condition.adult)"},
+    ]
+    blocks = _blocks("Q. AGE", "How old are you?", "Thanks")
+    segments = [
+        {"block_type": "question", "label": "qAge", "paragraph_indices": [0, 1]},
+        {"block_type": "text_screen", "label": "iThanks", "paragraph_indices": [2]},
+    ]
+    store = build_run_store(blocks, segments, {"conditions": [_CONDITIONS[0]], "questions": questions})
+
+    xml, warnings, debug = assembler._run_pipeline(blocks, "S", None, None, previous_store=store)
+    assert debug["incremental"]["blocks_dirty"] == 0
+    assert "assemble" in debug["timings"]
+    assert 'label="qAge"' in xml and '<condition label="adult"' in xml
+    assert 'cond="(condition.adult)"' in xml
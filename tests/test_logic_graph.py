@@ -0,0 +1,84 @@
+"""Static skip-logic analysis of the assembled XML."""
+
+from survey_xml_generator.logic_graph import LogicGraph
+
+
+def _survey(*elements):
+    return "<survey>\n" + "\n".join(elements) + "\n</survey>"
+
+
+def _radio(label, rows=("r1", "r2", "r3"), cond="", row_conds=None):
+    row_conds = row_conds or {}
+    attr = f' cond="{cond}"' if cond else ""
+    body = "".join(
+        f'<row label="{r}"' + (f' cond="{row_conds[r]}"' if r in row_conds else "") + f">{r}</row>"
+        for r in rows
+    )
+    return f'<radio label="{label}"{attr}><title>T</title>{body}</radio>'
+
+
+def _analyze(*elements):
+    return LogicGraph.from_xml(_survey(*elements)).analyze()
+
+
+def test_forward_reference_is_reported_once_per_question():
+    warnings = _analyze(
+        '<html label="iIntro" cond="q1.r1 or q1.r2 or q1.r3">Hi</html>',
+        "<suspend/>",
+        _radio("q1"),
+    )
+    assert warnings == ["'iIntro' at line 2, column 1 depends on q1, which is asked on a later page (line 4)"]
+
+
+def test_undefined_question_is_reported_once_per_element():
+    warnings = _analyze(_radio("q1", cond="qX.r1 or qX.r2", row_conds={"r2": "qX.r3"}))
+    assert warnings == ["'q1' at line 2, column 1 references undefined question 'qX'"]
+
+
+def test_missing_option_is_reported_once_per_element():
+    warnings = _analyze(
+        _radio("q1"),
+        "<suspend/>",
+        _radio("q2", cond="q1.r7 or (q1.r7 and q1.r1)"),
+    )
+    assert warnings == ["'q2' at line 4, column 1 references q1.r7, but q1 has no row, column or choice 'r7'"]
+
+
+def test_each_element_gets_its_own_warning():
+    warnings = _analyze(_radio("q1", cond="qX.r1"), _radio("q2", cond="qX.r1"))
+    assert len(warnings) == 2
+
+
+def test_contradiction_through_block_and_definition():
+    warnings = _analyze(
+        '<condition label="isYoung" cond="q1.r1"/>',
+        _radio("q1"),
+        "<suspend/>",
+        '<block label="bOld" cond="q1.r2">',
+        '<html label="iYoung" cond="condition.isYoung">x</html>',
+        "</block>",
+    )
+    assert warnings == ["'iYoung' at line 6, column 1 can never be shown: its condition requires both q1.r1 and q1.r2"]
+
+
+def test_condition_cycle():
+    warnings = _analyze(
+        '<condition label="a" cond="condition.b"/>',
+        '<condition label="b" cond="condition.a"/>',
+    )
+    assert len(warnings) == 1 and warnings[0].startswith("Circular condition dependency: condition.")
+
+
+def test_unconditional_term_cuts_off_what_follows():
+    warnings = _analyze(_radio("q1"), "<suspend/>", '<term label="tAll"/>', _radio("q2"))
+    assert warnings == [
+        "'tAll' at line 4, column 1 has no condition and terminates every respondent "
+        "who reaches it; 1 element(s) after it are unreachable"
+    ]
+
+
+def test_graph_export_marks_undefined_targets():
+    graph = LogicGraph.from_xml(_survey(_radio("q1", cond="qX.r1")))
+    data = graph.to_dict()
+    assert {"id": "qX", "kind": "undefined"} in data["nodes"]
+    assert {"source": "q1", "target": "qX", "kind": "cond"} in data["edges"]
@@ -0,0 +1,138 @@
+"""Post-processing rule engine and the classifier's registered rules."""
+
+import pytest
+
+from survey_xml_generator.classifier import _POSTPROCESS
+from survey_xml_generator.postprocess import SURVEY, PostProcessContext, RuleEngine
+
+
+def _ctx(questions, segments=(), conditions=()):
+    return PostProcessContext(list(questions), list(segments), list(conditions))
+
+
+def test_question_rules_are_fused_between_survey_barriers():
+    engine = RuleEngine()
+    calls = []
+
+    @engine.rule("b", after=("a",))
+    def b(q, ctx):
+        calls.append(("b", q["label"]))
+        return q["label"] == "q1"
+
+    @engine.rule("a")
+    def a(q, ctx):
+        calls.append(("a", q["label"]))
+        return False
+
+    @engine.rule("sweep", scope=SURVEY, after=("b",))
+    def sweep(ctx):
+        calls.append(("sweep", None))
+        return 3
+
+    @engine.rule("c", after=("sweep",))
+    def c(q, ctx):
+        calls.append(("c", q["label"]))
+
+    assert [[r.name for r in stage] for stage in engine.plan()] == [["a", "b"], ["sweep"], ["c"]]
+
+    stats = engine.run(_ctx([{"label": "q1"}, {"label": "q2"}]))
+    assert calls == [
+        ("a", "q1"), ("b", "q1"), ("a", "q2"), ("b", "q2"),
+        ("sweep", None),
+        ("c", "q1"), ("c", "q2"),
+    ]
+    assert {name: s["changes"] for name, s in stats.items()} == {"a": 0, "b": 1, "sweep": 3, "c": 0}
+    assert stats["sweep"]["scope"] == SURVEY
+
+
+def test_registration_order_breaks_ties():
+    engine = RuleEngine()
+    for name in ("x", "y", "z"):
+        engine.rule(name)(lambda q, ctx: False)
+    assert [r.name for r in engine.plan()[0]] == ["x", "y", "z"]
+
+
+@pytest.mark.parametrize("rules, message", [
+    ([("a", ("b",)), ("b", ("a",))], "Dependency cycle"),
+    ([("a", ("missing",))], "unknown rule 'missing'"),
+])
+def test_bad_dependencies(rules, message):
+    engine = RuleEngine()
+    for name, after in rules:
+        engine.rule(name, after=after)(lambda q, ctx: False)
+    with pytest.raises(ValueError, match=message):
+        engine.plan()
+
+
+def test_duplicate_rule_and_unknown_scope():
+    engine = RuleEngine()
+    engine.rule("a")(lambda q, ctx: False)
+    with pytest.raises(ValueError, match="already registered"):
+        engine.rule("a")(lambda q, ctx: False)
+    with pytest.raises(ValueError, match="scope"):
+        engine.rule("b", scope="chunk")(lambda q, ctx: False)
+
+
+def test_classifier_plan_converts_selects_before_resolving_conditions():
+    stages = [[r.name for r in stage] for stage in _POSTPROCESS.plan()]
+    flat = [name for stage in stages for name in stage]
+    assert flat.index("select_to_radio") < flat.index("rewrite_converted_refs") < flat.index("resolve_cond_references")
+    assert flat.index("dedupe_conditions") < flat.index("explicit_answers")
+    assert "anchor_exclusive" in stages[-1] and "other_open_end" in stages[-1]
+
+
+def test_select_to_radio_renames_choice_references():
+    questions = [
+        {
+            "forsta_type": "select", "label": "qPets", "title": "Do you have pets?",
+            "choices": [{"label": "ch1", "text": "Yes"}, {"label": "ch2", "text": "No"}],
+        },
+        {"forsta_type": "radio", "label": "qDog", "title": "Dog?", "cond": "(qPets.ch1)", "answers": []},
+    ]
+    segments = [{"block_type": "question", "label": "qPets", "title_text": "Do you have pets?", "answer_lines": ["Yes", "No"]}]
+    ctx = _ctx(questions, segments, [{"label": "petOwner", "cond": "(qPets.ch1)"}])
+    stats = _POSTPROCESS.run(ctx)
+
+    assert questions[0]["forsta_type"] == "radio"
+    assert [a["label"] for a in questions[0]["answers"]] == ["r1", "r2"]
+    assert questions[1]["cond"] == "(qPets.r1)"
+    assert ctx.conditions[0]["cond"] == "(qPets.r1)"
+    assert stats["select_to_radio"]["changes"] == 1
+
+
+def test_catch_all_answers_are_anchored_and_exclusive():
+    q = {
+        "forsta_type": "checkbox", "label": "qBrands", "title": "Which brands?", "comment": "Select all that apply.",
+        "answers": [
+            {"label": "r1", "text": "Brand A"},
+            {"label": "r2", "text": "Other", "open": "1", "openSize": 25},
+            {"label": "r3", "text": "None of the above"},
+        ],
+    }
+    segments = [{"block_type": "question", "label": "qBrands", "answer_lines": ["Brand A", "Other", "None of the above"]}]
+    _POSTPROCESS.run(_ctx([q], segments))
+
+    brand, other, none = q["answers"]
+    assert "randomize" not in brand
+    assert "open" not in other
+    assert none["randomize"] == "0" and none["exclusive"] == "1"
+
+
+def test_duplicate_conditions_are_merged_in_nested_conds():
+    questions = [{
+        "forsta_type": "radio", "label": "qStay", "title": "Where?", "cond": "(condition.US_Resp)",
+        "answers": [
+            {"label": "r1", "text": "Hotel"},
+            {"label": "r2", "text": "Motel", "cond": "(condition.US_Resp)"},
+        ],
+    }]
+    conditions = [
+        {"label": "US", "cond": "(qCountry.r1)"},
+        {"label": "US_Resp", "cond": "(qCountry.r1)"},
+    ]
+    ctx = _ctx(questions, conditions=conditions)
+    _POSTPROCESS.run(ctx)
+
+    assert [c["label"] for c in ctx.conditions] == ["US"]
+    assert questions[0]["cond"] == "(condition.US)"
+    assert questions[0]["answers"][1]["cond"] == "(condition.US)"
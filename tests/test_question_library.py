@@ -0,0 +1,98 @@
+"""Question library: near-match lookup reuses structure, never stale text."""
+
+import pytest
+
+from survey_xml_generator.classifier import _split_library_segments
+from survey_xml_generator.question_library import QuestionLibrary, retext_question
+
+_TITLE = (
+    "Thinking about all of the leisure trips you took with family or friends, "
+    "how many nights in total did you spend away from home during {}?"
+)
+_ANSWERS = [
+    "None at all",
+    "One to three nights",
+    "Four to seven nights",
+    "Eight to fourteen nights",
+    "Fifteen nights or more",
+]
+
+
+def _segment(year="2024", answers=_ANSWERS, **extra):
+    seg = {
+        "block_type": "question",
+        "label": "qNights",
+        "title_text": _TITLE.format(year) + " [RANDOMIZE]",
+        "instruction_text": "Select one.",
+        "answer_lines": list(answers),
+        "inline_modifiers": ["RANDOMIZE"],
+        "conditions": [],
+        "paragraph_indices": [3],
+    }
+    seg.update(extra)
+    return seg
+
+
+def _question(year="2024"):
+    return {
+        "forsta_type": "radio",
+        "label": "qNights",
+        "title": _TITLE.format(year),
+        "comment": "Select one.",
+        "shuffle": True,
+        "answers": [{"label": f"r{i}", "text": a} for i, a in enumerate(_ANSWERS, 1)],
+    }
+
+
+@pytest.fixture
+def library(tmp_path):
+    lib = QuestionLibrary(tmp_path / "library.sqlite3")
+    lib.add([(_segment(), _question())])
+    return lib
+
+
+def test_renumbered_segment_reuses_stored_question(library):
+    seg = _segment(label="qNew", title_text="Q7. " + _TITLE.format("2024") + " [RANDOMIZE]")
+    match = library.lookup([seg])[0]
+    assert match is not None
+    assert match.question == _question()
+
+
+def test_edited_title_takes_the_new_text(library):
+    match = library.lookup([_segment(year="2025")])[0]
+    assert match is not None and match.similarity < 1
+    assert match.question["title"] == _TITLE.format("2025")
+    assert [a["text"] for a in match.question["answers"]] == _ANSWERS
+
+
+def test_edited_answer_takes_the_new_text(library):
+    answers = list(_ANSWERS)
+    answers[4] = "Fifteen nights or more [ANCHOR]"
+    assert library.lookup([_segment(answers=answers)])[0] is None
+
+    answers[4] = "Fifteen nights or more  "
+    match = library.lookup([_segment(answers=answers)])[0]
+    assert match.question["answers"][4]["text"] == "Fifteen nights or more"
+
+
+def test_text_the_ai_rewrote_is_not_carried():
+    stored = _segment()
+    question = dict(_question(), title="Nights away from home in 2024?")
+    assert retext_question(stored, question, _segment(year="2025")) is None
+    assert retext_question(stored, question, _segment(label="qOther")) == question
+
+
+def test_other_content_changes_rule_the_match_out():
+    stored = _segment(answer_modifiers={"None at all": ["EXCLUSIVE"]})
+    assert retext_question(stored, _question(), _segment(year="2025")) is None
+
+
+def test_split_applies_label_cond_and_text(library):
+    seg = _segment(year="2025", label="qNights25", paragraph_indices=[40, 41])
+    for_ai, segs, questions, stats = _split_library_segments([seg], [], library)
+    assert for_ai == [] and segs == [seg]
+    (q,) = questions
+    assert q["label"] == "qNights25"
+    assert q["title"] == _TITLE.format("2025")
+    assert q["_sort_key"] == 40
+    assert stats["hits"] == 1
@@ -0,0 +1,127 @@
+"""Process-wide AI scheduler: fairness, priorities and the global limit."""
+
+import threading
+import time
+from contextvars import ContextVar
+
+import pytest
+
+from survey_xml_generator import ai_client
+from survey_xml_generator.ai_client import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    AIScheduler,
+)
+
+
+def _run_in_order(scheduler, queue_tasks):
+    """Hold the only slot, let *queue_tasks* queue work, return dispatch order."""
+    gate = threading.Event()
+    order = []
+    holder = scheduler.register("holder")
+    blocker = holder.submit(gate.wait, 5)
+    futures = queue_tasks(lambda job, name: job.submit(order.append, name))
+    gate.set()
+    blocker.result(timeout=5)
+    for f in futures:
+        f.result(timeout=5)
+    return order
+
+
+def test_weighted_fair_serves_the_least_served_job():
+    scheduler = AIScheduler(max_concurrency=1)
+    big = scheduler.register("tracker")
+    small = scheduler.register("screener")
+
+    def queue(submit):
+        return [submit(big, f"big{i}") for i in range(4)] + [submit(small, f"small{i}") for i in range(2)]
+
+    assert _run_in_order(scheduler, queue) == ["big0", "small0", "big1", "small1", "big2", "big3"]
+
+
+def test_weight_gives_a_larger_share():
+    scheduler = AIScheduler(max_concurrency=1)
+    heavy = scheduler.register("heavy", weight=2)
+    light = scheduler.register("light")
+
+    def queue(submit):
+        return [submit(heavy, f"h{i}") for i in range(4)] + [submit(light, f"l{i}") for i in range(2)]
+
+    assert _run_in_order(scheduler, queue) == ["h0", "l0", "h1", "h2", "l1", "h3"]
+
+
+def test_interactive_jobs_go_before_batch_jobs():
+    scheduler = AIScheduler(max_concurrency=1)
+    batch = scheduler.register("cli", priority=PRIORITY_BATCH)
+    ui = scheduler.register("ui", priority=PRIORITY_INTERACTIVE)
+
+    def queue(submit):
+        return [submit(batch, "b0"), submit(batch, "b1"), submit(ui, "u0"), submit(ui, "u1")]
+
+    assert _run_in_order(scheduler, queue) == ["u0", "u1", "b0", "b1"]
+
+
+def test_round_robin_alternates_jobs():
+    scheduler = AIScheduler(max_concurrency=1, policy="round_robin")
+    a = scheduler.register("a")
+    b = scheduler.register("b")
+
+    def queue(submit):
+        return [submit(a, "a0"), submit(a, "a1"), submit(a, "a2"), submit(b, "b0"), submit(b, "b1")]
+
+    assert _run_in_order(scheduler, queue) == ["a0", "b0", "a1", "b1", "a2"]
+
+
+def test_global_limit_caps_in_flight_tasks():
+    scheduler = AIScheduler(max_concurrency=2)
+    lock = threading.Lock()
+    running = [0, 0]  # current, peak
+
+    def task():
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    jobs = [scheduler.register(f"job{i}") for i in range(3)]
+    futures = [job.submit(task) for job in jobs for _ in range(3)]
+    for f in futures:
+        f.result(timeout=5)
+    assert running[1] == 2
+
+
+def test_lowering_the_limit_takes_effect():
+    scheduler = AIScheduler(max_concurrency=4)
+    scheduler.set_max_concurrency(1)
+    assert scheduler.max_concurrency == 1
+    order = _run_in_order(scheduler, lambda submit: [submit(scheduler.register("j"), "x")])
+    assert order == ["x"]
+
+
+def test_results_exceptions_and_context_reach_the_caller():
+    scheduler = AIScheduler(max_concurrency=2)
+    job = scheduler.register("job")
+    var = ContextVar("var", default="unset")
+    var.set("caller")
+
+    def fail():
+        raise ValueError("boom")
+
+    assert job.submit(var.get).result(timeout=5) == "caller"
+    with pytest.raises(ValueError, match="boom"):
+        job.submit(fail).result(timeout=5)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError, match="policy"):
+        AIScheduler(policy="fifo")
+
+
+def test_nested_ai_jobs_share_the_outer_job():
+    with ai_client.ai_job("survey") as outer:
+        with ai_client.ai_job("segmentation") as inner:
+            assert inner is outer
+        assert outer in ai_client.get_scheduler()._jobs
+    assert outer not in ai_client.get_scheduler()._jobs
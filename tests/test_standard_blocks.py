@@ -0,0 +1,138 @@
+"""Standard demographic blocks: detection, segments and rendering."""
+
+import pytest
+
+from survey_xml_generator.standard_blocks import (
+    STANDARD_BLOCKS,
+    StandardBlock,
+    find_standard_block,
+    register,
+    standard_question_for_segment,
+)
+
+
+def _block(name):
+    return next(b for b in STANDARD_BLOCKS if b.name == name)
+
+
+def _radio(label, title, texts, forsta_type="radio"):
+    return {
+        "forsta_type": forsta_type,
+        "label": label,
+        "title": title,
+        "answers": [{"label": f"r{i}", "text": t} for i, t in enumerate(texts, 1)],
+    }
+
+
+def test_gender_keeps_the_source_answer_text():
+    q = _radio("qGender", "What is your gender?", ["Man", "Woman", "Non-binary", "Prefer not to answer"])
+    assert find_standard_block(q) is _block("gender")
+
+    xml = _block("gender").render(q)
+    assert '<row label="r3">Non-binary</row>' in xml
+    assert "third gender" not in xml
+    assert '<row label="r1">Man</row>' in xml
+    assert '<row label="r4">Prefer not to answer</row>' in xml
+
+
+def test_house_list_decides_row_attributes():
+    q = _radio(
+        "qRace", "Which of the following best describes your race? Select all that apply.",
+        ["White", "Black", "Asian", "Other (please specify)", "Rather not say"], forsta_type="checkbox",
+    )
+    xml = _block("ethnicity").render(q)
+    assert '<checkbox label="qRace" atleast="1">' in xml
+    assert '<row label="r4" randomize="0" open="1" openSize="25">Other (please specify)</row>' in xml
+    assert '<row label="r5" exclusive="1" randomize="0">Rather not say</row>' in xml
+
+
+@pytest.mark.parametrize("name, title, other", [
+    ("gender", "What is your gender?", "Other"),
+    ("ethnicity", "What is your race?", "Something else"),
+])
+def test_bare_other_has_no_open_end(name, title, other):
+    q = _radio("q1", title, ["White", "Black", "Asian", other] if name == "ethnicity" else ["Man", "Woman", other])
+    assert find_standard_block(q) is _block(name)
+    assert f'<row label="r{len(q["answers"])}">{other}</row>' in _block(name).render(q)
+
+    q["answers"][-1]["text"] = "Other [OPEN END]"
+    assert 'open="1" openSize="25">Other [OPEN END]</row>' in _block(name).render(q)
+
+
+def test_income_brackets_keep_their_wording():
+    texts = ["Under $25K", "$25,000 to $49,999", "$50K - $99,999", "$100,000+"]
+    q = _radio("qIncome", "What is your household income?", texts)
+    assert find_standard_block(q) is _block("income")
+    xml = _block("income").render(q)
+    assert all(f">{t}</row>" in xml for t in texts)
+
+
+def test_unknown_option_is_not_standard():
+    q = _radio("qGender", "What is your gender?", ["Man", "Woman", "Two-spirit"])
+    assert find_standard_block(q) is None
+
+
+def test_segment_builds_the_question_with_source_text():
+    seg = {
+        "block_type": "question",
+        "label": "qGender",
+        "title_text": "Q3. What is your gender?",
+        "instruction_text": "Select one.",
+        "answer_lines": ["Male", "Female", "Non binary", "Prefer not to say"],
+        "paragraph_indices": [4],
+    }
+    block, q = standard_question_for_segment(seg)
+    assert block.name == "gender" and q["forsta_type"] == "radio"
+    assert [a["text"] for a in q["answers"]] == ["Male", "Female", "Non binary", "Prefer not to say"]
+
+
+@pytest.mark.parametrize("instruction, modifiers, forsta_type", [
+    ("Select all.", [], "checkbox"),
+    ("Check all", [], "checkbox"),
+    (None, ["MULTI-SELECT"], "checkbox"),
+    ("Please choose one answer.", [], "radio"),
+    (None, ["SINGLE SELECT"], "radio"),
+    (None, [], None),
+    ("Select up to 2.", ["MULTI-SELECT"], None),
+    ("Select one.", ["MULTI-SELECT"], None),
+])
+def test_segment_select_type_needs_clear_wording(instruction, modifiers, forsta_type):
+    seg = {
+        "block_type": "question",
+        "label": "qRace",
+        "title_text": "What is your race?",
+        "instruction_text": instruction,
+        "inline_modifiers": modifiers,
+        "answer_lines": ["White", "Black", "Asian", "Other"],
+    }
+    built = standard_question_for_segment(seg)
+    assert (built and built[1]["forsta_type"]) == forsta_type
+
+
+def test_segment_with_termination_goes_to_the_ai():
+    seg = {
+        "block_type": "question",
+        "label": "qGender",
+        "title_text": "What is your gender?",
+        "answer_lines": ["Male", "Female [TERMINATE]"],
+    }
+    assert standard_question_for_segment(seg) is None
+
+
+def test_zipcode_and_country_templates():
+    zipq = {"forsta_type": "text", "label": "qZip", "title": "Your zip code?", "cond": "qAge.r2"}
+    xml = _block("zipcode").render(zipq)
+    assert xml.startswith('<block label="bZipCode" cond="qAge.r2"')
+    assert "#RECORD = dataFile.get( qZip.val )" in xml
+
+    country = {"forsta_type": "select", "label": "qCountry", "title": "Country?", "special_handling": "countries"}
+    assert find_standard_block(country) is _block("country")
+    assert _block("country").render(country).count("<choice ") > 100
+
+
+def test_register_rejects_duplicate_names():
+    class Gender(StandardBlock):
+        name = "gender"
+
+    with pytest.raises(ValueError, match="already registered"):
+        register(Gender())